@@ -0,0 +1,16 @@
+#-------------------------------------------------------------------------------
+# Name:		benchmarks
+# Purpose:	Throughput benchmarks for the feed processing pipeline. Run them
+#			from the repository root with:
+#
+#				python -m benchmarks [--quick] [--filter name] [--save label]
+#
+#			Results are stored in benchmarks/results so versions can be
+#			compared, see benchmarks.harness.
+#
+#			Queue management is simulated against a fake transmission
+#			server, see benchmarks.queuesim:
+#
+#				python -m benchmarks.queuesim --torrents 5000 --queued 200
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
@@ -0,0 +1,60 @@
+#-------------------------------------------------------------------------------
+# Name:		benchmarks.__main__
+# Purpose:	Command line entry point, see benchmarks/__init__.py
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import argparse, sys
+
+# Sets up the isolated FF_ROOT before flannelfox is imported
+import benchmarks.sandbox
+
+from benchmarks import harness
+
+# Registers the benchmarks
+from benchmarks import bench_scenetools, bench_filters, bench_rss, bench_database, bench_pipeline, queuesim
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m benchmarks', description='flannelfox throughput benchmarks')
+	parser.add_argument('--quick', action='store_true', help='smaller inputs and one timed run')
+	parser.add_argument('--filter', action='append', help='only run benchmarks whose name contains this')
+	parser.add_argument('--save', metavar='LABEL', help='store the results as benchmarks/results/LABEL.json')
+	parser.add_argument('--compare', metavar='LABEL', help='compare with stored results (default: the latest)')
+	parser.add_argument('--threshold', type=float, default=0.10, help='slowdown flagged as a regression (default 0.10)')
+	parser.add_argument('--list', action='store_true', help='list the benchmarks')
+
+	args = parser.parse_args(argv)
+
+	if args.list:
+		for bench in harness.BENCHMARKS:
+			print(bench.name)
+		return 0
+
+	results = harness.runBenchmarks(names=args.filter, quick=args.quick)
+
+	baselineLabel = args.compare or harness.getLatestLabel(exclude=args.save)
+	regressions = []
+
+	if baselineLabel is not None:
+		try:
+			regressions = harness.compareResults(
+				harness.loadResults(baselineLabel),
+				results,
+				threshold=args.threshold,
+				quick=args.quick
+			)
+
+		except (IOError, ValueError) as e:
+			print('Could not load the results of {0}: {1}'.format(baselineLabel, e))
+
+	if args.save:
+		harness.saveResults(args.save, results, quick=args.quick)
+		print('\nSaved to {0}'.format(harness.getResultsFile(args.save)))
+
+	return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
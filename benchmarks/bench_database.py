@@ -0,0 +1,103 @@
+#-------------------------------------------------------------------------------
+# Name:		bench_database
+# Purpose:	sqlite inserts and lookups against a queue of 100k torrents and
+#			TorrentQueue.append, which runs a lookup for every torrent
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import os, sqlite3, tempfile, shutil, time
+
+from flannelfox.databases import ff_sqlite3
+from flannelfox.torrenttools import Torrents, TorrentQueue
+
+from benchmarks.harness import benchmark
+from benchmarks import fixtures
+
+
+def __getDatabase(rows):
+	'''
+	Creates a database in a temp dir holding rows queued tv torrents
+
+	Returns:
+		Tuple (database, directory)
+	'''
+	directory = tempfile.mkdtemp(prefix='flannelfox-bench-db-')
+
+	database = ff_sqlite3.Database(databaseSettings={
+		'databaseLocation': os.path.join(directory, 'flannelfox.db')
+	})
+
+	columns = ('torrentType', 'title', 'season', 'episode', 'quality', 'source', 'codec', 'torrentTitle', 'url', 'feedDestination', 'queuedOn', 'added')
+	now = int(time.time())
+
+	def makeRows():
+		for idx in range(rows):
+			yield (
+				'tv', 'show {0}'.format(idx % 5000), str(idx // 5000 + 1), str(idx % 24 + 1),
+				'720p', 'hdtv', 'x264', 'show.{0}'.format(idx), 'https://tracker.example/seed/{0}'.format(idx),
+				'/data/tv', now, 0
+			)
+
+	connection = sqlite3.connect(database.databaseSettings['databaseLocation'])
+
+	with connection:
+		connection.executemany(
+			'INSERT INTO QueuedTorrents ({0}) VALUES ({1})'.format(
+				','.join('"{0}"'.format(col) for col in columns),
+				','.join('?' for col in columns)
+			),
+			makeRows()
+		)
+
+	connection.close()
+
+	return (database, directory)
+
+
+def __getTorrents(count):
+	return [
+		Torrents.TV(torrentTitle=title, url='https://tracker.example/new/{0}'.format(idx), feedDestination='/data/tv')
+		for idx, title in enumerate(fixtures.tvTitles(count))
+	]
+
+
+@benchmark('ff_sqlite3.addTorrentsToQueue (100k rows)', repeat=3)
+def addTorrentsToQueue(quick):
+	database, directory = __getDatabase(10000 if quick else 100000)
+	torrents = __getTorrents(100 if quick else 1000)
+
+	def run():
+		database.addTorrentsToQueue(torrents)
+
+	return (run, len(torrents), lambda: shutil.rmtree(directory, True))
+
+
+@benchmark('ff_sqlite3.torrentExists (100k rows)', repeat=3)
+def torrentExists(quick):
+	database, directory = __getDatabase(10000 if quick else 100000)
+	torrents = __getTorrents(100 if quick else 1000)
+
+	# Half of the lookups find the torrent
+	database.addTorrentsToQueue(torrents[::2])
+
+	def run():
+		for torrent in torrents:
+			database.torrentExists(torrent=torrent)
+
+	return (run, len(torrents), lambda: shutil.rmtree(directory, True))
+
+
+@benchmark('TorrentQueue.append (100k rows)', repeat=3)
+def queueAppend(quick):
+	database, directory = __getDatabase(10000 if quick else 100000)
+	torrents = __getTorrents(100 if quick else 1000)
+
+	# TorrentQueue uses the database location set above
+	def run():
+		queue = TorrentQueue.Queue()
+
+		for torrent in torrents:
+			queue.append(torrent)
+
+	return (run, len(torrents), lambda: shutil.rmtree(directory, True))
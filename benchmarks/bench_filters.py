@@ -0,0 +1,36 @@
+#-------------------------------------------------------------------------------
+# Name:		bench_filters
+# Purpose:	Generic.filterMatch against large watchlist sized filter lists
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+from flannelfox.torrenttools import Torrents, Filters
+
+from benchmarks.harness import benchmark
+from benchmarks import fixtures
+
+
+def __getTorrents(quick):
+	return [
+		Torrents.TV(torrentTitle=title, url='https://tracker.example/{0}'.format(idx))
+		for idx, title in enumerate(fixtures.tvTitles(200 if quick else 1000))
+	]
+
+
+def __matchFactory(makeFilters):
+
+	def factory(quick):
+		torrents = __getTorrents(quick)
+		filters = makeFilters(fixtures.titleFilters(500 if quick else 5000))
+
+		def run():
+			for torrent in torrents:
+				torrent.filterMatch(filters)
+
+		return (run, len(torrents), None)
+
+	return factory
+
+
+benchmark('Generic.filterMatch list (5k rules)')(__matchFactory(list))
+benchmark('Generic.filterMatch FilterList (5k rules)')(__matchFactory(Filters.FilterList))
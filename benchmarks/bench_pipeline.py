@@ -0,0 +1,64 @@
+#-------------------------------------------------------------------------------
+# Name:		bench_pipeline
+# Purpose:	A full rssReader cycle: config load, fetch from a local http
+#			server, parse, filter, dedupe and the database write
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import os, json, shutil
+
+from flannelfox.settings import settings
+from flannelfox import rssdaemon
+
+from benchmarks.harness import benchmark
+from benchmarks import fixtures
+
+
+@benchmark('rssdaemon.rssReader end to end', repeat=3)
+def rssReader(quick):
+	feeds = 4 if quick else 16
+	itemsPerFeed = 250 if quick else 1000
+
+	documents = {}
+	for idx in range(feeds):
+		documents['/feed{0}'.format(idx)] = fixtures.rssFeed(
+			fixtures.tvTitles(itemsPerFeed),
+			host='tracker{0}.example'.format(idx)
+		)
+
+	server = fixtures.FeedServer(documents)
+	server.start()
+
+	configDir = settings['files']['rssConfigDir']
+
+	if not os.path.exists(configDir):
+		os.makedirs(configDir)
+
+	config = []
+	for idx in range(feeds):
+		config.append({
+			'list_name': 'bench feed {0}'.format(idx),
+			'type': 'tv',
+			'feedDestination': '/data/tv',
+			'minorFeeds': [
+				{'url': server.getUrl('/feed{0}'.format(idx)), 'minRatio': '1.5', 'minTime': '24'}
+			],
+			'filters': [
+				{
+					'exclude': [{'codec': 'xvid'}],
+					'include': [{'quality': '720p'}]
+				}
+			]
+		})
+
+	configFile = os.path.join(configDir, 'bench.json')
+
+	with open(configFile, 'w') as benchConfig:
+		json.dump(config, benchConfig)
+
+	def cleanup():
+		server.stop()
+		os.remove(configFile)
+
+	return (rssdaemon.rssReader, feeds * itemsPerFeed, cleanup)
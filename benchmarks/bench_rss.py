@@ -0,0 +1,48 @@
+#-------------------------------------------------------------------------------
+# Name:		bench_rss
+# Purpose:	Feed parsing: charset conversion and rssToTorrents on large feeds
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+from flannelfox import tools
+from flannelfox import rssdaemon
+from flannelfox.torrenttools import Filters
+
+from benchmarks.harness import benchmark
+from benchmarks import fixtures
+
+
+def __getFeed(quick):
+	titles = fixtures.tvTitles(1000 if quick else 10000)
+	return (fixtures.rssFeed(titles), len(titles))
+
+
+@benchmark('rssdaemon.rssToTorrents (10k items)', repeat=3)
+def rssToTorrents(quick):
+	feed, items = __getFeed(quick)
+
+	def run():
+		rssdaemon.rssToTorrents(feed, feedType='tv', feedDestination='/data/tv')
+
+	return (run, items, None)
+
+
+@benchmark('rssdaemon.rssToTorrents watchlist (10k items, 5k rules)', repeat=3)
+def rssToTorrentsWatchlist(quick):
+	feed, items = __getFeed(quick)
+	feedFilters = Filters.FilterList(fixtures.titleFilters(500 if quick else 5000))
+
+	def run():
+		rssdaemon.rssToTorrents(feed, feedType='tv', feedDestination='/data/tv', feedFilters=feedFilters)
+
+	return (run, items, None)
+
+
+@benchmark('tools.changeCharset (10k items)', repeat=3)
+def changeCharset(quick):
+	feed, items = __getFeed(quick)
+
+	def run():
+		tools.changeCharset(feed, 'utf-8', 'xml')
+
+	return (run, items, None)
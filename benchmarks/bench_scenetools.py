@@ -0,0 +1,31 @@
+#-------------------------------------------------------------------------------
+# Name:		bench_scenetools
+# Purpose:	Title parsing throughput of the scenetools parsers
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+import flannelfox.scenetools.TV
+import flannelfox.scenetools.Movie
+import flannelfox.scenetools.Music
+
+from benchmarks.harness import benchmark
+from benchmarks import fixtures
+
+
+def __parseFactory(parseTitle, makeTitles):
+
+	def factory(quick):
+		titles = makeTitles(500 if quick else 5000)
+
+		def run():
+			for title in titles:
+				parseTitle(title)
+
+		return (run, len(titles), None)
+
+	return factory
+
+
+benchmark('scenetools.TV.parseTitle')(__parseFactory(flannelfox.scenetools.TV.parseTitle, fixtures.tvTitles))
+benchmark('scenetools.Movie.parseTitle')(__parseFactory(flannelfox.scenetools.Movie.parseTitle, fixtures.movieTitles))
+benchmark('scenetools.Music.parseTitle')(__parseFactory(flannelfox.scenetools.Music.parseTitle, fixtures.musicTitles))
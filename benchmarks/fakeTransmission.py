@@ -0,0 +1,479 @@
+#-------------------------------------------------------------------------------
+# Name:		fakeTransmission
+# Purpose:	A local transmission-rpc server that models a seedbox: torrents
+#			download at a rate, switch to seeding, upload, go dormant and
+#			can be removed, stopped, started and verified. Time only moves
+#			when advance is called so the queuedaemon sleeps can be skipped.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import json, time, random, hashlib, threading, socketserver
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from flannelfox.torrentclients.Torrent import Status
+
+
+# Kept before the simulator swaps time.sleep out so the per call latency is
+# real time
+_sleep = time.sleep
+
+GIGABYTE = 1024**3
+MEGABYTE = 1024**2
+
+SESSION_HEADER = 'X-Transmission-Session-Id'
+
+# Reply of a torrent that a tracker no longer knows about
+UNREGISTERED = 'Unregistered torrent'
+
+
+class Clock(object):
+	'''
+	Simulated time in seconds since the epoch
+	'''
+
+	def __init__(self, now=None):
+		self.now = float(now if now is not None else time.time())
+
+
+	def time(self):
+		return self.now
+
+
+class FakeTransmission(socketserver.ThreadingMixIn, HTTPServer):
+	'''
+	Answers transmission-rpc calls on 127.0.0.1 from an in memory model
+
+	Takes:
+		clock - Clock the model runs on
+		latency - Seconds every call takes
+		sessionRotate - Issue a new session id every n calls, 0 never does
+		seed - Seed of the random sizes and rates
+		trackerErrorRate - Fraction of new torrents the tracker rejects
+		badTorrentRate - Fraction of urls that are not valid torrents
+
+	Usage:
+		server = FakeTransmission(Clock())
+		server.populate(1000)
+		server.start()
+		...
+		server.advance(60)
+		server.stop()
+	'''
+
+	daemon_threads = True
+
+	def __init__(self, clock, latency=0.0, sessionRotate=0, seed=1234,
+			trackerErrorRate=0.0, badTorrentRate=0.0):
+
+		self.clock = clock
+		self.latency = latency
+		self.sessionRotate = sessionRotate
+		self.random = random.Random(seed)
+		self.trackerErrorRate = trackerErrorRate
+		self.badTorrentRate = badTorrentRate
+
+		self.lock = threading.Lock()
+
+		# hashString -> torrent dict, in the order they were added
+		self.torrents = {}
+		self.nextId = 1
+
+		# Bytes left on disk by torrents removed without their data
+		self.orphanedBytes = 0
+
+		self.sessionId = None
+		self.sessions = 0
+		self.requests = 0
+
+		# method -> number of calls, conflicts counts the 409 replies
+		self.calls = {}
+		self.conflicts = 0
+
+		# What the model saw happen
+		self.events = {}
+
+		self.__newSession()
+
+		HTTPServer.__init__(self, ('127.0.0.1', 0), RPCRequestHandler)
+		self.thread = None
+
+
+	def __newSession(self):
+		self.sessions += 1
+		self.sessionId = hashlib.sha1('session{0}'.format(self.sessions).encode('ascii')).hexdigest()
+
+
+	def __count(self, values, key, num=1):
+		values[key] = values.get(key, 0) + num
+
+
+	def getUrl(self):
+		return 'http://127.0.0.1:{0}/transmission/rpc'.format(self.server_address[1])
+
+
+	def start(self):
+		self.thread = threading.Thread(target=self.serve_forever)
+		self.thread.daemon = True
+		self.thread.start()
+
+
+	def stop(self):
+		self.shutdown()
+		self.server_close()
+
+
+	@classmethod
+	def getHash(self, url):
+		return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+	def newTorrent(self, url, downloadDir, size=None):
+		'''
+		Adds a torrent to the model, it starts downloading
+
+		Returns:
+			The torrent dict
+		'''
+		rand = self.random
+
+		torrent = {
+			'id': self.nextId,
+			'hashString': self.getHash(url),
+			'name': url.rsplit('/', 1)[-1],
+			'url': url,
+			'downloadDir': downloadDir,
+			'totalSize': size or int(rand.uniform(0.2, 8.0) * GIGABYTE),
+			'downloaded': 0,
+			'uploaded': 0,
+			'rateDownload': int(rand.uniform(1, 20) * MEGABYTE),
+			'rateUpload': 0,
+			# Upload rate while seeding and how long peers stay interested
+			'seedRate': int(rand.expovariate(1.0 / (200 * 1024))),
+			'interest': rand.expovariate(1.0 / (3 * 86400)),
+			'status': Status.Downloading,
+			'stoppedStatus': None,
+			'addedDate': int(self.clock.now),
+			'doneDate': 0,
+			'activityDate': int(self.clock.now),
+			'error': 0,
+			'errorString': '',
+			'trackerResult': '',
+			'trackerSucceeded': True
+		}
+
+		if rand.random() < self.trackerErrorRate:
+			torrent['trackerResult'] = UNREGISTERED
+			torrent['trackerSucceeded'] = False
+			torrent['rateDownload'] = 0
+
+		self.nextId += 1
+		self.torrents[torrent['hashString']] = torrent
+
+		return torrent
+
+
+	def populate(self, count, downloading=0, downloadDir='/data/tv', urlPrefix='https://tracker.example/seed/'):
+		'''
+		Fills the client with count torrents, the first downloading ones are
+		part way through their download and the rest finished at some time
+		over the last two weeks
+
+		Returns:
+			List of the torrent dicts
+		'''
+		torrents = []
+
+		with self.lock:
+			for idx in range(count):
+				torrent = self.newTorrent('{0}{1}.torrent'.format(urlPrefix, idx), downloadDir)
+
+				if idx >= downloading:
+					age = self.random.uniform(0, 14 * 86400)
+					torrent['status'] = Status.Seeding
+					torrent['downloaded'] = torrent['totalSize']
+					torrent['addedDate'] = torrent['doneDate'] = int(self.clock.now - age)
+					torrent['uploaded'] = int(torrent['seedRate'] * min(age, torrent['interest']))
+					torrent['activityDate'] = int(torrent['doneDate'] + min(age, torrent['interest']))
+					self.__updateRates(torrent)
+
+				else:
+					torrent['downloaded'] = int(torrent['totalSize'] * self.random.random())
+
+				torrents.append(torrent)
+
+		return torrents
+
+
+	def __updateRates(self, torrent):
+		'''
+		Peers lose interest in a seed once it is older than its interest
+		'''
+		if torrent['status'] != Status.Seeding:
+			torrent['rateUpload'] = 0
+			return
+
+		if self.clock.now - torrent['doneDate'] < torrent['interest']:
+			torrent['rateUpload'] = torrent['seedRate']
+			if torrent['seedRate'] > 0:
+				torrent['activityDate'] = int(self.clock.now)
+		else:
+			torrent['rateUpload'] = 0
+
+
+	def advance(self, seconds):
+		'''
+		Moves the clock forward and lets the torrents download and upload
+		'''
+		if seconds <= 0:
+			return
+
+		with self.lock:
+			start = self.clock.now
+			self.clock.now += seconds
+
+			for torrent in self.torrents.values():
+
+				if torrent['status'] == Status.Verifying:
+					torrent['status'] = torrent['stoppedStatus']
+					torrent['stoppedStatus'] = None
+
+				if torrent['status'] == Status.Downloading and torrent['rateDownload'] > 0:
+					left = torrent['totalSize'] - torrent['downloaded']
+					needed = left / float(torrent['rateDownload'])
+					torrent['activityDate'] = int(self.clock.now)
+
+					if needed <= seconds:
+						torrent['downloaded'] = torrent['totalSize']
+						torrent['status'] = Status.Seeding
+						torrent['doneDate'] = int(start + needed)
+						self.__count(self.events, 'completed')
+
+					else:
+						torrent['downloaded'] += int(torrent['rateDownload'] * seconds)
+
+				if torrent['status'] == Status.Seeding:
+					self.__updateRates(torrent)
+					torrent['uploaded'] += int(torrent['rateUpload'] * seconds)
+
+
+	def usedSpace(self, folder=None, size='G'):
+		'''
+		Bytes on disk, in the units UsedSpace.check uses
+		'''
+		with self.lock:
+			used = self.orphanedBytes + sum(torrent['downloaded'] for torrent in self.torrents.values())
+
+		return int(used / float(1024**'BKMGT'.index(size)) + 0.999)
+
+
+	def getTorrentFields(self, torrent, fields):
+		values = {
+			'hashString': torrent['hashString'],
+			'id': torrent['id'],
+			'name': torrent['name'],
+			'error': torrent['error'],
+			'errorString': torrent['errorString'],
+			'uploadRatio': round(torrent['uploaded'] / float(torrent['totalSize']), 4),
+			'percentDone': round(torrent['downloaded'] / float(torrent['totalSize']), 4),
+			'doneDate': torrent['doneDate'],
+			'addedDate': torrent['addedDate'],
+			'activityDate': torrent['activityDate'],
+			'rateUpload': torrent['rateUpload'],
+			'rateDownload': torrent['rateDownload'] if torrent['status'] == Status.Downloading else 0,
+			'status': torrent['status'],
+			'downloadDir': torrent['downloadDir'],
+			'totalSize': torrent['totalSize'],
+			'trackerStats': [{
+				'host': 'https://tracker.example:443',
+				'lastAnnounceResult': torrent['trackerResult'],
+				'lastAnnounceSucceeded': torrent['trackerSucceeded']
+			}]
+		}
+
+		return dict((field, values[field]) for field in fields if field in values)
+
+
+	def __getIds(self, arguments):
+		'''
+		Returns:
+			List of the torrents the call is for, transmission takes a single
+			id or hash as well as a list of them
+		'''
+		ids = arguments.get('ids', None)
+
+		if ids is None:
+			return list(self.torrents.values())
+
+		if not isinstance(ids, list):
+			ids = [ids]
+
+		torrents = []
+
+		for torrentId in ids:
+			for torrent in self.torrents.values():
+				if torrent['hashString'] == torrentId or torrent['id'] == torrentId:
+					torrents.append(torrent)
+					break
+
+		return torrents
+
+
+	def call(self, method, arguments):
+		'''
+		Runs a single rpc method
+
+		Returns:
+			Tuple (result, arguments)
+		'''
+		with self.lock:
+
+			if method == 'torrent-get':
+				fields = arguments.get('fields', [])
+				return ('success', {
+					'torrents': [self.getTorrentFields(torrent, fields) for torrent in self.__getIds(arguments)]
+				})
+
+			elif method == 'torrent-add':
+				url = arguments.get('filename', '')
+				torrent = self.torrents.get(self.getHash(url), None)
+
+				if torrent is not None:
+					self.__count(self.events, 'duplicates')
+					return ('success', {'torrent-duplicate': self.getTorrentFields(torrent, ('id', 'name', 'hashString'))})
+
+				if self.random.random() < self.badTorrentRate:
+					self.__count(self.events, 'badTorrents')
+					return ('invalid or corrupt torrent file', {})
+
+				torrent = self.newTorrent(url, arguments.get('download-dir', '/data'))
+				self.__count(self.events, 'added')
+
+				return ('success', {'torrent-added': self.getTorrentFields(torrent, ('id', 'name', 'hashString'))})
+
+			elif method == 'torrent-remove':
+				for torrent in self.__getIds(arguments):
+					del self.torrents[torrent['hashString']]
+
+					if arguments.get('delete-local-data', False):
+						self.__count(self.events, 'removedWithData')
+					else:
+						self.orphanedBytes += torrent['downloaded']
+						self.__count(self.events, 'removed')
+
+				return ('success', {})
+
+			elif method == 'torrent-stop':
+				for torrent in self.__getIds(arguments):
+					if torrent['status'] != Status.Paused:
+						torrent['stoppedStatus'] = torrent['status']
+						torrent['status'] = Status.Paused
+						torrent['rateUpload'] = 0
+
+				return ('success', {})
+
+			elif method == 'torrent-start':
+				for torrent in self.__getIds(arguments):
+					if torrent['status'] == Status.Paused:
+						torrent['status'] = torrent['stoppedStatus'] or Status.Downloading
+						torrent['stoppedStatus'] = None
+
+				return ('success', {})
+
+			elif method == 'torrent-verify':
+				for torrent in self.__getIds(arguments):
+					if torrent['status'] != Status.Verifying:
+						torrent['stoppedStatus'] = torrent['stoppedStatus'] or torrent['status']
+						torrent['status'] = Status.Verifying
+
+				return ('success', {})
+
+			elif method in ('torrent-set', 'session-set'):
+				return ('success', {})
+
+			return ('method name not recognized', {})
+
+
+	def handleRequest(self, sessionId, body):
+		'''
+		Returns:
+			Tuple (httpCode, headers, body)
+		'''
+		with self.lock:
+			self.requests += 1
+
+			if self.sessionRotate > 0 and self.requests % self.sessionRotate == 0:
+				self.__newSession()
+
+			if sessionId != self.sessionId:
+				self.conflicts += 1
+				return (409, {SESSION_HEADER: self.sessionId}, b'<h1>409: Conflict</h1>')
+
+		try:
+			request = json.loads(body.decode('utf-8'))
+			method = request['method']
+
+		except (ValueError, KeyError, TypeError):
+			return (400, {}, b'')
+
+		with self.lock:
+			self.__count(self.calls, method)
+
+		result, arguments = self.call(method, request.get('arguments', {}))
+
+		reply = {'result': result, 'arguments': arguments}
+
+		if 'tag' in request:
+			reply['tag'] = request['tag']
+
+		return (200, {'Content-Type': 'application/json'}, json.dumps(reply).encode('utf-8'))
+
+
+	def getCounts(self):
+		'''
+		Returns:
+			Dict of torrents by state
+		'''
+		counts = {'downloading': 0, 'seeding': 0, 'dormant': 0, 'other': 0}
+
+		with self.lock:
+			for torrent in self.torrents.values():
+				if torrent['status'] == Status.Downloading:
+					counts['downloading'] += 1
+				elif torrent['status'] == Status.Seeding and torrent['rateUpload'] > 0:
+					counts['seeding'] += 1
+				elif torrent['status'] == Status.Seeding:
+					counts['dormant'] += 1
+				else:
+					counts['other'] += 1
+
+		counts['total'] = sum(counts.values())
+
+		return counts
+
+
+class RPCRequestHandler(BaseHTTPRequestHandler):
+
+	def do_POST(self):
+		if self.server.latency > 0:
+			_sleep(self.server.latency)
+
+		body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+		code, headers, reply = self.server.handleRequest(
+			self.headers.get(SESSION_HEADER, None),
+			body
+		)
+
+		self.send_response(code)
+
+		for key, val in headers.items():
+			self.send_header(key, val)
+
+		self.send_header('Content-Length', str(len(reply)))
+		self.end_headers()
+		self.wfile.write(reply)
+
+
+	def log_message(self, *args):
+		pass
@@ -0,0 +1,182 @@
+#-------------------------------------------------------------------------------
+# Name:		fixtures
+# Purpose:	Synthetic titles, rss feeds and filter lists for the benchmarks
+#			and a local http server to serve the feeds from.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import random, threading, socketserver
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape
+
+
+# Seeded so every run works on the same data
+SEED = 1234
+
+WORDS = (
+	'chicago', 'house', 'doctor', 'magicians', 'flash', 'legends', 'tomorrow',
+	'cards', 'scandal', 'titans', 'galaxy', 'guardians', 'spider', 'man',
+	'blue', 'night', 'city', 'the', 'of', 'and', 'river', 'storm', 'empire',
+	'last', 'first', 'black', 'mirror', 'kingdom', 'crown', 'lost'
+)
+
+QUALITIES = ('720p', '1080p', '2160p', 'sd')
+SOURCES = ('hdtv', 'web-dl', 'webrip', 'bluray')
+CODECS = ('x264', 'h264', 'x265', 'xvid')
+AUDIO = ('MP3 / V0 (VBR) / CD', 'FLAC / Lossless / WEB', 'MP3 / 320 / CD', 'FLAC / 24bit Lossless / Vinyl')
+RELEASE_TYPES = ('Album', 'EP', 'Single', 'Live album')
+
+
+def getRandom():
+	return random.Random(SEED)
+
+
+def makeName(rand, words=2):
+	return ' '.join(rand.choice(WORDS) for i in range(words))
+
+
+def tvTitles(count):
+	rand = getRandom()
+	titles = []
+
+	for i in range(count):
+		name = makeName(rand, rand.randint(1, 3)).replace(' ', '.')
+
+		if i % 5 == 0:
+			# Daily shows
+			titles.append('{0}.{1}.{2:02d}.{3:02d}.{4}.{5}-GRP'.format(
+				name, rand.randint(2010, 2020), rand.randint(1, 12), rand.randint(1, 28),
+				rand.choice(QUALITIES), rand.choice(SOURCES)
+			))
+		else:
+			titles.append('{0}.S{1:02d}E{2:02d}.{3}.{4}.{5}-GRP'.format(
+				name, rand.randint(1, 12), rand.randint(1, 24),
+				rand.choice(QUALITIES), rand.choice(SOURCES), rand.choice(CODECS)
+			))
+
+	return titles
+
+
+def movieTitles(count):
+	rand = getRandom()
+
+	return [
+		'{0}.{1}.{2}.{3}.{4}-GRP'.format(
+			makeName(rand, rand.randint(1, 4)).replace(' ', '.'),
+			rand.randint(1960, 2020),
+			rand.choice(QUALITIES),
+			rand.choice(SOURCES),
+			rand.choice(CODECS)
+		)
+		for i in range(count)
+	]
+
+
+def musicTitles(count):
+	rand = getRandom()
+
+	return [
+		'{0} - {1} [{2}] [{3}] - {4}'.format(
+			makeName(rand, 2),
+			makeName(rand, 3),
+			rand.randint(1960, 2020),
+			rand.choice(RELEASE_TYPES),
+			rand.choice(AUDIO)
+		)
+		for i in range(count)
+	]
+
+
+def rssFeed(titles, host='tracker.example'):
+	'''
+	Returns:
+		bytes, an rss 2.0 document with one item per title
+	'''
+	items = []
+
+	for idx, title in enumerate(titles):
+		items.append(
+			'<item><title>{0}</title><description>desc</description>'
+			'<pubDate>Fri, 27 Jan 2017 04:37:49 +0000</pubDate>'
+			'<link>https://{1}/torrents/{2}.torrent</link>'
+			'<guid>https://{1}/torrents/{2}</guid></item>'.format(escape(title), host, idx)
+		)
+
+	return (
+		'<?xml version="1.0" encoding="utf-8"?>'
+		'<rss version="2.0"><channel><title>Bench</title>'
+		'<link>https://{0}/</link><description>Benchmark feed</description>'
+		'{1}</channel></rss>'.format(host, ''.join(items))
+	).encode('utf-8')
+
+
+def titleFilters(count, quality='720p'):
+	'''
+	Returns:
+		List of rule lists like the ones a trakt watchlist produces
+	'''
+	rand = getRandom()
+
+	return [
+		[
+			{'key':'title', 'val':makeName(rand, rand.randint(1, 3)), 'exclude':False},
+			{'key':'quality', 'val':quality, 'exclude':False},
+			{'key':'codec', 'val':'xvid', 'exclude':True}
+		]
+		for i in range(count)
+	]
+
+
+class FeedServer(socketserver.ThreadingMixIn, HTTPServer):
+	'''
+	Serves rss documents from memory on 127.0.0.1
+
+	Usage:
+		server = FeedServer({'/tv': rssFeed(tvTitles(1000))})
+		server.start()
+		url = server.getUrl('/tv')
+		server.stop()
+	'''
+
+	daemon_threads = True
+
+	def __init__(self, documents):
+		self.documents = documents
+		HTTPServer.__init__(self, ('127.0.0.1', 0), FeedRequestHandler)
+		self.thread = None
+
+
+	def getUrl(self, path):
+		return 'http://127.0.0.1:{0}{1}'.format(self.server_address[1], path)
+
+
+	def start(self):
+		self.thread = threading.Thread(target=self.serve_forever)
+		self.thread.daemon = True
+		self.thread.start()
+
+
+	def stop(self):
+		self.shutdown()
+		self.server_close()
+
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+
+	def do_GET(self):
+		document = self.server.documents.get(self.path, None)
+
+		if document is None:
+			self.send_error(404)
+			return
+
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/rss+xml; charset=utf-8')
+		self.send_header('Content-Length', str(len(document)))
+		self.end_headers()
+		self.wfile.write(document)
+
+
+	def log_message(self, *args):
+		pass
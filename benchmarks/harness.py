@@ -0,0 +1,245 @@
+#-------------------------------------------------------------------------------
+# Name:		harness
+# Purpose:	Registers, runs and stores benchmarks. Each run is written to
+#			benchmarks/results/<label>.json and compared with an earlier
+#			result so a regression shows up as a slower items/s figure.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import os, sys, time, json, platform, gc
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Benchmarks in the order they were registered
+BENCHMARKS = []
+
+# Width of the name column of the output, fits the longest benchmark name
+NAME_WIDTH = 60
+
+
+class Benchmark(object):
+	'''
+	A benchmark is a factory that prepares its data and returns the callable
+	to time. Only the callable is measured.
+
+	The factory takes quick (bool, use smaller inputs) and returns a tuple
+	(run, items, cleanup) where items is the number of things run
+	processes and cleanup is None or a callable run after the timings.
+	'''
+
+	def __init__(self, name, factory, repeat=5):
+		self.name = name
+		self.factory = factory
+		self.repeat = repeat
+
+
+	def run(self, quick=False):
+		'''
+		Returns:
+			Dict with the timings of the benchmark
+		'''
+		run, items, cleanup = self.factory(quick)
+
+		timings = []
+
+		try:
+			# One untimed call to warm up caches and compiled regex
+			run()
+
+			for i in range(1 if quick else self.repeat):
+				gc.collect()
+				startTime = time.perf_counter()
+				run()
+				timings.append(time.perf_counter() - startTime)
+
+		finally:
+			if cleanup is not None:
+				cleanup()
+
+		timings.sort()
+		best = timings[0]
+
+		return {
+			'items': items,
+			'runs': len(timings),
+			'best': best,
+			'median': timings[len(timings) // 2],
+			'itemsPerSecond': items / best if best > 0 else 0.0
+		}
+
+
+def benchmark(name, repeat=5):
+	'''
+	Registers a benchmark factory
+
+	Usage:
+		@benchmark('scenetools.TV.parseTitle')
+		def parseTv(quick):
+			titles = ...
+			return (lambda: [TV.parseTitle(t) for t in titles], len(titles), None)
+	'''
+	def register(factory):
+		BENCHMARKS.append(Benchmark(name, factory, repeat))
+		return factory
+
+	return register
+
+
+def getEnvironment():
+	import flannelfox.jsoncodec
+
+	return {
+		'python': platform.python_version(),
+		'implementation': platform.python_implementation(),
+		'platform': platform.platform(),
+		'machine': platform.machine(),
+		'jsoncodec': flannelfox.jsoncodec.name,
+		'timestamp': int(time.time())
+	}
+
+
+def runBenchmarks(names=None, quick=False, out=sys.stdout):
+	'''
+	Runs the registered benchmarks
+
+	Takes:
+		names - List of substrings, only matching benchmarks are run
+		quick - Use smaller inputs and a single timed run
+
+	Returns:
+		Dict name -> timings
+	'''
+	results = {}
+
+	for bench in BENCHMARKS:
+
+		if names and not any(name in bench.name for name in names):
+			continue
+
+		out.write('{0:<{1}} '.format(bench.name, NAME_WIDTH))
+		out.flush()
+
+		try:
+			results[bench.name] = bench.run(quick=quick)
+			out.write('{itemsPerSecond:>14,.1f} items/s  best {best:.4f}s  median {median:.4f}s\n'.format(**results[bench.name]))
+
+		except Exception as e:
+			out.write('failed: {0}\n'.format(e))
+
+	return results
+
+
+def getResultsFile(label):
+	return os.path.join(RESULTS_DIR, '{0}.json'.format(label))
+
+
+def saveResults(label, results, quick=False):
+	'''
+	Stores the results of a run under label (usually the version)
+	'''
+	if not os.path.exists(RESULTS_DIR):
+		os.makedirs(RESULTS_DIR)
+
+	with open(getResultsFile(label), 'w') as resultsFile:
+		json.dump(
+			{
+				'label': label,
+				'quick': quick,
+				'environment': getEnvironment(),
+				'results': results
+			},
+			resultsFile,
+			indent=4,
+			sort_keys=True
+		)
+		resultsFile.write('\n')
+
+
+def loadResults(label):
+	'''
+	Returns:
+		The stored results of label, raises IOError if there are none
+	'''
+	fileName = label if os.path.isfile(label) else getResultsFile(label)
+
+	with open(fileName) as resultsFile:
+		return json.load(resultsFile)
+
+
+def getLatestLabel(exclude=None):
+	'''
+	Returns:
+		The label of the most recently stored results, None if there are none
+	'''
+	if not os.path.isdir(RESULTS_DIR):
+		return None
+
+	stored = []
+
+	for fileName in os.listdir(RESULTS_DIR):
+		if not fileName.endswith('.json'):
+			continue
+
+		label = fileName[:-len('.json')]
+
+		if label == exclude:
+			continue
+
+		try:
+			stored.append((loadResults(label)['environment']['timestamp'], label))
+
+		except (IOError, ValueError, KeyError):
+			continue
+
+	if len(stored) == 0:
+		return None
+
+	return max(stored)[1]
+
+
+def compareResults(baseline, results, threshold=0.10, quick=False, out=sys.stdout):
+	'''
+	Prints the change in items/s of each benchmark against baseline
+
+	Takes:
+		baseline - Stored results (see loadResults)
+		results - Dict name -> timings of this run
+		threshold - Slowdowns larger than this fraction are flagged
+		quick - This was a quick run, a baseline that was not (or the
+			other way around) ran on other inputs and is not compared
+
+	Returns:
+		List of the names of the benchmarks that regressed
+	'''
+	regressions = []
+
+	if baseline.get('quick', False) != quick:
+		out.write('\nNot compared with {0}, {1} a quick run and this one {2}\n'.format(
+			baseline['label'],
+			'it was' if baseline.get('quick', False) else 'it was not',
+			'was' if quick else 'was not'
+		))
+		return regressions
+
+	out.write('\nCompared with {0}\n'.format(baseline['label']))
+
+	for name, timings in sorted(results.items()):
+
+		before = baseline['results'].get(name, None)
+
+		if before is None or before['itemsPerSecond'] <= 0:
+			out.write('{0:<{1}} {2:>8}\n'.format(name, NAME_WIDTH, 'new'))
+			continue
+
+		change = timings['itemsPerSecond'] / before['itemsPerSecond'] - 1.0
+		flag = ''
+
+		if change < -threshold:
+			flag = '  REGRESSION'
+			regressions.append(name)
+
+		out.write('{0:<{1}} {2:>+7.1%}{3}\n'.format(name, NAME_WIDTH, change, flag))
+
+	return regressions
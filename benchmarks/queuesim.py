@@ -0,0 +1,405 @@
+#-------------------------------------------------------------------------------
+# Name:		queuesim
+# Purpose:	Runs queuedaemon passes against the fake transmission server and
+#			reports the rpc calls, wall time, sleep time and the decisions
+#			that were made. Sleeps are not slept, they move the simulated
+#			clock forward so hours of queue management take seconds.
+#
+#				python -m benchmarks.queuesim --torrents 5000 --queued 200
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import os, sys, time, argparse, tempfile, shutil, sqlite3, contextlib
+from unittest import mock
+
+# Sets up the isolated FF_ROOT before flannelfox is imported
+import benchmarks.sandbox
+
+from flannelfox.settings import settings
+from flannelfox.databases import ff_sqlite3
+from flannelfox.ostools import FreeSpace, UsedSpace
+from flannelfox import metrics, queuedaemon
+
+from benchmarks.harness import benchmark
+from benchmarks.fakeTransmission import FakeTransmission, Clock
+
+
+# Modules whose time.time and time.sleep run on the simulated clock
+TIMED_MODULES = (
+	'flannelfox.queuedaemon',
+	'flannelfox.torrentclients',
+	'flannelfox.torrentclients.Transmission',
+	'flannelfox.torrentclients.Torrent',
+	'flannelfox.databases.ff_sqlite3'
+)
+
+
+class Stalled(Exception):
+	'''
+	Raised when a pass keeps checking disk space without calling the client,
+	the queuedaemon loops that free space do not end if nothing can be
+	removed
+	'''
+	pass
+
+
+class VirtualTime(object):
+	'''
+	Stands in for the time module, sleeping advances the server instead
+	'''
+
+	def __init__(self, server):
+		self.server = server
+		self.slept = 0.0
+		self.sleeps = {}
+
+
+	def time(self):
+		return self.server.clock.now
+
+
+	def sleep(self, seconds):
+		self.slept += seconds
+		self.sleeps[seconds] = self.sleeps.get(seconds, 0) + 1
+		self.server.advance(seconds)
+
+
+	def __getattr__(self, name):
+		return getattr(time, name)
+
+
+class Simulation(object):
+	'''
+	A seedbox holding torrents and a database with queued torrents waiting
+	to be added
+
+	Takes:
+		torrents - Torrents already in the client
+		queued - Torrents waiting in the database
+		downloading - How many of the torrents are still downloading
+		latency - Seconds each rpc call takes
+		sessionRotate - New transmission session id every n calls
+		maxTorrents, maxDownloadingTorrents, strictQueueManagement - Queue
+			settings, see settings['queueManagement']
+		maxUsedSpace - GB, 0 disables the used space checks
+		diskSize - GB, the free space is what the torrents leave of this
+		minRatio, minTime - Seeding goals of every torrent
+	'''
+
+	MAX_IDLE_CHECKS = 100
+
+	def __init__(self, torrents=1000, queued=100, downloading=0, latency=0.0,
+			sessionRotate=0, maxTorrents=None, maxDownloadingTorrents=5,
+			strictQueueManagement=False, maxUsedSpace=0, diskSize=100000,
+			minRatio=1.5, minTime=72, trackerErrorRate=0.0, badTorrentRate=0.0):
+
+		self.clock = Clock()
+		self.server = FakeTransmission(
+			self.clock,
+			latency=latency,
+			sessionRotate=sessionRotate,
+			trackerErrorRate=trackerErrorRate,
+			badTorrentRate=badTorrentRate
+		)
+		self.virtualTime = VirtualTime(self.server)
+
+		self.diskSize = diskSize
+		self.lastRequests = 0
+		self.idleChecks = 0
+
+		self.directory = tempfile.mkdtemp(prefix='flannelfox-queuesim-')
+
+		# Every Database instance shares these settings
+		ff_sqlite3.Database(databaseSettings={
+			'databaseLocation': os.path.join(self.directory, 'flannelfox.db')
+		})
+
+		self.__seedDatabase(
+			self.server.populate(torrents, downloading=downloading),
+			queued,
+			minRatio,
+			minTime
+		)
+
+		self.settings = {
+			'client': {
+				'name': 'fake-transmission',
+				'type': 'transmission',
+				'host': '127.0.0.1',
+				'https': False,
+				'port': str(self.server.server_address[1]),
+				'rpcLocation': 'transmission/rpc',
+				'user': None,
+				'password': None
+			},
+			'clients': None,
+			'queueManagement': dict(
+				settings['queueManagement'],
+				maxTorrents=maxTorrents if maxTorrents is not None else torrents,
+				maxDownloadingTorrents=maxDownloadingTorrents,
+				strictQueueManagement=strictQueueManagement
+			),
+			'maxUsedSpace': maxUsedSpace,
+			'minimumFreeSpace': 0
+		}
+
+		self.stack = None
+		self.passes = 0
+		self.wallTime = 0.0
+		self.errors = []
+
+
+	def __seedDatabase(self, torrents, queued, minRatio, minTime):
+		columns = ('torrentType', 'title', 'torrentTitle', 'url', 'feedDestination', 'minRatio', 'minTime', 'comparison', 'queuedOn', 'hashString', 'addedOn', 'added')
+		now = int(self.clock.now)
+
+		def makeRows():
+			for idx, torrent in enumerate(torrents):
+				yield ('tv', 'seed {0}'.format(idx), torrent['name'], torrent['url'], torrent['downloadDir'],
+					minRatio, minTime, 'or', torrent['addedDate'], torrent['hashString'], torrent['addedDate'], 1)
+
+			for idx in range(queued):
+				url = 'https://tracker.example/queued/{0}.torrent'.format(idx)
+				yield ('tv', 'queued {0}'.format(idx), 'queued.{0}'.format(idx), url, '/data/tv',
+					minRatio, minTime, 'or', now + idx, None, None, 0)
+
+		connection = sqlite3.connect(ff_sqlite3.Database.databaseSettings['databaseLocation'])
+
+		with connection:
+			connection.executemany(
+				'INSERT INTO QueuedTorrents ({0}) VALUES ({1})'.format(
+					','.join('"{0}"'.format(col) for col in columns),
+					','.join('?' for col in columns)
+				),
+				makeRows()
+			)
+
+		connection.close()
+
+
+	def __checkProgress(self):
+		'''
+		Raises Stalled when the disk space is checked over and over without
+		a call to the client in between
+		'''
+		if self.server.requests != self.lastRequests:
+			self.lastRequests = self.server.requests
+			self.idleChecks = 0
+			return
+
+		self.idleChecks += 1
+
+		if self.idleChecks > self.MAX_IDLE_CHECKS:
+			raise Stalled('disk space checked {0} times without a client call'.format(self.idleChecks))
+
+
+	def usedSpace(self, folder, size='G'):
+		self.__checkProgress()
+
+		return self.server.usedSpace(folder, size)
+
+
+	def freeSpace(self, folder, size='G'):
+		self.__checkProgress()
+
+		free = self.diskSize * 1024**3 - self.server.usedSpace(folder, 'B')
+
+		return free / float(1024**'BKMGT'.index(size))
+
+
+	def start(self):
+		self.server.start()
+		metrics.registry.reset()
+
+		self.stack = contextlib.ExitStack()
+		self.stack.enter_context(mock.patch.dict(settings, self.settings))
+		self.stack.enter_context(mock.patch.dict(settings['metrics'], {'enabled': True}))
+		self.stack.enter_context(mock.patch.object(UsedSpace, 'check', self.usedSpace))
+		self.stack.enter_context(mock.patch.object(FreeSpace, 'check', self.freeSpace))
+
+		for module in TIMED_MODULES:
+			self.stack.enter_context(mock.patch('{0}.time'.format(module), self.virtualTime))
+
+
+	def stop(self):
+		self.stack.close()
+		self.server.stop()
+		shutil.rmtree(self.directory, True)
+
+
+	def runPass(self):
+		'''
+		Runs one queuedaemon pass, errors are kept instead of raised like
+		queuedaemon.main does
+		'''
+		self.idleChecks = 0
+		startTime = time.perf_counter()
+
+		try:
+			getattr(queuedaemon, '__queueReader')()
+
+		except Exception as e:
+			self.errors.append('pass {0}: {1}: {2}'.format(self.passes + 1, type(e).__name__, e))
+			metrics.inc('queue_pass_errors')
+
+		self.wallTime += time.perf_counter() - startTime
+		self.passes += 1
+
+		# The scheduler starts the next pass this much later
+		self.virtualTime.sleep(settings['queueDaemonThreadSleep'])
+
+
+	def getDatabaseCounts(self):
+		connection = sqlite3.connect(ff_sqlite3.Database.databaseSettings['databaseLocation'])
+
+		try:
+			queued, added = connection.execute(
+				'SELECT SUM(added = 0), SUM(added = 1) FROM QueuedTorrents'
+			).fetchone()
+			blacklisted = connection.execute('SELECT COUNT(*) FROM BlacklistedTorrents').fetchone()[0]
+
+		finally:
+			connection.close()
+
+		return {'queued': queued or 0, 'added': added or 0, 'blacklisted': blacklisted}
+
+
+	def getReport(self):
+		'''
+		Returns:
+			Dict with the numbers of the passes run so far
+		'''
+		snapshot = metrics.registry.snapshot()
+
+		def collect(values, name, label):
+			totals = {}
+			for (key, labels), val in values.items():
+				if key == name:
+					labels = dict(labels)
+					totals[labels.get(label)] = totals.get(labels.get(label), 0) + (val if not isinstance(val, list) else val[1])
+			return totals
+
+		rpcCounts = {}
+		for (key, labels), val in snapshot['timers'].items():
+			if key == 'client_rpc':
+				method = dict(labels)['method']
+				rpcCounts[method] = rpcCounts.get(method, 0) + val[0]
+
+		return {
+			'passes': self.passes,
+			'wallTime': self.wallTime,
+			'sleepTime': self.virtualTime.slept,
+			'sleeps': dict(self.virtualTime.sleeps),
+			'rpc': dict(self.server.calls),
+			'clientRpc': rpcCounts,
+			'rpcTime': collect(snapshot['timers'], 'client_rpc', 'method'),
+			'conflicts': self.server.conflicts,
+			'phases': collect(snapshot['timers'], 'queue_phase', 'phase'),
+			'adds': collect(snapshot['counters'], 'queue_adds', 'result'),
+			'removes': collect(snapshot['counters'], 'queue_removes', 'deleteData'),
+			'events': dict(self.server.events),
+			'client': self.server.getCounts(),
+			'database': self.getDatabaseCounts(),
+			'errors': list(self.errors)
+		}
+
+
+def printReport(report, out=sys.stdout):
+
+	def row(name, value):
+		out.write('  {0:<32} {1}\n'.format(name, value))
+
+	out.write('Passes: {passes}  wall time {wallTime:.3f}s  slept {sleepTime:,.0f}s (simulated)\n'.format(**report))
+	out.write('Wall time per pass: {0:.3f}s\n'.format(report['wallTime'] / max(report['passes'], 1)))
+
+	out.write('\nRPC calls (server)\n')
+	for method, count in sorted(report['rpc'].items()):
+		row(method, '{0:>8,}  {1:.3f}s'.format(count, report['rpcTime'].get(method, 0.0)))
+	row('409 session conflicts', '{0:>8,}'.format(report['conflicts']))
+
+	out.write('\nSleeps\n')
+	for seconds, count in sorted(report['sleeps'].items()):
+		row('{0}s'.format(seconds), '{0:>8,}'.format(count))
+
+	out.write('\nPhases (wall time)\n')
+	for phase, seconds in sorted(report['phases'].items(), key=lambda item: -item[1]):
+		row(phase, '{0:>10.3f}s'.format(seconds))
+
+	out.write('\nDecisions\n')
+	for result, count in sorted(report['adds'].items()):
+		row('add result {0}'.format(result), '{0:>8,}'.format(count))
+	for deleteData, count in sorted(report['removes'].items()):
+		row('remove deleteData={0}'.format(deleteData), '{0:>8,}'.format(count))
+	for event, count in sorted(report['events'].items()):
+		row('client {0}'.format(event), '{0:>8,}'.format(count))
+
+	out.write('\nAfterwards\n')
+	for state, count in sorted(report['client'].items()):
+		row('client {0}'.format(state), '{0:>8,}'.format(count))
+	for state, count in sorted(report['database'].items()):
+		row('database {0}'.format(state), '{0:>8,}'.format(count))
+
+	for error in report['errors']:
+		out.write('\nError in {0}\n'.format(error))
+
+
+@benchmark('queuedaemon pass (fake transmission)', repeat=3)
+def queuePass(quick):
+	torrents = 500 if quick else 3000
+
+	simulation = Simulation(torrents=torrents, queued=50, downloading=torrents // 50)
+	simulation.start()
+
+	return (simulation.runPass, torrents, simulation.stop)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m benchmarks.queuesim', description='queuedaemon against a fake transmission server')
+	parser.add_argument('--torrents', type=int, default=2000, help='torrents in the client')
+	parser.add_argument('--queued', type=int, default=100, help='torrents waiting in the database')
+	parser.add_argument('--downloading', type=int, default=0, help='torrents in the client still downloading')
+	parser.add_argument('--passes', type=int, default=5, help='queuedaemon passes to run')
+	parser.add_argument('--latency', type=float, default=0.0, help='seconds each rpc call takes')
+	parser.add_argument('--session-rotate', type=int, default=0, help='new session id every n calls')
+	parser.add_argument('--max-torrents', type=int, help='queueManagement.maxTorrents (default: --torrents)')
+	parser.add_argument('--max-downloading', type=int, default=5, help='queueManagement.maxDownloadingTorrents')
+	parser.add_argument('--strict', action='store_true', help='queueManagement.strictQueueManagement')
+	parser.add_argument('--max-used-space', type=int, default=0, help='maxUsedSpace in GB, 0 disables it')
+	parser.add_argument('--disk-size', type=int, default=100000, help='disk size in GB')
+	parser.add_argument('--tracker-errors', type=float, default=0.0, help='fraction of added torrents the tracker rejects')
+	parser.add_argument('--bad-torrents', type=float, default=0.0, help='fraction of adds that are not valid torrents')
+
+	args = parser.parse_args(argv)
+
+	simulation = Simulation(
+		torrents=args.torrents,
+		queued=args.queued,
+		downloading=args.downloading,
+		latency=args.latency,
+		sessionRotate=args.session_rotate,
+		maxTorrents=args.max_torrents,
+		maxDownloadingTorrents=args.max_downloading,
+		strictQueueManagement=args.strict,
+		maxUsedSpace=args.max_used_space,
+		diskSize=args.disk_size,
+		trackerErrorRate=args.tracker_errors,
+		badTorrentRate=args.bad_torrents
+	)
+
+	simulation.start()
+
+	try:
+		for i in range(args.passes):
+			simulation.runPass()
+
+		printReport(simulation.getReport())
+
+	finally:
+		simulation.stop()
+
+	return 1 if simulation.errors else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,14 @@
+#-------------------------------------------------------------------------------
+# Name:		sandbox
+# Purpose:	Points flannelfox at a temporary FF_ROOT, import this before
+#			flannelfox so the benchmarks stay away from the real config,
+#			caches and database
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+import os, tempfile, shutil, atexit
+
+# flannelfox reads its paths when it is imported. This is not done in the
+# package __init__ as unittest discovery imports every package it finds.
+os.environ['FF_ROOT'] = tempfile.mkdtemp(prefix='flannelfox-bench-')
+atexit.register(shutil.rmtree, os.environ['FF_ROOT'], True)
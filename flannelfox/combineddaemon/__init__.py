@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+#-------------------------------------------------------------------------------
+# Name:		combineddaemon
+# Purpose:	Runs the rssdaemon and queuedaemon loops in one process for
+#			small setups. New torrents are still written to the database
+#			and are also handed straight to the queue reader, which keeps
+#			its database connection and torrent client session between
+#			passes. Both loops count into the one metrics registry of the
+#			process, it is written to a single combineddaemon file.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import functools
+
+# Third party modules
+import daemon
+
+# flannelfox Includes
+import flannelfox.datasources.refresher
+from flannelfox import logging
+from flannelfox import metrics
+from flannelfox import scheduler
+from flannelfox import rssdaemon
+from flannelfox.rssdaemon import feedpool, circuitbreaker
+from flannelfox import queuedaemon
+from flannelfox.settings import settings
+from flannelfox.databases import Databases
+from flannelfox.databases.ff_sqlite3 import Database
+from flannelfox.torrenttools.TorrentQueue import Handoff
+
+# Setup the logging agent
+logger = logging.getLogger(__name__)
+
+
+class CombinedDaemon():
+	'''
+	Holds what the two loops share
+
+	Usage:
+		combined = CombinedDaemon()
+		combined.run()
+	'''
+
+	def __init__(self):
+
+		self.jobs = scheduler.Scheduler()
+
+		# rssReader wakes the queue reader whenever it hands torrents over
+		self.handoff = Handoff(wake=functools.partial(self.jobs.wake, 'queueReader'))
+
+		# Made on the first queue pass, again after it could not be made
+		self.queueReader = None
+
+		# Shared by both loops, see run
+		self.database = None
+
+		# Feeds are looked at every rssDaemonThreadSleep seconds, each one is
+		# polled when its own interval is up
+		if settings['adaptivePolling']['enabled']:
+			adaptive = settings['adaptivePolling']
+		else:
+			adaptive = None
+
+		self.schedule = scheduler.FeedSchedule(settings['rssDaemonThreadSleep'], adaptive=adaptive)
+
+		# The rss workers are kept between cycles
+		self.pool = feedpool.FeedPool(rssdaemon.rssJob, settings['maxRssThreads'])
+
+		if settings['circuitBreaker']['enabled']:
+			self.breaker = circuitbreaker.CircuitBreaker(settings['circuitBreaker'])
+		else:
+			self.breaker = None
+
+
+	def readFeeds(self):
+		'''
+		Runs an rssReader cycle
+		'''
+		rssdaemon.rssReader(schedule=self.schedule, handoff=self.handoff, pool=self.pool, breaker=self.breaker, metricsName='combineddaemon', database=self.database)
+
+
+	def manageQueue(self):
+		'''
+		Runs a queuedaemon pass with the queue reader of the last one
+		'''
+		if self.queueReader is None:
+			try:
+				with metrics.timer('queue_phase', phase='setup'):
+					self.queueReader = queuedaemon.QueueReader(handoff=self.handoff, database=self.database)
+
+			except Exception as e:
+				logger.error('Could not setup the queue reader: {0}'.format(e))
+				metrics.inc('queue_pass_errors')
+				return
+
+		queuedaemon.runQueueReader(self.queueReader, metricsName='combineddaemon')
+
+
+	def run(self):
+		'''
+		Runs both loops until interrupted
+		'''
+
+		# Every database call of both loops goes through one connection
+		self.database = Databases(
+			dbType = settings['database']['defaultDatabaseEngine'],
+			databaseSettings = {
+				'persistentConnection': True
+			}
+		)
+
+		self.jobs.add('rssReader', self.readFeeds, settings['rssDaemonThreadSleep'])
+		self.jobs.add('queueReader', self.manageQueue, settings['queueDaemonThreadSleep'])
+		self.jobs.listen(settings['files']['queueDaemonSocket'], 'queueReader')
+
+		try:
+			self.jobs.run()
+
+		finally:
+			self.jobs.stop()
+			self.pool.close()
+			Database.closeConnection()
+
+
+def main():
+	'''
+	Main entry point for the Application
+	'''
+
+	with daemon.DaemonContext(
+		files_preserve = [
+			logging.getFileHandle(__name__).stream
+		]
+	):
+
+		# Logs are written and watchlists are refreshed in the background
+		# from here on, threads do not survive the fork into the daemon so
+		# this has to happen here
+		logging.startListener()
+		flannelfox.datasources.refresher.start()
+
+		logger.critical('Combined Daemon Started')
+
+		try:
+			CombinedDaemon().run()
+
+		except KeyboardInterrupt as e:
+			logger.critical('Application Aborted')
+
+	logger.critical('Application Exited')
+
+
+if __name__ == '__main__':
+	main()
@@ -145,7 +145,8 @@ class Databases(object):
 
 	def getQueuedTorrents(self, selectors=None, num=None):
 		'''
-		Returns the desired information about the torrent queue
+		Returns the desired information about the torrent queue, highest
+		priority first then oldest first
 
 		Takes:
 			selectors - List of fields that you want returned
@@ -160,6 +161,26 @@ class Databases(object):
 		return self.Database.getQueuedTorrents(selectors=selectors, num=num)
 
 
+	def getNextQueuedTorrent(self, selectors=None):
+		'''
+		Returns the torrent that should be added next, the one with the
+		highest priority that was queued first
+
+		Takes:
+			selectors - List of fields that you want returned
+
+		Returns:
+			Dict of key,val, None if nothing is queued
+		'''
+
+		queuedTorrents = self.getQueuedTorrents(selectors=selectors, num=1)
+
+		if len(queuedTorrents) == 0:
+			return None
+
+		return queuedTorrents[0]
+
+
 	def getQueuedTorrentsCount(self):
 		'''
 		Returns the total number of torrents waiting in queue
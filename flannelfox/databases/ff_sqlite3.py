@@ -11,7 +11,7 @@
 
 # System Includes
 import sqlite3 as sql
-import time, os
+import time, os, threading, contextlib
 
 # flannelfox Includes
 import flannelfox
@@ -33,20 +33,33 @@ GENERIC_TORRENTS_VIEW = "GenericTorrentsView"
 class Database(object):
 
 	databaseSettings = {
-		'databaseLocation': os.path.join(settings['files']['privateDir'],'flannelfox.db')
+		'databaseLocation': os.path.join(settings['files']['privateDir'],'flannelfox.db'),
+
+		# Keep one connection open for the whole process instead of one per
+		# call, used when both daemons run in one process
+		'persistentConnection': False
 	}
 
+	# The connection shared by every instance when persistentConnection is set
+	connection = None
+	connectionPid = None
+	connectionLock = threading.RLock()
+
+	# Highest priority first, then the oldest
+	queuedViewSetup = ( "CREATE VIEW QueuedTorrentsView AS SELECT QueuedTorrents.comparison, QueuedTorrents.hashstring, QueuedTorrents.feeddestination, QueuedTorrents.minratio, QueuedTorrents.mintime, QueuedTorrents.addedon, QueuedTorrents.added, QueuedTorrents.queuedon, QueuedTorrents.day, QueuedTorrents.month, QueuedTorrents.year, QueuedTorrents.torrenttitle, QueuedTorrents.url, QueuedTorrents.title, QueuedTorrents.season, QueuedTorrents.episode, QueuedTorrents.codec, QueuedTorrents.container, QueuedTorrents.proper, QueuedTorrents.quality, QueuedTorrents.source, QueuedTorrents.torrentType, QueuedTorrents.priority FROM QueuedTorrents WHERE added = 0 ORDER BY priority DESC, queuedOn ASC;" )
+
 	dbSetup = ( "PRAGMA foreign_keys = off;"
 		"BEGIN TRANSACTION;"
-		"CREATE TABLE QueuedTorrents (comparison TEXT, hashString TEXT, feedDestination TEXT, minRatio REAL, minTime INTEGER, addedOn INTEGER, added INTEGER, queuedOn INTEGER, torrentType INTEGER, proper TEXT, source TEXT, container TEXT, codec TEXT, quality TEXT, day INTEGER, month INTEGER, year INTEGER, torrentTitle TEXT, url TEXT, title TEXT, season INTEGER, episode INTEGER, releaseType TEXT, album TEXT, artist TEXT);"
+		"CREATE TABLE QueuedTorrents (comparison TEXT, hashString TEXT, feedDestination TEXT, minRatio REAL, minTime INTEGER, addedOn INTEGER, added INTEGER, queuedOn INTEGER, torrentType INTEGER, proper TEXT, source TEXT, container TEXT, codec TEXT, quality TEXT, day INTEGER, month INTEGER, year INTEGER, torrentTitle TEXT, url TEXT, title TEXT, season INTEGER, episode INTEGER, releaseType TEXT, album TEXT, artist TEXT, priority INTEGER DEFAULT 0);"
 		"CREATE TABLE BlacklistedTorrents (url STRING PRIMARY KEY);"
 		"CREATE INDEX idx_Queue ON QueuedTorrents (added COLLATE BINARY ASC, queuedOn COLLATE BINARY ASC);"
+		"CREATE INDEX idx_QueuePriority ON QueuedTorrents (added COLLATE BINARY ASC, priority COLLATE BINARY DESC, queuedOn COLLATE BINARY ASC);"
 		"CREATE INDEX idx_FeedDestination ON QueuedTorrents (feedDestination COLLATE BINARY ASC);"
 		"CREATE INDEX idx_Added ON QueuedTorrents (added COLLATE BINARY DESC);"
 		"CREATE INDEX idx_HashString ON QueuedTorrents (hashString COLLATE BINARY ASC);"
 		"CREATE INDEX idx_TorrentType ON QueuedTorrents (torrentType COLLATE BINARY ASC);"
 		"CREATE VIEW GenericTorrentsView AS SELECT QueuedTorrents.comparison, QueuedTorrents.hashstring, QueuedTorrents.feeddestination, QueuedTorrents.minratio, QueuedTorrents.mintime, QueuedTorrents.addedon, QueuedTorrents.added, QueuedTorrents.queuedon, QueuedTorrents.day, QueuedTorrents.month, QueuedTorrents.year, QueuedTorrents.torrenttitle, QueuedTorrents.url, QueuedTorrents.title, QueuedTorrents.season, QueuedTorrents.episode, QueuedTorrents.codec, QueuedTorrents.container, QueuedTorrents.proper, QueuedTorrents.quality, QueuedTorrents.source, QueuedTorrents.torrentType FROM QueuedTorrents WHERE torrentType = 'none';"
-		"CREATE VIEW QueuedTorrentsView AS SELECT QueuedTorrents.comparison, QueuedTorrents.hashstring, QueuedTorrents.feeddestination, QueuedTorrents.minratio, QueuedTorrents.mintime, QueuedTorrents.addedon, QueuedTorrents.added, QueuedTorrents.queuedon, QueuedTorrents.day, QueuedTorrents.month, QueuedTorrents.year, QueuedTorrents.torrenttitle, QueuedTorrents.url, QueuedTorrents.title, QueuedTorrents.season, QueuedTorrents.episode, QueuedTorrents.codec, QueuedTorrents.container, QueuedTorrents.proper, QueuedTorrents.quality, QueuedTorrents.source, QueuedTorrents.torrentType FROM QueuedTorrents WHERE added = 0 ORDER BY queuedOn ASC;"
+		+ queuedViewSetup +
 		"CREATE VIEW MovieTorrentsView AS SELECT QueuedTorrents.comparison, QueuedTorrents.hashstring, QueuedTorrents.feeddestination, QueuedTorrents.minratio, QueuedTorrents.mintime, QueuedTorrents.addedon, QueuedTorrents.added, QueuedTorrents.queuedon, QueuedTorrents.year, QueuedTorrents.torrenttitle, QueuedTorrents.url, QueuedTorrents.title, QueuedTorrents.codec, QueuedTorrents.container, QueuedTorrents.proper, QueuedTorrents.quality, QueuedTorrents.source, QueuedTorrents.torrentType FROM QueuedTorrents WHERE torrentType = 'movie';"
 		"CREATE VIEW MusicTorrentsView AS SELECT QueuedTorrents.comparison, QueuedTorrents.hashstring, QueuedTorrents.feeddestination, QueuedTorrents.minratio, QueuedTorrents.mintime, QueuedTorrents.addedon, QueuedTorrents.added, QueuedTorrents.queuedon, QueuedTorrents.year, QueuedTorrents.torrenttitle, QueuedTorrents.url, QueuedTorrents.title, QueuedTorrents.album, QueuedTorrents.artist, QueuedTorrents.codec, QueuedTorrents.releaseType, QueuedTorrents.container, QueuedTorrents.proper, QueuedTorrents.quality, QueuedTorrents.source, QueuedTorrents.torrentType FROM QueuedTorrents WHERE torrentType = 'music';"
 		"CREATE VIEW AddedTorrentsView AS SELECT QueuedTorrents.comparison, QueuedTorrents.hashstring, QueuedTorrents.feeddestination, QueuedTorrents.minratio, QueuedTorrents.mintime, QueuedTorrents.addedon, QueuedTorrents.added, QueuedTorrents.queuedon, QueuedTorrents.day, QueuedTorrents.month, QueuedTorrents.year, QueuedTorrents.torrenttitle, QueuedTorrents.url, QueuedTorrents.title, QueuedTorrents.season, QueuedTorrents.episode, QueuedTorrents.codec, QueuedTorrents.container, QueuedTorrents.proper, QueuedTorrents.quality, QueuedTorrents.source, QueuedTorrents.torrentType FROM QueuedTorrents WHERE added = 1 ORDER BY queuedOn ASC;"
@@ -54,6 +67,15 @@ class Database(object):
 		"COMMIT TRANSACTION;"
 		"PRAGMA foreign_keys = on;" )
 
+	# Brings databases made by older versions up to date, each script runs
+	# once when its column is missing from QueuedTorrents
+	dbMigrations = (
+		('priority', "ALTER TABLE QueuedTorrents ADD COLUMN priority INTEGER DEFAULT 0;"
+			"CREATE INDEX idx_QueuePriority ON QueuedTorrents (added COLLATE BINARY ASC, priority COLLATE BINARY DESC, queuedOn COLLATE BINARY ASC);"
+			"DROP VIEW QueuedTorrentsView;"
+			+ queuedViewSetup ),
+	)
+
 
 	def __init__(self, databaseSettings=None):
 
@@ -61,13 +83,15 @@ class Database(object):
 
 		self.logger = logging.getLogger(__name__)
 
+		# The defaults are copied so the settings of one instance are not
+		# picked up by the next
+		self.databaseSettings = dict(Database.databaseSettings, **databaseSettings)
+
 		directory = os.path.dirname(self.databaseSettings['databaseLocation'])
 
 		if not os.path.exists(directory):
 			os.makedirs(directory)
 
-		self.databaseSettings.update(databaseSettings)
-
 		self.setupDB()
 
 
@@ -80,9 +104,7 @@ class Database(object):
 
 		try:
 			# SQL Connection
-			sqlConnection = sql.connect(self.databaseSettings['databaseLocation'])
-
-			with sqlConnection:
+			with self.__connect() as sqlConnection, sqlConnection:
 
 				# Set the results to be in dictionary form
 				sqlConnection.row_factory = self.dictFactory
@@ -111,9 +133,7 @@ class Database(object):
 
 		try:
 			# SQL Connection
-			sqlConnection = sql.connect(self.databaseSettings['databaseLocation'])
-
-			with sqlConnection:
+			with self.__connect() as sqlConnection, sqlConnection:
 
 				# Set the results to be in dictionary form
 				sqlConnection.row_factory = self.dictFactory
@@ -143,9 +163,7 @@ class Database(object):
 
 		try:
 			# SQL Connection
-			sqlConnection = sql.connect(self.databaseSettings['databaseLocation'])
-
-			with sqlConnection:
+			with self.__connect() as sqlConnection, sqlConnection:
 
 				# Set the results to be in dictionary form
 				sqlConnection.row_factory = self.dictFactory
@@ -171,8 +189,57 @@ class Database(object):
 			return []
 
 
+	@contextlib.contextmanager
+	def __connect(self):
+		'''
+		Yields a connection to the database, the shared one when
+		persistentConnection is set, otherwise a new one
+
+		The shared connection is held by one caller at a time and is opened
+		again in a forked child
+		'''
+		if not self.databaseSettings.get('persistentConnection', False):
+			yield sql.connect(self.databaseSettings['databaseLocation'])
+			return
+
+		with Database.connectionLock:
+
+			if Database.connection is None or Database.connectionPid != os.getpid():
+				Database.connection = sql.connect(self.databaseSettings['databaseLocation'], check_same_thread=False)
+				Database.connectionPid = os.getpid()
+
+			yield Database.connection
+
+
+	@classmethod
+	def closeConnection(self):
+		'''
+		Closes the shared connection, the next call opens a new one
+		'''
+		with Database.connectionLock:
+
+			if Database.connection is not None and Database.connectionPid == os.getpid():
+				Database.connection.close()
+
+			Database.connection = None
+			Database.connectionPid = None
+
+
 	def setupDB(self):
 		self.__execScriptDB(self.dbSetup)
+		self.migrateDB()
+
+
+	def migrateDB(self):
+		'''
+		Runs the migrations an existing database is missing
+		'''
+		columns = [row['name'] for row in self.__queryDB('PRAGMA table_info({0})'.format(QUEUED_TORRENTS_TABLE))]
+
+		for column, script in self.dbMigrations:
+			if column not in columns:
+				self.logger.info('Adding {0} to the database'.format(column))
+				self.__execScriptDB('BEGIN TRANSACTION;{0}COMMIT TRANSACTION;'.format(script))
 
 
 	@classmethod
@@ -9,49 +9,282 @@
 # -*- coding: utf-8 -*-
 
 # System Includes
-import datetime, json, math, time, os
+import json, math, time, os, struct, ctypes, ctypes.util, threading, tempfile, marshal
 
-from flannelfox import logging
+from flannelfox.settings import settings
+from flannelfox import logging, jsoncodec
 
 
-def getConfigFiles(directory):
+class InotifyWatch(object):
+	'''
+	Watches a directory with inotify through libc so unchanged config
+	directories do not even need to be listed. Only available on linux,
+	check InotifyWatch.available() before using it.
+	'''
 
-	logger = logging.getLogger(__name__)
-	configFiles = []
+	IN_MODIFY = 0x00000002
+	IN_ATTRIB = 0x00000004
+	IN_CLOSE_WRITE = 0x00000008
+	IN_MOVED_FROM = 0x00000040
+	IN_MOVED_TO = 0x00000080
+	IN_CREATE = 0x00000100
+	IN_DELETE = 0x00000200
+	IN_DELETE_SELF = 0x00000400
+	IN_MOVE_SELF = 0x00000800
+	IN_IGNORED = 0x00008000
+
+	IN_NONBLOCK = os.O_NONBLOCK
+	IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+	WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+		IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
 
-	if os.path.isdir(directory):
+	# struct inotify_event without the trailing name
+	EVENT = struct.Struct('iIII')
 
-		for configFile in os.listdir(directory):
-			configFilePath = os.path.join(directory,configFile)
+	libc = None
 
+	@classmethod
+	def available(self):
+		if self.libc is None:
 			try:
-				if configFile.endswith('.json'):
-					configFileJson = __readConfigFile(configFilePath)
+				libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+				libc.inotify_init1
+				libc.inotify_add_watch
+				self.libc = libc
+			except (OSError, AttributeError):
+				self.libc = False
 
-					if configFile != None:
-						configFiles.append((configFilePath, configFileJson))
-			except Exception as e:
-				logger.warning('There was a problem reading the a config file\n{}\n{}'.format(
-					configFilePath,
-					e
-				))
-				continue
+		return self.libc is not False
 
-	return configFiles
 
+	def __init__(self, directory):
+		self.fd = -1
 
-def __readConfigFile(file):
-	# Try to read in the rss lists
+		if not self.available():
+			raise OSError('inotify is not available')
 
-	logger = logging.getLogger(__name__)
+		self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+		if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK) < 0:
+			errno = ctypes.get_errno()
+			self.close()
+			raise OSError(errno, 'inotify_add_watch failed for {0}'.format(directory))
+
+		self.alive = True
+
+
+	def changed(self):
+		'''
+		Drains the pending events
+
+		Returns:
+			bool True if anything in the directory changed since the last call
+		'''
+		changed = False
+
+		while True:
+			try:
+				events = os.read(self.fd, 65536)
+			except BlockingIOError:
+				break
+
+			if not events:
+				break
+
+			changed = True
+			offset = 0
+
+			while offset < len(events):
+				wd, mask, cookie, length = self.EVENT.unpack_from(events, offset)
+				offset += self.EVENT.size + length
+
+				# The directory itself went away, the watch is gone with it
+				if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF | self.IN_IGNORED):
+					self.alive = False
+
+		return changed
+
+
+	def close(self):
+		if self.fd >= 0:
+			os.close(self.fd)
+		self.fd = -1
+		self.alive = False
+
+
+class ConfigStore(object):
+	'''
+	Keeps the parsed json config files of a directory in memory and only
+	re-reads the files whose mtime/size changed. When inotify is available
+	(and settings['watchConfigFiles'] is on) the directory is not even listed
+	unless something in it changed.
+	'''
+
+	def __init__(self, directory, useInotify=None):
+		self.directory = directory
+		self.logger = logging.getLogger(__name__)
+
+		if useInotify is None:
+			useInotify = settings.get('watchConfigFiles', True)
+
+		self.useInotify = useInotify and InotifyWatch.available()
+		self.watch = None
+
+		# path -> (stamp, data)
+		self.files = {}
+
+		# paths in directory listing order
+		self.paths = []
+
+		# Bumped every time the set of files or their contents change
+		self.version = 0
+		self.scanned = False
+
+
+	def __getStamp(self, path):
+		stat = os.stat(path)
+		return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+	def __readConfigFile(self, path):
+		# Try to read in the rss lists
+		try:
+			self.logger.debug('Reading RSS config file: {0}'.format(path))
+			with open(path) as rssJson:
+				return json.load(rssJson)
+		except Exception as e:
+			self.logger.error('There was a problem reading the rss config file\n{0}'.format(e))
+			return []
+
+
+	def __needsScan(self):
+		if not self.useInotify:
+			return True
+
+		if self.watch is not None and not self.watch.alive:
+			self.watch.close()
+			self.watch = None
+
+		if self.watch is None:
+			# Start watching before listing so no change is missed
+			try:
+				self.watch = InotifyWatch(self.directory)
+			except OSError as e:
+				self.logger.debug('Not watching {0}: {1}'.format(self.directory, e))
+			return True
+
+		return self.watch.changed() or not self.scanned
+
+
+	def refresh(self):
+		'''
+		Brings the in memory copy up to date with the directory
+
+		Returns:
+			bool True if anything changed
+		'''
+		if not self.__needsScan():
+			return False
+
+		changed = False
+		files = {}
+		paths = []
+
+		if os.path.isdir(self.directory):
+
+			for configFile in os.listdir(self.directory):
+
+				if not configFile.endswith('.json'):
+					continue
+
+				configFilePath = os.path.join(self.directory, configFile)
+
+				try:
+					stamp = self.__getStamp(configFilePath)
+				except OSError as e:
+					self.logger.warning('There was a problem reading the a config file\n{}\n{}'.format(
+						configFilePath,
+						e
+					))
+					continue
+
+				cached = self.files.get(configFilePath, None)
+
+				if cached is None or cached[0] != stamp:
+					cached = (stamp, self.__readConfigFile(configFilePath))
+					changed = True
+
+				files[configFilePath] = cached
+				paths.append(configFilePath)
+
+		if set(paths) != set(self.paths):
+			changed = True
+
+		self.files = files
+		self.paths = paths
+		self.scanned = True
+
+		if changed:
+			self.version += 1
+
+		return changed
+
+
+	def getConfigFiles(self):
+		'''
+		Returns:
+			List [(configFilePath, configFileJson)]
+		'''
+		self.refresh()
+		return [(path, self.files[path][1]) for path in self.paths]
+
+
+	def getStamp(self, path):
+		'''
+		Returns:
+			The (mtime, size, inode) the cached copy of path was read with
+		'''
+		return self.files[path][0]
+
+
+	def close(self):
+		if self.watch is not None:
+			self.watch.close()
+			self.watch = None
+
+
+# One store per config directory, kept for the life of the process
+configStores = {}
+
+
+def getConfigStore(directory):
+	'''
+	Returns:
+		The ConfigStore for directory, created the first time it is asked for
+	'''
+	store = configStores.get(directory, None)
+
+	if store is None:
+		store = ConfigStore(directory)
+		configStores[directory] = store
+
+	return store
+
+
+def getConfigFiles(directory):
+	'''
+	Returns the parsed json config files in directory, files are only
+	re-read when they change
+
+	Returns:
+		List [(configFilePath, configFileJson)]
+	'''
+	return getConfigStore(directory).getConfigFiles()
 
-	try:
-		logger.debug('Reading RSS config file: {0}'.format(file))
-		with open(file) as rssJson:
-			return json.load(rssJson)
-	except Exception as e:
-		logger.error('There was a problem reading the rss config file\n{0}'.format(e))
-		return []
 
 def __getModificationDate(filename):
 	'''
@@ -63,40 +296,126 @@ def __getModificationDate(filename):
 	'''
 	logger = logging.getLogger(__name__)
 	try:
-		return int(datetime.datetime.fromtimestamp(os.path.getmtime(filename)).strftime('%s'))
+		return os.stat(filename).st_mtime
 
-	except Exception:
+	except OSError:
 		logger.error('There was a problem getting the timestamp for:\n{0}'.format(filename))
 		return -1
 
 
-def isCacheStillValid(force=False, cacheFileName=None, frequency=360):
+def getPollInterval(feedList):
+	'''
+	Reads how often the feeds of a list should be polled
+
+	Takes:
+		feedList - A list from a config file, pollInterval is in minutes
+
+	Returns:
+		Seconds, None if the list does not set one
+	'''
+	pollInterval = feedList.get('pollInterval', None)
+
+	if pollInterval is None or pollInterval == '':
+		return None
+
+	pollInterval = float(pollInterval)
+
+	if pollInterval <= 0:
+		raise ValueError('The pollInterval must be more than 0 minutes')
+
+	return int(pollInterval * 60)
+
+
+def getPriority(feedList):
+	'''
+	Reads the queue priority of a config list, torrents from lists with a
+	higher priority are added first
+
+	Takes:
+		feedList - A list from a config file
+
+	Returns:
+		Int, None if the list does not set one
+	'''
+	priority = feedList.get('priority', None)
+
+	if priority is None or priority == '':
+		return None
+
+	return int(priority)
+
+
+def addFeedOptions(majorFeed, feedList):
+	'''
+	Copies the optional settings of a config list onto its majorFeed:
+		pollInterval - a list without one is polled every
+			rssDaemonThreadSleep seconds
+		priority - a list without one has a priority of 0
+
+	Returns:
+		The majorFeed
+	'''
+	pollInterval = getPollInterval(feedList)
+
+	if pollInterval is not None:
+		majorFeed['pollInterval'] = pollInterval
+
+	priority = getPriority(feedList)
+
+	if priority is not None:
+		majorFeed['priority'] = priority
+
+	return majorFeed
+
+
+def getCacheTTL(source=None):
+	'''
+	Looks up how long a cache stays fresh and, once it is out of date, how
+	much longer it can still be served while it is refreshed
+
+	Takes:
+		source - Name of the datasource (trakt, lastfm, goodreads)
+
+	Returns:
+		Tuple (ttl, staleWindow) in minutes
+	'''
+	ttls = settings['cache']['ttl']
+	staleWindows = settings['cache']['staleWindow']
+
+	return (
+		ttls.get(source, ttls['default']),
+		staleWindows.get(source, staleWindows['default'])
+	)
+
+
+def isCacheStillValid(force=False, cacheFileName=None, frequency=None):
 	'''
 	Used to determine if a cachefile needs to be updated
 
 	force: force an update
 	cacheFileName: The full path of the file to check
-	frequency: how often the file should be updated in minutes
+	frequency: how often the file should be updated in minutes, defaults to
+		the default cache ttl
 
 	Returns Boolean
 	'''
 	logger = logging.getLogger(__name__)
 	try:
 
-		if not os.path.exists(os.path.dirname(cacheFileName)):
-			try:
-				os.makedirs(os.path.dirname(cacheFileName))
-			except OSError: # Guard against race condition
-				pass
+		if force:
+			return False
+
+		if frequency is None:
+			frequency = getCacheTTL()[0]
 
 		lastModified = __getModificationDate(cacheFileName)
 
 		if lastModified == -1:
 			return False
 
-		logger.debug('Checking cache: {0} {1}:{2}'.format(cacheFileName, frequency, math.ceil((time.time()/60 - lastModified/60))))
+		difference = math.ceil((time.time() - lastModified) / 60)
 
-		difference = math.ceil((time.time()/60 - lastModified/60))
+		logger.debug('Checking cache: {0} {1}:{2}'.format(cacheFileName, frequency, difference))
 
 		if difference >= frequency:
 			logger.debug('Cache update needed')
@@ -111,41 +430,146 @@ def isCacheStillValid(force=False, cacheFileName=None, frequency=360):
 		return False
 
 
+class CacheFiles(object):
+	'''
+	Keeps a copy of every cache file that has been read or written. A copy is
+	only used while the file still has the same mtime and size, so a hit
+	costs one stat instead of reading and parsing the file.
+
+	Files are written to a temp file and renamed into place so a reader never
+	sees half a file. settings['cache']['format'] chooses between json and a
+	compact marshal format, both can always be read.
+	'''
+
+	# Marks a cache file written with marshal
+	MARSHAL_MAGIC = b'FFC1'
+
+	def __init__(self):
+		self.lock = threading.Lock()
+
+		# cacheFileName -> (stamp, data)
+		self.files = {}
+
+
+	def __getStamp(self, cacheFileName):
+		stat = os.stat(cacheFileName)
+		return (stat.st_mtime_ns, stat.st_size)
+
+
+	def __decode(self, raw):
+		if raw.startswith(self.MARSHAL_MAGIC):
+			return marshal.loads(raw[len(self.MARSHAL_MAGIC):])
+
+		return jsoncodec.decode(raw)
+
+
+	def __encode(self, data):
+		if settings['cache'].get('format', 'json') == 'marshal':
+			return self.MARSHAL_MAGIC + marshal.dumps(data)
+
+		return jsoncodec.encode(data)
+
+
+	def read(self, cacheFileName):
+		'''
+		Returns:
+			The cached data, raises OSError/ValueError if it can not be read
+		'''
+		stamp = self.__getStamp(cacheFileName)
+		cached = self.files.get(cacheFileName, None)
+
+		if cached is not None and cached[0] == stamp:
+			return cached[1]
+
+		with open(cacheFileName, 'rb') as cacheFile:
+			# Stamp the copy with what was actually read
+			stat = os.fstat(cacheFile.fileno())
+			stamp = (stat.st_mtime_ns, stat.st_size)
+			data = self.__decode(cacheFile.read())
+
+		with self.lock:
+			self.files[cacheFileName] = (stamp, data)
+
+		return data
+
+
+	def write(self, cacheFileName, data):
+		'''
+		Atomically replaces the cache file with data
+		'''
+		directory = os.path.dirname(cacheFileName)
+
+		if not os.path.exists(directory):
+			try:
+				os.makedirs(directory)
+			except OSError: # Guard against race condition
+				pass
+
+		raw = self.__encode(data)
+
+		fd, tempName = tempfile.mkstemp(dir=directory, prefix='.{0}.'.format(os.path.basename(cacheFileName)))
+
+		try:
+			with os.fdopen(fd, 'wb') as cache:
+				cache.write(raw)
+
+			os.replace(tempName, cacheFileName)
+
+		except BaseException:
+			try:
+				os.remove(tempName)
+			except OSError:
+				pass
+			raise
+
+		with self.lock:
+			self.files[cacheFileName] = (self.__getStamp(cacheFileName), data)
+
+
+	def forget(self, cacheFileName=None):
+		with self.lock:
+			if cacheFileName is None:
+				self.files = {}
+			else:
+				self.files.pop(cacheFileName, None)
+
+
+cacheFiles = CacheFiles()
+
+
 def readCacheFile(cacheFileName):
+	'''
+	Reads a cache file, repeated reads of an unchanged file are served from
+	memory. The returned data is shared, it must not be modified.
+
+	Returns the cached data or [] if there is no usable cache
+	'''
 
 	logger = logging.getLogger(__name__)
 
 	try:
 		logger.debug('Reading cache file for [{0}]'.format(cacheFileName))
-		with open(cacheFileName) as cacheFile:
-			return json.load(cacheFile)
+		return cacheFiles.read(cacheFileName)
 	except Exception as e:
-		logger.error('There was a problem reading a lastfm list cache file: {0}'.format(e))
+		logger.error('There was a problem reading a cache file {0}: {1}'.format(cacheFileName, e))
 		return []
 
 
 def updateCacheFile(force=False, cacheFileName=None, data=None):
 	'''
 	Used to update cache files for api calls. This is needed so we do not keep
-	asking the api servers for the same information on a frequent basis. The
-	fault frequency is to ask once an hour.
+	asking the api servers for the same information on a frequent basis.
 
 	force: preform the update regardless of frequency
-	location: where to save the file
-	frequency: how often to update the file in minutes
+	cacheFileName: where to save the file
+	data: the data to cache
 	'''
 
-	directory = os.path.dirname(cacheFileName)
-
-	if not os.path.exists(directory):
-		os.makedirs(directory)
-
 	logger = logging.getLogger(__name__)
 
 	try:
 		logger.debug('Cache update for {0} needed'.format(cacheFileName))
-		with open(cacheFileName, 'w') as cache:
-			cache.write(json.dumps(data))
+		cacheFiles.write(cacheFileName, data)
 
 	except Exception as e:
 		logger.error('There was a problem writing a cache file {0}: {1}'.format(cacheFileName, e))
@@ -4,7 +4,7 @@
 #-------------------------------------------------------------------------------
 # -*- coding: utf-8 -*-
 
-import traceback, os
+import traceback, os, functools
 import defusedxml.ElementTree as ET
 
 # Third party modules
@@ -15,7 +15,8 @@ import requests
 #urllib3.contrib.pyopenssl.inject_into_urllib3()
 
 from flannelfox.settings import settings
-from flannelfox.datasources import common
+from flannelfox.datasources import common, refresher
+from flannelfox.torrenttools import Filters
 from flannelfox import logging, tools
 
 class goodreadsApi():
@@ -37,6 +38,7 @@ class goodreadsApi():
 
 		try:
 
+			refresher.rateLimit('goodreads')
 			r = requests.get(url, headers=headers, params=params, timeout=60)
 			httpResponse = r.status_code
 
@@ -103,6 +105,56 @@ def getCacheDir():
 	return settings['files']['goodreadsCacheDir']
 
 
+# The filter list of each majorFeed, kept so a new snapshot only has to
+# apply what changed
+compiledFilters = Filters.FilterCache()
+
+
+def __cleanAuthor(author):
+	return author.lower().strip().replace(' & ', ' and ')
+
+
+def __getRuleLists(author, feedFilters, configFileName):
+	'''
+	Builds the rule lists for a single author
+
+	Returns:
+		List of rule lists
+	'''
+	logger = logging.getLogger(__name__)
+
+	# Without filters the author alone is enough
+	if len(feedFilters) < 1:
+		return [[{'key':'titleLike', 'val':__cleanAuthor(author), 'exclude':False}]]
+
+	ruleLists = []
+
+	for filterItem in feedFilters:
+
+		try:
+
+			ruleList = []
+
+			ruleList.append({'key':'titleLike', 'val':__cleanAuthor(author), 'exclude':False})
+
+			# Load the excludes
+			for exclude in filterItem.get('exclude', []):
+				for key, val in exclude.items():
+					ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':True})
+
+			for include in filterItem.get('include', []):
+				for key, val in include.items():
+					ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':False})
+
+			ruleLists.append(ruleList)
+
+		except Exception as e:
+			logger.error('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
+			continue
+
+	return ruleLists
+
+
 def readGoodreadsConfigs(configFolder=settings['files']['goodreadsConfigDir']):
 	'''
 	Read the authors a user favorites on GoodReads
@@ -159,34 +211,15 @@ def readGoodreadsConfigs(configFolder=settings['files']['goodreadsConfigDir']):
 
 				cacheFileName = os.path.join(getCacheDir(),feedName)
 
-				if common.isCacheStillValid(cacheFileName=cacheFileName):
-
-					goodreadsListResults = common.readCacheFile(cacheFileName)
-					logger.debug('Using cache file {} for {}'.format(cacheFileName, feedName))
-
-				else:
-
-					goodreadsapi = goodreadsApi()
-
-					goodreadsListResults = goodreadsapi.getFavouriteAuthors(
+				goodreadsListResults = refresher.getWatchlist(
+					cacheFileName,
+					functools.partial(
+						goodreadsApi().getFavouriteAuthors,
 						apiKey=feedList.get('api_key'),
 						username=feedList.get('username'),
-					)
-
-					logger.debug('Fetching new data {}'.format(feedName))
-
-					if not isinstance(goodreadsListResults, list) or len(goodreadsListResults) < 1:
-
-						goodreadsListResults = common.readCacheFile(cacheFileName)
-						logger.debug('Using cache file {} for {}'.format(cacheFileName, feedName))
-
-						if not isinstance(goodreadsListResults, list) or len(goodreadsListResults) < 1:
-							raise ValueError('There was not a valid feed reply nor is there a valid cache for the feed')
-
-					else:
-
-						common.updateCacheFile(cacheFileName=cacheFileName, data=goodreadsListResults)
-						logger.debug('Updating cache file {} for {}'.format(cacheFileName, feedName))
+					),
+					source='goodreads'
+				)
 
 				logger.debug('Found {} items from {}'.format(len(goodreadsListResults), feedName))
 
@@ -210,55 +243,25 @@ def readGoodreadsConfigs(configFolder=settings['files']['goodreadsConfigDir']):
 
 				feedFilters = feedList.get('filters', [])
 
-				for item in goodreadsListResults:
-
-					# Loop through each author and append a filter for it
-					if (len(feedFilters) > 0):
-						for filterItem in feedFilters:
-
-							try:
-
-								ruleList = []
+				majorFeedKey = '{}.{}'.format(configFileName,feedName)
 
-								item = item.lower().strip().replace(' & ', ' and ')
-
-								ruleList.append({'key':'titleLike', 'val':item, 'exclude':False})
-
-								 # Load the excludes
-								for exclude in filterItem.get('exclude', []):
-									for key, val in exclude.items():
-										ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':True})
-
-								for include in filterItem.get('include', []):
-									for key, val in include.items():
-										ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':False})
-
-								feedFilterList.append(ruleList)
-								print(ruleList)
-
-							except Exception as e:
-								print('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=traceback.format_exc()))
-								logger.error('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
-								continue
-					else:
-						try:
-
-							item = item.lower().strip().replace(' & ', ' and ')
-
-							feedFilterList.append([{'key':'titleLike', 'val':item, 'exclude':False}])
-
-						except Exception as e:
-							logger.error('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
-							continue
+				# Only the authors that changed since the last snapshot get rules built
+				feedFilterList = compiledFilters.get(
+					majorFeedKey,
+					feedList,
+					goodreadsListResults,
+					__cleanAuthor,
+					functools.partial(__getRuleLists, feedFilters=feedFilters, configFileName=configFileName)
+				)
 
 				# Append the Config item to the dict
-				majorFeeds['{}.{}'.format(configFileName,feedName)] = {
+				majorFeeds[majorFeedKey] = common.addFeedOptions({
 					'feedName':feedName,
 					'feedType':feedType,
 					'feedDestination':feedDestination,
 					'minorFeeds':minorFeeds,
 					'feedFilters':feedFilterList
-				}
+				}, feedList)
 
 			except Exception as e:
 				logger.warning('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
@@ -4,7 +4,8 @@
 #-------------------------------------------------------------------------------
 # -*- coding: utf-8 -*-
 
-import os
+import os, functools
+from concurrent.futures import ThreadPoolExecutor
 
 # Third party modules
 import requests
@@ -14,7 +15,8 @@ import requests
 #urllib3.contrib.pyopenssl.inject_into_urllib3()
 
 from flannelfox.settings import settings
-from flannelfox.datasources import common
+from flannelfox.datasources import common, refresher
+from flannelfox.torrenttools import Filters
 from flannelfox import logging
 
 
@@ -23,12 +25,13 @@ class lastfmApi():
 	logger = logging.getLogger(__name__)
 
 
-	def __getLibraryArtistsFeed(self, apiKey, username):
+	def __getLibraryArtistsPage(self, apiKey, username, page):
+		'''
+		Fetches a single page of a users library
 
-		currentPage = 1
-		maxPages = 1
-		httpResponse = -1
-		artists = []
+		Returns:
+			Tuple (httpResponse, reply), reply is None if the page failed
+		'''
 
 		headers = {
 			'Content-Type':'application/json',
@@ -40,39 +43,67 @@ class lastfmApi():
 			'api_key': apiKey,
 			'user':username,
 			'format':'json',
-			'page':currentPage
+			'page':page
 		}
 
-		while currentPage <= maxPages:
+		try:
 
-			reply = None
-			params['page'] = currentPage
+			refresher.rateLimit('lastfm')
+			r = requests.get(settings['apis']['lastfm'], headers=headers, params=params, timeout=60)
+			httpResponse = r.status_code
+			self.logger.debug('Fetched LastFm album page {0}: [{1}]'.format(page, httpResponse))
 
-			try:
+			if httpResponse == 200:
+				return (httpResponse, r.json())
 
-				r = requests.get(settings['apis']['lastfm'], headers=headers, params=params, timeout=60)
-				httpResponse = r.status_code
-				self.logger.debug('Fetched LastFm album page {0} of {1}: [{2}]'.format(currentPage, maxPages, httpResponse))
+		except Exception as e:
+			httpResponse = -1
+			self.logger.debug('Lastfm album page {0} failed: {1}'.format(page, e))
 
-				if httpResponse == 200:
-					reply = r.json()
+		self.logger.error('There was a problem fetching a Lastfm album page\n{0}'.format(httpResponse))
+		return (httpResponse, None)
 
-				else:
-					raise ValueError
 
+	def __getLibraryArtistsFeed(self, apiKey, username):
+		'''
+		Fetches every page of a users library, the first page tells how many
+		pages there are and the rest are then fetched concurrently
+
+		Returns:
+			Tuple (httpResponse, artists), artists is empty if any page failed
+		'''
 
-			except Exception:
-				httpResponse = -1
-				self.logger.error('There was a problem fetching a Lastfm album page\n{0}'.format(httpResponse))
-				return artists
+		httpResponse, reply = self.__getLibraryArtistsPage(apiKey, username, 1)
 
+		try:
+
+			if reply is None:
+				raise ValueError
 
 			maxPages = int(reply['artists']['@attr']['totalPages'])
-			currentPage = currentPage + 1
+			replies = [reply]
+
+			if maxPages > 1:
+				with ThreadPoolExecutor(max_workers=settings.get('lastfmPageWorkers', 4)) as pagePool:
+					pages = pagePool.map(
+						functools.partial(self.__getLibraryArtistsPage, apiKey, username),
+						range(2, maxPages + 1)
+					)
 
-			artists.extend(
-				[artist['name'] for artist in reply['artists']['artist']]
-			)
+					for httpResponse, reply in pages:
+						if reply is None:
+							raise ValueError
+						replies.append(reply)
+
+			artists = []
+			for reply in replies:
+				artists.extend(
+					[artist['name'] for artist in reply['artists']['artist']]
+				)
+
+		except (ValueError, KeyError, TypeError):
+			# A partial library would shrink the watchlist, so use none of it
+			return (-1, [])
 
 		return (httpResponse, artists)
 
@@ -91,6 +122,57 @@ def getCacheDir():
 	return settings['files']['lastfmCacheDir']
 
 
+# The filter list of each majorFeed, kept so a new snapshot only has to
+# apply what changed
+compiledFilters = Filters.FilterCache()
+
+
+def __cleanArtist(artist):
+	artist = artist.lower().strip().replace(' & ', ' and ')
+	for ch in (':', '\\', '\'', ','):
+		artist = artist.replace(ch, '')
+	return artist
+
+
+def __getRuleLists(artist, feedFilters, configFileName):
+	'''
+	Builds the rule lists for a single artist
+
+	Returns:
+		List of rule lists
+	'''
+	logger = logging.getLogger(__name__)
+
+	ruleLists = []
+
+	# Loop through each show and append a filter for it
+	for filterItem in feedFilters:
+
+		try:
+
+			ruleList = []
+
+			ruleList.append({'key':'artist', 'val':__cleanArtist(artist), 'exclude':False})
+
+			# Load the excludes
+			for exclude in filterItem.get('exclude', []):
+				for key, val in exclude.items():
+					ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':True})
+
+			for include in filterItem.get('include', []):
+				for key, val in include.items():
+					ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':False})
+
+			ruleLists.append(ruleList)
+
+		except Exception as e:
+
+			logger.error('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
+			continue
+
+	return ruleLists
+
+
 def readLastfmArtistsConfigs(configFolder=settings['files']['lastfmConfigDir']):
 	'''
 	Read the artists from a users lastfm library.
@@ -146,34 +228,15 @@ def readLastfmArtistsConfigs(configFolder=settings['files']['lastfmConfigDir']):
 
 				cacheFileName = os.path.join(getCacheDir(), feedName)
 
-				if common.isCacheStillValid(cacheFileName=cacheFileName):
-
-					lastfmListResults = common.readCacheFile(cacheFileName)
-					logger.debug('Using cache file {} for {}'.format(cacheFileName, feedName))
-
-				else:
-
-					lastfmapi = lastfmApi()
-
-					lastfmListResults = lastfmapi.getLibraryArtists(
+				lastfmListResults = refresher.getWatchlist(
+					cacheFileName,
+					functools.partial(
+						lastfmApi().getLibraryArtists,
 						apiKey=feedList.get('api_key'),
 						username=feedList.get('username')
-					)
-
-					logger.debug('Fetching new data {}'.format(feedName))
-
-					if not isinstance(lastfmListResults, list) or len(lastfmListResults) < 1:
-
-						lastfmListResults = common.readCacheFile(cacheFileName)
-						logger.debug('Using cache file {} for {}'.format(cacheFileName, feedName))
-
-						if not isinstance(lastfmListResults, list) or len(lastfmListResults) < 1:
-							raise ValueError('There was not a valid feed reply nor is there a valid cache for the feed')
-
-					else:
-
-						common.updateCacheFile(cacheFileName=cacheFileName, data=lastfmListResults)
-						logger.debug('Updating cache file {} for {}'.format(cacheFileName, feedName))
+					),
+					source='lastfm'
+				)
 
 				logger.debug('Found {} items from {}'.format(len(lastfmListResults), feedName))
 
@@ -196,47 +259,25 @@ def readLastfmArtistsConfigs(configFolder=settings['files']['lastfmConfigDir']):
 
 				feedFilters = feedList.get('filters', [])
 
-
-				for item in lastfmListResults:
-
-					# Loop through each show and append a filter for it
-					for filterItem in feedFilters:
-
-						try:
-
-							ruleList = []
-
-							# Clean the artist name
-							item = item.lower().strip().replace(' & ', ' and ')
-							for ch in (':', '\\', '\'', ','):
-								item = item.replace(ch, '')
-
-							ruleList.append({'key':'artist', 'val':item, 'exclude':False})
-
-							# Load the excludes
-							for exclude in filterItem.get('exclude', []):
-								for key, val in exclude.items():
-									ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':True})
-
-							for include in filterItem.get('include', []):
-								for key, val in include.items():
-									ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':False})
-
-							feedFilterList.append(ruleList)
-
-						except Exception as e:
-
-							logger.error('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
-							continue
+				# Only the artists that were added or removed since the last
+				# snapshot change the filter list
+				majorFeedKey = '{}.{}'.format(configFileName,feedName)
+				feedFilterList = compiledFilters.get(
+					majorFeedKey,
+					feedList,
+					lastfmListResults,
+					__cleanArtist,
+					functools.partial(__getRuleLists, feedFilters=feedFilters, configFileName=configFileName)
+				)
 
 				# Append the Config item to the dict
-				majorFeeds['{}.{}'.format(configFileName,feedName)] = {
+				majorFeeds[majorFeedKey] = common.addFeedOptions({
 					'feedName':feedName,
 					'feedType':feedType,
 					'feedDestination':feedDestination,
 					'minorFeeds':minorFeeds,
 					'feedFilters':feedFilterList
-				}
+				}, feedList)
 
 
 			except Exception as e:
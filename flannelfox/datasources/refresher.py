@@ -0,0 +1,230 @@
+#-------------------------------------------------------------------------------
+# Name:		refresher.py
+# Purpose:	Refreshes the watchlist caches (trakt, lastfm, goodreads) in the
+#			background so the rss cycle never waits on an api. Calls to
+#			each api are rate limited, whether they are made here or not.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from flannelfox.settings import settings
+from flannelfox.datasources import common
+from flannelfox import logging
+
+
+class RateLimiter(object):
+	'''
+	Spaces out calls so no more than rate calls are made per second, it is
+	shared by every thread calling the same api
+	'''
+
+	def __init__(self, rate):
+		self.interval = 1.0 / rate if rate > 0 else 0.0
+		self.nextCall = 0.0
+		self.lock = threading.Lock()
+
+
+	def wait(self):
+		'''
+		Blocks until the next call is allowed
+		'''
+		with self.lock:
+			now = time.monotonic()
+			callAt = max(now, self.nextCall)
+			self.nextCall = callAt + self.interval
+
+		if callAt > now:
+			time.sleep(callAt - now)
+
+
+class Refresher(object):
+	'''
+	Runs watchlist fetches on a small thread pool. Each cache file is only
+	refreshed by one job at a time and a failed refresh is not retried until
+	RETRY_DELAY has passed.
+	'''
+
+	RETRY_DELAY = 300
+
+	def __init__(self, workers=4):
+		self.logger = logging.getLogger(__name__)
+		self.workers = workers
+		self.executor = None
+		self.lock = threading.Lock()
+
+		# Cache files being refreshed right now
+		self.pending = set()
+
+		# Cache file -> time the last refresh failed
+		self.failed = {}
+
+
+	def start(self):
+		if self.executor is None:
+			self.logger.info('Watchlist refresher started')
+			self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+
+	def stop(self):
+		if self.executor is not None:
+			self.executor.shutdown(wait=False)
+			self.executor = None
+
+
+	def isRunning(self):
+		return self.executor is not None
+
+
+	def submit(self, cacheFileName, fetch):
+		'''
+		Queues a refresh of a cache file unless one is already running
+
+		Takes:
+			cacheFileName - The cache file to update
+			fetch - Callable returning the fresh list
+
+		Returns:
+			bool True if a refresh was queued
+		'''
+		with self.lock:
+			if cacheFileName in self.pending:
+				return False
+
+			if time.time() - self.failed.get(cacheFileName, 0) < self.RETRY_DELAY:
+				return False
+
+			self.pending.add(cacheFileName)
+
+		try:
+			self.executor.submit(self.__refresh, cacheFileName, fetch)
+
+		except RuntimeError:
+			# The refresher was stopped
+			with self.lock:
+				self.pending.discard(cacheFileName)
+			return False
+
+		return True
+
+
+	def __refresh(self, cacheFileName, fetch):
+		try:
+			results = fetch()
+
+			if isinstance(results, list) and len(results) > 0:
+				common.updateCacheFile(cacheFileName=cacheFileName, data=results)
+				self.logger.debug('Refreshed cache file {0}'.format(cacheFileName))
+				self.failed.pop(cacheFileName, None)
+
+			else:
+				self.logger.warning('Refreshing {0} did not return anything, keeping the old copy'.format(cacheFileName))
+				self.failed[cacheFileName] = time.time()
+
+		except Exception as e:
+			self.logger.error('There was a problem refreshing {0}: {1}'.format(cacheFileName, e))
+			self.failed[cacheFileName] = time.time()
+
+		finally:
+			with self.lock:
+				self.pending.discard(cacheFileName)
+
+
+# One limiter per api, settings['apiRateLimits'] is in calls per second
+rateLimiters = {}
+rateLimitersLock = threading.Lock()
+
+refresher = Refresher()
+
+
+def rateLimit(api):
+	'''
+	Waits until another call to the api is allowed
+
+	Takes:
+		api - Name of the api (trakt, lastfm, goodreads)
+	'''
+	limiter = rateLimiters.get(api, None)
+
+	if limiter is None:
+		with rateLimitersLock:
+			limiter = rateLimiters.setdefault(
+				api,
+				RateLimiter(settings.get('apiRateLimits', {}).get(api, 1))
+			)
+
+	limiter.wait()
+
+
+def start():
+	'''
+	Starts refreshing watchlists in the background, this should be called
+	after the daemon has forked
+	'''
+	refresher.start()
+
+
+def stop():
+	refresher.stop()
+
+
+def getWatchlist(cacheFileName, fetch, source=None):
+	'''
+	Returns the cached watchlist, refreshing it when it is out of date.
+
+	A fresh cache (younger than the source's ttl) is returned as is. When the
+	refresher is running anything else is refreshed in the background and an
+	out of date cache is still returned while it is inside the stale window,
+	so the caller never waits on the api. Without the refresher the list is
+	fetched right away.
+
+	Takes:
+		cacheFileName - The cache file of the watchlist
+		fetch - Callable returning the fresh list
+		source - Name of the datasource, selects the ttl
+
+	Returns:
+		List, raises ValueError if there is no list to use
+	'''
+	logger = logging.getLogger(__name__)
+
+	ttl, staleWindow = common.getCacheTTL(source)
+
+	if common.isCacheStillValid(cacheFileName=cacheFileName, frequency=ttl):
+		logger.debug('Using cache file {0}'.format(cacheFileName))
+		return common.readCacheFile(cacheFileName)
+
+	if refresher.isRunning():
+
+		if refresher.submit(cacheFileName, fetch):
+			logger.debug('Refreshing {0} in the background'.format(cacheFileName))
+
+		if not common.isCacheStillValid(cacheFileName=cacheFileName, frequency=ttl + staleWindow):
+			raise ValueError('The cache is too old to use and is being refreshed')
+
+		results = common.readCacheFile(cacheFileName)
+
+		if not isinstance(results, list) or len(results) < 1:
+			raise ValueError('The feed has not been fetched yet')
+
+		return results
+
+	results = fetch()
+	logger.debug('Fetching new data {0}'.format(cacheFileName))
+
+	if not isinstance(results, list) or len(results) < 1:
+
+		results = common.readCacheFile(cacheFileName)
+		logger.debug('Using cache file {0}'.format(cacheFileName))
+
+		if not isinstance(results, list) or len(results) < 1:
+			raise ValueError('There was not a valid feed reply nor is there a valid cache for the feed')
+
+	else:
+
+		common.updateCacheFile(cacheFileName=cacheFileName, data=results)
+		logger.debug('Updating cache file {0}'.format(cacheFileName))
+
+	return results
@@ -9,104 +9,145 @@ from flannelfox.settings import settings
 from flannelfox import logging
 
 
-def readRssConfigs(configFolder=settings['files']['rssConfigDir']):
-	'''
-	Read the RSSFeedConfig file
+# Compiled feeds of each config file, kept between cycles so only changed
+# files are rebuilt: {configFolder: {configFileName: (stamp, majorFeeds)}}
+compiledFeeds = {}
 
-	rssFilter children are stackable and help to refine the filter
 
-	An empty or non-existant rssFilters will result in all items being a
-	match
+def __compileConfigFile(configFileName, configFileData):
+	'''
+	Builds the majorFeeds described by a single config file
 
-	Takes the location of the config file as a parameter
-	Returns a dict of filters to match torrents with
+	Takes:
+		configFileName - Path of the config file, used in the feed keys
+		configFileData - The parsed json of the config file
+
+	Returns:
+		Dict of majorFeeds
 	'''
 
 	logger = logging.getLogger(__name__)
-	logger.debug('Reading RSS Feeds')
 
 	majorFeeds = {}
 
-	for configFileName, configFileData in common.getConfigFiles(configFolder):
-
-		logger.debug('Found {} feed(s) in {}'.format(len(configFileData), configFileName))
-		for feedList in configFileData:
-
-			try:
-
-				# Setup some variables for the feed
-				feedName = None
-				feedType = None
-				feedDestination = None
-				minorFeeds = []
-				feedFilters = []
-				feedFilterList = []
+	logger.debug('Found {} feed(s) in {}'.format(len(configFileData), configFileName))
+	for feedList in configFileData:
+
+		try:
+
+			# Setup some variables for the feed
+			feedName = None
+			feedType = None
+			feedDestination = None
+			minorFeeds = []
+			feedFilters = []
+			feedFilterList = []
+
+			# Get the feedName
+			feedName = feedList.get('list_name','').lower().strip()
+			if feedName == '':
+				raise ValueError('Feeds with out names are not permitted')
+
+			# Get the feedType
+			feedType = feedList.get('type','none').lower().strip()
+
+			# Get the feedDestination
+			feedDestination = feedList.get('feedDestination','').strip()
+			if feedDestination == '':
+				raise ValueError('The feed has an invalid destination value')
+
+			# Collect the feeds
+			if not isinstance(feedList.get('minorFeeds',[]), list):
+				raise ValueError('The minorFeeds value must be an array/list')
+
+			logger.debug('{} contains {} minorFeed(s)'.format(feedName, len(feedList.get('minorFeeds',[]))))
+			for minorFeed in feedList.get('minorFeeds',[]):
+				try:
+					url = minorFeed.get('url','').strip()
+					minTime = int(minorFeed.get('minTime','0').strip()) # Hours Int
+					minRatio = float(minorFeed.get('minRatio','0.0').strip()) # Ratio Float
+					comparison = minorFeed.get('comparison','or').strip() # Comparison String
+					minorFeeds.append({'url':url,'minTime':minTime,'minRatio':minRatio,'comparison':comparison})
+
+				except (ValueError, KeyError, TypeError) as e:
+					logger.warning('The feed contains an invalid minorFeed:\n{0}'.format(e))
+					continue
+
+			# Collect the feedFilters
+			feedFilters = feedList.get('filters', [])
+
+			# Loop through each show and append a filter for it
+			for filterItem in feedFilters:
+				try:
+
+					ruleList = []
+
+					# Load the excludes
+					for exclude in filterItem.get('exclude', []):
+						for key, val in exclude.items():
+							ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':True})
+
+					for include in filterItem.get('include', []):
+						for key, val in include.items():
+							ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':False})
+
+					feedFilterList.append(ruleList)
+
+				except Exception as e:
+					logger.warning('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
+					continue
+
+			# Append the Config item to the dict
+			majorFeeds['{}.{}'.format(configFileName,feedName)] = common.addFeedOptions({
+				'feedName':feedName,
+				'feedType':feedType,
+				'feedDestination':feedDestination,
+				'minorFeeds':minorFeeds,
+				'feedFilters':feedFilterList
+			}, feedList)
+
+		except Exception as e:
+			logger.warning('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
 
-				# Get the feedName
-				feedName = feedList.get('list_name','').lower().strip()
-				if feedName == '':
-					raise ValueError('Feeds with out names are not permitted')
-
-				# Get the feedType
-				feedType = feedList.get('type','none').lower().strip()
+	return majorFeeds
 
-				# Get the feedDestination
-				feedDestination = feedList.get('feedDestination','').strip()
-				if feedDestination == '':
-					raise ValueError('The feed has an invalid destination value')
 
-				# Collect the feeds
-				if not isinstance(feedList.get('minorFeeds',[]), list):
-					raise ValueError('The minorFeeds value must be an array/list')
+def readRssConfigs(configFolder=settings['files']['rssConfigDir']):
+	'''
+	Read the RSSFeedConfig file
 
-				logger.debug('{} contains {} minorFeed(s)'.format(feedName, len(feedList.get('minorFeeds',[]))))
-				for minorFeed in feedList.get('minorFeeds',[]):
-					try:
-						url = minorFeed.get('url','').strip()
-						minTime = int(minorFeed.get('minTime','0').strip()) # Hours Int
-						minRatio = float(minorFeed.get('minRatio','0.0').strip()) # Ratio Float
-						comparison = minorFeed.get('comparison','or').strip() # Comparison String
-						minorFeeds.append({'url':url,'minTime':minTime,'minRatio':minRatio,'comparison':comparison})
+	rssFilter children are stackable and help to refine the filter
 
-					except (ValueError, KeyError, TypeError) as e:
-						logger.warning('The feed contains an invalid minorFeed:\n{0}'.format(e))
-						continue
+	An empty or non-existant rssFilters will result in all items being a
+	match
 
-				# Collect the feedFilters
-				feedFilters = feedList.get('filters', [])
+	Config files are only recompiled when they change on disk
 
-				# Loop through each show and append a filter for it
-				for filterItem in feedFilters:
-					try:
+	Takes the location of the config file as a parameter
+	Returns a dict of filters to match torrents with
+	'''
 
-						ruleList = []
+	logger = logging.getLogger(__name__)
+	logger.debug('Reading RSS Feeds')
 
-						# Load the excludes
-						for exclude in filterItem.get('exclude', []):
-							for key, val in exclude.items():
-								ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':True})
+	store = common.getConfigStore(configFolder)
+	previous = compiledFeeds.get(configFolder, {})
+	current = {}
 
-						for include in filterItem.get('include', []):
-							for key, val in include.items():
-								ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':False})
+	majorFeeds = {}
 
-						feedFilterList.append(ruleList)
+	for configFileName, configFileData in store.getConfigFiles():
 
-					except Exception as e:
-						logger.warning('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
-						continue
+		stamp = store.getStamp(configFileName)
+		cached = previous.get(configFileName, None)
 
-				# Append the Config item to the dict
-				majorFeeds['{}.{}'.format(configFileName,feedName)] = {
-					'feedName':feedName,
-					'feedType':feedType,
-					'feedDestination':feedDestination,
-					'minorFeeds':minorFeeds,
-					'feedFilters':feedFilterList
-				}
+		if cached is None or cached[0] != stamp:
+			cached = (stamp, __compileConfigFile(configFileName, configFileData))
 
-			except Exception as e:
-				logger.warning('The {file} contains an invalid rule:\n{e}'.format(file=configFileName,e=e))
+		current[configFileName] = cached
+		majorFeeds.update(cached[1])
 
+	# Files that were removed are dropped here
+	compiledFeeds[configFolder] = current
 
 	return majorFeeds
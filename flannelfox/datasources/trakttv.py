@@ -4,7 +4,7 @@
 #-------------------------------------------------------------------------------
 # -*- coding: utf-8 -*-
 
-import os, traceback
+import os, traceback, functools
 
 # Third party modules
 import requests
@@ -14,7 +14,8 @@ import requests
 #urllib3.contrib.pyopenssl.inject_into_urllib3()
 
 from flannelfox.settings import settings
-from flannelfox.datasources import common
+from flannelfox.datasources import common, refresher
+from flannelfox.torrenttools import Filters
 from flannelfox import logging
 
 
@@ -36,6 +37,7 @@ class trakttvApi():
 
 		try:
 
+			refresher.rateLimit('trakt')
 			r = requests.get(url, headers=headers, timeout=60)
 			httpResponse = r.status_code
 
@@ -70,6 +72,84 @@ def getCacheDir():
 	return settings['files']['traktCacheDir']
 
 
+# The filter list of each majorFeed, kept so a new snapshot only has to
+# apply what changed
+compiledFilters = Filters.FilterCache()
+
+
+def __getTitle(item, feedType):
+	'''
+	Pulls the title and year out of a trakt list item
+
+	Returns:
+		Tuple (title, year), year is None for tv
+	'''
+	year = None
+
+	if 'show' not in item and feedType == 'tv':
+		# This happens if you select the wrong type of media tv/movie
+		raise ValueError('Media type is not show, but feed type is tv')
+
+	elif 'movie' not in item and feedType == 'movie':
+		# This happens if you select the wrong type of media tv/movie
+		raise ValueError('Media type is not movie, but feed type is movie')
+
+	elif 'show' in item and feedType == 'tv':
+		item = item['show']
+
+	elif 'movie' in item and feedType == 'movie':
+		item = item['movie']
+		year = str(item['year']).strip()
+
+	else:
+		raise ValueError('Could not use the trakt feed data')
+
+	title = item['title'].lower().strip().replace(' & ', ' and ')
+	for ch in (':', '\\', '\'', ','):
+		title = title.replace(ch, '')
+
+	return (title, year)
+
+
+def __getRuleLists(item, feedType, feedFilters, titleMatchMethod):
+	'''
+	Builds the rule lists for a single trakt list item
+
+	Takes:
+		item - The trakt list item
+		feedType - tv or movie
+		feedFilters - The filters of the feed
+		titleMatchMethod - title or titleLike
+
+	Returns:
+		List of rule lists
+	'''
+	title, year = __getTitle(item, feedType)
+
+	ruleLists = []
+	ruleList = []
+
+	for filterItem in feedFilters:
+
+		ruleList.append({'key':titleMatchMethod, 'val':title, 'exclude':False})
+
+		if year is not None:
+			ruleList.append({'key':'year', 'val':year, 'exclude':False})
+
+		# Load the excludes
+		for exclude in filterItem.get('exclude', []):
+			for key, val in exclude.items():
+				ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':True})
+
+		for include in filterItem.get('include', []):
+			for key, val in include.items():
+				ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':False})
+
+		ruleLists.append(ruleList)
+
+	return ruleLists
+
+
 def readTraktTvConfigs(configFolder=settings['files']['traktConfigDir']):
 	'''
 	Reads the titles and other information from a specified trakt.tv list
@@ -99,8 +179,6 @@ def readTraktTvConfigs(configFolder=settings['files']['traktConfigDir']):
 				minorFeeds = []
 				feedFilters = []
 				traktListResults = []
-				title = None
-				year = None
 				feedFilterList = []
 
 				# Make sure our list at least has some basic parts
@@ -131,35 +209,16 @@ def readTraktTvConfigs(configFolder=settings['files']['traktConfigDir']):
 
 				cacheFileName = os.path.join(getCacheDir(),feedName)
 
-				if common.isCacheStillValid(cacheFileName=cacheFileName):
-
-					traktListResults = common.readCacheFile(cacheFileName)
-					logger.debug('Using cache file {} for {}'.format(cacheFileName, feedName))
-
-				else:
-
-					traktapi = trakttvApi()
-
-					traktListResults = traktapi.getPublicList(
+				traktListResults = refresher.getWatchlist(
+					cacheFileName,
+					functools.partial(
+						trakttvApi().getPublicList,
 						apiKey=feedList.get('api_key'),
 						username=feedList.get('username'),
 						listname=feedName
-					)
-
-					logger.debug('Fetching new data {}'.format(feedName))
-
-					if not isinstance(traktListResults, list) or len(traktListResults) < 1:
-
-						traktListResults = common.readCacheFile(cacheFileName)
-						logger.debug('Using cache file {} for {}'.format(cacheFileName, feedName))
-
-						if not isinstance(traktListResults, list) or len(traktListResults) < 1:
-							raise ValueError('There was not a valid feed reply nor is there a valid cache for the feed')
-
-					else:
-
-						common.updateCacheFile(cacheFileName=cacheFileName, data=traktListResults)
-						logger.debug('Updating cache file {} for {}'.format(cacheFileName, feedName))
+					),
+					source='trakt'
+				)
 
 				logger.debug('Found {} items from {}'.format(len(traktListResults), feedName))
 
@@ -184,78 +243,31 @@ def readTraktTvConfigs(configFolder=settings['files']['traktConfigDir']):
 
 				feedFilters = feedList.get('filters', [])
 
-				# Loop through each show and append a filter for it
-				for item in traktListResults:
-
-					try:
-
-						ruleList = []
-
-						if feedList.get('like', False):
-							titleMatchMethod = 'titleLike'
-
-						else:
-							titleMatchMethod = 'title'
-
-						if 'show' not in item and feedType == 'tv':
-							# This happens if you select the wrong type of media tv/movie
-							raise ValueError('Media type is not show, but feed type is tv {0}'.format(title))
+				if feedList.get('like', False):
+					titleMatchMethod = 'titleLike'
 
-						elif 'movie' not in item and feedType == 'movie':
-							# This happens if you select the wrong type of media tv/movie
-							raise ValueError('Media type is not movie, but feed type is movie {0}'.format(title))
-
-						elif 'show' in item and feedType == 'tv':
-
-							item = item['show']
-							title = item['title'].lower().strip().replace(' & ', ' and ')
-							for ch in (':', '\\', '\'', ','):
-								title = title.replace(ch, '')
-
-						elif 'movie' in item and feedType == 'movie':
-
-							item = item['movie']
-							title = item['title'].lower().strip().replace(' & ', ' and ')
-							for ch in (':', '\\', '\'', ','):
-								title = title.replace(ch, '')
-
-							year = str(item['year']).strip()
-
-						else:
-							raise ValueError('Could not use the trakt feed data')
-
-
-						for filterItem in feedFilters:
-
-							ruleList.append({'key':titleMatchMethod, 'val':title, 'exclude':False})
-
-							if year is not None:
-								ruleList.append({'key':'year', 'val':year, 'exclude':False})
-
-							# Load the excludes
-							for exclude in filterItem.get('exclude', []):
-								for key, val in exclude.items():
-									ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':True})
-
-							for include in filterItem.get('include', []):
-								for key, val in include.items():
-									ruleList.append({'key':key.strip(), 'val':val.strip(), 'exclude':False})
-
-							feedFilterList.append(ruleList)
+				else:
+					titleMatchMethod = 'title'
 
-					except Exception as e:
+				majorFeedKey = '{}.{}'.format(configFileName,feedName)
 
-						logger.warning('The {file} contains an invalid rule:\n{e}\n{t}'.format(file=configFileName,e=e,t=traceback.format_exc()))
-						continue
+				# Only the titles that changed since the last snapshot get rules built
+				feedFilterList = compiledFilters.get(
+					majorFeedKey,
+					feedList,
+					traktListResults,
+					functools.partial(__getTitle, feedType=feedType),
+					functools.partial(__getRuleLists, feedType=feedType, feedFilters=feedFilters, titleMatchMethod=titleMatchMethod)
+				)
 
 				# Append the Config item to the dict
-				majorFeeds['{}.{}'.format(configFileName,feedName)] = {
+				majorFeeds[majorFeedKey] = common.addFeedOptions({
 					'feedName':feedName,
 					'feedType':feedType,
 					'feedDestination':feedDestination,
 					'minorFeeds':minorFeeds,
 					'feedFilters':feedFilterList
-				}
+				}, feedList)
 
 			except Exception as e:
 
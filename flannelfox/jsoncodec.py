@@ -0,0 +1,80 @@
+#-------------------------------------------------------------------------------
+# Name:		jsoncodec
+# Purpose:	Picks the fastest json library that is installed so large
+#			replies (torrent lists, api results) are cheap to encode/decode.
+#			orjson is preferred, then ujson, then the standard library.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import json
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+try:
+	import ujson
+except ImportError:
+	ujson = None
+
+
+# Errors that can be raised while decoding, regardless of the library used
+DecodeError = (ValueError, TypeError)
+
+
+if orjson is not None:
+
+	name = 'orjson'
+
+	def encode(data):
+		return orjson.dumps(data)
+
+	def decode(data):
+		return orjson.loads(data)
+
+elif ujson is not None:
+
+	name = 'ujson'
+
+	def encode(data):
+		return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+	def decode(data):
+		return ujson.loads(data)
+
+else:
+
+	name = 'json'
+
+	__encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+	def encode(data):
+		return __encoder.encode(data).encode('utf-8')
+
+	def decode(data):
+		if isinstance(data, (bytes, bytearray)):
+			data = data.decode('utf-8')
+		return json.loads(data)
+
+
+encode.__doc__ = '''
+	Serializes data to compact json
+
+	Takes:
+		data - Any json serializable object
+
+	Returns:
+		bytes (utf-8)
+	'''
+
+decode.__doc__ = '''
+	Parses a json document
+
+	Takes:
+		data - json as bytes or str
+
+	Returns:
+		The decoded object, raises one of DecodeError if the data is invalid
+	'''
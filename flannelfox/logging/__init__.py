@@ -8,10 +8,209 @@
 
 import logging, logging.handlers
 import flannelfox.debuglevels, flannelfox.settings
-import os
+import os, queue, atexit, threading, multiprocessing
 
 handles = {};
 
+# Writes the queued records once started, see startListener
+listener = None
+
+# Set in pool workers, their records are sent to the listener of the
+# parent through it, see initWorker
+workerQueue = None
+
+
+class LazyMessage(object):
+	'''
+	A log message that is only formatted when a handler writes it, so a
+	disabled level or a busy caller never pays for str() of the arguments
+	'''
+
+	__slots__ = ('fmt', 'args', 'kwargs')
+
+	def __init__(self, fmt, *args, **kwargs):
+		self.fmt = fmt
+		self.args = args
+		self.kwargs = kwargs
+
+
+	def __str__(self):
+		return self.fmt.format(*self.args, **self.kwargs)
+
+
+def lazy(fmt, *args, **kwargs):
+	'''
+	Defers a '...'.format(...) call until the record is written
+
+	Usage:
+		logger.debug(logging.lazy('Matched Torrent: {0}', torrent))
+	'''
+	return LazyMessage(fmt, *args, **kwargs)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+	'''
+	Passes records to the listener thread so the caller never waits on the
+	file. The message is formatted by prepare() before the record is
+	queued, so arguments changed afterwards do not change what is written.
+
+	Pool workers send their records to the listener of the parent, see
+	initWorker. When no listener is reachable (before the daemon forks, in
+	scripts) the file handler is called directly.
+	'''
+
+	def __init__(self, target, targetName=None):
+		'''
+		Takes:
+			target - Handler that writes the records
+			targetName - Name of target in handles, records of pool workers
+				can only be passed on for handlers that have one
+		'''
+		logging.handlers.QueueHandler.__init__(self, None)
+		self.target = target
+		self.targetName = targetName
+
+
+	def emit(self, record):
+		try:
+			current = listener
+
+			if current is not None and current.pid == os.getpid():
+				current.queue.put_nowait((self.target, self.prepare(record)))
+
+			elif workerQueue is not None and self.targetName is not None:
+				workerQueue.put_nowait((self.targetName, self.prepare(record)))
+
+			else:
+				self.target.handle(record)
+
+		except Exception:
+			self.handleError(record)
+
+
+class Listener(logging.handlers.QueueListener):
+	'''
+	Background thread writing (handler, record) pairs from the queue
+	'''
+
+	def __init__(self):
+		logging.handlers.QueueListener.__init__(self, queue.Queue(-1))
+		self.pid = os.getpid()
+
+		# Records of pool workers, see getWorkerQueue
+		self.workerQueue = None
+		self.workerThread = None
+
+
+	def handle(self, item):
+		target, record = item
+
+		# Workers name the handler, it is made here if this process has
+		# not logged to it yet
+		if isinstance(target, str):
+			if target not in handles:
+				getLogger(target)
+
+			target = handles[target]
+
+		target.handle(record)
+
+
+	def getWorkerQueue(self):
+		'''
+		Returns:
+			multiprocessing.Queue the pool workers put their records on,
+			they are moved onto the queue of this listener
+		'''
+		if self.workerQueue is None:
+			self.workerQueue = multiprocessing.Queue(-1)
+			self.workerThread = threading.Thread(target=self.drainWorkers)
+			self.workerThread.daemon = True
+			self.workerThread.start()
+
+		return self.workerQueue
+
+
+	def drainWorkers(self):
+		while True:
+			item = self.workerQueue.get()
+
+			if item is None:
+				break
+
+			self.queue.put_nowait(item)
+
+
+	def stop(self):
+		# The records of the workers are moved over before the last ones
+		# are written
+		if self.workerQueue is not None:
+			self.workerQueue.put_nowait(None)
+			self.workerThread.join()
+			self.workerQueue.close()
+			self.workerQueue = None
+
+		logging.handlers.QueueListener.stop(self)
+
+
+def startListener():
+	'''
+	Moves log writing onto a background thread. Threads do not survive a
+	fork so this has to be called inside the DaemonContext.
+	'''
+	global listener
+
+	if listener is not None and listener.pid == os.getpid():
+		return
+
+	listener = Listener()
+	listener.start()
+
+	atexit.register(stopListener)
+
+
+def stopListener():
+	'''
+	Writes out the queued records and stops the background thread
+	'''
+	global listener
+
+	current = listener
+
+	if current is None or current.pid != os.getpid():
+		return
+
+	current.stop()
+	listener = None
+
+
+def getWorkerQueue():
+	'''
+	Returns:
+		The queue pool workers should send their records to, None when no
+		listener runs in this process
+	'''
+	current = listener
+
+	if current is None or current.pid != os.getpid():
+		return None
+
+	return current.getWorkerQueue()
+
+
+def initWorker(records=None):
+	'''
+	Pool initializer, the records of the worker are sent to records (see
+	getWorkerQueue) instead of being written to the files by the worker
+
+	Usage:
+		Pool(initializer=logging.initWorker, initargs=(logging.getWorkerQueue(),))
+	'''
+	global workerQueue
+
+	workerQueue = records
+
+
 def __init():
 	# Add some custom log levels
 	THREADINGINFO = flannelfox.debuglevels.levels["THREADINGINFO"]
@@ -76,7 +275,7 @@ def getLogger(name='flannelfox'):
 
 			handles[name].addFilter(logFilter)
 
-			logger.addHandler(handles[name])
+			logger.addHandler(QueueHandler(handles[name], name))
 
 		return logger
 
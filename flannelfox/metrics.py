@@ -0,0 +1,376 @@
+#-------------------------------------------------------------------------------
+# Name:		metrics
+# Purpose:	Counters, gauges and timers for the daemons. Values are kept in
+#			memory and written out once per cycle as a Prometheus textfile
+#			(or json) so a slow feed or phase can be spotted without debug
+#			logging.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import os, time, threading, tempfile
+
+# flannelfox Includes
+from flannelfox.settings import settings
+from flannelfox import jsoncodec
+
+
+class Timer(object):
+	'''
+	Context manager that adds the time spent inside it to a timer
+	'''
+
+	def __init__(self, registry, name, labels):
+		self.registry = registry
+		self.name = name
+		self.labels = labels
+		self.startTime = None
+
+
+	def __enter__(self):
+		self.startTime = time.perf_counter()
+		return self
+
+
+	def __exit__(self, *args):
+		self.registry.observe(self.name, time.perf_counter() - self.startTime, **self.labels)
+		return False
+
+
+class NullTimer(object):
+	'''
+	Timer used while metrics are disabled, it does not look at the clock
+	'''
+
+	def __enter__(self):
+		return self
+
+
+	def __exit__(self, *args):
+		return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Registry(object):
+	'''
+	Holds the metrics of a process. Timers keep a count, a sum and the
+	slowest observation. Everything can be copied out with snapshot and
+	merged into another registry, which is how the rss workers hand their
+	numbers back to the daemon.
+	'''
+
+	def __init__(self, enabled=True):
+		'''
+		Takes:
+			enabled - Bool, a disabled registry ignores every metric
+		'''
+		self.enabled = enabled
+		self.lock = threading.Lock()
+		self.reset()
+
+
+	def reset(self):
+		with self.lock:
+			# (name, labels) -> value
+			self.counters = {}
+			self.gauges = {}
+
+			# (name, labels) -> [count, sum, max]
+			self.timers = {}
+
+
+	@classmethod
+	def __key(self, name, labels):
+		return (name, tuple(sorted(labels.items())))
+
+
+	def inc(self, name, value=1, **labels):
+		'''
+		Adds value to a counter
+		'''
+		if not self.enabled:
+			return
+
+		key = self.__key(name, labels)
+
+		with self.lock:
+			self.counters[key] = self.counters.get(key, 0) + value
+
+
+	def gauge(self, name, value, **labels):
+		'''
+		Sets a gauge to value
+		'''
+		if not self.enabled:
+			return
+
+		key = self.__key(name, labels)
+
+		with self.lock:
+			self.gauges[key] = value
+
+
+	def observe(self, name, seconds, **labels):
+		'''
+		Adds a duration to a timer
+		'''
+		if not self.enabled:
+			return
+
+		key = self.__key(name, labels)
+
+		with self.lock:
+			timer = self.timers.get(key, None)
+
+			if timer is None:
+				self.timers[key] = [1, seconds, seconds]
+
+			else:
+				timer[0] += 1
+				timer[1] += seconds
+				timer[2] = max(timer[2], seconds)
+
+
+	def timer(self, name, **labels):
+		'''
+		Times a block of code
+
+		Usage:
+			with registry.timer('rss_fetch', feed='tv'):
+				...
+		'''
+		if not self.enabled:
+			return NULL_TIMER
+
+		return Timer(self, name, labels)
+
+
+	def get(self, name, **labels):
+		'''
+		Returns the value of a counter or gauge, or [count, sum, max] of a
+		timer, None if it has not been set
+		'''
+		key = self.__key(name, labels)
+
+		with self.lock:
+			for values in (self.counters, self.gauges, self.timers):
+				if key in values:
+					return values[key]
+
+		return None
+
+
+	def snapshot(self):
+		'''
+		Returns a picklable copy of every metric
+		'''
+		with self.lock:
+			return {
+				'counters': dict(self.counters),
+				'gauges': dict(self.gauges),
+				'timers': dict((key, list(val)) for key, val in self.timers.items())
+			}
+
+
+	def merge(self, snapshot):
+		'''
+		Adds the metrics of a snapshot to this registry, gauges are replaced
+		'''
+		if not snapshot:
+			return
+
+		with self.lock:
+			for key, value in snapshot.get('counters', {}).items():
+				self.counters[key] = self.counters.get(key, 0) + value
+
+			self.gauges.update(snapshot.get('gauges', {}))
+
+			for key, (count, total, slowest) in snapshot.get('timers', {}).items():
+				timer = self.timers.get(key, None)
+
+				if timer is None:
+					self.timers[key] = [count, total, slowest]
+
+				else:
+					timer[0] += count
+					timer[1] += total
+					timer[2] = max(timer[2], slowest)
+
+
+	@classmethod
+	def __formatLabels(self, labels):
+		if len(labels) == 0:
+			return ''
+
+		return '{{{0}}}'.format(','.join(
+			'{0}="{1}"'.format(
+				key,
+				str(val).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+			) for key, val in labels
+		))
+
+
+	def toPrometheus(self, prefix='flannelfox'):
+		'''
+		Formats the metrics in the Prometheus text exposition format
+
+		Returns:
+			str
+		'''
+		snapshot = self.snapshot()
+		lines = []
+
+		def group(values):
+			grouped = {}
+			for (name, labels), value in sorted(values.items(), key=lambda item: (item[0][0], item[0][1])):
+				grouped.setdefault(name, []).append((labels, value))
+			return sorted(grouped.items())
+
+		for name, values in group(snapshot['counters']):
+			metric = '{0}_{1}_total'.format(prefix, name)
+			lines.append('# TYPE {0} counter'.format(metric))
+			for labels, value in values:
+				lines.append('{0}{1} {2}'.format(metric, self.__formatLabels(labels), value))
+
+		for name, values in group(snapshot['gauges']):
+			metric = '{0}_{1}'.format(prefix, name)
+			lines.append('# TYPE {0} gauge'.format(metric))
+			for labels, value in values:
+				lines.append('{0}{1} {2}'.format(metric, self.__formatLabels(labels), value))
+
+		for name, values in group(snapshot['timers']):
+			metric = '{0}_{1}_seconds'.format(prefix, name)
+			lines.append('# TYPE {0} summary'.format(metric))
+			for labels, (count, total, slowest) in values:
+				lines.append('{0}_count{1} {2}'.format(metric, self.__formatLabels(labels), count))
+				lines.append('{0}_sum{1} {2:.6f}'.format(metric, self.__formatLabels(labels), total))
+
+			lines.append('# TYPE {0}_max gauge'.format(metric))
+			for labels, (count, total, slowest) in values:
+				lines.append('{0}_max{1} {2:.6f}'.format(metric, self.__formatLabels(labels), slowest))
+
+		return '\n'.join(lines) + '\n'
+
+
+	def toDict(self):
+		'''
+		Formats the metrics as a json friendly dict
+		'''
+		snapshot = self.snapshot()
+
+		def flatten(values, makeValue):
+			return [
+				dict(name=name, labels=dict(labels), **makeValue(value))
+				for (name, labels), value in sorted(values.items(), key=lambda item: (item[0][0], item[0][1]))
+			]
+
+		return {
+			'counters': flatten(snapshot['counters'], lambda value: {'value':value}),
+			'gauges': flatten(snapshot['gauges'], lambda value: {'value':value}),
+			'timers': flatten(snapshot['timers'], lambda value: {'count':value[0], 'sum':value[1], 'max':value[2]})
+		}
+
+
+	def write(self, fileName, fmt='prometheus'):
+		'''
+		Writes the metrics to fileName, the file is replaced atomically so a
+		collector never reads half of it
+
+		Takes:
+			fileName - The file to write
+			fmt - prometheus or json
+		'''
+		if fmt == 'json':
+			data = jsoncodec.encode(self.toDict())
+		else:
+			data = self.toPrometheus().encode('utf-8')
+
+		directory = os.path.dirname(fileName) or '.'
+
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+
+		fd, tempName = tempfile.mkstemp(dir=directory, prefix='.{0}.'.format(os.path.basename(fileName)))
+
+		try:
+			with os.fdopen(fd, 'wb') as metricsFile:
+				metricsFile.write(data)
+
+			# Collectors only read world readable files
+			os.chmod(tempName, 0o644)
+			os.replace(tempName, fileName)
+
+		except BaseException:
+			try:
+				os.remove(tempName)
+			except OSError:
+				pass
+			raise
+
+
+# The metrics of this process
+registry = Registry()
+
+
+# Nothing is kept while metrics are disabled, see isEnabled
+def inc(name, value=1, **labels):
+	if isEnabled():
+		registry.inc(name, value, **labels)
+
+
+def gauge(name, value, **labels):
+	if isEnabled():
+		registry.gauge(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+	if isEnabled():
+		registry.observe(name, seconds, **labels)
+
+
+def timer(name, **labels):
+	if not isEnabled():
+		return NULL_TIMER
+
+	return registry.timer(name, **labels)
+
+
+def isEnabled():
+	return settings.get('metrics', {}).get('enabled', False)
+
+
+def getMetricsFile(daemonName):
+	'''
+	Returns the file the metrics of a daemon are written to
+	'''
+	fmt = settings.get('metrics', {}).get('format', 'prometheus')
+
+	return os.path.join(
+		settings['files']['metricsDir'],
+		'{0}.{1}'.format(daemonName, 'json' if fmt == 'json' else 'prom')
+	)
+
+
+def write(daemonName):
+	'''
+	Writes the metrics of this process for a daemon, nothing is written when
+	metrics are disabled
+
+	Takes:
+		daemonName - Name of the daemon (rssdaemon, queuedaemon or
+			combineddaemon, which runs the other two in one process)
+
+	Returns:
+		bool True if the file was written
+	'''
+	if not isEnabled():
+		return False
+
+	registry.write(
+		getMetricsFile(daemonName),
+		settings.get('metrics', {}).get('format', 'prometheus')
+	)
+
+	return True
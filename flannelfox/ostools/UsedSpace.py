@@ -9,6 +9,7 @@ import ctypes, platform, subprocess, re, math
 
 # Logging
 from flannelfox import logging
+from flannelfox import metrics
 
 def check(folder,size='G'):
 	''' Return folder/drive used space (in bytes) '''
@@ -44,7 +45,8 @@ def check(folder,size='G'):
 		# TODO: Change this to walk the directory and add up the sizes, we want
 		# this to be all python after all
 
-			response, error = subprocess.Popen(['du','-s',folder], stdout=subprocess.PIPE).communicate()
+			with metrics.timer('used_space_check'):
+				response, error = subprocess.Popen(['du','-s',folder], stdout=subprocess.PIPE).communicate()
 
 			response = response.decode('utf-8')
 
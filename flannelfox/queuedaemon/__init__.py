@@ -21,6 +21,8 @@ from flannelfox.ostools import FreeSpace, UsedSpace
 
 # Logging
 from flannelfox import logging
+from flannelfox import metrics
+from flannelfox import scheduler
 
 # Flannelfox Includes
 from flannelfox.settings import settings
@@ -42,24 +44,34 @@ class QueueReader():
 	# Torrent client object
 	torrentClient = None
 
-	def __init__(self, *args):
-		self.database = Databases(
+	# Torrents handed over by rssReader, see TorrentQueue.Handoff
+	handoff = None
+
+	def __init__(self, handoff=None, database=None):
+		'''
+		Takes:
+			handoff - TorrentQueue.Handoff the torrents are taken from
+				instead of the database
+			database - Databases to use, a new one is made when there is none
+		'''
+		self.database = database or Databases(
 			dbType = self.defaultDatabaseType
 		)
+		self.handoff = handoff
 		self.torrentClient = self.setupTorrentClient()
 		self.torrentClient.updateQueue()
 
 
 	def setupTorrentClient(self):
-		if 'client' not in settings:
+		if 'client' not in settings and not settings.get('clients', None):
 			self.logger.warning('No client was configured to monitor!')
 			return None
 
-		# Try to create a torrent client instance
+		# Try to create a torrent client instance, the backend types are
+		# checked by TorrentClient
 		try:
-			if settings['client']['type'] == 'transmission':
-				self.logger.debug("Creating Transmission Client");
-				return TorrentClient()
+			self.logger.debug("Creating Torrent Client");
+			return TorrentClient(database=self.database)
 
 		except Exception as e:
 			self.logger.error('Could not create torrent client: {0}'.format(e))
@@ -70,6 +82,60 @@ class QueueReader():
 			return None
 
 
+	def hasQueuedTorrents(self):
+		'''
+		Returns:
+			bool True if there is a torrent waiting to be added
+		'''
+		if self.handoff is None:
+			return self.database.getNextQueuedTorrent(selectors=['url', 'feedDestination']) is not None
+
+		self.handoff.load(self.database)
+		return len(self.handoff) > 0
+
+
+	def getQueuedTorrents(self, num=None):
+		'''
+		Takes:
+			num - Int, the most torrents to return
+
+		Returns:
+			List of the torrents waiting to be added in the order they
+			should be added, see Databases.getQueuedTorrents
+		'''
+		if self.handoff is None:
+			return self.database.getQueuedTorrents(selectors=['url', 'feedDestination'], num=num)
+
+		self.handoff.load(self.database)
+		return self.handoff.get(num)
+
+
+	def addTorrent(self, torrent):
+		'''
+		Adds a queued torrent to the client
+
+		Takes:
+			torrent - Dict with the url and feedDestination
+
+		Returns:
+			The result of TorrentClient.addTorrentURL
+		'''
+		# If a destination was not specified then don't pass one
+		if torrent.get('feedDestination', None) is None:
+			added = self.torrentClient.addTorrentURL(torrent['url'])
+		else:
+			added = self.torrentClient.addTorrentURL(torrent['url'],torrent['feedDestination'])
+
+		if self.handoff is not None:
+			self.handoff.remove(torrent['url'])
+
+			# The torrent was left queued in the database
+			if added is None:
+				self.handoff.invalidate()
+
+		return added
+
+
 	def checkSubDirectoryFreeSpace(self):
 		# Check for freespace in each directory
 		# Collect all the active destinations
@@ -176,7 +242,7 @@ class QueueReader():
 
 		# Add torrents if there is room
 		while ( len(self.torrentClient.getQueue()) < settings['queueManagement']['maxTorrents'] and
-				len(self.database.getQueuedTorrents(selectors=['url', 'feedDestination'],num=1)) > 0 and
+				self.hasQueuedTorrents() and
 				len(self.torrentClient.getDownloading()) < settings['queueManagement']['maxDownloadingTorrents'] and
 				(
 					int(UsedSpace.check(settings['files']['maxUsedSpaceDir'],'G')) < int(settings['maxUsedSpace']) or
@@ -184,22 +250,17 @@ class QueueReader():
 				)
 			):
 
-			queuedTorrents = self.database.getQueuedTorrents(selectors=['url', 'feedDestination'])
+			# Get the next torrent
+			queuedTorrents = self.getQueuedTorrents(num=1)
 
-			self.logger.info('There are {0} queued torrents, let\'s add them'.format(
-				len(queuedTorrents)
-			))
+			if len(queuedTorrents) <= 0:
+				break
 
-			# Get a new torrent
-			newTorrent = queuedTorrents.pop()
+			newTorrent = queuedTorrents[0]
 
 			# Add new torrent
-			# If a destination was not specified then don't pass one
 			self.logger.info('Adding: {0}'.format(newTorrent))
-			if newTorrent.get('feedDestination', None) is None:
-				self.torrentClient.addTorrentURL(newTorrent['url'])
-			else:
-				self.torrentClient.addTorrentURL(newTorrent['url'],newTorrent['feedDestination'])
+			self.addTorrent(newTorrent)
 
 			self.torrentClient.updateQueue()
 
@@ -208,7 +269,7 @@ class QueueReader():
 
 		# Remove a finished torrent if room is needed to add a torrent
 		while ( len(self.torrentClient.getQueue()) >= settings['queueManagement']['maxTorrents'] and
-				len(self.database.getQueuedTorrents(selectors=['url', 'feedDestination'],num=1)) > 0 and
+				self.hasQueuedTorrents() and
 				len(self.torrentClient.getDownloading()) < settings['queueManagement']['maxDownloadingTorrents'] and
 				(
 					int(UsedSpace.check(settings['files']['maxUsedSpaceDir'],'G')) < int(settings['maxUsedSpace']) or
@@ -216,13 +277,15 @@ class QueueReader():
 				)
 			   ):
 
-			queuedTorrents = self.database.getQueuedTorrents(selectors=['url', 'feedDestination'])
 			dormantSeeds = self.torrentClient.getDormantSeeds()
 			slowSeeds = self.torrentClient.getSlowestSeeds()
 
 			if len(dormantSeeds) <= 0 and len(slowSeeds) <= 0:
 				break
 
+			# No more torrents can be added than seeds removed
+			queuedTorrents = self.getQueuedTorrents(num=len(dormantSeeds) + len(slowSeeds))
+
 			self.logger.info('There are {0} queued torrents, let\'s make room and add them'.format(
 				len(queuedTorrents)
 			))
@@ -248,24 +311,26 @@ class QueueReader():
 				# Remove slow seed
 				if self.torrentClient.deleteTorrent(hashString=slowestFinishedSeed['hashString'], reason='Making Room For a New Torrent'):
 
-					# Get a new torrent
-					newTorrent = queuedTorrents.pop()
+					# Get the next torrent
+					newTorrent = queuedTorrents.pop(0)
 
 
 					# Add new torrent
-					# If a destination was not specified then don't pass one
-					if newTorrent.get('feedDestination', None) is None:
-						self.torrentClient.addTorrentURL(newTorrent['url'])
-					else:
-						self.torrentClient.addTorrentURL(newTorrent['url'],newTorrent['feedDestination'])
+					self.addTorrent(newTorrent)
 
 			self.torrentClient.updateQueue()
 
 
-def __queueReader():
+def __queueReader(queueReader=None, metricsName='queuedaemon'):
 	'''
 	Connects to the rpc daemon and attempts to manange the queue
 
+	Takes:
+		queueReader - QueueReader kept between passes, a new one is made
+			when there is none
+		metricsName - Name the metrics file is written under, see
+			metrics.write
+
 	Steps:
 		Update queue list
 		Checks for freespace on feedDestinations
@@ -275,38 +340,79 @@ def __queueReader():
 	'''
 	logger.info('QueueDaemon Started')
 
+	startTime = time.time()
+
+	if queueReader is None:
+		with metrics.timer('queue_phase', phase='setup'):
+			queueReader = QueueReader()
 
-	queueReader = QueueReader()
+	else:
+		with metrics.timer('queue_phase', phase='updateQueue'):
+			queueReader.torrentClient.updateQueue()
 
 	logger.debug('Checking Sub Freespace')
-	queueReader.checkSubDirectoryFreeSpace()
+	with metrics.timer('queue_phase', phase='subDirectoryFreeSpace'):
+		queueReader.checkSubDirectoryFreeSpace()
 
 	logger.debug('Checking Main Directory Freespace')
-	queueReader.checkMainDirectoryFreeSpace()
+	with metrics.timer('queue_phase', phase='mainDirectoryFreeSpace'):
+		queueReader.checkMainDirectoryFreeSpace()
 
 	logger.debug('Checking Queue Size')
-	queueReader.checkQueueSize()
+	with metrics.timer('queue_phase', phase='queueSize'):
+		queueReader.checkQueueSize()
 
 	logger.debug('Checking Finished Torrents')
-	queueReader.checkFinishedTorrents()
+	with metrics.timer('queue_phase', phase='finishedTorrents'):
+		queueReader.checkFinishedTorrents()
 
 	logger.debug('Adding Torrents')
-	queueReader.addTorrents()
+	with metrics.timer('queue_phase', phase='addTorrents'):
+		queueReader.addTorrents()
 
 	logger.debug('Adding Torrents and Removing Finished')
-	queueReader.addTorrentsAndRemoveFinished()
+	with metrics.timer('queue_phase', phase='addTorrentsAndRemoveFinished'):
+		queueReader.addTorrentsAndRemoveFinished()
 
+	downloading = len(queueReader.torrentClient.getDownloading())
+	seeding = len(queueReader.torrentClient.getSeeding())
+	total = len(queueReader.torrentClient.getQueue())
 
 	logger.info('Downloading: {0} | Seeding: {1} | Total: {2}'.format(
-		len(queueReader.torrentClient.getDownloading()),
-		len(queueReader.torrentClient.getSeeding()),
-		len(queueReader.torrentClient.getQueue())
+		downloading,
+		seeding,
+		total
 	))
 
+	metrics.gauge('queue_torrents', downloading, state='downloading')
+	metrics.gauge('queue_torrents', seeding, state='seeding')
+	metrics.gauge('queue_torrents', total, state='total')
+	metrics.gauge('queue_pass_seconds', time.time() - startTime)
+	metrics.gauge('queue_pass_timestamp', int(time.time()))
+
+	try:
+		metrics.write(metricsName)
+
+	except Exception as e:
+		logger.error('Could not write the metrics file: {0}'.format(e))
+
 	logger.info('Loop Stopped {0}'.format(strftime('%Y-%m-%d %H:%M:%S', gmtime())))
 
-	# Put the app to sleep
-	time.sleep(settings['queueDaemonThreadSleep'])
+
+def runQueueReader(queueReader=None, metricsName='queuedaemon'):
+	'''
+	Runs a pass, errors are logged so the next pass still happens on time
+
+	Takes:
+		queueReader - QueueReader kept between passes, see __queueReader
+		metricsName - Name the metrics file is written under
+	'''
+	try:
+		__queueReader(queueReader, metricsName)
+
+	except Exception as e:
+		logger.error('Queue pass failed {0}\nTrace: {1}'.format(e, traceback.format_exc() ))
+		metrics.inc('queue_pass_errors')
 
 
 def main():
@@ -320,22 +426,25 @@ def main():
 			logging.getFileHandle(__name__).stream
 		]
 	):
-		while True:
 
-			try:
-				__queueReader()
+		# Logs are written in the background from here on, threads do not
+		# survive the fork into the daemon so this has to happen here
+		logging.startListener()
 
-			except KeyboardInterrupt as e:
-				logger.warning('Application Aborted')
-				break
+		# Passes run every queueDaemonThreadSleep seconds and as soon as
+		# rssdaemon queues new torrents
+		jobs = scheduler.Scheduler()
+		jobs.add('queueReader', runQueueReader, settings['queueDaemonThreadSleep'])
+		jobs.listen(settings['files']['queueDaemonSocket'], 'queueReader')
+
+		try:
+			jobs.run()
 
-			except Exception as e:
-				logger.error('Application Stopped {0}\nTrace: {1}'.format(e, traceback.format_exc() ))
+		except KeyboardInterrupt as e:
+			logger.warning('Application Aborted')
 
-				# Sleep for 10 seconds to give a bit of time for the error to try and resolve itself
-				# This is mainly related to the occurance of an error that can be generated randomly
-				#   [Errno 11] Resource temporarily unavailable
-				time.sleep(10)
+		finally:
+			jobs.stop()
 
 	logger.info('Application Exited')
 
@@ -14,9 +14,8 @@
 
 
 # System Includes
-import time, re, signal, os, traceback
+import time, re, signal, os, traceback, functools
 import defusedxml.ElementTree as ET
-from multiprocessing import Pool
 from time import gmtime, strftime
 
 # Third party modules
@@ -31,23 +30,55 @@ import daemon
 import flannelfox
 from flannelfox import logging
 from flannelfox import tools
+from flannelfox import metrics
+from flannelfox import scheduler
 from flannelfox.settings import settings
 import flannelfox.datasources.trakttv, \
 		flannelfox.datasources.rss, \
 		flannelfox.datasources.goodreads, \
-		flannelfox.datasources.lastfm
+		flannelfox.datasources.lastfm, \
+		flannelfox.datasources.refresher
 
 # rssdaemon Includes
-from flannelfox.torrenttools import Torrents, TorrentQueue
+from flannelfox.torrenttools import Torrents, TorrentQueue, Filters
 from flannelfox.torrenttools.Torrents import TORRENT_TYPES
+from flannelfox.scenetools import Patterns
+from flannelfox.rssdaemon import feedpool, circuitbreaker
 
 
 # TODO: can this be moved?
 httpRegex = re.compile(r'https?://([^/]+)(?:/.*)?')
 
+SYNDICATION_NAMESPACE = 'http://purl.org/rss/1.0/modules/syndication/'
+
+# Seconds in each sy:updatePeriod
+UPDATE_PERIODS = {
+	'hourly': 3600,
+	'daily': 86400,
+	'weekly': 604800,
+	'monthly': 2592000,
+	'yearly': 31536000
+}
+
 # Setup the logging agent
 logger = logging.getLogger(__name__)
 
+# The http session of this process, connections are kept open between
+# fetches and cycles
+session = {'pid': None, 'session': None}
+
+
+def getSession():
+	'''
+	Returns the requests session of this process, pool workers each make
+	their own
+	'''
+	if session['pid'] != os.getpid():
+		session['session'] = requests.Session()
+		session['pid'] = os.getpid()
+
+	return session['session']
+
 
 def readRSSFeed(url):
 
@@ -65,11 +96,11 @@ def readRSSFeed(url):
 		headers = {'user-agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.99 Safari/537.36'}
 
 		# Open the URL and get the data
-		r = requests.get(url, headers=headers, timeout=10)
+		r = getSession().get(url, headers=headers, timeout=10)
 		response = r.content
 		httpCode = r.status_code
 		encoding = r.encoding
-		logger.threadingDebug('[T:{0}] RSS fetch OK URL: [{1}]|[{2}]'.format(pid, httpRegex.match(url).group(1), r.status_code))
+		logger.threadingDebug(logging.lazy('[T:{0}] RSS fetch OK URL: [{1}]|[{2}]', pid, httpRegex.match(url).group(1), r.status_code))
 
 	except Exception as e:
 		logger.threadingInfo('[T:{0}] There was a problem fetching the URL: [{1}]\n-  {2}'.format(pid, httpRegex.match(url).group(1), e))
@@ -78,12 +109,47 @@ def readRSSFeed(url):
 	return (response, httpCode, encoding)
 
 
-def rssToTorrents(xmlData, feedType='none', feedDestination=None, minRatio=0.0, minTime=0, comparison='or'):
+def getFeedHint(channel):
 	'''
-	Read the RSS Feed and return a list of torrent items
+	Reads how long a feed asks to be cached for from its ttl (minutes) or
+	its sy:updatePeriod and sy:updateFrequency
+
+	Returns:
+		Seconds, None if the feed does not say
+	'''
+	try:
+		ttl = channel.findtext('ttl')
+
+		if ttl is not None and ttl.strip() != '':
+			return int(ttl.strip()) * 60
+
+		period = channel.findtext('{{{0}}}updatePeriod'.format(SYNDICATION_NAMESPACE))
+
+		if period is not None:
+			frequency = channel.findtext('{{{0}}}updateFrequency'.format(SYNDICATION_NAMESPACE)) or '1'
+			return int(UPDATE_PERIODS[period.strip().lower()] / max(int(frequency.strip()), 1))
+
+	except (ValueError, KeyError):
+		pass
+
+	return None
+
+
+def parseFeed(xmlData, feedType='none', feedInfo=None):
+	'''
+	Read the RSS Feed and parse the titles of its items, this only has to
+	be done once however many majorFeeds subscribe to the feed
+
+	Takes:
+		feedInfo - Dict, when given it is filled with the links of every
+			item (links), the caching hint of the feed (hint) and the number
+			of items that are of feedType (parsed)
+
+	Returns:
+		Tuple (torrentType, titles, links, columns) for feedToTorrents,
+		None when the feed could not be read
 	'''
 
-	rssTorrents = []
 	pid = os.getpid()
 
 	try:
@@ -99,6 +165,9 @@ def rssToTorrents(xmlData, feedType='none', feedDestination=None, minRatio=0.0,
 		if channel is not None:
 			rssItems = channel
 
+		titles = []
+		links = []
+
 		for rssItem in rssItems.iter('item'):
 			try:
 				title = rssItem.find('title').text
@@ -126,115 +195,271 @@ def rssToTorrents(xmlData, feedType='none', feedDestination=None, minRatio=0.0,
 			except Exception:
 				continue
 
-			# Try to create a torrent from the title
-			try:
-
-				torrentItem = TORRENT_TYPES[feedType](torrentTitle=title, url=link, minTime=minTime, minRatio=minRatio, comparison=comparison, feedDestination=feedDestination)
+			titles.append(title)
+			links.append(link)
 
-				if torrentItem is not None:
-					rssTorrents.append(torrentItem)
+		if feedInfo is not None:
+			feedInfo['hint'] = getFeedHint(rssItems)
+			feedInfo['links'] = links
 
-				else:
-					raise TypeError('The Title given does not appear to be of type: {0}\n-  {1}'.format(feedType, title))
-
-
-			except (KeyError) as e:
-				logger.threadingInfo('[T:{0}] A valid Feed Type was not specified:\n-  {1}'.format(pid, e))
+		# Parse every title in one go
+		try:
+			torrentType = TORRENT_TYPES[feedType]
+			columns = torrentType.parseTitles(titles)
 
-			except (TypeError, ValueError) as e:
-				logger.threadingDebug('[T:{0}] There was a problem creating a torrent:\n-  {1}'.format(pid, e))
+		except (KeyError) as e:
+			logger.threadingInfo('[T:{0}] A valid Feed Type was not specified:\n-  {1}'.format(pid, e))
+			torrentType = None
+			columns = {'parsed': []}
 
-			except Exception as e:
-				logger.threadingDebug('[T:{0}] There was a problem creating a torrent:\n-  {1}'.format(pid, e))
+		if feedInfo is not None:
+			feedInfo['parsed'] = sum(columns['parsed'])
 
 		rssItems = None
 
 	except (IOError,ValueError,ET.ParseError) as e:
 		logger.threadingInfo('[T:{0}]  There was a problem reading the RSS Feed:\n-  {1}'.format(pid, e))
+		return None
+
+	return (torrentType, titles, links, columns)
+
+
+def feedToTorrents(parsedFeed, feedDestination=None, minRatio=0.0, minTime=0, comparison='or', feedFilters=None):
+	'''
+	Make the torrents of a feed read by parseFeed
+
+	Takes:
+		parsedFeed - Tuple, see parseFeed
+		feedFilters - The feedFilters of the majorFeed, when given torrents
+			are only made for the items that could match them
+	'''
+
+	rssTorrents = []
+	pid = os.getpid()
+
+	torrentType, titles, links, columns = parsedFeed
+
+	if isinstance(feedFilters, Filters.FilterList) and len(feedFilters) > 0:
+		rows = feedFilters.survivors(columns)
+
+	else:
+		rows = range(len(columns['parsed']))
+
+	for idx in rows:
+
+		# Try to create a torrent from the title
+		try:
+
+			if not columns['parsed'][idx]:
+				raise TypeError('The Title given does not appear to be of type: {0}\n-  {1}'.format(torrentType.__name__, titles[idx]))
+
+			rssTorrents.append(torrentType.fromColumns(columns, idx, links[idx], minTime=minTime, minRatio=minRatio, comparison=comparison, feedDestination=feedDestination))
+
+		except (TypeError, ValueError) as e:
+			logger.threadingDebug(logging.lazy('[T:{0}] There was a problem creating a torrent:\n-  {1}', pid, e))
+
+		except Exception as e:
+			logger.threadingDebug(logging.lazy('[T:{0}] There was a problem creating a torrent:\n-  {1}', pid, e))
 
 	return rssTorrents
 
 
+def rssToTorrents(xmlData, feedType='none', feedDestination=None, minRatio=0.0, minTime=0, comparison='or', feedInfo=None, feedFilters=None):
+	'''
+	Read the RSS Feed and return a list of torrent items
+
+	Takes:
+		feedFilters - The feedFilters of the majorFeed, when given torrents
+			are only made for the items that could match them
+		feedInfo - Dict, see parseFeed
+	'''
+
+	parsedFeed = parseFeed(xmlData, feedType=feedType, feedInfo=feedInfo)
+
+	if parsedFeed is None:
+		return []
+
+	return feedToTorrents(parsedFeed, feedDestination=feedDestination, minRatio=minRatio, minTime=minTime, comparison=comparison, feedFilters=feedFilters)
+
+
 def rssThread(majorFeed):
+	'''
+	Fetches, parses and filters the minorFeeds of a majorFeed
+
+	Returns:
+		See readSubscriptions
+	'''
+	return readSubscriptions([(majorFeed, minorFeed) for minorFeed in majorFeed['minorFeeds']])
+
+
+def readSubscriptions(subscriptions):
+	'''
+	Fetches and parses each feed url once, then makes and filters the
+	torrents of every majorFeed subscribed to it
+
+	Takes:
+		subscriptions - List of (majorFeed, minorFeed)
+
+	Returns:
+		Tuple (pid, torrents, error, processed, metrics snapshot, feedInfo)
+		feedInfo maps each url that was fetched to its http status
+		(status) and, when it was read, its links and hint, see parseFeed
+	'''
 
 	error = None
 	processed = 0
 	pid = os.getpid()
+	feedInfo = {}
+	url = None
+	feedName = ''
+
+	# Workers hand their metrics back with the result
+	feedMetrics = metrics.Registry(enabled=metrics.isEnabled())
 
 	try:
 
 		rssTorrents = []
 
-		logger.threadingInfo('[T:{0}] Thread Started'.format(pid))
+		logger.threadingInfo(logging.lazy('[T:{0}] Thread Started', pid))
 
 		# This is needed to ensure Keyboard driven interruptions are handled correctly
 		# signal.signal(signal.SIGINT, signal.SIG_IGN)
 
 		# Check each feed for a list of possible torrents
 		# Set the default type for untyped feeds
-		if isinstance(majorFeed['feedType'],str) and majorFeed['feedType'] != '':
-			majorFeed['feedType'] = majorFeed['feedType']
+		for majorFeed, minorFeed in subscriptions:
+			majorFeed['feedType'] = feedpool.getFeedType(majorFeed)
 
-		else:
-			majorFeed['feedType'] = 'none'
+		# The subscriptions of each feed, in the order they came
+		for (url, feedType), subscribers in feedpool.groupSubscriptions(subscriptions):
+
+			# The fetch and parse are shared, they are put down to the
+			# first majorFeed subscribed
+			feedName = subscribers[0][0].get('feedName', '')
+			host = httpRegex.match(url).group(1)
 
-		# Aggregate all the minorFeed items
-		for minorFeed in majorFeed['minorFeeds']:
+			with feedMetrics.timer('rss_fetch', feed=feedName, host=host):
+				rssData, httpCode = readRSSFeed(url)[:2]
 
-			rssData, httpCode = readRSSFeed(minorFeed['url'])[:2]
+			feedMetrics.inc('rss_fetch_responses', feed=feedName, host=host, status=httpCode)
 
-			logger.threadingDebug('[T:{0}] Checking URL: {1} [{2}]'.format(pid, httpRegex.match(minorFeed['url']).group(1), httpCode))
+			# Failed fetches are reported too, see circuitbreaker
+			feedInfo[url] = {'status': httpCode}
+
+			logger.threadingDebug(logging.lazy('[T:{0}] Checking URL: {1} [{2}]', pid, host, httpCode))
 
 			if rssData is None or httpCode != 200:
 				continue
 
+			feedMetrics.inc('rss_fetch_bytes', len(rssData), feed=feedName, host=host)
+
 			# Ensure data is utf-8
-			rssData = tools.changeCharset(rssData, 'utf-8', 'xml')
+			with feedMetrics.timer('rss_charset', feed=feedName):
+				rssData = tools.changeCharset(rssData, 'utf-8', 'xml')
 
-			# Create a list of torrents from the RSS Feed
-			torrents = rssToTorrents(rssData, feedType=majorFeed['feedType'], feedDestination=majorFeed['feedDestination'],minRatio=minorFeed['minRatio'],comparison=minorFeed['comparison'],minTime=minorFeed['minTime'])
+			# Parse the feed once for every subscriber
+			with feedMetrics.timer('rss_parse', feed=feedName):
+				parsedFeed = parseFeed(rssData, feedType=feedType, feedInfo=feedInfo[url])
 
-			# Update the processed count
-			processed += len(torrents)
+			# Update the processed count, items the filters could not match
+			# were parsed but never made into torrents
+			parsed = feedInfo[url].get('parsed', 0)
+			processed += parsed
+			feedMetrics.inc('rss_items', parsed, feed=feedName)
 
-			for torrent in torrents:
-				if torrent.filterMatch(majorFeed['feedFilters']):
-					rssTorrents.append(torrent)
+			# Titles that were too long or took too long to parse
+			for reason, count in Patterns.takeRejected().items():
+				feedMetrics.inc('rss_title_rejects', count, feed=feedName, reason=reason)
 
+			if parsedFeed is None:
+				continue
 
-					logger.threadingDebug('Matched Torrent: ')
-					logger.threadingDebug('======================')
-					logger.threadingDebug('{0}'.format(torrent))
-					logger.threadingDebug('======================')
-				else:
-					logger.threadingDebug('UnMatched Torrent: ')
-					logger.threadingDebug('======================')
-					logger.threadingDebug('{0}'.format(torrent))
-					logger.threadingDebug('======================')
-					logger.threadingDebug('{0}'.format(majorFeed['feedFilters']))
-					logger.threadingDebug('======================')
+			for majorFeed, minorFeed in subscribers:
+
+				feedName = majorFeed.get('feedName', '')
+
+				with feedMetrics.timer('rss_build', feed=feedName):
+					torrents = feedToTorrents(parsedFeed, feedDestination=majorFeed['feedDestination'],minRatio=minorFeed['minRatio'],comparison=minorFeed['comparison'],minTime=minorFeed['minTime'],feedFilters=majorFeed['feedFilters'])
 
+				filterStart = time.perf_counter()
+				matched = len(rssTorrents)
+
+				for torrent in torrents:
+					if torrent.filterMatch(majorFeed['feedFilters']):
+						torrent.setPriority(majorFeed.get('priority', 0))
+						rssTorrents.append(torrent)
+
+						logger.threadingDebug(logging.lazy(
+							'Matched Torrent: \n======================\n{0}\n======================',
+							torrent
+						))
+
+					else:
+						logger.threadingDebug(logging.lazy(
+							'UnMatched Torrent: \n======================\n{0}\n======================\n{1}\n======================',
+							torrent,
+							majorFeed['feedFilters']
+						))
+
+				feedMetrics.observe('rss_filter', time.perf_counter() - filterStart, feed=feedName)
+				feedMetrics.inc('rss_matches', len(rssTorrents) - matched, feed=feedName)
 
 		# Garbage Collection
-		minorFeed = rssData = torrents = None
+		rssData = parsedFeed = torrents = None
 
 	except Exception as e:
 
-		error = 'ERROR: [T:{0}]: {0}\nException: {1}\nTraceback: {2}'.format(minorFeed['url'],e, traceback.format_exc())
+		error = 'ERROR: [T:{0}]: {0}\nException: {1}\nTraceback: {2}'.format(url,e, traceback.format_exc())
 		rssTorrents = []
+		feedMetrics.inc('rss_feed_errors', feed=feedName)
+
+	logger.threadingInfo(logging.lazy('[T:{0}] Thread Done', pid))
+
+	return (pid, rssTorrents, error, processed, feedMetrics.snapshot(), feedInfo)
+
+
+def rssJob(job):
+	'''
+	Runs readSubscriptions in a worker of a FeedPool
+
+	Takes:
+		job - Tuple, see feedpool.FeedPool.getJobs
 
-	logger.threadingInfo('[T:{0}] Thread Done'.format(pid))
+	Returns:
+		See readSubscriptions, the torrents are sent back as records, see
+		Torrents.packTorrents
+	'''
+	pid, torrents, error, processed, feedMetrics, feedInfo = readSubscriptions(feedpool.getSubscriptions(job))
 
-	return (pid, rssTorrents, error, processed)
+	return (pid, Torrents.packTorrents(torrents), error, processed, feedMetrics, feedInfo)
 
 
-def rssReader():
+def rssReader(schedule=None, handoff=None, pool=None, breaker=None, metricsName='rssdaemon', database=None):
 	'''
 	This thread will take care of Processing RSS Feeds
+
+	Takes:
+		schedule - FeedSchedule, only the feeds that are due are polled.
+			Every feed is polled when there is none.
+		handoff - TorrentQueue.Handoff, new torrents are passed to the queue
+			reader of this process through it instead of waking queuedaemon
+		pool - feedpool.FeedPool kept between cycles, one is made for this
+			cycle when there is none
+		breaker - circuitbreaker.CircuitBreaker, feeds and trackers that
+			keep failing are left alone for a while
+		metricsName - Name the metrics file is written under, see
+			metrics.write
+		database - Databases the torrents are written to, a new one is made
+			when there is none
 	'''
 
 	logger.info('RSSDaemon Started')
 
+	ownPool = pool is None
+
+	if ownPool:
+		pool = feedpool.FeedPool(rssJob, settings['maxRssThreads'])
+
 	logger.debug('Pool Created')
 
 	try:
@@ -242,71 +467,172 @@ def rssReader():
 
 		startTime = time.time()
 
+		# Feeds still being read at the deadline are left for the next cycle
+		if settings['rssCycleTimeout']:
+			deadline = time.monotonic() + settings['rssCycleTimeout']
+		else:
+			deadline = None
+
 		# Reads the RSSFeedConfig file each loop to ensure new entries are picked up
 		# rssFeeds
 		majorFeeds = {}
 
-		results = []
+		with metrics.timer('rss_config_load', source='trakt'):
+			majorFeeds.update(flannelfox.datasources.trakttv.readTraktTvConfigs())
+
+		with metrics.timer('rss_config_load', source='lastfm'):
+			majorFeeds.update(flannelfox.datasources.lastfm.readLastfmArtistsConfigs())
+
+		with metrics.timer('rss_config_load', source='goodreads'):
+			majorFeeds.update(flannelfox.datasources.goodreads.readGoodreadsConfigs())
+
+		with metrics.timer('rss_config_load', source='rss'):
+			majorFeeds.update(flannelfox.datasources.rss.readRssConfigs())
+
+		metrics.gauge('rss_major_feeds', len(majorFeeds))
+
+		# The workers read the feeds again only when they changed
+		with metrics.timer('rss_pool_update'):
+			pool.update(majorFeeds)
+
+		configuredFeeds = majorFeeds
+
+		if schedule is not None:
+			majorFeeds = schedule.getDue(majorFeeds, startTime)
+
+		if breaker is not None:
+			breaker.prune(configuredFeeds)
+			majorFeeds = breaker.filter(majorFeeds, startTime)
+
+		metrics.gauge('rss_due_feeds', len(majorFeeds))
 
-		majorFeeds.update(flannelfox.datasources.trakttv.readTraktTvConfigs())
-		majorFeeds.update(flannelfox.datasources.lastfm.readLastfmArtistsConfigs())
-		majorFeeds.update(flannelfox.datasources.goodreads.readGoodreadsConfigs())
-		majorFeeds.update(flannelfox.datasources.rss.readRssConfigs())
+		# Holds the torrents that are in the feeds, filtered, and new until
+		# they are written to the database
+		rssTorrents = TorrentQueue.Queue(database=database)
 
-		# Holds all the torrents that are in the feeds, filtered, and new
-		rssTorrents = TorrentQueue.Queue()
+		# The torrents written to the database this cycle
+		newTorrents = []
 
+		# url -> links and hint of the feeds that were read
+		polledFeeds = {}
+
+		# Urls that were given up on at the deadline
+		cancelledFeeds = set()
 
 		try:
 
 			logger.info('Pool fetch of RSS Started {0}'.format(strftime('%Y-%m-%d %H:%M:%S', gmtime())))
 
-			with Pool(processes=settings['maxRssThreads'], maxtasksperchild=10) as rssPool:
-				for result in rssPool.imap_unordered(rssThread, (f for f in majorFeeds.values())):
-					results.append(result)
+			with metrics.timer('rss_pool'):
+
+				# Each result is queued and written as it comes in, while the
+				# workers go on fetching
+				for result in pool.map(pool.getJobs(majorFeeds), deadline=deadline):
+
+					pid, records, error, processed, feedMetrics, feedInfo = result
+
+					metrics.registry.merge(feedMetrics)
+
+					for url, info in feedInfo.items():
+						polledFeeds[url] = info
+
+					if error is not None:
+						logger.error('ERROR: There was a problem processing a rss feed:\n-  {0}'.format(error))
+
+					totalProcessed += processed
+
+					logger.debug('Processing results of thread {0}'.format(pid))
+
+					dedupeStart = time.perf_counter()
+
+					for t in Torrents.unpackTorrents(records):
+						try:
+							if rssTorrents.append(t) != 0:
+								metrics.inc('rss_duplicates')
+
+						except Exception as e:
+							logger.error('ERROR: There was a problem appending data to the queue.\n-  {0}'.format(e))
+
+					metrics.observe('rss_dedupe', time.perf_counter() - dedupeStart)
+
+					if len(rssTorrents) > 0:
+
+						# Write matching filters to database
+						logger.debug('Writing {0} Torrents to DB'.format(len(rssTorrents)))
+						metrics.inc('rss_new_torrents', len(rssTorrents))
+
+						with metrics.timer('rss_db_insert'):
+							written = rssTorrents.flush()
+
+						if written is not None:
+							newTorrents.extend(written)
+
+					logger.debug('Finished processing results of thread {0}'.format(pid))
+
+			# Compared with rss_pool it shows how well the work was spread
+			metrics.gauge('rss_pool_work_seconds', pool.work)
+
+			cancelledFeeds.update(pool.getFeed(job)[0] for job in pool.unfinished)
+			metrics.inc('rss_cancelled_feeds', len(cancelledFeeds))
 
 		except Exception as e:
 			logger.error('ERROR: There was an error fetching the RSS Feeds.\n-  {0}'.format(e))
 
 
-		# Try to get the rssFeeds and return the resutls
-		logger.info('Appending items to the queue')
-
-		for result in results:
+		# Feeds that could not be read count as polled so they are not
+		# retried straight away, the ones given up on stay due
+		if schedule is not None:
+			for majorFeed in majorFeeds.values():
+				for minorFeed in majorFeed['minorFeeds']:
+					if minorFeed['url'] in cancelledFeeds:
+						continue
 
-			#Take each item in the result and append it to the Queue
-			pid, torrents, error, processed = result
+					info = polledFeeds.get(minorFeed['url'], {})
+					schedule.record(minorFeed['url'], majorFeed, info.get('links', None), info.get('hint', None), startTime)
 
-			if error is not None:
-				logger.error('ERROR: There was a problem processing a rss feed:\n-  {0}'.format(error))
+		# Feeds that could not be fetched count against their circuit, the
+		# ones given up on at the deadline are not held against them
+		if breaker is not None:
+			for url, info in polledFeeds.items():
+				ok = info['status'] == 200
+				reason = None if ok else 'no response' if info['status'] is None else 'http {0}'.format(info['status'])
 
-			totalProcessed += processed
+				for tripped in breaker.record(url, ok, startTime, error=reason):
+					logger.warning('Not polling {0} for a while, {1}'.format(tripped, reason))
 
-			logger.debug('Processing results of thread {0}'.format(pid))
+			tripped = breaker.getTripped()
+			metrics.gauge('rss_tripped_circuits', len(tripped))
 
-			for t in torrents:
-				try:
-					rssTorrents.append(t)
+			if len(tripped) > 0:
+				logger.info('Tripped feeds and hosts:\n{0}'.format(breaker.getSummary()))
 
-				except Exception as e:
-					logger.error('ERROR: There was a problem appending data to the queue.\n-  {0}'.format(e))
+			try:
+				breaker.save()
 
-			logger.debug('Finished processing results of thread {0}'.format(pid))
+			except OSError as e:
+				logger.error('ERROR: Could not save the circuit breaker state\n-  {0}'.format(e))
 
-		logger.info('Pool fetch of RSS Done {0} {1} records loaded'.format(strftime('%Y-%m-%d %H:%M:%S', gmtime()), len(rssTorrents)))
+		logger.info('Pool fetch of RSS Done {0} {1} records loaded'.format(strftime('%Y-%m-%d %H:%M:%S', gmtime()), len(newTorrents)))
 
 		# Log the number of records processed
 		logger.info('Processed {0} items in {1:.2f} second(s)'.format(totalProcessed, time.time() - startTime))
-		if len(rssTorrents) > 0:
-			logger.info('Found {0} new items'.format(len(rssTorrents)))
+		if len(newTorrents) > 0:
+			logger.info('Found {0} new items'.format(len(newTorrents)))
+
+		# Let queuedaemon add the new torrents now rather than on its next pass
+		if len(newTorrents) > 0:
+			if handoff is None:
+				scheduler.notify(settings['files']['queueDaemonSocket'])
 
-		# Write matching filters to database
-		logger.debug('Writing {0} Torrents to DB'.format(len(rssTorrents)))
-		rssTorrents.writeToDB()
+			else:
+				handoff.put(newTorrents)
+
+		metrics.gauge('rss_cycle_seconds', time.time() - startTime)
+		metrics.gauge('rss_cycle_timestamp', int(time.time()))
 
 		# Garbage collection
 		logger.debug('Garbage Collection')
-		majorFeeds = rssTorrents = results = result = rssPool = None
+		majorFeeds = configuredFeeds = rssTorrents = newTorrents = result = None
 
 	except Exception as e:
 		logger.error('ERROR: rssReader Failed {0} {1}\n-  {2}'.format(
@@ -314,6 +640,17 @@ def rssReader():
 			e,
 			traceback.format_exc())
 		)
+		metrics.inc('rss_cycle_errors')
+
+	finally:
+		if ownPool:
+			pool.close()
+
+	try:
+		metrics.write(metricsName)
+
+	except Exception as e:
+		logger.error('ERROR: Could not write the metrics file\n-  {0}'.format(e))
 
 
 def main():
@@ -328,31 +665,50 @@ def main():
 		]
 	):
 
-		while True:
-			try:
-
-				logger.critical('rssReader Started')
+		# Logs are written and watchlists are refreshed in the background
+		# from here on, threads do not survive the fork into the daemon so
+		# this has to happen here
+		logging.startListener()
+		flannelfox.datasources.refresher.start()
 
-				while True:
-					rssReader()
+		# Feeds are looked at every rssDaemonThreadSleep seconds, each one is
+		# polled when its own interval is up
+		if settings['adaptivePolling']['enabled']:
+			adaptive = settings['adaptivePolling']
+		else:
+			adaptive = None
 
-					# Put the app to sleep
-					logger.info('Sleep for a bit')
-					time.sleep(settings['rssDaemonThreadSleep'])
+		# The workers are kept between cycles
+		pool = feedpool.FeedPool(rssJob, settings['maxRssThreads'])
 
-			except KeyboardInterrupt as e:
+		if settings['circuitBreaker']['enabled']:
+			breaker = circuitbreaker.CircuitBreaker(settings['circuitBreaker'])
+		else:
+			breaker = None
+
+		jobs = scheduler.Scheduler()
+		jobs.add(
+			'rssReader',
+			functools.partial(
+				rssReader,
+				schedule=scheduler.FeedSchedule(settings['rssDaemonThreadSleep'], adaptive=adaptive),
+				pool=pool,
+				breaker=breaker
+			),
+			settings['rssDaemonThreadSleep']
+		)
 
-				logger.critical('Application Aborted')
-				break
+		logger.critical('rssReader Started')
 
-			except Exception as e:
+		try:
+			jobs.run()
 
-				logger.critical('Application Stopped {0}'.format(e))
+		except KeyboardInterrupt as e:
+			logger.critical('Application Aborted')
 
-				# Sleep for 10 seconds to give a bit of time for the error to try and resolve itself
-				# This is mainly related to the occurance of an error that can be generated randomly
-				#   [Errno 11] Resource temporarily unavailable
-				time.sleep(10)
+		finally:
+			jobs.stop()
+			pool.close()
 
 
 	logger.critical('Application Exited')
@@ -0,0 +1,272 @@
+#-------------------------------------------------------------------------------
+# Name:		circuitbreaker
+# Purpose:	Stops polling feeds and trackers that keep failing. A feed that
+#			fails enough times in a row is tripped and left alone for a
+#			while, the wait doubles every time it fails again. Once the wait
+#			is up one poll is let through to probe it and a success resets
+#			it. Hosts are tracked the same way so a dead tracker does not
+#			cost a timeout for each of its feeds. The state is kept in a
+#			file so a restart does not start hammering dead feeds again.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import os, time
+from urllib.parse import urlsplit
+
+# flannelfox Includes
+from flannelfox import logging, jsoncodec
+from flannelfox.settings import settings
+
+# Setup the logging agent
+logger = logging.getLogger(__name__)
+
+
+class Circuit(object):
+	'''
+	Failures of a single feed url or host
+	'''
+
+	def __init__(self, failures=0, openUntil=None, lastError=None):
+		self.failures = failures
+
+		# Time the next probe is let through, None until it is tripped
+		self.openUntil = openUntil
+		self.lastError = lastError
+
+
+	def isTripped(self):
+		return self.openUntil is not None
+
+
+	def isOpen(self, now):
+		return self.openUntil is not None and now < self.openUntil
+
+
+	def toDict(self):
+		return {
+			'failures': self.failures,
+			'openUntil': self.openUntil,
+			'lastError': self.lastError
+		}
+
+
+class CircuitBreaker(object):
+	'''
+	Decides which feeds are worth polling
+
+	Usage:
+		breaker = CircuitBreaker(settings['circuitBreaker'])
+		due = breaker.filter(due)
+		...
+		breaker.record(url, httpCode == 200, error='http 503')
+		breaker.save()
+	'''
+
+	def __init__(self, options, stateFile=None):
+		'''
+		Takes:
+			options - Dict, failures and hostFailures in a row trip a feed
+				or a host, it then waits delay seconds doubled for each
+				failure after that, up to maxDelay
+			stateFile - Where the state is kept between restarts
+		'''
+		if stateFile is None:
+			stateFile = settings['files']['circuitBreakerFile']
+
+		self.options = options
+		self.stateFile = stateFile
+
+		# url -> Circuit and host -> Circuit, only failing ones are held
+		self.feeds = {}
+		self.hosts = {}
+
+		self.changed = False
+
+		self.load()
+
+
+	def getHost(self, url):
+		return urlsplit(url).netloc.lower()
+
+
+	def load(self):
+		'''
+		Reads the state saved by save, a missing or broken file starts
+		with every circuit closed
+		'''
+		try:
+			with open(self.stateFile, 'rb') as stateFile:
+				state = jsoncodec.decode(stateFile.read())
+
+			self.feeds = dict((url, Circuit(**circuit)) for url, circuit in state.get('feeds', {}).items())
+			self.hosts = dict((host, Circuit(**circuit)) for host, circuit in state.get('hosts', {}).items())
+
+		except (OSError, TypeError, AttributeError) + jsoncodec.DecodeError as e:
+			if os.path.exists(self.stateFile):
+				logger.warning('The circuit breaker state could not be read:\n-  {0}'.format(e))
+
+
+	def save(self):
+		'''
+		Writes the state out when it changed since the last save
+		'''
+		if not self.changed:
+			return
+
+		state = {
+			'feeds': dict((url, circuit.toDict()) for url, circuit in self.feeds.items()),
+			'hosts': dict((host, circuit.toDict()) for host, circuit in self.hosts.items())
+		}
+
+		tempFile = '{0}.tmp'.format(self.stateFile)
+
+		with open(tempFile, 'wb') as stateFile:
+			stateFile.write(jsoncodec.encode(state))
+
+		os.replace(tempFile, self.stateFile)
+
+		self.changed = False
+
+
+	def prune(self, majorFeeds):
+		'''
+		Forgets the feeds and hosts that are no longer configured
+
+		Takes:
+			majorFeeds - Dict key -> majorFeed, every configured feed
+		'''
+		urls = set(minorFeed['url'] for majorFeed in majorFeeds.values() for minorFeed in majorFeed.get('minorFeeds', []))
+		hosts = set(self.getHost(url) for url in urls)
+
+		for circuits, keys in ((self.feeds, urls), (self.hosts, hosts)):
+			for key in list(circuits.keys()):
+				if key not in keys:
+					del circuits[key]
+					self.changed = True
+
+
+	def filter(self, majorFeeds, now=None):
+		'''
+		Takes:
+			majorFeeds - Dict key -> majorFeed
+			now - Time of the poll
+
+		Returns:
+			Dict of the majorFeeds with minorFeeds that may be polled,
+			holding only those minorFeeds. A tripped host whose wait is up
+			only has one of its feeds polled to probe it.
+		'''
+		now = now if now is not None else time.time()
+
+		probes = {}
+		allowed = {}
+
+		for key, majorFeed in majorFeeds.items():
+			minorFeeds = []
+
+			for minorFeed in majorFeed.get('minorFeeds', []):
+				url = minorFeed['url']
+				host = self.getHost(url)
+
+				feed = self.feeds.get(url, None)
+
+				if feed is not None and feed.isOpen(now):
+					continue
+
+				tripped = self.hosts.get(host, None)
+
+				if tripped is not None and tripped.isTripped():
+
+					if tripped.isOpen(now):
+						continue
+
+					# The same url may be in more than one list
+					if probes.setdefault(host, url) != url:
+						continue
+
+				minorFeeds.append(minorFeed)
+
+			if len(minorFeeds) == len(majorFeed.get('minorFeeds', [])):
+				allowed[key] = majorFeed
+
+			elif len(minorFeeds) > 0:
+				allowed[key] = dict(majorFeed, minorFeeds=minorFeeds)
+
+		return allowed
+
+
+	def record(self, url, ok, now=None, error=None):
+		'''
+		Records a poll of url
+
+		Takes:
+			url - Url of the minorFeed
+			ok - Bool, the feed was read
+			now - Time of the poll
+			error - String, what went wrong
+
+		Returns:
+			List of the urls and hosts this tripped
+		'''
+		now = now if now is not None else time.time()
+
+		tripped = []
+
+		for circuits, key, threshold in (
+			(self.feeds, url, self.options['failures']),
+			(self.hosts, self.getHost(url), self.options['hostFailures'])
+		):
+
+			if ok:
+				if circuits.pop(key, None) is not None:
+					self.changed = True
+
+				continue
+
+			circuit = circuits.setdefault(key, Circuit())
+			circuit.failures += 1
+			circuit.lastError = error
+
+			if circuit.failures >= threshold:
+				delay = self.options['delay'] * 2 ** (circuit.failures - threshold)
+				circuit.openUntil = now + min(delay, self.options['maxDelay'])
+
+				tripped.append(key)
+
+			self.changed = True
+
+		return tripped
+
+
+	def getTripped(self):
+		'''
+		Returns:
+			List of (url or host, Circuit) that are tripped, longest to
+			wait first
+		'''
+		tripped = [(key, circuit) for circuits in (self.hosts, self.feeds) for key, circuit in circuits.items() if circuit.isTripped()]
+		tripped.sort(key=lambda item: -item[1].openUntil)
+
+		return tripped
+
+
+	def getSummary(self, now=None):
+		'''
+		Returns:
+			String, a line for every tripped feed and host
+		'''
+		now = now if now is not None else time.time()
+
+		lines = []
+
+		for key, circuit in self.getTripped():
+
+			if circuit.isOpen(now):
+				state = 'retried in {0:.0f}s'.format(circuit.openUntil - now)
+			else:
+				state = 'being probed'
+
+			lines.append('{0}: {1} failures, {2}, last error: {3}'.format(key, circuit.failures, state, circuit.lastError))
+
+		return '\n'.join(lines)
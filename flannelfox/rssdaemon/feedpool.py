@@ -0,0 +1,356 @@
+#-------------------------------------------------------------------------------
+# Name:		feedpool
+# Purpose:	Keeps the rssdaemon worker processes alive between cycles. The
+#			majorFeeds are written to a file whenever they change and each
+#			worker only reads them again when the version it holds is out
+#			of date, a cycle only sends the workers the keys of the feeds
+#			to poll. Each feed url is its own job, shared by every
+#			majorFeed subscribed to it, and the jobs are handed out one at
+#			a time, the ones that took longest last time first, so one long
+#			list does not keep a single worker busy while the others sit
+#			idle. A map can be given a deadline, the workers are stopped
+#			when it passes so one hanging tracker can not hold up a cycle.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import os, pickle, time, copy
+from collections import OrderedDict
+from multiprocessing import Pool, TimeoutError
+
+# flannelfox Includes
+from flannelfox import logging
+from flannelfox.settings import settings
+
+# Setup the logging agent
+logger = logging.getLogger(__name__)
+
+# The majorFeeds a worker last read, see getSubscriptions
+loaded = {
+	'configFile': None,
+	'version': None,
+	'majorFeeds': {}
+}
+
+
+class FeedPool(object):
+	'''
+	A pool of workers running rss jobs, kept for the life of the daemon
+
+	Usage:
+		feedPool = FeedPool(rssJob, 8)
+		feedPool.update(majorFeeds)
+		for result in feedPool.map(feedPool.getJobs(dueFeeds)):
+			...
+		feedPool.close()
+	'''
+
+	def __init__(self, worker, processes, configFile=None):
+		'''
+		Takes:
+			worker - Module level function taking a job, see getSubscriptions
+			processes - Number of worker processes
+			configFile - Where the majorFeeds are written for the workers
+		'''
+		if configFile is None:
+			configFile = os.path.join(settings['files']['privateDir'], 'rssfeeds-{0}.pickle'.format(os.getpid()))
+
+		self.worker = worker
+		self.processes = processes
+		self.configFile = configFile
+
+		self.version = 0
+		self.majorFeeds = {}
+
+		# key -> what the majorFeed was written out with, see getVersion
+		self.versions = None
+
+		# (url, feedType) -> seconds its job took last time
+		self.durations = {}
+
+		# Seconds of work done by the workers in the last map
+		self.work = 0.0
+
+		# Jobs of the last map that were given up on at its deadline
+		self.unfinished = []
+
+		# Started on the first map so the workers fork as late as possible
+		self.pool = None
+
+
+	def update(self, majorFeeds):
+		'''
+		Hands the workers the majorFeeds of this cycle, they are only
+		written out when they changed. The feedFilters are not compared,
+		a FilterList is known by its version and a plain list by its
+		identity as the datasources only rebuild those when their config
+		changes.
+
+		Returns:
+			Bool, True when the workers have to read them again
+		'''
+		versions = dict((key, getVersion(majorFeed)) for key, majorFeed in majorFeeds.items())
+
+		self.majorFeeds = majorFeeds
+
+		if self.versions is not None and isSameVersion(self.versions, versions):
+			return False
+
+		tempFile = '{0}.tmp'.format(self.configFile)
+
+		with open(tempFile, 'wb') as configFile:
+			pickle.dump(majorFeeds, configFile, pickle.HIGHEST_PROTOCOL)
+
+		os.replace(tempFile, self.configFile)
+
+		self.versions = versions
+		self.version += 1
+
+		# Feeds that are no longer configured are forgotten
+		feeds = set(getFeedKey(majorFeed, minorFeed) for majorFeed in majorFeeds.values() for minorFeed in majorFeed.get('minorFeeds', []))
+
+		for feed in list(self.durations.keys()):
+			if feed not in feeds:
+				del self.durations[feed]
+
+		return True
+
+
+	def getJobs(self, dueFeeds):
+		'''
+		Turns the majorFeeds to poll into one job per feed, a url of a
+		feedType is fetched and parsed once for all the minorFeeds that
+		point at it. The jobs are ordered longest first by how long each
+		took last time, feeds that have not been timed yet go first.
+
+		Takes:
+			dueFeeds - Dict key -> majorFeed, taken from the majorFeeds
+				given to update. A majorFeed may only hold some of its
+				minorFeeds, see scheduler.FeedSchedule.getDue
+
+		Returns:
+			List of (configFile, version, [(key, minorFeed index)])
+		'''
+		subscriptions = []
+
+		for key, majorFeed in dueFeeds.items():
+
+			configured = self.majorFeeds[key]
+			due = set(id(minorFeed) for minorFeed in majorFeed['minorFeeds'])
+
+			for idx, minorFeed in enumerate(configured['minorFeeds']):
+				if id(minorFeed) in due:
+					subscriptions.append((configured, minorFeed, (key, idx)))
+
+		jobs = []
+
+		for feed, subscribers in groupSubscriptions(subscriptions):
+			duration = self.durations.get(feed, float('inf'))
+			jobs.append((duration, (self.configFile, self.version, [subscriber[2] for subscriber in subscribers])))
+
+		# Stable, so equal jobs keep the order of the config
+		jobs.sort(key=lambda job: job[0], reverse=True)
+
+		return [job for duration, job in jobs]
+
+
+	def getFeed(self, job):
+		'''
+		Returns the (url, feedType) a job fetches
+		'''
+		configFile, version, subscribers = job
+		key, idx = subscribers[0]
+		majorFeed = self.majorFeeds[key]
+
+		return getFeedKey(majorFeed, majorFeed['minorFeeds'][idx])
+
+
+	def map(self, jobs, deadline=None):
+		'''
+		Runs the jobs on the workers
+
+		Takes:
+			jobs - List of jobs, see getJobs
+			deadline - time.monotonic() after which the jobs that are not
+				done are given up on, they are left in unfinished. The
+				workers are stopped and new ones started on the next map.
+
+		Returns:
+			Iterator of the worker results, in the order they finish
+		'''
+		if self.pool is None:
+			# The workers log through the listener of this process
+			self.pool = Pool(processes=self.processes, initializer=logging.initWorker, initargs=(logging.getWorkerQueue(),))
+
+		self.work = 0.0
+		self.unfinished = list(jobs)
+
+		# One job at a time, an idle worker takes the next one
+		results = self.pool.imap_unordered(runJob, [(self.worker, job) for job in self.unfinished], chunksize=1)
+
+		try:
+			for idx in range(len(self.unfinished)):
+
+				if deadline is None:
+					job, duration, result = results.next()
+
+				else:
+					job, duration, result = results.next(max(deadline - time.monotonic(), 0))
+
+				self.unfinished.remove(job)
+				self.durations[self.getFeed(job)] = duration
+				self.work += duration
+
+				yield result
+
+		except TimeoutError:
+			logger.warning('Gave up on {0} feed(s) at the deadline'.format(len(self.unfinished)))
+
+			# Not timed, so they go first next time
+			for job in self.unfinished:
+				self.durations.pop(self.getFeed(job), None)
+
+			self.terminate()
+
+		except Exception:
+
+			# Start with new workers next time
+			self.terminate()
+			raise
+
+
+	def terminate(self):
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool.join()
+			self.pool = None
+
+
+	def close(self):
+		'''
+		Stops the workers and removes the majorFeeds file
+		'''
+		if self.pool is not None:
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
+
+		try:
+			os.remove(self.configFile)
+
+		except OSError:
+			pass
+
+
+def runJob(work):
+	'''
+	Runs a job in a worker and times it
+
+	Takes:
+		work - Tuple (worker, job)
+
+	Returns:
+		Tuple (job, seconds, result of the worker)
+	'''
+	worker, job = work
+
+	start = time.perf_counter()
+	result = worker(job)
+
+	return (job, time.perf_counter() - start, result)
+
+
+def getVersion(majorFeed):
+	'''
+	Returns what tells one version of a majorFeed from the next without
+	serialising its feedFilters
+
+	Returns:
+		Tuple (feedFilters, FilterList version, copy of everything else)
+	'''
+	feedFilters = majorFeed.get('feedFilters', None)
+	options = dict((key, val) for key, val in majorFeed.items() if key != 'feedFilters')
+
+	# The rest is small, it is copied so changes made in place are seen
+	return (feedFilters, getattr(feedFilters, 'version', None), copy.deepcopy(options))
+
+
+def isSameVersion(previous, current):
+	'''
+	Compares the versions of two sets of majorFeeds, see getVersion
+	'''
+	if previous.keys() != current.keys():
+		return False
+
+	for key, version in current.items():
+		feedFilters, filtersVersion, options = previous[key]
+
+		if version[0] is not feedFilters or version[1] != filtersVersion or version[2] != options:
+			return False
+
+	return True
+
+
+def getFeedType(majorFeed):
+	'''
+	Returns the feedType of a majorFeed, untyped feeds are 'none'
+	'''
+	feedType = majorFeed.get('feedType', None)
+
+	if isinstance(feedType, str) and feedType != '':
+		return feedType
+
+	return 'none'
+
+
+def getFeedKey(majorFeed, minorFeed):
+	return (minorFeed['url'], getFeedType(majorFeed))
+
+
+def groupSubscriptions(subscriptions):
+	'''
+	Groups the minorFeeds that fetch the same url as the same feedType
+
+	Takes:
+		subscriptions - List of tuples starting with (majorFeed, minorFeed)
+
+	Returns:
+		List of ((url, feedType), subscriptions), in the order each feed
+		first came up
+	'''
+	feeds = OrderedDict()
+
+	for subscription in subscriptions:
+		feeds.setdefault(getFeedKey(subscription[0], subscription[1]), []).append(subscription)
+
+	return list(feeds.items())
+
+
+def getSubscriptions(job):
+	'''
+	Returns the (majorFeed, minorFeed) subscriptions of a job, the
+	majorFeeds are read from the file when this process does not have the
+	version of the job yet
+
+	Takes:
+		job - Tuple, see FeedPool.getJobs
+	'''
+	configFile, version, subscribers = job
+
+	if loaded['configFile'] != configFile or loaded['version'] != version:
+
+		with open(configFile, 'rb') as majorFeeds:
+			loaded['majorFeeds'] = pickle.load(majorFeeds)
+
+		loaded['configFile'] = configFile
+		loaded['version'] = version
+
+		logger.threadingDebug(logging.lazy('[T:{0}] Read version {1} of the feeds', os.getpid(), version))
+
+	subscriptions = []
+
+	for key, idx in subscribers:
+		majorFeed = loaded['majorFeeds'][key]
+		subscriptions.append((majorFeed, majorFeed['minorFeeds'][idx]))
+
+	return subscriptions
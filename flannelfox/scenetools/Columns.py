@@ -0,0 +1,89 @@
+#-------------------------------------------------------------------------------
+# Name:		Columns
+# Purpose:	Holds the parsed properties of many titles as one list per
+#			property, so a batch of titles can be looked over before any
+#			torrent objects are made from them.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# flannelfox Includes
+from flannelfox.scenetools import MetaData
+
+
+def toColumns(rows):
+	'''
+	Turns a list of parsed titles into columns
+
+	Takes:
+		rows - List of property dicts, None for a title that could not be
+			parsed
+
+	Returns:
+		Dict of property name -> list with an entry for every row, the entry
+		is None where the row does not have the property. The 'parsed'
+		column is False for the rows that could not be parsed.
+	'''
+	columns = {'parsed': [row is not None for row in rows]}
+
+	for idx, row in enumerate(rows):
+
+		if row is None:
+			continue
+
+		for key, val in row.items():
+
+			if key not in columns:
+				columns[key] = [None] * len(rows)
+
+			columns[key][idx] = val
+
+	return columns
+
+
+def getRow(columns, idx):
+	'''
+	Takes the properties of one title back out of the columns
+
+	Returns:
+		Dict of the properties of the row, None if it could not be parsed
+	'''
+	if not columns['parsed'][idx]:
+		return None
+
+	row = {}
+
+	for key, column in columns.items():
+		if key != 'parsed' and column[idx] is not None:
+			row[key] = column[idx]
+
+	return row
+
+
+def parseTitles(titles, splitTitle, parseMetaDataMany):
+	'''
+	Parses many titles of one type into columns, the meta data of all the
+	titles is extracted in one batch
+
+	Takes:
+		titles - List of titles
+		splitTitle - Callable returning (properties, meta) for a title or
+			None when it is not of the type
+		parseMetaDataMany - Callable extracting the meta data of many titles
+
+	Returns:
+		Dict of columns, see toColumns
+	'''
+	splits = [splitTitle(title) for title in titles]
+
+	metaData = iter(parseMetaDataMany([split[1] for split in splits if split is not None]))
+
+	rows = []
+	for split in splits:
+
+		if split is None:
+			rows.append(None)
+
+		else:
+			rows.append(MetaData.addMetaData(split[0], next(metaData)))
+
+	return toColumns(rows)
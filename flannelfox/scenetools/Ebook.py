@@ -12,7 +12,7 @@ import re
 
 # flannelfox Includes
 from flannelfox import settings
-from flannelfox.scenetools import VideoProperties, SeparatorCharacters
+from flannelfox.scenetools import VideoProperties, SeparatorCharacters, Columns, Normalise
 
 
 def parseTitle(title):
@@ -20,12 +20,8 @@ def parseTitle(title):
 	Read the given title and return a dict of valid property matches
 	'''
 
-	# Strip all the possible bad prefixes form the string
-	title = re.sub(r'(?:'+')|(?:'.join(settings.BAD_PREFIXES)+r')', '', title, flags=re.IGNORECASE)
-
-	# Meta data sanitization
-	for key, val in settings.KEYWORD_SYNONYMS.items():
-		title = re.sub(key, val, title, flags=re.IGNORECASE)
+	# Strip the bad prefixes and sanitize the meta data
+	title = Normalise.sanitise(title)
 
 	'''
 	List of parsing regex to try and extract data from the file title,
@@ -52,6 +48,19 @@ def parseTitle(title):
 		return None
 
 
+def parseTitles(titles):
+	'''
+	Read many titles at once
+
+	Takes:
+		titles - List of titles
+
+	Returns:
+		Dict of columns, see Columns.toColumns
+	'''
+	return Columns.toColumns([parseTitle(title) for title in titles])
+
+
 def parseMetaData(meta):
 	'''
 	Try to extract meta data out of the remaining file title and return a dict
@@ -0,0 +1,188 @@
+#-------------------------------------------------------------------------------
+# Name:		MetaData
+# Purpose:	Finds the properties (quality, codec, source, ...) in the meta
+#			data part of a title. The meta data is split into tokens once
+#			and each token is looked up in a table built from the property
+#			lists, instead of searching the text for every list entry.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# flannelfox Includes
+from flannelfox.scenetools import SeparatorCharacters
+
+
+# How a property is picked when several of its values are in a title
+FIRST = 'first'		# The value that comes first in its list
+LONGEST = 'longest'	# The longest value, the first in its list on a tie
+FLAG = 'flag'		# True when any value is found
+
+# Characters that separate the tokens of the meta data
+SEPARATORS = '.[](){}-'
+
+
+class Extractor(object):
+	'''
+	Finds properties in the meta data of titles
+
+	Values are matched as whole tokens, values with several words such as
+	"24bit lossless" match the same words one space apart in the title.
+
+	Usage:
+		extractor = Extractor([
+			('quality', VideoProperties.Quality, FIRST),
+			('codec', VideoProperties.Codec, LONGEST),
+			('proper', VideoProperties.Proper, FLAG)
+		])
+		extractor.parse('720p.hdtv.x264-group')
+	'''
+
+	TRANSLATION = str.maketrans(SEPARATORS, ' ' * len(SEPARATORS))
+
+	def __init__(self, properties):
+		'''
+		Takes:
+			properties - List of (name, values, rule), the properties are
+				returned in this order
+		'''
+		self.properties = [(name, rule) for name, values, rule in properties]
+
+		# tuple of words -> [(name, rank, value, rule)]
+		self.tokens = {}
+
+		# First words of the values with more than one word
+		self.phraseStarts = set()
+		self.maxWords = 1
+
+		for name, values, rule in properties:
+
+			seen = set()
+
+			for rank, value in enumerate(values):
+
+				key = tuple(value.lower().split(' '))
+
+				# Only the first copy of a value counts
+				if key in seen:
+					continue
+
+				seen.add(key)
+				self.tokens.setdefault(key, []).append((name, rank, value, rule))
+
+				if len(key) > 1:
+					self.phraseStarts.add(key[0])
+					self.maxWords = max(self.maxWords, len(key))
+
+
+	def tokenize(self, meta):
+		'''
+		Returns:
+			List of the words in meta, empty strings stand for repeated
+			separators so phrases only match one space apart
+		'''
+		return meta.lower().translate(self.TRANSLATION).strip().split(' ')
+
+
+	def parse(self, meta):
+		'''
+		Try to extract meta data out of the remaining file title
+
+		Takes:
+			meta - String, the part of the title after the name
+
+		Returns:
+			Dict of the properties that were found
+		'''
+		metaData = {}
+
+		if meta is None:
+			return metaData
+
+		words = self.tokenize(meta)
+
+		# name -> (rank, value) of the best value so far
+		found = {}
+
+		for idx, word in enumerate(words):
+
+			matches = self.tokens.get((word,), None)
+
+			if matches is not None:
+				self.__pick(found, matches)
+
+			if word in self.phraseStarts:
+				for size in range(2, self.maxWords + 1):
+					matches = self.tokens.get(tuple(words[idx:idx + size]), None)
+
+					if matches is not None:
+						self.__pick(found, matches)
+
+		for name, rule in self.properties:
+			if name in found:
+				metaData[name] = True if rule == FLAG else found[name][1]
+
+		return metaData
+
+
+	def parseMany(self, metas):
+		'''
+		Parses the meta data of many titles, titles from one feed tend to
+		share their meta data so each distinct one is only parsed once
+
+		Takes:
+			metas - List of meta data strings
+
+		Returns:
+			List of dicts, one for each entry in metas
+		'''
+		parsed = {}
+		results = []
+
+		for meta in metas:
+
+			if meta not in parsed:
+				parsed[meta] = self.parse(meta)
+
+			# Each title gets its own dict
+			results.append(dict(parsed[meta]))
+
+		return results
+
+
+	@classmethod
+	def __pick(self, found, matches):
+		'''
+		Keeps the better of each match and the value found before it
+		'''
+		for name, rank, value, rule in matches:
+
+			current = found.get(name, None)
+
+			if current is None:
+				found[name] = (rank, value)
+
+			elif rule == LONGEST and len(value) != len(current[1]):
+				if len(value) > len(current[1]):
+					found[name] = (rank, value)
+
+			elif rank < current[0]:
+				found[name] = (rank, value)
+
+
+def addMetaData(properties, metaData):
+	'''
+	Copies the meta data found in a title into its properties
+
+	Takes:
+		properties - Dict of the properties taken from the name of the title
+		metaData - Dict returned by Extractor.parse
+
+	Returns:
+		properties
+	'''
+	for key, val in metaData.items():
+		if isinstance(val, str):
+			properties[key] = val.strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
+		elif val is not None:
+			properties[key] = val
+
+	return properties
@@ -8,66 +8,65 @@
 #-------------------------------------------------------------------------------
 # -*- coding: utf-8 -*-
 
-# System Includes
-import re
-
 # flannelfox Includes
-from flannelfox import settings
-from flannelfox.scenetools import VideoProperties, SeparatorCharacters
-
-def parseTitle(title):
-	'''
-	Read the given title and return a dict of valid property matches
+from flannelfox.scenetools import VideoProperties, SeparatorCharacters, MetaData, Columns, Patterns, Normalise
+
+# The first value in each list wins
+metaDataExtractor = MetaData.Extractor([
+	('quality', VideoProperties.Quality, MetaData.FIRST),
+	('container', VideoProperties.Container, MetaData.FIRST),
+	('codec', VideoProperties.Codec, MetaData.FIRST),
+	('source', VideoProperties.Source, MetaData.FIRST),
+	('proper', VideoProperties.Proper, MetaData.FLAG)
+])
+
+
+'''
+List of parsing regex to try and extract data from the file title,
+this list should also be in order of searching preference
+'''
+parsingOrderSingle = [
+
+	# Find Title.(Year).Meta
+	# Find Title.[Year].Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[\(\[](?P<year>\d{4})[\)\]](?:[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<metaData>.*))?'
+		))
+	),
+
+	# Find Title.Year.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<year>\d{4})(?:[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<metaData>.*))?'
+		))
+	)
+
+]
+
+
+def splitTitle(title):
 	'''
+	Split the given title into its name properties and its meta data
 
-	# Strip all the possible bad prefixes form the string
-	# badPrefixRegex = re.compile(r'(?:'+')|(?:'.join(settings.BAD_PREFIXES)+r')')
-	title = re.sub(r'(?:'+')|(?:'.join(settings.BAD_PREFIXES)+r')', '', title, flags=re.IGNORECASE)
-
-	# Meta data sanitization
-	for key, val in settings.KEYWORD_SYNONYMS.items():
-		title = re.sub(key, val, title, flags=re.IGNORECASE)
-
-	'''
-	List of parsing regex to try and extract data from the file title,
-	this list should also be in order of searching preference
+	Returns:
+		Tuple (dict of valid property matches, meta data string or None),
+		None when the title does not match
 	'''
-	parsingOrderSingle = [
-
-		# Find Title.(Year).Meta
-		# Find Title.[Year].Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[\(\[](?P<year>\d{4})[\)\]](?:[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<metaData>.*))?'
-			)),
-			re.UNICODE
-		),
-
-		# Find Title.Year.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<year>\d{4})(?:[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<metaData>.*))?'
-			)),
-			re.UNICODE
-		)
-
-	]
 
-	# Check each rule and see if there is a match
-	for rule in parsingOrderSingle:
-		parsedData = rule.match(title)
+	# Strip the bad prefixes and sanitize the meta data
+	title = Normalise.sanitise(title)
 
-		# Check if any matches were found
-		if parsedData:
-			break
+	# Check each rule and see if there is a match
+	parsedData = Patterns.matchFirst(parsingOrderSingle, title)
 
 	# Check if any pattern matches were found, if not return None
 	if parsedData is None:
@@ -77,70 +76,58 @@ def parseTitle(title):
 	videoProperties = {}
 
 	if 'title' in parsedData.groupdict():
-		videoProperties['title'] = parsedData.group('title').strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
-		videoProperties['title'] = SeparatorCharacters.SeparatorCharactersRegexCompiled.sub(' ',videoProperties['title'])
-		videoProperties['title'] = videoProperties['title'].strip()
-
-		# Strip out some characters that can cause problems matching, this is due to scene naming
-		for ch in [u'(',u')',u'[',u']', '{', '}']:
-			if ch in videoProperties['title']:
-				videoProperties['title'] = videoProperties['title'].replace(ch, u'')
-
+		videoProperties['title'] = Normalise.cleanName(parsedData.group('title'), ampersands=False)
 
 	if 'year' in parsedData.groupdict():
 		videoProperties['year'] = parsedData.group('year').strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
 
-	# Key and Val are strings
 	if 'metaData' in parsedData.groupdict():
-		for key, val in parseMetaData(parsedData.group('metaData')).items():
-			if isinstance(val, str):
-				videoProperties[key] = val.strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
-			elif val is not None:
-				videoProperties[key] = val
+		return (videoProperties, parsedData.group('metaData'))
 
-	return videoProperties
+	return (videoProperties, None)
 
 
-def parseMetaData(meta):
+def parseTitle(title):
 	'''
-	Try to extract meta data out of the remaining file title and return a dict
-	of metadata
+	Read the given title and return a dict of valid property matches
 	'''
-	metaData = {}
+	split = splitTitle(title)
 
-	if meta is None:
-		return metaData
+	if split is None:
+		return None
 
-	meta = meta.lower()
-	for ch in ('.', '[', ']', '(', ')', '{', '}', '-'):
-		meta = meta.replace(ch, ' ')
+	return MetaData.addMetaData(split[0], parseMetaData(split[1]))
 
-	meta = ' {0} '.format(meta.strip())
 
-	for quality in VideoProperties.Quality:
-		if ' {0} '.format(quality.lower()) in meta:
-			metaData['quality'] = quality
-			break
+def parseTitles(titles):
+	'''
+	Read many titles at once, the meta data they share is only parsed once
 
-	for container in VideoProperties.Container:
-		if ' {0} '.format(container.lower()) in meta.lower():
-			metaData['container'] = container
-			break
+	Takes:
+		titles - List of titles
 
-	for codec in VideoProperties.Codec:
-		if ' {0} '.format(codec.lower()) in meta:
-			if 'codec' not in metaData or len(metaData['codec']) < len(codec):
-				metaData['codec'] = codec
-				break
+	Returns:
+		Dict of columns, see Columns.toColumns
+	'''
+	return Columns.parseTitles(titles, splitTitle, parseMetaDataMany)
 
-	for source in VideoProperties.Source:
-		if ' {0} '.format(source.lower()) in meta:
-			metaData['source'] = source
-			break
 
-	for proper in VideoProperties.Proper:
-		if ' {0} '.format(proper.lower()) in meta:
-			metaData['proper'] = True
-			break
+def parseMetaData(meta):
+	'''
+	Try to extract meta data out of the remaining file title and return a dict
+	of metadata
+	'''
+	return metaDataExtractor.parse(meta)
 
-	return metaData
+
+def parseMetaDataMany(metas):
+	'''
+	Extracts the meta data of many titles at once
+
+	Takes:
+		metas - List of meta data strings
+
+	Returns:
+		List of dicts, see parseMetaData
+	'''
+	return metaDataExtractor.parseMany(metas)
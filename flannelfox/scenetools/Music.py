@@ -7,51 +7,52 @@
 #-------------------------------------------------------------------------------
 # -*- coding: utf-8 -*-
 
-# System Includes
-import re
-
 # flannelfox Includes
-from flannelfox import settings
-from flannelfox.scenetools import AudioProperties, SeparatorCharacters
+from flannelfox.scenetools import AudioProperties, SeparatorCharacters, MetaData, Columns, Patterns, Normalise
 
-def parseTitle(title):
-	'''
-	Read the given title and return a dict of valid property matches
-	'''
+# The first value in each list wins
+metaDataExtractor = MetaData.Extractor([
+	('quality', AudioProperties.Quality, MetaData.FIRST),
+	('releaseType', AudioProperties.ReleaseType, MetaData.FIRST),
+	('codec', AudioProperties.Codec, MetaData.FIRST),
+	('source', AudioProperties.Source, MetaData.FIRST),
+	('proper', AudioProperties.Proper, MetaData.FLAG)
+])
 
-	# Strip all the possible bad prefixes form the string
-	# badPrefixRegex = re.compile(r'(?:'+")|(?:".join(settings.BAD_PREFIXES)+r')')
-	title = re.sub(r'(?:'+")|(?:".join(settings.BAD_PREFIXES)+r')', "", title, flags=re.IGNORECASE)
 
-	# Meta data sanitization
-	for key, val in settings.KEYWORD_SYNONYMS.items():
-		title = re.sub(key, val, title, flags=re.IGNORECASE)
+'''
+List of parsing regex to try and extract data from the file title,
+this list should also be in order of searching preference
+'''
+parsingOrderSingle = [
 
+	# Artist - Album [meta] [meta] - meta
+	# [meta] is optional, - meta is not
+	Patterns.compile(r'(?P<artist>.+?) - (?P<album>.+?)(?: (?P<metaData>(?:(?:\[[^\]]+\]\s)?(?:\[[^\]]+\]\s)?-.*)))$'),
 
+	# Artist - Album [meta]
+	Patterns.compile(r'(?P<artist>.+?) - (?P<album>.+?)(?: (?P<metaData>(?:\[[^\]]+\])))$'),
+
+	# Artist - Album
+	Patterns.compile(r'(?P<artist>.+?) - (?P<album>.+?)$')
+]
+
+
+def splitTitle(title):
 	'''
-	List of parsing regex to try and extract data from the file title,
-	this list should also be in order of searching preference
-	'''
-	parsingOrderSingle = [
+	Split the given title into its name properties and its meta data
 
-		# Artist - Album [meta] [meta] - meta
-		# [meta] is optional, - meta is not
-		re.compile(r'(?P<artist>.+?) - (?P<album>.+?)(?: (?P<metaData>(?:(?:\[[^\]]+\]\s)?(?:\[[^\]]+\]\s)?-.*)))$', re.UNICODE),
+	Returns:
+		Tuple (dict of valid property matches, meta data string or None),
+		None when the title does not match
+	'''
 
-		# Artist - Album [meta]
-		re.compile(r'(?P<artist>.+?) - (?P<album>.+?)(?: (?P<metaData>(?:\[[^\]]+\])))$', re.UNICODE),
+	# Strip the bad prefixes and sanitize the meta data
+	title = Normalise.sanitise(title)
 
-		# Artist - Album
-		re.compile(r'(?P<artist>.+?) - (?P<album>.+?)$', re.UNICODE)
-	]
 
 	# Check each rule and see if there is a match
-	for rule in parsingOrderSingle:
-		parsedData = rule.match(title)
-
-		# Check if any matches were found
-		if parsedData:
-			break
+	parsedData = Patterns.matchFirst(parsingOrderSingle, title)
 
 	# Check if any pattern matches were found, if not return None
 	if parsedData is None:
@@ -61,44 +62,40 @@ def parseTitle(title):
 	audioProperties = {}
 
 	if "artist" in parsedData.groupdict():
-		audioProperties["artist"] = parsedData.group("artist").strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
-		audioProperties["artist"] = SeparatorCharacters.SeparatorCharactersRegexCompiled.sub(" ",audioProperties["artist"])
+		audioProperties["artist"] = Normalise.cleanName(parsedData.group("artist"))
+
+	if "album" in parsedData.groupdict():
+		audioProperties["album"] = Normalise.cleanName(parsedData.group("album"))
 
-		# Change amperstands to and
-		audioProperties["artist"] = audioProperties["artist"].replace(u" & ", u" and ")
+	if "metaData" in parsedData.groupdict():
+		return (audioProperties, parsedData.group("metaData"))
 
-		# Strip white space from beginning and end
-		audioProperties["artist"] = audioProperties["artist"].strip()
+	return (audioProperties, None)
 
-		# Strip out some characters that can cause problems matching, this is due to scene naming
-		for ch in [u'(',u')',u'[',u']', '{', '}']:
-			if ch in audioProperties["artist"]:
-				audioProperties["artist"] = audioProperties["artist"].replace(ch, u'')
 
-	if "album" in parsedData.groupdict():
-		audioProperties["album"] = parsedData.group("album").strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
-		audioProperties["album"] = SeparatorCharacters.SeparatorCharactersRegexCompiled.sub(" ",audioProperties["album"])
+def parseTitle(title):
+	'''
+	Read the given title and return a dict of valid property matches
+	'''
+	split = splitTitle(title)
+
+	if split is None:
+		return None
 
-		# Change amperstands to and
-		audioProperties["album"] = audioProperties["album"].replace(u" & ", u" and ")
+	return MetaData.addMetaData(split[0], parseMetaData(split[1]))
 
-		# Strip white space from beginning and end
-		audioProperties["album"] = audioProperties["album"].strip()
 
-		# Strip out some characters that can cause problems matching, this is due to scene naming
-		for ch in [u'(',u')',u'[',u']', '{', '}']:
-			if ch in audioProperties["album"]:
-				audioProperties["album"] = audioProperties["album"].replace(ch, u'')
+def parseTitles(titles):
+	'''
+	Read many titles at once, the meta data they share is only parsed once
 
-	# Key and Val are strings
-	if "metaData" in parsedData.groupdict():
-		for key, val in parseMetaData(parsedData.group("metaData")).items():
-			if isinstance(val, str):
-				audioProperties[key] = val.strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
-			elif val is not None:
-				audioProperties[key] = val
+	Takes:
+		titles - List of titles
 
-	return audioProperties
+	Returns:
+		Dict of columns, see Columns.toColumns
+	'''
+	return Columns.parseTitles(titles, splitTitle, parseMetaDataMany)
 
 
 def parseMetaData(meta):
@@ -106,43 +103,17 @@ def parseMetaData(meta):
 	Try to extract meta data out of the remaining file title and return a dict
 	of metadata
 	'''
+	return metaDataExtractor.parse(meta)
 
-	metaData = {}
 
-	if meta is None:
-		return metaData
-
-	meta = meta.lower()
-	for ch in ('.', '[', ']', '(', ')', '{', '}', '-'):
-		meta = meta.replace(ch, ' ')
-
-	meta = ' {0} '.format(meta.strip())
-
-	for quality in AudioProperties.Quality:
-		if ' {0} '.format(quality.lower()) in meta:
-			metaData["quality"] = quality
-			break
-
-	for releaseType in AudioProperties.ReleaseType:
-		if ' {0} '.format(releaseType.lower()) in meta:
-			if "releaseType" not in metaData or len(metaData["releaseType"]) < len(releaseType):
-				metaData["releaseType"] = releaseType
-				break
-
-	for codec in AudioProperties.Codec:
-		if ' {0} '.format(codec.lower()) in meta:
-			if "codec" not in metaData or len(metaData["codec"]) < len(codec):
-				metaData["codec"] = codec
-				break
-
-	for source in AudioProperties.Source:
-		if ' {0} '.format(source.lower()) in meta:
-			metaData["source"] = source
-			break
+def parseMetaDataMany(metas):
+	'''
+	Extracts the meta data of many titles at once
 
-	for proper in AudioProperties.Proper:
-		if ' {0} '.format(proper.lower()) in meta:
-			metaData["proper"] = True
-			break
+	Takes:
+		metas - List of meta data strings
 
-	return metaData
+	Returns:
+		List of dicts, see parseMetaData
+	'''
+	return metaDataExtractor.parseMany(metas)
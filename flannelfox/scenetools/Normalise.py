@@ -0,0 +1,105 @@
+#-------------------------------------------------------------------------------
+# Name:		Normalise
+# Purpose:	Cleans up the names and titles taken from scene titles. The
+#			character swaps are done with str.translate tables built once,
+#			instead of a replace call for each character.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import re
+
+# flannelfox Includes
+from flannelfox import settings
+from flannelfox.scenetools import SeparatorCharacters
+
+
+# Every separator becomes a space
+SEPARATORS = str.maketrans(dict(
+	(char, ' ') for char in SeparatorCharacters.SeparatorCharactersStr + SeparatorCharacters.SeparatorSpecialCharactersStr
+))
+
+# Characters that can cause problems matching, this is due to scene naming
+BRACKETS = str.maketrans('', '', '()[]{}')
+
+# Ampersands become and, punctuation that gets in the way of comparing
+# titles is dropped
+TITLE = str.maketrans({'&': 'and', '.': ' ', ':': None, '\\': None, '\'': None, ',': None})
+
+# A year in parenthesis at the end of a name
+YEAR = re.compile(r'(.+) \([\d]+\)$')
+
+# Prefixes some feeds put in front of the file name
+BAD_PREFIXES = re.compile(r'(?:'+r')|(?:'.join(settings.BAD_PREFIXES)+r')', re.IGNORECASE)
+
+# Keywords swapped for their one spelling, in order
+KEYWORD_SYNONYMS = [(re.compile(key, re.IGNORECASE), val) for key, val in settings.KEYWORD_SYNONYMS.items()]
+
+
+def sanitise(title):
+	'''
+	Strips the bad prefixes from a scene title and reconciles the keywords
+	that come in multiple forms, see settings.KEYWORD_SYNONYMS
+
+	Takes:
+		title - String
+
+	Returns:
+		String
+	'''
+	title = BAD_PREFIXES.sub('', title)
+
+	for key, val in KEYWORD_SYNONYMS:
+		title = key.sub(val, title)
+
+	return title
+
+
+def cleanName(name, ampersands=True, dropYear=False):
+	'''
+	Cleans up a name (title, artist, album) matched in a scene title
+
+	Takes:
+		name - String
+		ampersands - Bool, change " & " to " and "
+		dropYear - Bool, remove a year in parenthesis from the end
+
+	Returns:
+		String
+	'''
+
+	# Runs of separators become a single space and are taken off the ends
+	name = name.translate(SEPARATORS)
+
+	while '  ' in name:
+		name = name.replace('  ', ' ')
+
+	name = name.strip(' ')
+
+	if ampersands and '&' in name:
+		name = name.replace(' & ', ' and ')
+
+	# Strip white space from beginning and end
+	name = name.strip()
+
+	if dropYear and name.endswith(')'):
+		name = YEAR.sub(r'\1', name)
+
+	return name.translate(BRACKETS)
+
+
+def cleanTitle(title):
+	'''
+	Normalises a title so it can be compared with the filters, "&" becomes
+	"and" and the punctuation that gets in the way is dropped
+
+	Takes:
+		title - String
+
+	Returns:
+		String
+	'''
+
+	# No "&" is left to start an html entity, so there is nothing for
+	# html.unescape to do after this
+	return title.translate(TITLE)
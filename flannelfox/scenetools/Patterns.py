@@ -0,0 +1,111 @@
+#-------------------------------------------------------------------------------
+# Name:		Patterns
+# Purpose:	Compiles and runs the title parsing patterns. Titles longer than
+#			titleParsing.maxLength are given up on before any pattern is
+#			tried, so one junk title can not stall a feed. When the regex
+#			module is installed it is used instead of re and a title is
+#			also given up on once its patterns have run for
+#			titleParsing.timeout seconds.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import re, time
+
+try:
+	import regex
+except ImportError:
+	regex = None
+
+# flannelfox Includes
+from flannelfox import settings
+from flannelfox import logging
+
+# Setup the logging agent
+logger = logging.getLogger(__name__)
+
+
+if regex is not None:
+
+	name = 'regex'
+
+	def compile(pattern):
+		return regex.compile(pattern, regex.VERSION0)
+
+else:
+
+	name = 're'
+
+	def compile(pattern):
+		return re.compile(pattern)
+
+	if settings.settings['titleParsing']['timeout']:
+		logger.warning('The regex module is not installed, titleParsing.timeout is ignored and only titles longer than titleParsing.maxLength are given up on')
+
+
+# Titles given up on since the counts were last taken, by reason
+rejected = {}
+
+
+def __reject(reason):
+	rejected[reason] = rejected.get(reason, 0) + 1
+	return None
+
+
+def matchFirst(rules, title, accept=None):
+	'''
+	Tries each rule on the title in order
+
+	Takes:
+		rules - List of compiled patterns
+		title - String to match
+		accept - Callable taking a match, the next rule is tried when it
+			returns False
+
+	Returns:
+		The first accepted match. When no match is accepted the match of
+		the last rule, None when it did not match or the title was given up
+		on.
+	'''
+	limits = settings.settings['titleParsing']
+
+	if len(title) > limits['maxLength']:
+		return __reject('length')
+
+	match = None
+
+	if regex is None:
+
+		for rule in rules:
+			match = rule.match(title)
+
+			if match and (accept is None or accept(match)):
+				break
+
+		return match
+
+	deadline = time.perf_counter() + limits['timeout']
+
+	for rule in rules:
+
+		try:
+			match = rule.match(title, timeout=max(deadline - time.perf_counter(), 0))
+
+		except TimeoutError:
+			return __reject('timeout')
+
+		if match and (accept is None or accept(match)):
+			break
+
+	return match
+
+
+def takeRejected():
+	'''
+	Returns the number of titles given up on by reason and starts counting
+	again
+	'''
+	counts = dict(rejected)
+	rejected.clear()
+
+	return counts
@@ -8,244 +8,227 @@
 #-------------------------------------------------------------------------------
 # -*- coding: utf-8 -*-
 
-# System Includes
-import re
-
 # flannelfox Includes
-from flannelfox import settings
-from flannelfox.scenetools import VideoProperties, SeparatorCharacters
+from flannelfox.scenetools import VideoProperties, SeparatorCharacters, MetaData, Columns, Patterns, Normalise
+
+# The most specific codec wins, for the rest the first in each list
+metaDataExtractor = MetaData.Extractor([
+	('quality', VideoProperties.Quality, MetaData.FIRST),
+	('container', VideoProperties.Container, MetaData.FIRST),
+	('codec', VideoProperties.Codec, MetaData.LONGEST),
+	('source', VideoProperties.Source, MetaData.FIRST),
+	('proper', VideoProperties.Proper, MetaData.FLAG)
+])
+
+
+'''
+List of parsing regex to try and extract data from the file title,
+this list should also be in order of searching preference
+'''
+parsingOrderSingle = [
+
+	# Find Showname.S00.E00.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[sS](?P<season>\d{1,3})[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']*(?:[eE](?P<episode>\d+))+(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	# Find Showname.S00.E00A.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[sS](?P<season>\d{1,3})[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']*(?:[eE](?P<episode>\d+[abcde]?))+(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	# Find Showname.ep00.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[Ee][Pp](?P<episode>\d{1,3})(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[Ee][Pp](?P<episode>[CcLlXxVvIi]+)(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$',
+		))
+	),
+
+	# Find Showname.e00.Meta
+	Patterns.compile(
+		r''.join((
+			r'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[Ee](?P<episode>\d{1,3})(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+
+	# find Showname.0000.00.00.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<year>\d{4})[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<month>\d{2})[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<day>\d{2})(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	# find Showname.00.00.0000.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<day>\d{2})[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<month>\d{2})[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<year>\d{4})(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	# find Showname.0x00.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<season>\d+)[Xx](?P<episode>\d+)(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	# Find Showname.part00.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[Pp][Aa][Rr][Tt][',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']*(?P<episode>\d{1,2})(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[Pp][Aa][Rr][Tt][',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']*(?P<episode>[CcLlXxVvIi]+)(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	# Find Showname.pt00.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[Pp][Tt][',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']*(?P<episode>\d{1,2})(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[Pp][Tt][',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']*(?P<episode>[CcLlXxVvIi]+)(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	),
+
+	# find Showname.000.Meta
+	Patterns.compile(
+		r''.join((
+			'(?P<title>.+?)[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+(?P<season>\d)(?P<episode>\d{2})(?P<metaData>[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+.*)?$'
+		))
+	)
+]
+
+parsingOrderMultiple = [
+
+	# Find Showname.S00.E00.S00.E00.Meta
+	Patterns.compile(
+		''.join((
+			'[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[sS]\d+[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[eE](\d+)+'
+		))
+	),
+
+	# Find Showname.S00.E00.E00.E00.Meta
+	Patterns.compile(
+		''.join((
+			'[',
+			SeparatorCharacters.SeparatorCharactersRegexStr,
+			']+[eE](\d+)+'
+		))
+	)
+]
+
 
 # Logging
 from flannelfox import logging
 
-def parseTitle(title):
-
-
-	'''
-	Read the given title and return a dict of valid property matches
+def splitTitle(title):
 	'''
+	Split the given title into its name properties and its meta data
 
-	# Strip all the possible bad prefixes form the string
-	# badPrefixRegex = re.compile(r'(?:'+')|(?:'.join(settings.BAD_PREFIXES)+r')')
-	title = re.sub(r'(?:'+r')|(?:'.join(settings.BAD_PREFIXES)+r')', r'', title, flags=re.IGNORECASE)
+	Returns:
+		Tuple (dict of valid property matches, meta data string or None),
+		None when the title does not match
+	'''
 
-	# Meta data sanitization
-	for key, val in settings.KEYWORD_SYNONYMS.items():
-		title = re.sub(key, val, title, flags=re.IGNORECASE)
+	# Strip the bad prefixes and sanitize the meta data
+	title = Normalise.sanitise(title)
 
 	# Used to store information on multiple episode instances
 	multiData = None
 
-
-	'''
-	List of parsing regex to try and extract data from the file title,
-	this list should also be in order of searching preference
-	'''
-	parsingOrderSingle = [
-
-		# Find Showname.S00.E00.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[sS](?P<season>\d{1,3})[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']*(?:[eE](?P<episode>\d+))+(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		# Find Showname.S00.E00A.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[sS](?P<season>\d{1,3})[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']*(?:[eE](?P<episode>\d+[abcde]?))+(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		# Find Showname.ep00.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[Ee][Pp](?P<episode>\d{1,3})(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[Ee][Pp](?P<episode>[CcLlXxVvIi]+)(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$',
-			)),
-			re.UNICODE
-		),
-
-		# Find Showname.e00.Meta
-		re.compile(
-			r''.join((
-				r'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[Ee](?P<episode>\d{1,3})(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-
-		# find Showname.0000.00.00.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<year>\d{4})[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<month>\d{2})[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<day>\d{2})(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		# find Showname.00.00.0000.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<day>\d{2})[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<month>\d{2})[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<year>\d{4})(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		# find Showname.0x00.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<season>\d+)[Xx](?P<episode>\d+)(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		# Find Showname.part00.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[Pp][Aa][Rr][Tt][',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']*(?P<episode>\d{1,2})(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[Pp][Aa][Rr][Tt][',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']*(?P<episode>[CcLlXxVvIi]+)(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		# Find Showname.pt00.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[Pp][Tt][',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']*(?P<episode>\d{1,2})(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[Pp][Tt][',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']*(?P<episode>[CcLlXxVvIi]+)(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		),
-
-		# find Showname.000.Meta
-		re.compile(
-			r''.join((
-				'(?P<title>.+?)[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+(?P<season>\d)(?P<episode>\d{2})(?P<metaData>[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+.*)?$'
-			)),
-			re.UNICODE
-		)
-	]
-
-	parsingOrderMultiple = [
-
-		# Find Showname.S00.E00.S00.E00.Meta
-		re.compile(
-			''.join((
-				'[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[sS]\d+[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[eE](\d+)+'
-			)),
-			re.UNICODE
-		),
-
-		# Find Showname.S00.E00.E00.E00.Meta
-		re.compile(
-			''.join((
-				'[',
-				SeparatorCharacters.SeparatorCharactersRegexStr,
-				']+[eE](\d+)+'
-			)),
-			re.UNICODE
-		)
-	]
-
 	# Check each rule and see if there is a match
-	for rule in parsingOrderSingle:
-		parsedData = rule.match(title)
-
-		# Check if any matches were found
-		if parsedData and parsedData.group('title') not in ['', None]:
-			break
+	parsedData = Patterns.matchFirst(parsingOrderSingle, title, accept=lambda match: match.group('title') not in ['', None])
 
 	# Check if any pattern matches were found, if not return None
 	if parsedData is None:
@@ -274,25 +257,7 @@ def parseTitle(title):
 	videoProperties = {}
 
 	if 'title' in parsedData.groupdict():
-		videoProperties['title'] = parsedData.group('title').strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
-		videoProperties['title'] = SeparatorCharacters.SeparatorCharactersRegexCompiled.sub(' ', videoProperties['title'])
-
-		# Change amperstands to and
-		videoProperties['title'] = videoProperties['title'].replace(u' & ', u' and ')
-
-		# Strip white space from beginning and end
-		videoProperties['title'] = videoProperties['title'].strip()
-
-		# String year in parenthesis from end of title
-		videoProperties['title'] = re.sub(r'(.+) \([\d]+\)$', r'\1', videoProperties['title'])
-
-		# Strip out some characters that can cause problems matching, this is due to scene naming
-		for ch in [u'(', u')', u'[', u']', '{', '}']:
-			if ch in videoProperties['title']:
-				videoProperties['title'] = videoProperties['title'].replace(ch, u'')
-
-		# Strip white space from beginning and end
-		videoProperties['title'] = videoProperties['title'].strip()
+		videoProperties['title'] = Normalise.cleanName(parsedData.group('title'), dropYear=True).strip()
 
 	if 'episode' in parsedData.groupdict():
 		if multiData: # if there is multiple episodes then collapse them into a single csv
@@ -312,15 +277,35 @@ def parseTitle(title):
 	if 'day' in parsedData.groupdict():
 		videoProperties['day'] = parsedData.group('day').strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr).lstrip('0')
 
-	# Key and Val are strings
 	if 'metaData' in parsedData.groupdict():
-		for key, val in parseMetaData(parsedData.group('metaData')).items():
-			if isinstance(val, str):
-				videoProperties[key] = val.strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
-			elif val is not None:
-				videoProperties[key] = val
+		return (videoProperties, parsedData.group('metaData'))
 
-	return videoProperties
+	return (videoProperties, None)
+
+
+def parseTitle(title):
+	'''
+	Read the given title and return a dict of valid property matches
+	'''
+	split = splitTitle(title)
+
+	if split is None:
+		return None
+
+	return MetaData.addMetaData(split[0], parseMetaData(split[1]))
+
+
+def parseTitles(titles):
+	'''
+	Read many titles at once, the meta data they share is only parsed once
+
+	Takes:
+		titles - List of titles
+
+	Returns:
+		Dict of columns, see Columns.toColumns
+	'''
+	return Columns.parseTitles(titles, splitTitle, parseMetaDataMany)
 
 
 def extractMultipleSeasonAndEpisode(sne):
@@ -338,45 +323,17 @@ def parseMetaData(meta):
 	Try to extract meta data out of the remaining file title and return a dict
 	of metadata
 	'''
+	return metaDataExtractor.parse(meta)
 
-	metaData = {}
-
-	if meta is None:
-		return metaData
 
-	meta = meta.lower()
-	for ch in ('.', '[', ']', '(', ')', '{', '}', '-'):
-		meta = meta.replace(ch, ' ')
-
-	meta = ' {0} '.format(meta.strip())
-
-	for quality in VideoProperties.Quality:
-		if ' {0} '.format(quality.lower()) in meta:
-			if 'quality' not in metaData:
-				metaData['quality'] = quality
-				break
-
-	for container in VideoProperties.Container:
-		if ' {0} '.format(container.lower()) in meta:
-			if 'container' not in metaData:
-				metaData['container'] = container
-				break
-
-	for codec in VideoProperties.Codec:
-		if ' {0} '.format(codec.lower()) in meta:
-			if 'codec' not in metaData or len(metaData['codec']) < len(codec):
-				metaData['codec'] = codec
+def parseMetaDataMany(metas):
+	'''
+	Extracts the meta data of many titles at once
 
-	for source in VideoProperties.Source:
-		if ' {0} '.format(source.lower()) in meta:
-			if 'source' not in metaData:
-				metaData['source'] = source
-				break
+	Takes:
+		metas - List of meta data strings
 
-	for proper in VideoProperties.Proper:
-		if ' {0} '.format(proper.lower()) in meta:
-			if 'proper' not in metaData:
-				metaData['proper'] = True
-				break
-
-	return metaData
+	Returns:
+		List of dicts, see parseMetaData
+	'''
+	return metaDataExtractor.parseMany(metas)
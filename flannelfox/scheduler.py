@@ -0,0 +1,563 @@
+#-------------------------------------------------------------------------------
+# Name:		scheduler
+# Purpose:	Runs the daemon work on fixed rate deadlines instead of sleeping
+#			between passes. A run that is still going when its next
+#			deadline comes up makes that deadline get skipped, jobs can be
+#			woken early and other processes can wake them through a unix
+#			datagram socket.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import os, time, socket, threading
+
+from flannelfox import logging
+from flannelfox import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class Job(object):
+	'''
+	Something the scheduler runs every interval seconds
+	'''
+
+	def __init__(self, name, func, interval, nextRun):
+		self.name = name
+		self.func = func
+		self.interval = float(interval)
+		self.nextRun = nextRun
+
+		self.running = False
+
+		# Woken while running, run again as soon as the run ends
+		self.pending = False
+
+		self.runs = 0
+		self.skipped = 0
+		self.errors = 0
+		self.lastDuration = None
+
+
+class Scheduler(object):
+	'''
+	Runs jobs on their own thread at fixed rate deadlines: a job with an
+	interval of 60 that takes 20 seconds starts again 40 seconds after it
+	finished, not 60.
+
+	Usage:
+		jobs = Scheduler()
+		jobs.add('queueReader', queueReader, 60)
+		jobs.listen('/path/to/queuedaemon.sock', 'queueReader')
+		jobs.run()
+	'''
+
+	def __init__(self, clock=time.monotonic):
+		self.clock = clock
+		self.jobs = {}
+		self.triggers = []
+		self.threads = []
+		self.lock = threading.Lock()
+
+		# Set whenever something changes that could make a job due sooner
+		self.changed = threading.Event()
+		self.stopped = False
+
+
+	def add(self, name, func, interval, delay=0):
+		'''
+		Adds a job
+
+		Takes:
+			name - Name used to wake the job and in the logs and metrics
+			func - Callable that does the work
+			interval - Seconds between the start of two runs
+			delay - Seconds before the first run
+
+		Returns:
+			The Job
+		'''
+		if interval <= 0:
+			raise ValueError('The interval of {0} must be more than 0'.format(name))
+
+		job = Job(name, func, interval, self.clock() + delay)
+
+		with self.lock:
+			self.jobs[name] = job
+
+		self.changed.set()
+
+		return job
+
+
+	def wake(self, name):
+		'''
+		Runs a job now, a job that is running is run again once it is done
+
+		Returns:
+			bool True if the job exists
+		'''
+		with self.lock:
+			job = self.jobs.get(name, None)
+
+			if job is None:
+				return False
+
+			if job.running:
+				job.pending = True
+			else:
+				job.nextRun = self.clock()
+
+		logger.debug(logging.lazy('Woke {0}', name))
+		metrics.inc('scheduler_wakes', job=name)
+		self.changed.set()
+
+		return True
+
+
+	def listen(self, path, name):
+		'''
+		Wakes a job whenever a datagram is sent to the unix socket at path,
+		see notify
+
+		Returns:
+			bool True if the socket could be opened
+		'''
+		trigger = Trigger(path, lambda message: self.wake(name))
+
+		if not trigger.start():
+			return False
+
+		self.triggers.append(trigger)
+
+		return True
+
+
+	def __runJob(self, job, deadline):
+		startTime = self.clock()
+		metrics.observe('scheduler_lag', max(startTime - deadline, 0.0), job=job.name)
+
+		try:
+			job.func()
+
+		except Exception as e:
+			job.errors += 1
+			metrics.inc('scheduler_errors', job=job.name)
+			logger.error('{0} failed: {1}'.format(job.name, e))
+
+		finally:
+			job.lastDuration = self.clock() - startTime
+			metrics.observe('scheduler_job', job.lastDuration, job=job.name)
+
+			with self.lock:
+				job.running = False
+				job.runs += 1
+
+				if job.pending:
+					job.pending = False
+					job.nextRun = self.clock()
+
+			self.changed.set()
+
+
+	def runPending(self):
+		'''
+		Starts the jobs that are due, a job never runs twice at once
+
+		Returns:
+			List of the jobs that were started
+		'''
+		started = []
+		now = self.clock()
+
+		with self.lock:
+			for job in self.jobs.values():
+
+				if job.running or job.nextRun > now:
+					continue
+
+				deadline = job.nextRun
+
+				# Fixed rate, the next deadline does not move with how long
+				# this run takes. Deadlines that passed while the last run
+				# was still going are skipped, they all get this one run.
+				missed = int((now - job.nextRun) // job.interval)
+				job.nextRun += (missed + 1) * job.interval
+
+				if missed > 0:
+					job.skipped += missed
+					metrics.inc('scheduler_skipped', missed, job=job.name)
+					logger.info(logging.lazy('{0} ran over, skipped {1} run(s)', job.name, missed))
+
+				job.running = True
+				started.append((job, deadline))
+
+		for job, deadline in started:
+			thread = threading.Thread(
+				target=self.__runJob,
+				args=(job, deadline),
+				name='scheduler-{0}'.format(job.name)
+			)
+			thread.daemon = True
+			self.threads = [t for t in self.threads if t.is_alive()] + [thread]
+			thread.start()
+
+		return [job for job, deadline in started]
+
+
+	def getTimeout(self):
+		'''
+		Returns:
+			Seconds until the next job is due, None if there are no jobs
+		'''
+		with self.lock:
+			deadlines = [job.nextRun for job in self.jobs.values() if not job.running]
+
+		if len(deadlines) == 0:
+			return None
+
+		return max(min(deadlines) - self.clock(), 0.0)
+
+
+	def run(self):
+		'''
+		Runs the jobs until stop is called
+		'''
+		while not self.stopped:
+			self.runPending()
+
+			self.changed.wait(self.getTimeout())
+			self.changed.clear()
+
+		# Let runs that are going finish their work
+		for thread in list(self.threads):
+			thread.join()
+
+
+	def stop(self):
+		self.stopped = True
+
+		for trigger in self.triggers:
+			trigger.close()
+
+		self.triggers = []
+		self.changed.set()
+
+
+class Trigger(object):
+	'''
+	Listens on a unix datagram socket and calls callback with each message
+	'''
+
+	POLL_INTERVAL = 0.5
+
+	def __init__(self, path, callback):
+		self.path = path
+		self.callback = callback
+		self.socket = None
+		self.thread = None
+
+
+	def start(self):
+		'''
+		Returns:
+			bool True if the socket is listening
+		'''
+		if not hasattr(socket, 'AF_UNIX'):
+			logger.warning('Wake up triggers need unix sockets, {0} will not be used'.format(self.path))
+			return False
+
+		try:
+			# A socket left behind by a daemon that did not shut down
+			if os.path.exists(self.path):
+				os.remove(self.path)
+
+			self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+			self.socket.bind(self.path)
+
+		except OSError as e:
+			logger.warning('Could not listen on {0}: {1}'.format(self.path, e))
+			self.socket = None
+			return False
+
+		# recv wakes up now and then so close does not have to interrupt it
+		self.socket.settimeout(self.POLL_INTERVAL)
+
+		self.thread = threading.Thread(target=self.__listen, args=(self.socket,), name='trigger')
+		self.thread.daemon = True
+		self.thread.start()
+
+		return True
+
+
+	def __listen(self, listener):
+		while self.socket is listener:
+			try:
+				message = listener.recv(1024)
+
+			except socket.timeout:
+				continue
+
+			except OSError:
+				break
+
+			try:
+				self.callback(message)
+
+			except Exception as e:
+				logger.error('A wake up trigger failed: {0}'.format(e))
+
+
+	def close(self):
+		if self.socket is None:
+			return
+
+		listener, self.socket = self.socket, None
+		listener.close()
+
+		if self.thread is not None:
+			self.thread.join(self.POLL_INTERVAL * 2)
+
+		try:
+			os.remove(self.path)
+
+		except OSError:
+			pass
+
+
+def notify(path, message=b'wake'):
+	'''
+	Wakes the job listening on path, nothing happens when no one listens
+
+	Returns:
+		bool True if the message was sent
+	'''
+	if not path or not hasattr(socket, 'AF_UNIX'):
+		return False
+
+	sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+	try:
+		sender.setblocking(False)
+		sender.sendto(message, path)
+		return True
+
+	except OSError:
+		return False
+
+	finally:
+		sender.close()
+
+
+class FeedStats(object):
+	'''
+	Publishing statistics of a single feed url
+	'''
+
+	# Weight of the newest poll in the new item rate
+	SMOOTHING = 0.3
+
+	def __init__(self, interval):
+		self.interval = interval
+		self.lastPoll = None
+		self.lastNewItem = None
+
+		# New items per second
+		self.rate = None
+
+		# Seconds the feed asks to be cached for (ttl, sy:updatePeriod)
+		self.hint = None
+
+		# Links seen in the last poll, anything else is new
+		self.links = None
+		self.full = False
+
+
+	def update(self, links, hint, now):
+		'''
+		Records a poll
+
+		Takes:
+			links - Links of the items in the feed, None if the poll failed
+			hint - Seconds the feed asked to be cached for, or None
+			now - Time of the poll
+
+		Returns:
+			Int, the number of new items, None when it is not known
+		'''
+		elapsed = None if self.lastPoll is None else now - self.lastPoll
+
+		# The same url in another list polled in the same cycle
+		if elapsed is not None and elapsed <= 0:
+			return None
+
+		self.lastPoll = now
+
+		if links is None:
+			return None
+
+		self.hint = hint
+		links = frozenset(links)
+
+		if self.links is None:
+			self.links = links
+			return None
+
+		new = len(links - self.links)
+		self.links = links
+
+		if new > 0:
+			self.lastNewItem = now
+
+		rate = new / float(elapsed)
+
+		if self.rate is None:
+			self.rate = rate
+		else:
+			self.rate = self.SMOOTHING * rate + (1 - self.SMOOTHING) * self.rate
+
+		# Every item was new so some may have dropped off the feed already
+		self.full = len(links) > 0 and new == len(links)
+
+		return new
+
+
+class FeedSchedule(object):
+	'''
+	Remembers when each feed url was polled so feeds can have their own
+	interval. A url uses the pollInterval (seconds) of its list and falls
+	back on defaultInterval.
+
+	With adaptive polling the interval of a url follows how often it
+	publishes: it is set so a poll finds about targetItems new items,
+	halved when a poll finds nothing but new items, and grows by half when
+	nothing new turns up. It never goes below the ttl or sy:updatePeriod the
+	feed asks for and stays between minInterval and maxInterval. Lists with
+	a pollInterval are not adapted.
+
+	The feeds are looked at every time the rss job runs, a feed is due when
+	it was polled at least its interval ago, less tolerance to allow for
+	the job starting a little early or late.
+	'''
+
+	BACKOFF = 1.5
+
+	def __init__(self, defaultInterval, tolerance=None, adaptive=None):
+		self.defaultInterval = defaultInterval
+		self.tolerance = tolerance if tolerance is not None else defaultInterval / 2.0
+
+		# minInterval, maxInterval and targetItems, None turns it off
+		self.adaptive = adaptive
+
+		# url -> FeedStats
+		self.stats = {}
+
+
+	def getStats(self, url, majorFeed=None):
+		stats = self.stats.get(url, None)
+
+		if stats is None:
+			stats = self.stats[url] = FeedStats(self.getInterval(majorFeed or {}))
+
+		return stats
+
+
+	def getInterval(self, majorFeed):
+		return majorFeed.get('pollInterval', None) or self.defaultInterval
+
+
+	def isDue(self, url, majorFeed, now):
+		stats = self.stats.get(url, None)
+
+		if stats is None or stats.lastPoll is None:
+			return True
+
+		if majorFeed.get('pollInterval', None) or self.adaptive is None:
+			interval = self.getInterval(majorFeed)
+		else:
+			interval = stats.interval
+
+		return now - stats.lastPoll >= interval - self.tolerance
+
+
+	def getDue(self, majorFeeds, now=None):
+		'''
+		Takes:
+			majorFeeds - Dict key -> majorFeed
+			now - Time of the poll
+
+		Returns:
+			Dict of the majorFeeds with minorFeeds that should be polled,
+			holding only those minorFeeds
+		'''
+		now = now if now is not None else time.time()
+
+		urls = set()
+		due = {}
+
+		for key, majorFeed in majorFeeds.items():
+			minorFeeds = []
+
+			for minorFeed in majorFeed.get('minorFeeds', []):
+				urls.add(minorFeed['url'])
+
+				if self.isDue(minorFeed['url'], majorFeed, now):
+					minorFeeds.append(minorFeed)
+
+			if len(minorFeeds) == len(majorFeed.get('minorFeeds', [])):
+				due[key] = majorFeed
+
+			elif len(minorFeeds) > 0:
+				due[key] = dict(majorFeed, minorFeeds=minorFeeds)
+
+		# Feeds that are no longer configured are forgotten
+		for url in list(self.stats.keys()):
+			if url not in urls:
+				del self.stats[url]
+
+		return due
+
+
+	def record(self, url, majorFeed, links, hint=None, now=None):
+		'''
+		Records a poll of url and works out when it is next due
+
+		Takes:
+			url - Url of the minorFeed
+			majorFeed - The majorFeed it belongs to
+			links - Links of the items in the feed, None if the poll failed
+			hint - Seconds the feed asked to be cached for, or None
+			now - Time of the poll
+
+		Returns:
+			The FeedStats of the url
+		'''
+		now = now if now is not None else time.time()
+		stats = self.getStats(url, majorFeed)
+
+		new = stats.update(links, hint, now)
+
+		if self.adaptive is not None and new is not None:
+			stats.interval = self.getAdaptiveInterval(stats, new)
+
+		return stats
+
+
+	def getAdaptiveInterval(self, stats, new):
+		minInterval = self.adaptive['minInterval']
+		maxInterval = self.adaptive['maxInterval']
+
+		if new == 0:
+			interval = stats.interval * self.BACKOFF
+
+		elif stats.full:
+			interval = stats.interval / 2.0
+
+		else:
+			interval = self.adaptive['targetItems'] / stats.rate
+
+		if stats.hint is not None:
+			interval = max(interval, stats.hint)
+
+		return min(max(interval, minInterval), maxInterval)
@@ -60,6 +60,7 @@ FUZZY_PROPERTIES = [
 
 # Properties ignored due to being related to storage
 	'feedDestination',
+	'priority',
 
 # Properties ignored due to being based on ratio/timing
 	'addedOn',
@@ -102,7 +103,12 @@ settings = {
 		'traktConfigDir': os.path.join(HOME_DIR, '.flannelfox/config/feeds/traktfeeds'),
 		'traktCacheDir': os.path.join(HOME_DIR, '.flannelfox/cache/TraktConfigCache'),
 		'goodreadsConfigDir': os.path.join(HOME_DIR, '.flannelfox/config/feeds/goodreadsfeeds'),
-		'goodreadsCacheDir': os.path.join(HOME_DIR, '.flannelfox/cache/GoodreadsConfigCache')
+		'goodreadsCacheDir': os.path.join(HOME_DIR, '.flannelfox/cache/GoodreadsConfigCache'),
+		'metricsDir': os.path.join(HOME_DIR, '.flannelfox/metrics'),
+		'circuitBreakerFile': os.path.join(HOME_DIR, '.flannelfox/circuitbreaker.json'),
+		# rssdaemon wakes queuedaemon through this socket when it queues
+		# new torrents
+		'queueDaemonSocket': os.path.join(HOME_DIR, '.flannelfox/queuedaemon.sock')
 	},
 	'apis':{
 		'lastfm':'https://ws.audioscrobbler.com/2.0',
@@ -115,7 +121,19 @@ settings = {
 	'queueManagement':{
 		'maxTorrents': 300,
 		'maxDownloadingTorrents': 5,
-		'strictQueueManagement': False
+		'strictQueueManagement': False,
+		'shardingPolicy': 'fewestTorrents',
+		# Added to the priority of a queued torrent on top of the priority
+		# of its list, see Torrents.Generic.setPriority
+		'priority': {
+			'proper': 1,
+			'qualities': {
+				'1080p': 2,
+				'1080i': 2,
+				'720p': 1,
+				'720i': 1
+			}
+		}
 	},
 	'client':{
 		'name': 'transmission-server1',
@@ -151,7 +169,66 @@ settings = {
 	'maxUsedSpace': 600,
 	'queueDaemonThreadSleep': 60,
 	'rssDaemonThreadSleep': 60,
-	'maxRssThreads': 8
+	# Poll each rss feed about as often as it publishes, see
+	# scheduler.FeedSchedule. Intervals are in seconds.
+	'adaptivePolling': {
+		'enabled': True,
+		'minInterval': 60,
+		'maxInterval': 3600,
+		# New items a poll should find on average
+		'targetItems': 1.0
+	},
+	'maxRssThreads': 8,
+	# Seconds a rss cycle may spend reading feeds, the feeds still being
+	# read then are given up on and polled again next cycle. 0 turns it off
+	'rssCycleTimeout': 50,
+	# Feeds that fail this many times in a row are not polled for delay
+	# seconds, doubled for every failure after that up to maxDelay. A host
+	# is left alone the same way once hostFailures of its feeds fail in a
+	# row, see rssdaemon.circuitbreaker
+	'circuitBreaker': {
+		'enabled': True,
+		'failures': 3,
+		'hostFailures': 5,
+		'delay': 300,
+		'maxDelay': 21600
+	},
+	# Titles longer than maxLength are not parsed. A title is also given up
+	# on after timeout seconds, this needs the optional regex module
+	# (pip install regex), with only re installed the timeout is ignored
+	'titleParsing': {
+		'maxLength': 512,
+		'timeout': 0.05
+	},
+	'apiRateLimits': {
+		'lastfm': 5,
+		'trakt': 1,
+		'goodreads': 1
+	},
+	'lastfmPageWorkers': 4,
+	'cache': {
+		# json or marshal (smaller and faster, python only)
+		'format': 'json',
+		# Minutes a cached watchlist is fresh for
+		'ttl': {
+			'default': 360,
+			'trakt': 360,
+			'lastfm': 1440,
+			'goodreads': 1440
+		},
+		# Minutes an out of date watchlist may still be used while it is
+		# refreshed in the background
+		'staleWindow': {
+			'default': 10080
+		}
+	},
+	'watchConfigFiles': True,
+	'metrics': {
+		'enabled': True,
+		# prometheus writes <daemon>.prom for the node_exporter textfile
+		# collector, json writes <daemon>.json
+		'format': 'prometheus'
+	}
 }
 
 
@@ -0,0 +1,164 @@
+#-------------------------------------------------------------------------------
+# Name:		Generic
+# Purpose:	Base class for torrent client backends. Backends only need to
+#			talk to their daemon and fill elements['queue'] with Torrent
+#			objects, the queue views used by the queuedaemon live here.
+#
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+class Client(object):
+	'''
+	All backends must provide:
+		updateQueue, verifyTorrent, stopTorrent, startTorrent,
+		removeTorrent, addTorrentURL, restart, start, stop
+
+	addTorrentURL must return one of:
+		(0, hashString) - Torrent added
+		(1, hashString) - Torrent is a duplicate
+		(2, reason) - Torrent failed, but can be retried
+		(3, reason) - Torrent is bad and should be blacklisted
+		(4, reason) - Unknown failure
+	'''
+
+	elements = {
+		'queue': []
+	}
+
+
+	def __init__(self, queue=None):
+		'''
+		A bare Generic client only provides the queue views, TorrentClient
+		uses one to look across the queues of several backends at once
+
+		Takes:
+			queue - List of torrents to provide views for
+		'''
+		self.elements = {'queue': queue if queue is not None else []}
+
+
+	def getQueue(self):
+		'''
+		Returns:
+			List [torrents]
+		'''
+		return self.elements['queue']
+
+
+	def removeBadTorrent(self, hashString=None, reason='No Reason Given'):
+		'''
+		Removes a torrent from both the client and the database
+		this should be called when there is a bad torrent.
+
+		Takes:
+			hashString - Hash of the specific torrent to remove
+		'''
+
+		# Remove the torrent from the client
+		self.removeTorrent(hashString=hashString, deleteData=True, reason=reason)
+
+
+	def getSlowestSeeds(self, num=None):
+		'''
+		Look for the slowest seeding torrents, slowest first
+
+		Takes:
+			num - Int, the number of torrent objects to return
+		'''
+		slowestSeeds = []
+
+		torrents = self.getFinishedSeeding()
+
+		for torrent in torrents:
+			if torrent.isSeeding():
+				slowestSeeds.append(torrent)
+
+		# Sort torrents if we have any
+		if len(slowestSeeds) > 0:
+			slowestSeeds.sort(key=lambda torrent: torrent['rateUpload'])
+
+		if len(slowestSeeds) == 0 or num is None:
+			return slowestSeeds
+		return slowestSeeds[:num]
+
+
+	def getDormantSeeds(self, num=None):
+		'''
+		Looks for a seeding torrent with the longest time since active, returns
+		torrents, oldest first
+		'''
+		dormantSeeds = []
+
+
+		torrents = self.getFinishedSeeding()
+
+		for torrent in torrents:
+			if torrent.isDormant():
+				dormantSeeds.append(torrent)
+
+		# Sort torrents if we have any
+		if len(dormantSeeds) > 0:
+			dormantSeeds.sort(key=lambda torrent: torrent['activityDate'])
+
+		if len(dormantSeeds) == 0 or num is None:
+			return dormantSeeds
+		return dormantSeeds[:num]
+
+
+	def getDownloading(self, num=None):
+		'''
+		Returns a list of torrents that are downloading
+
+		Takes:
+			num - Int, the number of torrents to return
+		'''
+		downloadingTorrents = []
+
+		torrents = self.elements['queue']
+
+		for torrent in torrents:
+			if torrent.isDownloading():
+				downloadingTorrents.append(torrent)
+
+		if len(downloadingTorrents) == 0 or num is None:
+			return downloadingTorrents
+		return downloadingTorrents[:num]
+
+
+	def getSeeding(self, num=None):
+		'''
+		Returns a list of torrents that are Seeding
+
+		Takes:
+			num - Int, the number of torrents to return
+		'''
+		seedingTorrents = []
+
+		torrents = self.elements['queue']
+
+		for torrent in torrents:
+			if torrent.isSeeding():
+				seedingTorrents.append(torrent)
+
+		if len(seedingTorrents) == 0 or num is None:
+			return seedingTorrents
+		return seedingTorrents[:num]
+
+
+	def getFinishedSeeding(self, num=None):
+		'''
+		Returns a list of torrents that are finished seeding
+
+		Takes:
+			num - Int, the number of torrents to return
+		'''
+		torrents = self.getSeeding()
+		finishedSeeding = []
+
+		for torrent in torrents:
+			if torrent.isFinished():
+				finishedSeeding.append(torrent)
+
+		if len(finishedSeeding) == 0 or num is None:
+			return finishedSeeding
+		return finishedSeeding[:num]
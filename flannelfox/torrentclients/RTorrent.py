@@ -0,0 +1,503 @@
+#-------------------------------------------------------------------------------
+# Name:		RTorrent
+# Purpose:	Interacts with the rtorrent daemon over its SCGI socket
+#
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+# System Includes
+import hashlib, os, shutil, time, xmlrpc.client
+
+
+# Third party modules
+import requests
+
+# flannelfox Includes
+from flannelfox.settings import settings
+from flannelfox.torrentclients.Torrent import Status as TorrentStatus
+from flannelfox.torrentclients.Torrent import Torrent
+from flannelfox.torrentclients import Trackers
+from flannelfox.torrentclients import Generic
+from flannelfox.torrentclients.tools import xmlrpc2scgi
+
+from flannelfox import metrics
+
+# Setup the logging agent
+from flannelfox import logging
+
+
+class Responses(object):
+	success = 'success'
+	duplicate = 'duplicate torrent'
+	badTorrent = 'invalid or corrupt torrent file'
+	torrentNotFound = 'http error 404: Not Found'
+	torrentBadRequest = 'http error 400: Bad Request'
+	torrentServiceUnavailable = 'http error 503: Service Unavailable'
+	torrentNoResponse = 'http error 0: No Response'
+
+
+def bdecodeInfoHash(data):
+	'''
+	Finds the info dict of a bencoded torrent and returns its sha1 hash
+
+	Takes:
+		data - bytes, the contents of a .torrent file
+
+	Returns:
+		str, the upper case hex infohash, raises ValueError if the data is
+		not a valid torrent
+	'''
+
+	def skip(idx):
+		# Returns the index just past the bencoded value starting at idx
+		token = data[idx:idx+1]
+
+		if token == b'i':
+			end = data.index(b'e', idx)
+			int(data[idx+1:end])
+			return end + 1
+
+		elif token in (b'l', b'd'):
+			idx += 1
+			while data[idx:idx+1] != b'e':
+				if idx >= len(data):
+					raise ValueError('Unterminated list/dict')
+				idx = skip(idx)
+			return idx + 1
+
+		elif token.isdigit():
+			colon = data.index(b':', idx)
+			end = colon + 1 + int(data[idx:colon])
+			if end > len(data):
+				raise ValueError('String is longer than the data')
+			return end
+
+		raise ValueError('Invalid bencoded data')
+
+	try:
+
+		if data[:1] != b'd':
+			raise ValueError('A torrent must be a dict')
+
+		idx = 1
+		while data[idx:idx+1] != b'e':
+
+			if idx >= len(data):
+				raise ValueError('Unterminated dict')
+
+			keyEnd = skip(idx)
+			key = data[data.index(b':', idx)+1:keyEnd]
+			valEnd = skip(keyEnd)
+
+			if key == b'info':
+				return hashlib.sha1(data[keyEnd:valEnd]).hexdigest().upper()
+
+			idx = valEnd
+
+	except (IndexError, ValueError, RecursionError) as e:
+		raise ValueError('Invalid torrent: {0}'.format(e))
+
+	raise ValueError('The torrent does not contain an info dict')
+
+
+class Client(Generic.Client):
+
+	# Fields fetched for every torrent with a single d.multicall2
+	TORRENT_FIELDS = (
+		'd.hash=',
+		'd.state=',
+		'd.is_active=',
+		'd.is_hash_checking=',
+		'd.complete=',
+		'd.completed_bytes=',
+		'd.size_bytes=',
+		'd.ratio=',
+		'd.up.rate=',
+		'd.message=',
+		'd.directory=',
+		'd.is_multi_file=',
+		'd.timestamp.finished=',
+		'd.timestamp.last_active='
+	)
+
+	RTORRENT_MAX_RETRIES = 3
+
+	SLEEP_SHORT = 5
+	SLEEP_LONG = 10
+
+	logger = None
+
+	def __init__(self, clientSettings=None):
+
+		self.logger = logging.getLogger(__name__)
+		self.logger.info('RTorrentClient INIT')
+
+		self.elements = {
+			'url': None,
+			'host': None,
+			'port': None,
+			'queue': []
+		}
+
+		if clientSettings is None:
+			clientSettings = settings['client']
+
+		self.elements.update(clientSettings)
+
+		# Build the server URI, a unix socket is preferred
+		if self.elements['url'] is None:
+
+			missing = [key for key in ('host', 'port') if self.elements[key] is None]
+
+			if len(missing) > 0:
+				raise ValueError('The rtorrent client needs a url or a host and port, {0} not set'.format(
+					' and '.join(missing)
+				))
+
+			self.elements['url'] = 'scgi://{0}:{1}'.format(self.elements['host'], self.elements['port'])
+
+		self.logger.debug('RTorrentClient URL: {0}'.format(self.elements['url']))
+
+		# A single connection is shared by every call
+		self.rpc = xmlrpc2scgi.RTorrentXMLRPCClient(self.elements['url'])
+
+
+	def __call(self, method, *args):
+		'''
+		Makes an xmlrpc call to rtorrent
+
+		Takes:
+			method - The rtorrent method to call
+			args - Parameters for the call
+
+		Returns:
+			Tuple (result, error), error is None when the call worked
+		'''
+		try:
+			with metrics.timer('client_rpc', client=self.elements.get('name', 'rtorrent'), method=method):
+				return (getattr(self.rpc, method)(*args), None)
+
+		except xmlrpc.client.Fault as e:
+			self.logger.debug('rtorrent returned a fault for {0}: {1}'.format(method, e.faultString))
+			return (None, e.faultString)
+
+		except (OSError, ValueError, xmlrpc.client.Error) as e:
+			self.logger.debug('There was a problem communicating with rtorrent:\n{0}'.format(e))
+			self.rpc.close()
+			return (None, str(e))
+
+
+	def __multicall(self, calls):
+		'''
+		Runs several calls in a single round trip
+
+		Takes:
+			calls - List of (method, [params]) tuples
+
+		Returns:
+			List of results, a failed call is returned as None
+		'''
+		results, error = self.__call(
+			'system.multicall',
+			[{'methodName':method, 'params':list(params)} for method, params in calls]
+		)
+
+		if error is not None:
+			return [None] * len(calls)
+
+		# Each successful result is wrapped in a list, faults are dicts
+		return [result[0] if isinstance(result, list) else None for result in results]
+
+
+	def __getStatus(self, torrent):
+		'''
+		Maps the rtorrent state flags onto the generic Torrent status
+		'''
+		if torrent['d.is_hash_checking=']:
+			return TorrentStatus.Verifying
+
+		if not torrent['d.state='] or not torrent['d.is_active=']:
+			return TorrentStatus.Paused
+
+		if torrent['d.complete=']:
+			return TorrentStatus.Seeding
+
+		return TorrentStatus.Downloading
+
+
+	def updateQueue(self):
+		'''
+		Updates the class variable queue with the latest torrent queue info
+
+		Returns:
+			Tuple (rtorrentResponseCode, httpResponseCode)
+		'''
+
+		# The whole queue comes back from a single call
+		rows, error = self.__call('d.multicall2', '', 'main', *self.TORRENT_FIELDS)
+
+		tries = 0
+		while error is not None and tries < self.RTORRENT_MAX_RETRIES:
+			rows, error = self.__call('d.multicall2', '', 'main', *self.TORRENT_FIELDS)
+			tries += 1
+
+		if error is not None:
+			return (error, -1)
+
+		self.elements['queue'] = []
+
+		for row in rows:
+
+			torrent = dict(zip(self.TORRENT_FIELDS, row))
+			errorString = torrent['d.message=']
+
+			# Check for torrents that should be removed
+			removed = False
+			for trackerError in Trackers.Responses.Remove:
+				if trackerError in errorString:
+					self.logger.debug(logging.lazy('Removing torrent do to errorString: {0}', errorString))
+					self.removeBadTorrent(hashString=torrent['d.hash='], reason=errorString)
+					removed = True
+					break
+
+			if removed:
+				continue
+
+			if torrent['d.size_bytes='] > 0:
+				percentDone = torrent['d.completed_bytes='] / torrent['d.size_bytes=']
+			else:
+				percentDone = 0.0
+
+			# Multi file torrents report their own folder, use the parent so
+			# it matches the destination it was added to
+			downloadDir = torrent['d.directory=']
+			if torrent['d.is_multi_file=']:
+				downloadDir = os.path.dirname(downloadDir.rstrip('/'))
+
+			t = Torrent(hashString=torrent['d.hash='],
+						id=torrent['d.hash='],
+						error=1 if errorString != '' else 0,
+						errorString=errorString,
+						uploadRatio=torrent['d.ratio='] / 1000.0,
+						percentDone=percentDone,
+						doneDate=torrent['d.timestamp.finished='],
+						activityDate=torrent['d.timestamp.last_active='],
+						rateUpload=torrent['d.up.rate='],
+						downloadDir=downloadDir,
+						status=self.__getStatus(torrent)
+			)
+
+			self.elements['queue'].append(t)
+
+		return (Responses.success, 200)
+
+
+	def verifyTorrent(self, hashString=None):
+		'''
+		Verifies a corrupted torrent
+
+		Takes:
+			hashString - Hash of the specific torrent to remove
+
+		Returns:
+			bool True is action completed
+		'''
+		time.sleep(self.SLEEP_SHORT)
+
+		if hashString is None:
+			return False
+
+		stopped, checked = self.__multicall([
+			('d.stop', [hashString]),
+			('d.check_hash', [hashString])
+		])
+
+		if checked is not None:
+			self.logger.debug('Verification Succeeded')
+			return True
+		else:
+			self.logger.debug('Verification Failed')
+			return False
+
+
+	def stopTorrent(self, hashString=None):
+		'''
+		Stops a torrent
+
+		Takes:
+			hashString - Hash of the specific torrent to remove
+
+		Returns:
+			bool True is action completed
+		'''
+		time.sleep(self.SLEEP_SHORT)
+
+		if hashString is None:
+			return False
+
+		result, error = self.__call('d.stop', hashString)
+
+		if error is None:
+			self.logger.debug('Stop Succeeded')
+			return True
+		else:
+			self.logger.debug('Stop Failed')
+			return False
+
+
+	def startTorrent(self, hashString=None):
+		'''
+		Starts a torrent
+
+		Takes:
+			hashString - Hash of the specific torrent to remove
+
+		Returns:
+			bool True is action completed
+		'''
+		time.sleep(self.SLEEP_LONG)
+
+		if hashString is None:
+			return False
+
+		result, error = self.__call('d.start', hashString)
+
+		if error is None:
+			self.logger.debug('Start Succeeded')
+			return True
+		else:
+			self.logger.debug('Start Failed')
+			return False
+
+
+	def removeTorrent(self, hashString=None, deleteData=False, reason='No Reason Given'):
+		'''
+		Removes a torrent from rtorrent, rtorrent never deletes data itself so
+		the files are removed here when asked to
+
+		Takes:
+			hashString - Hash of the specific torrent to remove
+
+			deleteData - bool, tells if the torrent data should be removed
+
+		Returns:
+			bool True is action completed
+		'''
+		time.sleep(self.SLEEP_SHORT)
+
+		if hashString is None:
+			return False
+
+		# Look up where the data lives before the torrent is erased
+		basePath, erased = self.__multicall([
+			('d.base_path', [hashString]),
+			('d.erase', [hashString])
+		])
+
+		if deleteData:
+			self.logger.debug('Torrent deleted from client: {0}'.format(reason))
+		else:
+			self.logger.debug('Torrent Removed from client: {0}'.format(reason))
+
+		if erased is None:
+			self.logger.debug('Torrent Removal Failed')
+			return False
+
+		if deleteData and basePath:
+			try:
+				if os.path.isdir(basePath):
+					shutil.rmtree(basePath)
+				elif os.path.exists(basePath):
+					os.remove(basePath)
+
+			except OSError as e:
+				self.logger.warning('Could not delete torrent data {0}: {1}'.format(basePath, e))
+
+		self.logger.debug('Torrent Removal Succeeded')
+		return True
+
+
+	def addTorrentURL(self, url=None, destination=settings['files']['defaultTorrentLocation']):
+		'''
+		Attempts to load the torrent at the given url into rtorrent. The torrent
+		is fetched here so the infohash is known before rtorrent sees it.
+
+		Takes:
+			url - url of the torrent file to be added
+
+			destination - where the torrent should be saved
+
+		Returns:
+			Tuple (resultCode, hashString or reason), see Generic.Client
+		'''
+		self.logger.info('RTorrentClient adding torrent')
+
+		# Make sure a URL was passed
+		if url is None:
+			raise ValueError('A url must be provided to add a torrent')
+
+		self.logger.debug('Trying to add a new torrent:\n{0}'.format(url))
+
+		try:
+			r = requests.get(url, timeout=60)
+			httpCode = r.status_code
+			data = r.content
+
+		except Exception as e:
+			self.logger.info('Torrent failed, but we can retry: {0}'.format(e))
+			return (2, Responses.torrentNoResponse)
+
+		if httpCode == 404:
+			self.logger.info('Torrent is bad, so let\'s blacklist it')
+			return (3, Responses.torrentNotFound)
+
+		elif httpCode == 400:
+			return (2, Responses.torrentBadRequest)
+
+		elif httpCode != 200:
+			return (2, Responses.torrentServiceUnavailable)
+
+		try:
+			hashString = bdecodeInfoHash(data)
+
+		except ValueError as e:
+			self.logger.info('Torrent is bad, so let\'s blacklist it: {0}'.format(e))
+			return (3, Responses.badTorrent)
+
+		# d.hash only works on torrents that are already loaded
+		result, error = self.__call('d.hash', hashString)
+
+		if error is None:
+			self.logger.info('Duplicate Torrent Detected: {0}'.format(hashString))
+			return (1, hashString)
+
+		commands = []
+
+		if destination is not None:
+			commands.append('d.directory.set="{0}"'.format(
+				destination.replace('\\', '\\\\').replace('"', '\\"')
+			))
+
+		result, error = self.__call('load.raw_start_verbose', '', xmlrpc.client.Binary(data), *commands)
+
+		if error is None:
+			self.logger.info('Torrent Added: {0}'.format(hashString))
+			return (0, hashString)
+
+		self.logger.info('Torrent Add Failed: {0}'.format(error))
+		return (4, 'Unknown Error/Failed')
+
+
+	def restart(self):
+		self.logger.warning('Restarting rtorrent is not supported')
+		return False
+
+
+	def start(self):
+		self.logger.warning('Starting rtorrent is not supported')
+		return False
+
+
+	def stop(self):
+		self.logger.warning('Stopping rtorrent is not supported')
+		return False
@@ -9,7 +9,7 @@
 # -*- coding: utf-8 -*-
 
 # System Includes
-import json, time
+import time
 
 
 # Third party modules
@@ -24,7 +24,9 @@ from flannelfox.settings import settings
 from flannelfox.torrentclients.Torrent import Status as TorrentStatus
 from flannelfox.torrentclients.Torrent import Torrent
 from flannelfox.torrentclients import Trackers
+from flannelfox.torrentclients import Generic
 from flannelfox.tools import changeCharset
+from flannelfox import jsoncodec, metrics
 
 # Setup the logging agent
 from flannelfox import logging
@@ -40,7 +42,71 @@ class Responses(object):
 	torrentNoResponse = 'gotMetadataFromURL: http error 0: No Response'
 
 
-class Client(object):
+class Request(object):
+	'''
+	A single transmission-rpc call. Payloads are built from dicts so values
+	are always escaped, and the serialized method/arguments of calls that
+	never change (torrent-get with a fixed field list) are cached so only
+	the tag has to be appended on each call.
+	'''
+
+	# Serialized method/arguments keyed by the torrent-get field list
+	serializedTorrentGets = {}
+
+	def __init__(self, method, arguments=None, tag=None, prefix=None):
+		self.method = method
+		self.arguments = arguments or {}
+		self.tag = tag
+		self.prefix = prefix
+
+
+	@classmethod
+	def encodePrefix(self, method, arguments):
+		'''
+		Serializes everything but the tag, the result is left open so the
+		tag can be appended
+		'''
+		return b''.join((
+			b'{"method":',
+			jsoncodec.encode(method),
+			b',"arguments":',
+			jsoncodec.encode(arguments)
+		))
+
+
+	@classmethod
+	def torrentGet(self, fields, tag=None):
+		'''
+		Builds a torrent-get call, reusing the serialized field list when
+		the same fields were requested before
+		'''
+		fields = tuple(fields)
+		arguments = {'fields':list(fields)}
+
+		prefix = self.serializedTorrentGets.get(fields, None)
+
+		if prefix is None:
+			prefix = self.encodePrefix('torrent-get', arguments)
+			self.serializedTorrentGets[fields] = prefix
+
+		return self('torrent-get', arguments, tag=tag, prefix=prefix)
+
+
+	def encode(self):
+		'''
+		Returns:
+			bytes, the json payload to post to transmission-rpc
+		'''
+		if self.prefix is None:
+			self.prefix = self.encodePrefix(self.method, self.arguments)
+
+		if self.tag is None:
+			return self.prefix + b'}'
+
+		return self.prefix + ',"tag":{0}}}'.format(int(self.tag)).encode('ascii')
+
+
+class Client(Generic.Client):
 
 	elements = {
 		'host': 'localhost',
@@ -55,19 +121,42 @@ class Client(object):
 
 	TRANSMISSION_MAX_RETRIES = 3
 
+	# Fields requested from torrent-get when updating the queue
+	TORRENT_FIELDS = (
+		'hashString',
+		'id',
+		'error',
+		'errorString',
+		'uploadRatio',
+		'percentDone',
+		'doneDate',
+		'activityDate',
+		'rateUpload',
+		'status',
+		'downloadDir',
+		'trackerStats'
+	)
+
 	SLEEP_SHORT = 5
 	SLEEP_LONG = 10
 
 	logger = None
 
-	def __init__(self):
+	def __init__(self, clientSettings=None):
 
 		self.logger = logging.getLogger(__name__)
 		self.logger.info('TransmissionClient INIT')
-		self.logger.debug('TransmissionClient Settings: {0}'.format(settings['client']))
 
-		if settings['client'] != {}:
-			self.elements.update(settings['client'])
+		if clientSettings is None:
+			clientSettings = settings['client']
+
+		self.logger.debug('TransmissionClient Settings: {0}'.format(clientSettings))
+
+		# Each instance gets its own copy so several servers can be managed
+		self.elements = dict(Client.elements, queue=[])
+
+		if clientSettings != {}:
+			self.elements.update(clientSettings)
 
 		self.logger.debug('TransmissionClient Settings 2: {0}'.format(self.elements))
 
@@ -77,6 +166,9 @@ class Client(object):
 		# tag generator the keep transmisison calls matched
 		self.tagGenerator = self.__generateTag()
 
+		# Calls reuse the connections to the server
+		self.session = requests.Session()
+
 		# Build the server URI
 		self.elements['uri'] = 'http'
 
@@ -150,14 +242,14 @@ class Client(object):
 			# Connect to the RPC server
 			if postData is None:
 				if auth is not None:
-					r = requests.get(uri, auth=auth, headers=headers)
+					r = self.session.get(uri, auth=auth, headers=headers)
 				else:
-					r = requests.get(uri, headers=headers)
+					r = self.session.get(uri, headers=headers)
 			else:
 				if auth is not None:
-					r = requests.post(uri, auth=auth, headers=headers, data=postData)
+					r = self.session.post(uri, auth=auth, headers=headers, data=postData)
 				else:
-					r = requests.post(uri, headers=headers, data=postData)
+					r = self.session.post(uri, headers=headers, data=postData)
 
 			response = r.content
 			httpCode = r.status_code
@@ -182,13 +274,27 @@ class Client(object):
 		return (response, httpCode, encoding)
 
 
-	def __parseTransmissionResponse(self, postData, tries=0):
+	def __newRequest(self, method, arguments=None):
+		'''
+		Builds a transmission-rpc call with the next tag
+
+		Takes:
+			method - The rpc method to call
+			arguments - Dict of arguments for the method
+
+		Returns:
+			Request
+		'''
+		return Request(method, arguments, tag=next(self.tagGenerator))
+
+
+	def __parseTransmissionResponse(self, request, tries=0):
 		'''
 		Parse a transmission response
 
 		Takes:
 			tries - Limits the recursion of this call when tags do not match
-			postData - The data posted to transmission-rpc
+			request - The Request posted to transmission-rpc
 
 		Returns:
 			Tuple (torrents,httpResponseCode,transmissionResponseCode)
@@ -202,40 +308,41 @@ class Client(object):
 			return (response, httpResponseCode, transmissionResponseCode)
 
 		# Make the call
-		response, httpResponseCode = self.__sendRequest(postData = postData.encode('utf-8'))[:2]
+		with metrics.timer('client_rpc', client=self.elements.get('name', 'transmission'), method=request.method):
+			response, httpResponseCode = self.__sendRequest(postData = request.encode())[:2]
 
 		if httpResponseCode == 401:
 			return (response, httpResponseCode, 'Authorization Error')
 
-		# Ensure the result is in utf-8
-		response = changeCharset(response,'utf-8','html.parser')
+		# Parse the json if it exists, transmission replies in utf-8 so the
+		# charset cleanup is only needed when the fast path fails
+		try:
+			response = jsoncodec.decode(response)
+
+		except jsoncodec.DecodeError:
 
-		# parse the json if it exists
-		if response is not None:
 			try:
-				response = json.loads(response.decode('utf-8'))
+				response = jsoncodec.decode(changeCharset(response,'utf-8','html.parser'))
 
 			# If there is a problem parsing the response then return an empty set
-			except (ValueError) as e:
+			except jsoncodec.DecodeError:
 				pass
 
 		# Make sure we got a result
 		if isinstance(response,dict):
 
-			# Get Tag, if tag is available and ensure the response matches
-			posted = json.loads(postData)
-			if isinstance(posted,dict) and 'tag' in posted:
-				if isinstance(response,dict) and 'tag' in response:
-					if posted['tag'] != response['tag']:
-						time.sleep(self.SLEEP_SHORT)
-						response,httpResponseCode = self.__parseTransmissionResponse(
-							postData=postData,
-							tries=tries+1
-						)
+			# Ensure the response matches the tag that was sent
+			if request.tag is not None and 'tag' in response:
+				if request.tag != response['tag']:
+					time.sleep(self.SLEEP_SHORT)
+					return self.__parseTransmissionResponse(
+						request=request,
+						tries=tries+1
+					)
 
 
 			# Get Transmission Response Code
-			if isinstance(response,dict) and 'result' in response:
+			if 'result' in response:
 				transmissionResponseCode = response['result']
 
 		return (response, httpResponseCode, transmissionResponseCode)
@@ -251,41 +358,12 @@ class Client(object):
 		Returns:
 			Tuple (torrents,httpResponseCode,transmissionResponseCode)
 		'''
-		fields = fields or [
-			'hashString',
-			'id',
-			'error',
-			'errorString',
-			'uploadRatio',
-			'percentDone',
-			'doneDate',
-			'activityDate',
-			'rateUpload',
-			'status',
-			'downloadDir',
-			'trackerStats'
-		]
-
-
-		# Method
-		commandJson = '{"method":"torrent-get",'
-
-		# Arguments
-		commandJson += '"arguments":{'
+		fields = fields or self.TORRENT_FIELDS
 
-		# Fields
-		commandJson += '"fields":["'
-		commandJson += '","'.join(fields)
-		commandJson += '"]'
-
-		# Close Arguments
-		commandJson += '},'
-
-		# Tag (not strictly needed)
-		commandJson += '"tag":{0}'.format(next(self.tagGenerator))+'}'
+		request = Request.torrentGet(fields, tag=next(self.tagGenerator))
 
 		# Extract the values so we can replace the response with only torrents
-		response,httpResponseCode,transmissionResponseCode = self.__parseTransmissionResponse(commandJson)
+		response,httpResponseCode,transmissionResponseCode = self.__parseTransmissionResponse(request)
 
 		# Get Torrents
 		torrents = []
@@ -334,7 +412,7 @@ class Client(object):
 
 							if tracker['lastAnnounceResult'] != '' and tracker['lastAnnounceResult'] != None:
 								workingTrackerExists = True
-								self.logger.debug('Rewriting errorString: {0}'.format(tracker['lastAnnounceResult']))
+								self.logger.debug(logging.lazy('Rewriting errorString: {0}', tracker['lastAnnounceResult']))
 								torrent['errorString'] = tracker['lastAnnounceResult']
 
 							elif tracker['lastAnnounceSucceeded']:
@@ -349,7 +427,7 @@ class Client(object):
 				# Check for torrents that should be removed
 				for error in Trackers.Responses.Remove:
 					if error in torrent['errorString']:
-						self.logger.debug('Removing torrent do to errorString: {0}'.format(torrent['errorString']))
+						self.logger.debug(logging.lazy('Removing torrent do to errorString: {0}', torrent['errorString']))
 						self.removeBadTorrent(hashString=torrent['hashString'], reason=torrent['errorString'])
 						continue
 
@@ -365,10 +443,10 @@ class Client(object):
 						self.startTorrent(hashString=torrent['hashString'])
 						continue
 
-					self.logger.debug('Corrupted torrent: {1} STAT: {0}'.format(torrent['status'], torrent['hashString']))
+					self.logger.debug(logging.lazy('Corrupted torrent: {1} STAT: {0}', torrent['status'], torrent['hashString']))
 
 				elif torrent['errorString'] != '':
-					self.logger.debug('Error encountered: {0} {1}'.format(torrent['hashString'],torrent['errorString']))
+					self.logger.debug(logging.lazy('Error encountered: {0} {1}', torrent['hashString'], torrent['errorString']))
 
 
 				t = Torrent(hashString=torrent['hashString'],
@@ -389,14 +467,6 @@ class Client(object):
 		return (transmissionResponseCode, httpResponseCode)
 
 
-	def getQueue(self):
-		'''
-		Returns:
-			List [torrents]
-		'''
-		return self.elements['queue']
-
-
 	def verifyTorrent(self, hashString=None):
 		'''
 		Verifies a corrupted torrent
@@ -412,20 +482,7 @@ class Client(object):
 		if hashString is None:
 			return False
 
-		# Method
-		commandJson = '{"method":"torrent-verify",'
-
-		# Arguments
-		commandJson += '"arguments":{'
-
-		# Ids
-		commandJson += '"ids":"{0}"'.format(hashString)
-
-		# Close Arguments
-		commandJson += '},'
-
-		# Tag (not strictly needed)
-		commandJson += '"tag":{0}'.format(next(self.tagGenerator))+'}'
+		request = self.__newRequest('torrent-verify', {'ids':hashString})
 
 		# Stop the torrent first
 		if not self.stopTorrent(hashString=hashString):
@@ -434,7 +491,7 @@ class Client(object):
 
 		# Make sure the call worked
 		# *_ acts as a list to eat all data except what is before or after it
-		*_, transmissionResponseCode = self.__parseTransmissionResponse(commandJson)
+		*_, transmissionResponseCode = self.__parseTransmissionResponse(request)
 
 		if transmissionResponseCode == Responses.success:
 			self.logger.debug('Verification Succeeded')
@@ -459,23 +516,10 @@ class Client(object):
 		if hashString is None:
 			return False
 
-		# Method
-		commandJson = '{"method":"torrent-stop",'
-
-		# Arguments
-		commandJson += '"arguments":{'
-
-		# Ids
-		commandJson += '"ids":"{0}"'.format(hashString)
-
-		# Close Arguments
-		commandJson += '},'
-
-		# Tag (not strictly needed)
-		commandJson += '"tag":{0}'.format(next(self.tagGenerator))+'}'
+		request = self.__newRequest('torrent-stop', {'ids':hashString})
 
 		# Make sure the call worked
-		*_, transmissionResponseCode = self.__parseTransmissionResponse(commandJson)
+		*_, transmissionResponseCode = self.__parseTransmissionResponse(request)
 
 		if transmissionResponseCode == Responses.success:
 			self.logger.debug('Stop Succeeded')
@@ -500,23 +544,10 @@ class Client(object):
 		if hashString is None:
 			return False
 
-		# Method
-		commandJson = '{"method":"torrent-start",'
-
-		# Arguments
-		commandJson += '"arguments":{'
-
-		# Ids
-		commandJson += '"ids":"{0}"'.format(hashString)
-
-		# Close Arguments
-		commandJson += '},'
-
-		# Tag (not strictly needed)
-		commandJson += '"tag":{0}'.format(next(self.tagGenerator))+'}'
+		request = self.__newRequest('torrent-start', {'ids':hashString})
 
 		# Make sure the call worked
-		response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(commandJson)
+		response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(request)
 
 		if transmissionResponseCode == Responses.success:
 			self.logger.debug('Start Succeeded')
@@ -526,19 +557,6 @@ class Client(object):
 			return False
 
 
-	def removeBadTorrent(self, hashString=None, reason='No Reason Given'):
-		'''
-		Removes a torrent from both transmission and the database
-		this should be called when there is a bad torrent.
-
-		Takes:
-			hashString - Hash of the specific torrent to remove
-		'''
-
-		# Remove the torrent from the client
-		self.removeTorrent(hashString=hashString, deleteData=True, reason=reason)
-
-
 	def removeTorrent(self, hashString=None, deleteData=False, reason='No Reason Given'):
 		'''
 		Removes a torrent from transmission
@@ -559,26 +577,13 @@ class Client(object):
 		if hashString is None:
 			return False
 
-		# Method
-		commandJson = '{"method":"torrent-remove",'
-
-		# Arguments
-		commandJson += '"arguments":{'
-
-		# Ids
-		commandJson += '"ids":"{0}",'.format(hashString)
-
-		# Delete Option
-		commandJson += '"delete-local-data":{0}'.format(str(deleteData).lower())
-
-		# Close Arguments
-		commandJson += '},'
-
-		# Tag (not strictly needed)
-		commandJson += '"tag":{0}'.format(next(self.tagGenerator))+'}'
+		request = self.__newRequest('torrent-remove', {
+			'ids':hashString,
+			'delete-local-data':bool(deleteData)
+		})
 
 		# Make sure the call worked
-		response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(commandJson)
+		response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(request)
 
 
 		if deleteData:
@@ -598,29 +603,16 @@ class Client(object):
 		'''
 		Attempts to remove extra trackers from torrents that can cause automation issues.
 		'''
-		# Method
-		commandJson = '{"method":"torrent-set",'
-
-		# Arguments
-		commandJson += '"arguments":{'
-
-		# Tracker remove
-		commandJson += '"trackerRemove":[1],'
-
-		# Torrent Id
-		commandJson += '"ids":"{0}"'.format(hashString)
-
-		# Close Arguments
-		commandJson += '},'
-
-		# Tag (not strictly needed)
-		commandJson += '"tag":{0}'.format(next(self.tagGenerator))+'}'
+		request = self.__newRequest('torrent-set', {
+			'trackerRemove':[1],
+			'ids':hashString
+		})
 
 		self.logger.debug('Trying to remove extra trackers')
 		while (True):
 
 		# Remove a tracker
-			response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(commandJson)
+			response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(request)
 
 			# If the call did not work then we are down to
 			# the last tracker so break out of the loop
@@ -654,27 +646,16 @@ class Client(object):
 
 		self.logger.debug('Trying to add a new torrent:\n{0}'.format(url))
 
-		# Method
-		commandJson = '{"method":"torrent-add",'
-
-		# Arguments
-		commandJson += '"arguments":{'
+		arguments = {'filename':url}
 
 		# Download Dir
 		if destination is not None:
-			commandJson += '"download-dir":"{0}",'.format(destination)
-
-		# Filename
-		commandJson += '"filename":"{0}"'.format(url)
+			arguments['download-dir'] = destination
 
-		# Close Arguments
-		commandJson += '},'
-
-		# Tag (not strictly needed)
-		commandJson += '"tag":{0}'.format(next(self.tagGenerator))+'}'
+		request = self.__newRequest('torrent-add', arguments)
 
 		# Make sure the call worked
-		response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(commandJson)
+		response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(request)
 
 		if httpResponseCode != 200:
 			self.logger.info('Torrent Add Failed: {0}'.format(httpResponseCode))
@@ -730,112 +711,6 @@ class Client(object):
 				return (4, 'Unknown Error/Failed')
 
 
-	def getSlowestSeeds(self, num=None):
-		'''
-		Look for the slowest seeding torrents, slowest first
-
-		Takes:
-			num - Int, the number of torrent objects to return
-		'''
-		slowestSeeds = []
-
-		torrents = self.getFinishedSeeding()
-
-		for torrent in torrents:
-			if torrent.isSeeding():
-				slowestSeeds.append(torrent)
-
-		# Sort torrents if we have any
-		if len(slowestSeeds) > 0:
-			slowestSeeds.sort(key=lambda torrent: torrent['rateUpload'])
-
-		if len(slowestSeeds) == 0 or num is None:
-			return slowestSeeds
-		return slowestSeeds[:num]
-
-
-	def getDormantSeeds(self, num=None):
-		'''
-		Looks for a seeding torrent with the longest time since active, returns
-		torrents, oldest first
-		'''
-		dormantSeeds = []
-
-
-		torrents = self.getFinishedSeeding()
-
-		for torrent in torrents:
-			if torrent.isDormant():
-				dormantSeeds.append(torrent)
-
-		# Sort torrents if we have any
-		if len(dormantSeeds) > 0:
-			dormantSeeds.sort(key=lambda torrent: torrent['activityDate'])
-
-		if len(dormantSeeds) == 0 or num is None:
-			return dormantSeeds
-		return dormantSeeds[:num]
-
-
-	def getDownloading(self, num=None):
-		'''
-		Returns a list of torrents that are downloading
-
-		Takes:
-			num - Int, the number of torrents to return
-		'''
-		downloadingTorrents = []
-
-		torrents = self.elements['queue']
-
-		for torrent in torrents:
-			if torrent.isDownloading():
-				downloadingTorrents.append(torrent)
-
-		if len(downloadingTorrents) == 0 or num is None:
-			return downloadingTorrents
-		return downloadingTorrents[:num]
-
-
-	def getSeeding(self, num=None):
-		'''
-		Returns a list of torrents that are Seeding
-
-		Takes:
-			num - Int, the number of torrents to return
-		'''
-		seedingTorrents = []
-
-		torrents = self.elements['queue']
-
-		for torrent in torrents:
-			if torrent.isSeeding():
-				seedingTorrents.append(torrent)
-
-		if len(seedingTorrents) == 0 or num is None:
-			return seedingTorrents
-		return seedingTorrents[:num]
-
-
-	def getFinishedSeeding(self, num=None):
-		'''
-		Returns a list of torrents that are finished seeding
-
-		Takes:
-			num - Int, the number of torrents to return
-		'''
-		torrents = self.getSeeding()
-		finishedSeeding = []
-
-		for torrent in torrents:
-			if torrent.isFinished():
-				finishedSeeding.append(torrent)
-
-		if len(finishedSeeding) == 0 or num is None:
-			return finishedSeeding
-		return finishedSeeding[:num]
-
-
 	def setAltSpeed(self, enabled=False):
 		'''
 		Enables/Disables the altSpeed setting in transmission
@@ -847,23 +722,10 @@ class Client(object):
 			bool, True if action completed
 		'''
 
-		# Method
-		commandJson = '{"method":"session-set",'
-
-		# Arguments
-		commandJson += '"arguments":{'
-
-		# Ids
-		commandJson += '"alt-speed-time-enabled":{0}'.format(str(enabled).lower())
-
-		# Close Arguments
-		commandJson += '"},'
-
-		# Tag (not strictly needed)
-		commandJson += '"tag":{0}'.format(next(self.tagGenerator))+'}'
+		request = self.__newRequest('session-set', {'alt-speed-time-enabled':bool(enabled)})
 
 		# Make sure the call worked
-		response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(commandJson)
+		response, httpResponseCode, transmissionResponseCode = self.__parseTransmissionResponse(request)
 
 		return bool(transmissionResponseCode == Responses.success)
 
@@ -1,14 +1,15 @@
 #-------------------------------------------------------------------------------
 # Name:		torrentclients
-# Purpose:	This should be a generic torrent client that other clients
-#			can and should extend from in order to keep certain things sane.
+# Purpose:	Routes calls to one or more torrent client backends. With several
+#			clients configured the queues are polled concurrently, the
+#			views are aggregated and new torrents are sharded by load.
 #
-# TODO:     Build a base class that other torrent clients can use.
 #-------------------------------------------------------------------------------
 # -*- coding: utf-8 -*-
 
 # System Includes
 import re, json, time
+from concurrent.futures import ThreadPoolExecutor
 
 
 # Third party modules
@@ -24,19 +25,33 @@ from flannelfox.torrentclients.Torrent import Status as TorrentStatus
 from flannelfox.torrentclients.Torrent import Torrent
 from flannelfox.databases import Databases
 from flannelfox.torrentclients import Transmission
+from flannelfox.torrentclients import RTorrent
+from flannelfox.torrentclients import Generic
 from flannelfox.torrentclients import Trackers
+from flannelfox.ostools import UsedSpace
+
+from flannelfox import metrics
 
 # Setup the logging agent
 from flannelfox import logging
 
 class TorrentClient():
 	'''
-	This should be a generic class that torrent clients can extend from and use as a roadmap
-	all the functions in here need to be defined in the client module in order for it to work
-
-	TODO: instantiate a class of the given client type based on the config setup. We will
-		  also need to return it when this is instantiated.
-
+	Routes calls to the configured torrent client backends, see
+	Generic.Client for what a backend has to provide.
+
+	A single backend is configured with settings['client'], several with a
+	list in settings['clients']. When there is more than one backend:
+		- updateQueue polls every backend at the same time
+		- the queue views (getQueue, getSeeding, ...) cover all backends
+		- calls for a torrent go to the backend that holds it
+		- new torrents go to the backend picked by
+		  settings['queueManagement']['shardingPolicy']:
+			fewestTorrents - the backend with the fewest torrents
+			leastUsedSpace - the backend whose maxUsedSpaceDir is the smallest
+			feedDestination - a backend that lists the destination in its
+				'destinations' setting or already holds torrents there,
+				otherwise fewestTorrents
 	'''
 
 	logger = logging.getLogger(__name__)
@@ -45,23 +60,191 @@ class TorrentClient():
 	database = None
 	defaultDatabaseType = settings['database']['defaultDatabaseEngine']
 
+	# Backend classes by client type
+	BACKENDS = {
+		'transmission': Transmission.Client,
+		'rtorrent': RTorrent.Client
+	}
+
+	SHARDING_POLICIES = ('fewestTorrents', 'leastUsedSpace', 'feedDestination')
+
 	client = None
+	clients = None
 
-	def __init__(self):
+	def __init__(self, database=None):
+		'''
+		Takes:
+			database - Databases to use, a new one is made when there is none
+		'''
 
 		# Setup the database object
-		self.database = Databases(
+		self.database = database or Databases(
 			dbType = self.defaultDatabaseType
 		)
 
-		self.logger.info('TransmissionClient INIT')
+		self.logger.info('TorrentClient INIT')
+
+		self.clients = []
+
+		for clientSettings in self.__getClientSettings():
+
+			backend = self.BACKENDS.get(clientSettings.get('type', None), None)
+
+			if backend is None:
+				self.logger.info('TorrentClient Not Defined')
+				raise ValueError('Torrent client type not defined!')
+
+			self.logger.debug('TorrentClient Setup: {0}'.format(clientSettings.get('name', clientSettings['type'])))
+			self.clients.append(backend(clientSettings=clientSettings))
+
+		# The first backend takes calls for torrents that have not been seen yet
+		self.client = self.clients[0]
+
+		self.shardingPolicy = settings['queueManagement'].get('shardingPolicy', 'fewestTorrents')
+
+		if self.shardingPolicy not in self.SHARDING_POLICIES:
+			self.logger.warning('Unknown shardingPolicy {0}, using fewestTorrents'.format(self.shardingPolicy))
+			self.shardingPolicy = 'fewestTorrents'
+
+		# hashString -> backend that holds the torrent
+		self.owners = {}
+
+		# url -> hashString of the torrents added through this client
+		self.hashes = {}
+
+		# Torrents added to each backend since its queue was last read
+		self.pendingAdds = [0] * len(self.clients)
+
+		# Space used by each backend, measured once after its queue was read
+		self.usedSpace = None
+
+		if len(self.clients) > 1:
+			self.view = Generic.Client()
+		else:
+			self.view = self.client
+
+
+	def __getClientSettings(self):
+		'''
+		Returns:
+			List [clientSettings], one for each configured backend
+		'''
+		clients = settings.get('clients', None)
+
+		if clients:
+			return clients
+
+		return [settings['client']]
+
+
+	@classmethod
+	def __getClientName(self, client):
+		return client.elements.get('name', client.elements.get('type'))
+
+
+	def __pollClient(self, client):
+		'''
+		Updates the queue of a single backend, errors are returned instead of
+		raised so one unreachable backend does not stop the others
+		'''
+		try:
+			return client.updateQueue()
+
+		except Exception as e:
+			self.logger.error('Could not update the queue of {0}: {1}'.format(
+				self.__getClientName(client),
+				e
+			))
+			return (str(e), -1)
+
+
+	def __getClient(self, hashString=None):
+		'''
+		Returns:
+			The backend holding the torrent, or the first backend if the
+			torrent is not known
+		'''
+		return self.owners.get(hashString, self.client)
+
+
+	def __getLoad(self, idx):
+		return len(self.clients[idx].getQueue()) + self.pendingAdds[idx]
+
 
-		if settings['client']['type'] == 'transmission':
-			self.logger.debug('TorrentClient Setup')
-			self.client = Transmission.Client()
+	def __getUsedSpace(self):
+		'''
+		Returns:
+			List of the space each backend uses, measured once after each
+			updateQueue. The adds since then are counted at the average size
+			of the torrents the backends hold.
+		'''
+		if self.usedSpace is None:
+			self.usedSpace = [
+				UsedSpace.check(client.elements.get('maxUsedSpaceDir', settings['files']['maxUsedSpaceDir']), 'G')
+				for client in self.clients
+			]
+
+		torrents = sum(len(client.getQueue()) for client in self.clients)
+
+		if torrents > 0:
+			averageSize = sum(self.usedSpace) / float(torrents)
 		else:
-			self.logger.info('TorrentClient Not Defined')
-			raise ValueError('Torrent client type not defined!')
+			averageSize = 0
+
+		return [used + pending * averageSize for used, pending in zip(self.usedSpace, self.pendingAdds)]
+
+
+	def __pickClient(self, destination=None, url=None):
+		'''
+		Picks the backend a new torrent should be added to, a torrent that
+		one of the backends already holds goes back to it
+
+		Takes:
+			destination - Where the torrent will be saved
+			url - Url of the torrent
+
+		Returns:
+			Int, index of the backend in self.clients
+		'''
+		holder = self.owners.get(self.hashes.get(url, None), None)
+
+		if holder is not None:
+			return self.clients.index(holder)
+
+		candidates = list(range(len(self.clients)))
+
+		if len(candidates) == 1:
+			return 0
+
+		if self.shardingPolicy == 'feedDestination' and destination is not None:
+
+			# Prefer backends configured for the destination
+			configured = [
+				idx for idx in candidates
+				if any(destination.startswith(d) for d in self.clients[idx].elements.get('destinations', []))
+			]
+
+			if len(configured) > 0:
+				candidates = configured
+
+			else:
+				# Then backends already holding torrents for it
+				held = {}
+				for idx in candidates:
+					count = sum(1 for torrent in self.clients[idx].getQueue() if torrent['downloadDir'] == destination)
+					if count > 0:
+						held[idx] = count
+
+				if len(held) > 0:
+					return max(held, key=lambda idx: (held[idx], -self.__getLoad(idx)))
+
+		elif self.shardingPolicy == 'leastUsedSpace':
+
+			usedSpace = self.__getUsedSpace()
+
+			return min(candidates, key=lambda idx: (usedSpace[idx], self.__getLoad(idx)))
+
+		return min(candidates, key=self.__getLoad)
 
 
 	def __updateHashString(self, data=None, where=None):
@@ -85,9 +268,38 @@ class TorrentClient():
 		Updates the class variable queue with the latest torrent queue info
 
 		Returns:
-			Tuple (transmissionResponseCode, httpResponseCode)
+			Tuple (transmissionResponseCode, httpResponseCode), with several
+			backends the first failure is returned if there was one
 		'''
-		return self.client.updateQueue()
+		if len(self.clients) == 1:
+			results = [self.client.updateQueue()]
+		else:
+			with ThreadPoolExecutor(max_workers=len(self.clients)) as pollers:
+				results = list(pollers.map(self.__pollClient, self.clients))
+
+		owners = {}
+		queue = []
+
+		for client in self.clients:
+			for torrent in client.getQueue():
+				owners[torrent['hashString']] = client
+				queue.append(torrent)
+
+		self.owners = owners
+
+		# Torrents that are gone from every backend may go anywhere again
+		self.hashes = dict((url, hashString) for url, hashString in self.hashes.items() if hashString in owners)
+		self.pendingAdds = [0] * len(self.clients)
+		self.usedSpace = None
+
+		if len(self.clients) > 1:
+			self.view = Generic.Client(queue)
+
+		for result in results:
+			if result[0] not in (Transmission.Responses.success, RTorrent.Responses.success):
+				return result
+
+		return results[0]
 
 
 	def getQueue(self):
@@ -95,7 +307,7 @@ class TorrentClient():
 		Returns:
 			List [torrents]
 		'''
-		return self.client.getQueue()
+		return self.view.getQueue()
 
 
 	def verifyTorrent(self,hashString=None):
@@ -108,7 +320,7 @@ class TorrentClient():
 		Returns:
 			bool True is action completed
 		'''
-		return self.client.verifyTorrent(hashString=hashString)
+		return self.__getClient(hashString).verifyTorrent(hashString=hashString)
 
 
 	def stopTorrent(self,hashString=None):
@@ -121,7 +333,7 @@ class TorrentClient():
 		Returns:
 			bool True is action completed
 		'''
-		return self.client.stopTorrent(hashString=hashString)
+		return self.__getClient(hashString).stopTorrent(hashString=hashString)
 
 
 	def startTorrent(self, hashString=None):
@@ -134,7 +346,7 @@ class TorrentClient():
 		Returns:
 			bool True is action completed
 		'''
-		return self.client.startTorrent(hashString=hashString)
+		return self.__getClient(hashString).startTorrent(hashString=hashString)
 
 
 	def removeBadTorrent(self, hashString=None, reason='No Reason Given'):
@@ -147,7 +359,7 @@ class TorrentClient():
 		'''
 
 		# Remove the torrent from the client
-		self.client.removeTorrent(hashString=hashString, deleteData=True, reason=reason)
+		self.__getClient(hashString).removeTorrent(hashString=hashString, deleteData=True, reason=reason)
 
 		# Remove the torrent from the DB
 		self.database.deleteTorrent(hashString=hashString, reason=reason)
@@ -193,7 +405,10 @@ class TorrentClient():
 		Returns:
 			bool True is action completed
 		'''
-		return self.client.removeTorrent(hashString=hashString, deleteData=deleteData, reason=reason)
+		client = self.__getClient(hashString)
+		metrics.inc('queue_removes', client=self.__getClientName(client), deleteData=deleteData)
+
+		return client.removeTorrent(hashString=hashString, deleteData=deleteData, reason=reason)
 
 
 	def deleteTorrent(self, hashString=None, reason='No Reason Given'):
@@ -212,7 +427,10 @@ class TorrentClient():
 
 		# Logging is skipped here and put into the removeTorrent function to prevent
 		# duplicate logging
-		return self.client.removeTorrent(hashString=hashString, deleteData=True, reason=reason)
+		client = self.__getClient(hashString)
+		metrics.inc('queue_removes', client=self.__getClientName(client), deleteData=True)
+
+		return client.removeTorrent(hashString=hashString, deleteData=True, reason=reason)
 
 
 	def addTorrentURL(self, url=None, destination=settings['files']['defaultTorrentLocation']):
@@ -228,14 +446,21 @@ class TorrentClient():
 			bool True is action completed successfully
 		'''
 		self.logger.info('TorrentClient adding torrent1')
-		result, response = self.client.addTorrentURL(url=url, destination=destination)
-		self.logger.info('T {0}'.format(result))
-		self.logger.info('T {0}'.format(response))
+		idx = self.__pickClient(destination, url)
+		result, response = self.clients[idx].addTorrentURL(url=url, destination=destination)
+		metrics.inc('queue_adds', client=self.__getClientName(self.clients[idx]), result=result)
+		self.logger.info(logging.lazy('TorrentClient responded with ({0}, {1})', result, response))
 
-		self.logger.info('TorrentClient responded with ({0}, {1})'.format(result, response))
+		if result in (0, 1):
+
+			# A duplicate is removed from the backend that reported it
+			self.owners[response] = self.clients[idx]
+			self.hashes[url] = response
 
 		if result == 0:
 
+			self.pendingAdds[idx] += 1
+
 			# Get Current Time
 			sinceEpoch = int(time.time())
 
@@ -277,7 +502,7 @@ class TorrentClient():
 		Takes:
 			num - Int, the number of torrent objects to return
 		'''
-		return self.client.getSlowestSeeds(num=num)
+		return self.view.getSlowestSeeds(num=num)
 
 
 	def getDormantSeeds(self, num=None):
@@ -285,7 +510,7 @@ class TorrentClient():
 		Looks for a seeding torrent with the longest time since active, returns
 		torrents, oldest first
 		'''
-		return self.client.getDormantSeeds(num=num)
+		return self.view.getDormantSeeds(num=num)
 
 
 	def getDownloading(self, num=None):
@@ -295,7 +520,7 @@ class TorrentClient():
 		Takes:
 			num - Int, the number of torrents to return
 		'''
-		return self.client.getDownloading(num=num)
+		return self.view.getDownloading(num=num)
 
 
 	def getSeeding(self, num=None):
@@ -305,7 +530,7 @@ class TorrentClient():
 		Takes:
 			num - Int, the number of torrents to return
 		'''
-		return self.client.getSeeding(num=num)
+		return self.view.getSeeding(num=num)
 
 
 	def getFinishedSeeding(self, num=None):
@@ -315,16 +540,16 @@ class TorrentClient():
 		Takes:
 			num - Int, the number of torrents to return
 		'''
-		return self.client.getFinishedSeeding(num=num)
+		return self.view.getFinishedSeeding(num=num)
 
 
 	def restart(self):
-		return self.client.restart()
+		return all([client.restart() for client in self.clients])
 
 
 	def start(self):
-		return self.client.start()
+		return all([client.start() for client in self.clients])
 
 
 	def stop(self):
-		return self.client.stop()
+		return all([client.stop() for client in self.clients])
@@ -5,120 +5,247 @@ Borrowed from https://github.com/rakshasa/rtorrent-vagrant/blob/master/scripts/x
 Allows our script to directly communicate with the rtorrent socket instead
 of needing a webserver.
 
+The connection is kept open between calls when the server allows it and
+replies are read into a single reusable buffer, so large d.multicall2
+replies are not rebuilt from many small recv() chunks.
+
 EX.
 xmlrpc2scgi.py -p scgi:///home/deerocket/.config/rtorrent/socket system.listMethods
 '''
 
 
-import sys, cStringIO as StringIO
-import xmlrpclib, urllib, urlparse, socket
+import sys, socket
+import xmlrpc.client
+from urllib.parse import urlsplit, uses_netloc
 
-from urlparse import uses_netloc
 uses_netloc.append('scgi')
 
+# Initial size of the receive buffer, it grows when a reply does not fit
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
 def do_scgi_xmlrpc_request(host, methodname, params=()):
-	xmlreq = xmlrpclib.dumps(params, methodname)
+	xmlreq = xmlrpc.client.dumps(params, methodname)
 	xmlresp = SCGIRequest(host).send(xmlreq)
 	return xmlresp
 
 def do_scgi_xmlrpc_request_py(host, methodname, params=()):
 	xmlresp = do_scgi_xmlrpc_request(host, methodname, params)
-	return xmlrpclib.loads(xmlresp)[0][0]
+	return xmlrpc.client.loads(xmlresp)[0][0]
 
-class SCGIRequest(object):
 
-	def __init__(self, url):
-		self.url=url
-		self.resp_headers=[]
+class SCGIConnection(object):
+	'''
+	A reusable connection to an SCGI server (unix socket or tcp)
+	'''
+
+	def __init__(self, url, bufferSize=DEFAULT_BUFFER_SIZE, timeout=60):
+		self.url = url
+		self.timeout = timeout
+		self.sock = None
+		self.buffer = bytearray(bufferSize)
+		self.resp_headers = []
 
-	def __send(self, scgireq):
-		scheme, netloc, path, query, frag = urlparse.urlsplit(self.url)
-		host, port = urllib.splitport(netloc)
+		scheme, netloc, path, query, frag = urlsplit(url)
 
 		if netloc:
-			addrinfo = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)
-			assert len(addrinfo) == 1, "There's more than one? %r"%addrinfo
-			sock = socket.socket(*addrinfo[0][:3])
-			sock.connect(addrinfo[0][4])
+			host, _, port = netloc.partition(':')
+			addrinfo = socket.getaddrinfo(host, int(port or 5000), socket.AF_INET, socket.SOCK_STREAM)
+			self.family, self.socktype, self.proto = addrinfo[0][:3]
+			self.address = addrinfo[0][4]
 		else:
-			sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-			sock.connect(path)
-		sock.send(scgireq)
-		recvdata = resp = sock.recv(1024)
-
-		while recvdata != '':
-			recvdata = sock.recv(1024)
-			resp += recvdata
-		sock.close()
-		return resp
+			self.family, self.socktype, self.proto = socket.AF_UNIX, socket.SOCK_STREAM, 0
+			self.address = path
+
+
+	def connect(self):
+		self.close()
+		self.sock = socket.socket(self.family, self.socktype, self.proto)
+		self.sock.settimeout(self.timeout)
+		self.sock.connect(self.address)
+
+
+	def close(self):
+		if self.sock is not None:
+			try:
+				self.sock.close()
+			except OSError:
+				pass
+		self.sock = None
+
+
+	def __receive(self):
+		'''
+		Reads a whole scgi reply into the buffer
+
+		Returns (bodyStart, bodyEnd, serverClosed), or None when the server
+		closed the connection before sending anything
+		'''
+		received = 0
+		headerEnd = -1
+		contentLength = None
+		serverClosed = False
+
+		while True:
+
+			# Grow the buffer when a reply does not fit
+			if received == len(self.buffer):
+				self.buffer.extend(bytes(len(self.buffer)))
+
+			with memoryview(self.buffer) as view:
+				count = self.sock.recv_into(view[received:])
+
+			if count == 0:
+				serverClosed = True
+				break
+
+			received += count
+
+			if headerEnd < 0:
+				headerEnd = self.buffer.find(b'\r\n\r\n', 0, received)
+
+				if headerEnd >= 0:
+					self.resp_headers = []
+					for line in bytes(self.buffer[:headerEnd]).decode('latin-1').split('\r\n'):
+						name, _, val = line.partition(':')
+						self.resp_headers.append([name.strip(), val.strip()])
+
+						if name.strip().lower() == 'content-length':
+							contentLength = int(val.strip())
+
+			if contentLength is not None and received >= headerEnd + 4 + contentLength:
+				break
+
+		if received == 0:
+			return None
+
+		if headerEnd < 0:
+			raise ValueError('Invalid scgi reply, no headers were found')
+
+		bodyStart = headerEnd + 4
+
+		if contentLength is None:
+			return (bodyStart, received, serverClosed)
+
+		return (bodyStart, bodyStart + contentLength, serverClosed)
+
+
+	def request(self, data):
+		'''
+		Send data over scgi and return the reply body
+
+		The returned memoryview points into the receive buffer and is only
+		valid until the next request on this connection
+		'''
+		if isinstance(data, str):
+			data = data.encode('utf-8')
+
+		scgireq = SCGIRequest.add_required_scgi_headers(data)
+
+		for attempt in range(2):
+
+			reused = self.sock is not None
+
+			if not reused:
+				self.connect()
+
+			try:
+				self.sock.sendall(scgireq)
+				reply = self.__receive()
+
+			except (BrokenPipeError, ConnectionResetError):
+				reply = None
+
+			# The server closed the kept-alive connection, try once more on
+			# a fresh one
+			if reply is None:
+				self.close()
+				if reused:
+					continue
+				raise ConnectionError('The scgi server closed the connection without replying')
+
+			bodyStart, bodyEnd, serverClosed = reply
+
+			if serverClosed:
+				self.close()
+
+			return memoryview(self.buffer)[bodyStart:bodyEnd]
+
+		raise ConnectionError('The scgi server closed the connection without replying')
+
+
+class SCGIRequest(object):
+
+	def __init__(self, url):
+		self.url=url
+		self.resp_headers=[]
 
 	def send(self, data):
 		"Send data over scgi to url and get response"
-		scgiresp = self.__send(self.add_required_scgi_headers(data))
-		resp, self.resp_headers = self.get_scgi_resp(scgiresp)
+		connection = SCGIConnection(self.url)
+		try:
+			resp = bytes(connection.request(data))
+			self.resp_headers = connection.resp_headers
+		finally:
+			connection.close()
 		return resp
 
 	@staticmethod
 	def encode_netstring(string):
 		"Encode string as netstring"
-		return '%d:%s,'%(len(string), string)
+		return b'%d:%s,'%(len(string), string)
 
 	@staticmethod
 	def make_headers(headers):
 		"Make scgi header list"
-		return '\x00'.join(['%s\x00%s'%t for t in headers])+'\x00'
+		return b'\x00'.join([b'%s\x00%s'%t for t in headers])+b'\x00'
 
 	@staticmethod
 	def add_required_scgi_headers(data, headers=[]):
 		"Wrap data in an scgi request,\nsee spec at: http://python.ca/scgi/protocol.txt"
-		headers = SCGIRequest.make_headers([('CONTENT_LENGTH', str(len(data))),('SCGI', '1'),] + headers)
+		headers = SCGIRequest.make_headers([(b'CONTENT_LENGTH', str(len(data)).encode('ascii')),(b'SCGI', b'1'),] + headers)
 		enc_headers = SCGIRequest.encode_netstring(headers)
 		return enc_headers+data
 
-	@staticmethod
-	def gen_headers(file):
-		"Get header lines from scgi response"
-		line = file.readline().rstrip()
-
-		while line.strip():
-			yield line
-			line = file.readline().rstrip()
 
-	@staticmethod
-	def get_scgi_resp(resp):
-		"Get xmlrpc response from scgi response"
-		fresp = StringIO.StringIO(resp)
-		headers = []
+class RTorrentXMLRPCClient(object):
+	'''
+	Calls rtorrent xmlrpc methods over a shared scgi connection
 
-		for line in SCGIRequest.gen_headers(fresp):
-			headers.append(line.split(': ', 1))
+	EX.
+	client = RTorrentXMLRPCClient('scgi:///home/user/.rtorrent/socket')
+	client.d.multicall2('', 'main', 'd.hash=')
+	'''
 
-		xmlresp = fresp.read()
-		return (xmlresp, headers)
+	def __init__(self, url, methodname='', connection=None):
+		scheme, netloc, path, query, frag = urlsplit(url)
 
-class RTorrentXMLRPCClient(object):
+		if scheme != 'scgi':
+			raise ValueError('Unsupported protocol')
 
-	def __init__(self, url, methodname=''):
 		self.url = url
 		self.methodname = methodname
+		self.connection = connection or SCGIConnection(url)
 
 	def __call__(self, *args):
-		scheme, netloc, path, query, frag = urlparse.urlsplit(self.url)
-		xmlreq = xmlrpclib.dumps(args, self.methodname)
-
-		if scheme == 'scgi':
-			xmlresp = SCGIRequest(self.url).send(xmlreq)
-			return xmlrpclib.loads(xmlresp)[0][0]
-		elif scheme == 'http':
-			raise Exception('Unsupported protocol')
-		elif scheme == '':
-			raise Exception('Unsupported protocol')
-		else:
-			raise Exception('Unsupported protocol')
+		xmlreq = xmlrpc.client.dumps(args, self.methodname, allow_none=True)
+		xmlresp = self.connection.request(xmlreq)
+
+		parser, unmarshaller = xmlrpc.client.getparser(use_builtin_types=True)
+		try:
+			parser.feed(xmlresp)
+			parser.close()
+		finally:
+			xmlresp.release()
+
+		return unmarshaller.close()[0]
 
 	def __getattr__(self, attr):
 		methodname = self.methodname and '.'.join([self.methodname,attr]) or attr
-		return RTorrentXMLRPCClient(self.url, methodname)
+		return RTorrentXMLRPCClient(self.url, methodname, self.connection)
+
+	def close(self):
+		self.connection.close()
 
 def convert_params_to_native(params):
 	"Parse xmlrpc-c command line arg syntax"
@@ -142,31 +269,33 @@ def convert_params_to_native(params):
 	return tuple(cparams)
 
 def print_script(response):
-        for line in response:
-                print " ".join(map(str, line))
+	for line in response:
+		print(" ".join(map(str, line)))
 
 def main(argv):
-        if len(argv) < 1:
-                print "No arguments."
-                raise SystemExit, -1
+	output_arg = None
+
+	if len(argv) < 1:
+		print("No arguments.")
+		raise SystemExit(-1)
 
-        if len(argv[0]) and argv[0][0] == '-':
-                output_arg = argv[0]
-	        argv.pop(0)
+	if len(argv[0]) and argv[0][0] == '-':
+		output_arg = argv[0]
+		argv.pop(0)
 
-        if len(argv) < 2:
-                print "Too few arguments."
-                raise SystemExit, -1
+	if len(argv) < 2:
+		print("Too few arguments.")
+		raise SystemExit(-1)
 
 	host, methodname = argv[:2]
 	respxml = do_scgi_xmlrpc_request(host, methodname, convert_params_to_native(argv[2:]))
 
 	if output_arg == '-p':
-		print xmlrpclib.loads(respxml)[0][0]
+		print(xmlrpc.client.loads(respxml)[0][0])
 	elif output_arg == '-s':
-		print_script(xmlrpclib.loads(respxml)[0][0])
+		print_script(xmlrpc.client.loads(respxml)[0][0])
 	else:
-		print respxml
+		print(respxml.decode('utf-8'))
 
 if __name__ == "__main__":
 	main(sys.argv[1:])
@@ -0,0 +1,279 @@
+#-------------------------------------------------------------------------------
+# Name:		Filters.py
+# Purpose:	A feedFilters list that keeps an index of its rule lists so a
+#			torrent is only checked against the rule lists it could match,
+#			and that can be updated with just the entries that changed.
+#-------------------------------------------------------------------------------
+# -*- coding: utf-8 -*-
+
+from flannelfox import logging
+
+
+class FilterList(list):
+	'''
+	A list of rule lists (the feedFilters of a majorFeed) that indexes every
+	rule list requiring an exact match on one of INDEXED_KEYS. Torrents are
+	only compared against the rule lists indexed under their own value plus
+	the rule lists that could not be indexed.
+
+	Rule lists are grouped under a tag (the watchlist entry they were built
+	for) so an entry that leaves a watchlist can be removed without
+	rebuilding the rest. Use add/removeTag to change the list, plain list
+	methods are not indexed.
+	'''
+
+	# Keys that only match when the torrent value is exactly equal
+	INDEXED_KEYS = ('title', 'artist')
+
+	def __init__(self, *args):
+		list.__init__(self, *args)
+
+		# Bumped every time the rule lists change
+		self.version = 0
+
+		self.reindex()
+
+
+	def reindex(self):
+		'''
+		Rebuilds the index from scratch, tags are kept
+		'''
+		self.index = dict((key, {}) for key in self.INDEXED_KEYS)
+		self.unindexed = []
+
+		if not hasattr(self, 'tags'):
+			self.tags = {}
+
+		for ruleList in self:
+			self.__indexRuleList(ruleList)
+
+		self.indexed = len(self)
+		self.version += 1
+
+
+	def __getIndexKey(self, ruleList):
+		for rule in ruleList:
+			if rule['key'] in self.INDEXED_KEYS and not rule['exclude']:
+				return (rule['key'], rule['val'])
+		return None
+
+
+	def __indexRuleList(self, ruleList):
+		indexKey = self.__getIndexKey(ruleList)
+
+		if indexKey is None:
+			self.unindexed.append(ruleList)
+		else:
+			self.index[indexKey[0]].setdefault(indexKey[1], []).append(ruleList)
+
+
+	def __unindexRuleList(self, ruleList):
+		indexKey = self.__getIndexKey(ruleList)
+
+		if indexKey is None:
+			bucket = self.unindexed
+		else:
+			bucket = self.index[indexKey[0]].get(indexKey[1], [])
+
+		for idx, indexed in enumerate(bucket):
+			if indexed is ruleList:
+				del bucket[idx]
+				break
+
+		if indexKey is not None and len(bucket) == 0:
+			self.index[indexKey[0]].pop(indexKey[1], None)
+
+
+	def add(self, ruleList, tag=None):
+		'''
+		Appends a rule list and indexes it
+
+		Takes:
+			ruleList - List of rules
+			tag - The watchlist entry the rule list belongs to
+		'''
+		self.append(ruleList)
+		self.__indexRuleList(ruleList)
+		self.indexed += 1
+		self.version += 1
+
+		if tag is not None:
+			self.tags.setdefault(tag, []).append(ruleList)
+
+
+	def removeTag(self, tag):
+		'''
+		Removes every rule list added under tag
+
+		Returns:
+			Int, the number of rule lists removed
+		'''
+		ruleLists = self.tags.pop(tag, [])
+
+		for ruleList in ruleLists:
+			for idx, current in enumerate(self):
+				if current is ruleList:
+					del self[idx]
+					break
+
+			self.__unindexRuleList(ruleList)
+			self.indexed -= 1
+			self.version += 1
+
+		return len(ruleLists)
+
+
+	def candidates(self, elements):
+		'''
+		Returns the rule lists a torrent could match
+
+		Takes:
+			elements - The properties of the torrent
+		'''
+
+		# The list was changed without going through add/removeTag
+		if self.indexed != len(self):
+			self.reindex()
+
+		candidates = list(self.unindexed)
+
+		for key in self.INDEXED_KEYS:
+			if key in elements:
+				candidates.extend(self.index[key].get(elements[key], []))
+
+		return candidates
+
+
+	def survivors(self, columns):
+		'''
+		Returns the rows of a batch of parsed titles that could match, the
+		rest can be dropped before any torrents are made for them
+
+		Takes:
+			columns - Dict of columns, see Torrents.Generic.parseTitles
+
+		Returns:
+			List of row indexes, in order
+		'''
+
+		# The list was changed without going through add/removeTag
+		if self.indexed != len(self):
+			self.reindex()
+
+		parsed = columns['parsed']
+
+		# Rule lists that are not indexed could match anything
+		if len(self.unindexed) > 0:
+			return [idx for idx, isParsed in enumerate(parsed) if isParsed]
+
+		rows = set()
+
+		for key in self.INDEXED_KEYS:
+
+			index = self.index[key]
+
+			for idx, val in enumerate(columns.get(key, ())):
+				if val is not None and val in index:
+					rows.add(idx)
+
+		return sorted(idx for idx in rows if parsed[idx])
+
+
+def updateFilterList(filterList, items, getTag, makeRuleLists):
+	'''
+	Brings a FilterList in line with a new watchlist snapshot. Only entries
+	that were added get rule lists built and only entries that were removed
+	are taken out, the rest of the list and its index are left alone.
+
+	Takes:
+		filterList - The FilterList built from the previous snapshot or None
+		items - The new watchlist snapshot
+		getTag - Callable returning a hashable key for an item
+		makeRuleLists - Callable returning the rule lists for an item
+
+	Returns:
+		Tuple (FilterList, added, removed)
+	'''
+	if filterList is None:
+		filterList = FilterList()
+
+	logger = logging.getLogger(__name__)
+
+	tagged = []
+	for item in items:
+		try:
+			tagged.append((getTag(item), item))
+
+		except (ValueError, KeyError, TypeError, AttributeError) as e:
+			logger.warning('Skipping an invalid watchlist entry: {0}'.format(e))
+			continue
+
+	newTags = set(tag for tag, item in tagged)
+	oldTags = set(filterList.tags)
+
+	removed = oldTags - newTags
+
+	for tag in removed:
+		filterList.removeTag(tag)
+
+	added = 0
+	for tag, item in tagged:
+		if tag in oldTags:
+			continue
+
+		try:
+			ruleLists = makeRuleLists(item)
+
+		except (ValueError, KeyError, TypeError, AttributeError) as e:
+			logger.warning('Skipping an invalid watchlist entry: {0}'.format(e))
+			continue
+
+		for ruleList in ruleLists:
+			filterList.add(ruleList, tag=tag)
+
+		added += 1
+
+	return (filterList, added, len(removed))
+
+
+class FilterCache(object):
+	'''
+	Keeps the FilterList of each majorFeed between cycles so a new watchlist
+	snapshot only costs the entries that changed
+	'''
+
+	def __init__(self):
+		self.logger = logging.getLogger(__name__)
+
+		# majorFeedKey -> (feedList, snapshot, FilterList)
+		self.feeds = {}
+
+
+	def get(self, majorFeedKey, feedList, snapshot, getTag, makeRuleLists):
+		'''
+		Returns the FilterList for a majorFeed built from snapshot
+
+		Takes:
+			majorFeedKey - Key of the majorFeed
+			feedList - The feed config, a changed config rebuilds everything
+			snapshot - The watchlist the rules are built from
+			getTag - Callable returning a hashable key for an entry
+			makeRuleLists - Callable returning the rule lists for an entry
+		'''
+		previous = self.feeds.get(majorFeedKey, None)
+
+		if previous is None or previous[0] != feedList:
+			filterList = None
+
+		elif previous[1] is snapshot:
+			return previous[2]
+
+		else:
+			filterList = previous[2]
+
+		filterList, added, removed = updateFilterList(filterList, snapshot, getTag, makeRuleLists)
+		self.logger.debug('{0}: {1} entries added, {2} removed'.format(majorFeedKey, added, removed))
+
+		self.feeds[majorFeedKey] = (feedList, snapshot, filterList)
+
+		return filterList
@@ -6,9 +6,12 @@
 #-------------------------------------------------------------------------------
 # -*- coding: utf-8 -*-
 
+# System Includes
+import threading
+
 # flannelfox Includes
 from flannelfox.databases import Databases
-from flannelfox.settings import settings
+from flannelfox.settings import settings, FUZZY_PROPERTIES
 
 class Queue():
 	'''
@@ -20,9 +23,17 @@ class Queue():
 	defaultDatabaseType = settings['database']['defaultDatabaseEngine']
 
 
-	def __init__(self, *args):
+	def __init__(self, *args, database=None):
+		'''
+		Takes:
+			database - Databases to use, a new one is made when there is none
+		'''
 		self.elements = list(*args)
-		self.database = Databases(
+
+		# Dedupe keys of the torrents taken out by flush, appends are still
+		# checked against them
+		self.flushed = set()
+		self.database = database or Databases(
 			dbType = self.defaultDatabaseType
 		)
 
@@ -70,7 +81,7 @@ class Queue():
 	def append(self, torrent):
 
 		# Check and see if the value already exists in elements
-		if torrent in self.elements:
+		if torrent in self.elements or getDedupeKey(torrent) in self.flushed:
 			return -1
 
 		# Check and see if the value already exists in DB
@@ -92,8 +103,25 @@ class Queue():
 				return -1
 
 
-	def writeToDB(self):
-		self.database.addTorrentsToQueue(self.elements)
+	def flush(self):
+		'''
+		Writes the torrents to the database and empties the queue, torrents
+		appended after this are still checked against the flushed ones
+
+		Returns:
+			List of the torrents written, None when the write failed. The
+			torrents of a failed write are not remembered, so they can be
+			appended again and the ones that did get written are found in
+			the database.
+		'''
+		torrents = self.elements
+		self.elements = []
+
+		if self.database.addTorrentsToQueue(torrents):
+			self.flushed.update(getDedupeKey(torrent) for torrent in torrents)
+			return torrents
+
+		return None
 
 
 	def __str__(self):
@@ -101,3 +129,117 @@ class Queue():
 		for element in self.elements:
 			out += u'{0}\n'.format(element)
 		return out
+
+
+def getDedupeKey(torrent):
+	'''
+	Returns:
+		Frozenset of the properties a torrent is compared on, two torrents
+		that are equal have the same key, see Torrents.Generic.__eq__
+	'''
+	return frozenset((key, val) for key, val in torrent.items() if key not in FUZZY_PROPERTIES)
+
+
+class Handoff():
+	'''
+	Passes the torrents rssReader queues straight to the queue reader when
+	both run in one process, see flannelfox.combineddaemon
+
+	The database is still the record of what is queued, the handoff only
+	saves the queue reader from asking it every time. It is read from the
+	database on first use and again after invalidate().
+	'''
+
+	SELECTORS = ['url', 'feedDestination', 'priority']
+
+	def __init__(self, wake=None):
+		'''
+		Takes:
+			wake - Callable, run after torrents are put
+		'''
+		self.wake = wake
+		self.lock = threading.Lock()
+		self.torrents = None
+
+
+	def __len__(self):
+		with self.lock:
+			return len(self.torrents or [])
+
+
+	def load(self, database):
+		'''
+		Reads the queued torrents from the database unless they are held
+		already
+
+		Takes:
+			database - Databases
+		'''
+		with self.lock:
+			if self.torrents is None:
+				self.torrents = database.getQueuedTorrents(selectors=self.SELECTORS)
+
+
+	def invalidate(self):
+		'''
+		Drops the held torrents so the next load reads the database
+		'''
+		with self.lock:
+			self.torrents = None
+
+
+	def put(self, torrents):
+		'''
+		Hands over torrents that were just written to the database
+
+		Takes:
+			torrents - List of torrents
+		'''
+		with self.lock:
+
+			# Until the first load the database has them
+			if self.torrents is not None:
+
+				held = set(torrent['url'] for torrent in self.torrents)
+
+				for torrent in torrents:
+					if torrent['url'] in held:
+						continue
+
+					# Stored the way the database returns them
+					feedDestination = torrent.get('feedDestination', None)
+
+					self.torrents.append({
+						'url': torrent['url'],
+						'feedDestination': '' if feedDestination is None else feedDestination,
+						'priority': torrent.get('priority', 0)
+					})
+					held.add(torrent['url'])
+
+				# Highest priority first, the sort keeps the oldest first
+				# within a priority
+				self.torrents.sort(key=lambda torrent: -torrent.get('priority', 0))
+
+		if self.wake is not None and len(torrents) > 0:
+			self.wake()
+
+
+	def get(self, num=None):
+		'''
+		Takes:
+			num - Int, the most torrents to return
+
+		Returns:
+			List of queued torrents in the order getQueuedTorrents uses
+		'''
+		with self.lock:
+			return list(self.torrents or [])[:num]
+
+
+	def remove(self, url):
+		'''
+		Forgets a torrent once the queue reader has dealt with it
+		'''
+		with self.lock:
+			if self.torrents is not None:
+				self.torrents = [torrent for torrent in self.torrents if torrent['url'] != url]
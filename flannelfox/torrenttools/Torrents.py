@@ -7,7 +7,7 @@
 # -*- coding: utf-8 -*-
 
 # System Includes
-import re, html
+import re
 
 
 # flannelfox Include
@@ -18,6 +18,9 @@ import flannelfox.scenetools.TV
 import flannelfox.scenetools.Movie
 import flannelfox.scenetools.Music
 import flannelfox.scenetools.Ebook
+from flannelfox.scenetools import Columns, Normalise
+
+from flannelfox.torrenttools import Filters
 
 
 class Generic():
@@ -27,6 +30,9 @@ class Generic():
 
 	elements = {}
 
+	# The scenetools module that parses titles of this type
+	sceneTools = None
+
 
 	def __init__(self, torrentTitle, url=None, minTime=0, minRatio=0.0, comparison='or', feedDestination=None):
 		if not isinstance(torrentTitle, str):
@@ -35,9 +41,11 @@ class Generic():
 		self.elements = {}
 
 		# Let's make sure double quotes are escaped
+		torrentTitle = torrentTitle.replace('"', '')
+
 		self.elements['torrentType'] = 'none'
-		self.elements['torrentTitle'] = torrentTitle.replace('"', '')
-		self.elements['title'] = torrentTitle.replace('"', '').lower()
+		self.elements['torrentTitle'] = torrentTitle
+		self.elements['title'] = torrentTitle.lower()
 		self.elements['minTime'] = minTime
 		self.elements['minRatio'] = minRatio
 		self.elements['comparison'] = comparison
@@ -115,6 +123,30 @@ class Generic():
 		return self.elements.values()
 
 
+	def setPriority(self, weight=0):
+		'''
+		Works out where the torrent goes in the queue, torrents with a
+		higher priority are added first
+
+		Takes:
+			weight - Int, the priority of the list the torrent came from
+
+		Returns:
+			Int, the priority
+		'''
+		priorities = settings.settings['queueManagement']['priority']
+
+		priority = int(weight)
+		priority += priorities['qualities'].get(self.elements.get('quality', None), 0)
+
+		if self.elements.get('proper', False):
+			priority += priorities['proper']
+
+		self.elements['priority'] = priority
+
+		return priority
+
+
 	def filterMatch(self, currentFilters):
 		'''
 		Checks the current torrent against the passed filters
@@ -126,6 +158,10 @@ class Generic():
 		if currentFilters is None or len(currentFilters) < 1:
 			return True
 
+		# Watchlist feeds only need the rule lists for this title/artist
+		if isinstance(currentFilters, Filters.FilterList):
+			currentFilters = currentFilters.candidates(self.elements)
+
 		for currentFilterList in currentFilters:
 
 			# Tracks if the torrent makes a complete match with one of the rule
@@ -194,19 +230,99 @@ class Generic():
 
 			# Fix title entries
 			if key == 'title':
+				val = Normalise.cleanTitle(val)
+
+			self.elements[key] = val
 
-				# Normalize and, AND, &, ...
-				val = re.sub(r'&', r'and', val, flags=re.IGNORECASE)
 
-				# Clean out HTML entities
-				val = html.unescape(val)
+	@classmethod
+	def parseTitles(self, torrentTitles):
+		'''
+		Parses many titles of this type without making torrents, the ones
+		that are needed can then be made with fromColumns
 
-				# Clean out unneeded punctuation
-				val = val.replace('.',' ')
-				for ch in (':', '\\', '\'', ','):
-					val = val.replace(ch, '')
+		Takes:
+			torrentTitles - List of titles as given by a feed
 
-			self.elements[key] = val
+		Returns:
+			Dict of columns, see scenetools.Columns. torrentTitle and title
+			hold the values the torrents would get, parsedTitle the title
+			the scenetools found
+		'''
+		torrentTitles = [torrentTitle.replace('"', '') for torrentTitle in torrentTitles]
+		titles = [Normalise.cleanTitle(torrentTitle.lower()) for torrentTitle in torrentTitles]
+
+		if self.sceneTools is None:
+			columns = Columns.toColumns([{} for title in titles])
+		else:
+			columns = self.sceneTools.parseTitles(titles)
+
+		columns['parsedTitle'] = columns.pop('title', [None] * len(titles))
+		columns['torrentTitle'] = torrentTitles
+		columns['title'] = [None] * len(titles)
+
+		for idx, title in enumerate(titles):
+			if columns['parsed'][idx]:
+				columns['title'][idx] = self.matchTitle(Columns.getRow(columns, idx), title)
+
+		return columns
+
+
+	@classmethod
+	def fromElements(self, elements):
+		'''
+		Makes a torrent from the elements of one that was already made,
+		see unpackTorrents
+		'''
+		torrent = self.__new__(self)
+		torrent.elements = elements
+
+		return torrent
+
+
+	@classmethod
+	def matchTitle(self, row, title):
+		'''
+		Works out the title a torrent gets from its parsed properties
+
+		Takes:
+			row - Dict of the parsed properties, see parseTitles
+			title - The torrent title as given to the scenetools
+
+		Returns:
+			String
+		'''
+		return Normalise.cleanTitle(row.get('parsedTitle', title))
+
+
+	@classmethod
+	def fromColumns(self, columns, idx, url, minTime=0, minRatio=0.0, comparison='or', feedDestination=None):
+		'''
+		Makes the torrent of one row of parseTitles, without parsing its
+		title again
+
+		Takes:
+			columns - Dict of columns returned by parseTitles
+			idx - Int, the row to use
+			url - The url of the torrent
+		'''
+		if self.sceneTools is None:
+			return self(columns['torrentTitle'][idx], url, minTime=minTime, minRatio=minRatio, comparison=comparison, feedDestination=feedDestination)
+
+		metaData = Columns.getRow(columns, idx)
+
+		if metaData is None:
+			raise TypeError('The Title given does not appear to be of type: {0}\n{1}'.format(self.__name__.lower(), columns['torrentTitle'][idx]))
+
+		# The constructor works the title out again from what was parsed
+		del metaData['title']
+
+		if 'parsedTitle' in metaData:
+			metaData['title'] = metaData.pop('parsedTitle')
+
+		metaData['url'] = url
+
+		return self(metaData=metaData, minTime=minTime, minRatio=minRatio, comparison=comparison, feedDestination=feedDestination)
 
 
 class Music(Generic):
@@ -214,6 +330,8 @@ class Music(Generic):
 	Torrent Object Specified to Music
 	'''
 
+	sceneTools = flannelfox.scenetools.Music
+
 	def __init__(self, torrentTitle=None, url=None, metaData=None, minTime=0, minRatio=0.0, comparison='or', feedDestination=None):
 		if metaData is None:
 			super(Music, self).__init__(torrentTitle, url, minTime=minTime, minRatio=minRatio, comparison=comparison, feedDestination=feedDestination)
@@ -228,7 +346,12 @@ class Music(Generic):
 
 		self.populateProperties(metaData)
 
-		self.elements['title'] = '{0} - {1}'.format(self.elements['artist'], self.elements['album'])
+		self.elements['title'] = self.matchTitle(self.elements, None)
+
+
+	@classmethod
+	def matchTitle(self, row, title):
+		return '{0} - {1}'.format(row['artist'], row['album'])
 
 
 class TV(Generic):
@@ -236,6 +359,8 @@ class TV(Generic):
 	Torrent Object Specific to TV Shows
 	'''
 
+	sceneTools = flannelfox.scenetools.TV
+
 	def __init__(self, torrentTitle=None, url=None, metaData=None, minTime=0, minRatio=0.0, comparison='or', feedDestination=None):
 		if metaData is None:
 			super(TV, self).__init__(torrentTitle, url, minTime=minTime, minRatio=minRatio, comparison=comparison, feedDestination=feedDestination)
@@ -245,13 +370,28 @@ class TV(Generic):
 			metaData = flannelfox.scenetools.TV.parseTitle(self.elements['title'])
 
 		else:
-		   super(TV, elf).__init__(metaData['torrentTitle'], metaData['url'], minTime=minTime, minRatio=minRatio, comparison=comparison, feedDestination=feedDestination)
-		   self.elements['torrentType'] = 'tv'
+			super(TV, self).__init__(metaData['torrentTitle'], metaData['url'], minTime=minTime, minRatio=minRatio, comparison=comparison, feedDestination=feedDestination)
+			self.elements['torrentType'] = 'tv'
 
 		self.populateProperties(metaData)
 
+		self.elements['title'] = self.mapTitle(self.elements['title'])
+
+
+	@classmethod
+	def mapTitle(self, title):
+		'''
+		Swaps the title for the one in tvTitleMappings, if there is one
+		'''
 		if 'tvTitleMappings' in settings.settings:
-			self.elements['title'] = settings.settings['tvTitleMappings'].get(self.elements['title'].lower(), self.elements['title'])
+			return settings.settings['tvTitleMappings'].get(title.lower(), title)
+
+		return title
+
+
+	@classmethod
+	def matchTitle(self, row, title):
+		return self.mapTitle(super(TV, self).matchTitle(row, title))
 
 
 class Movie(Generic):
@@ -259,6 +399,8 @@ class Movie(Generic):
 	Torrent Object Specific to Movies
 	'''
 
+	sceneTools = flannelfox.scenetools.Movie
+
 	def __init__(self, torrentTitle=None, url=None, metaData=None, minTime=0, minRatio=0.0, comparison='or', feedDestination=None):
 
 		if metaData is None:
@@ -280,6 +422,8 @@ class Ebook(Generic):
 	Torrent Object Specific to EBooks
 	'''
 
+	sceneTools = flannelfox.scenetools.Ebook
+
 	def __init__(self, torrentTitle=None, url=None, metaData=None, minTime=0, minRatio=0.0, comparison='or', feedDestination=None):
 
 		if metaData is None:
@@ -298,3 +442,55 @@ class Ebook(Generic):
 
 # These are acceptable types in the RSSFeedsConfig File
 TORRENT_TYPES = {'tv':TV, 'movie':Movie, 'none':Generic, 'music':Music, 'ebook':Ebook}
+
+
+# Fields every torrent is made with, see Generic, they are kept when None
+TORRENT_FIELDS = ('torrentType', 'torrentTitle', 'title', 'minTime', 'minRatio', 'comparison', 'feedDestination')
+
+# The QueuedTorrents columns a torrent fills in, the order of the values in
+# the records made by packTorrents. queuedOn, added, addedOn and hashString
+# are set by the queue and the database.
+QUEUED_FIELDS = TORRENT_FIELDS + (
+	'url', 'priority', 'proper', 'source', 'container', 'codec', 'quality',
+	'day', 'month', 'year', 'season', 'episode', 'releaseType', 'album', 'artist'
+)
+
+
+def packTorrents(torrents):
+	'''
+	Turns torrents into compact records that are cheap to pickle, the
+	rssdaemon workers send these back instead of the torrents
+
+	Takes:
+		torrents - List of torrents
+
+	Returns:
+		List of tuples of the values of QUEUED_FIELDS, None where the
+		torrent does not have the field. Anything else the torrent holds
+		is not stored in the queue and is left out.
+	'''
+	return [tuple(torrent.get(field, None) for field in QUEUED_FIELDS) for torrent in torrents]
+
+
+def unpackTorrents(records):
+	'''
+	Turns the records made by packTorrents back into torrents, the titles
+	are not parsed again
+
+	Takes:
+		records - List of tuples, see packTorrents
+
+	Returns:
+		List of torrents
+	'''
+	torrents = []
+
+	for values in records:
+		elements = dict(
+			(field, val) for field, val in zip(QUEUED_FIELDS, values)
+			if val is not None or field in TORRENT_FIELDS
+		)
+
+		torrents.append(TORRENT_TYPES.get(elements['torrentType'], Generic).fromElements(elements))
+
+	return torrents
@@ -3,7 +3,7 @@ import sys
 from setuptools import setup, find_packages
 setup(name = 'flannelfox',
 	version = '1.1.5',
-	packages = find_packages(),
+	packages = find_packages(exclude=['benchmarks', 'benchmarks.*']),
 	package_data={'flannelfox': ['.flannelfox/config/*']},
 	data_files = [
 		(sys.prefix, ['.flannelfox/bin/flannelfox-init']),
@@ -21,6 +21,7 @@ setup(name = 'flannelfox',
 		'console_scripts': [
 		'RSSDaemon = flannelfox.rssdaemon:main',
 		'QueueDaemon = flannelfox.queuedaemon:main',
+		'CombinedDaemon = flannelfox.combineddaemon:main',
 		],
 	},
 	install_requires = [
@@ -2,10 +2,13 @@
 
 import unittest
 import os
+import sqlite3
+from unittest.mock import patch
 
 
 from flannelfox.torrenttools import Torrents
 from flannelfox.databases import Databases
+from flannelfox.databases.ff_sqlite3 import Database
 from flannelfox.torrenttools.TorrentQueue import Queue
 from flannelfox.settings import settings
 
@@ -103,5 +106,127 @@ class TestDatabases(unittest.TestCase):
 		self.removeDatabase()
 
 
+	def test_queuePriority(self):
+
+		self.removeDatabase()
+
+		dbObject = Databases(
+			dbType = "SQLITE3",
+			databaseSettings = {
+				'databaseLocation': self.testDatabaseFile
+			}
+		)
+
+		first = Torrents.TV(torrentTitle='some.show.s01e01.720p.junk.here', url='http://testurl.com/1')
+		second = Torrents.TV(torrentTitle='some.show.s01e02.hdtv.junk.here', url='http://testurl.com/2')
+		third = Torrents.TV(torrentTitle='some.show.s01e03.proper.1080p.junk.here', url='http://testurl.com/3')
+
+		for torrent in (first, second, third):
+			torrent.setPriority()
+
+		with patch('flannelfox.databases.ff_sqlite3.time.time') as mockTime:
+			for idx, torrent in enumerate((first, second, third)):
+				mockTime.return_value = 1000 + idx
+				dbObject.addTorrentsToQueue([torrent])
+
+		# Highest priority first, then the oldest
+		self.assertEqual(
+			[torrent['url'] for torrent in dbObject.getQueuedTorrents(selectors=['url'])],
+			['http://testurl.com/3', 'http://testurl.com/1', 'http://testurl.com/2']
+		)
+
+		self.assertEqual(dbObject.getNextQueuedTorrent(selectors=['url']), {'url':'http://testurl.com/3'})
+		self.assertEqual(len(dbObject.getQueuedTorrents(num=2)), 2)
+
+		dbObject.updateHashString({'added': 1}, {'url':'http://testurl.com/3'})
+		self.assertEqual(dbObject.getNextQueuedTorrent(selectors=['url']), {'url':'http://testurl.com/1'})
+
+		self.removeDatabase()
+
+
+	def test_migrateDB(self):
+
+		self.removeDatabase()
+
+		# A database made before torrents had a priority
+		connection = sqlite3.connect(self.testDatabaseFile)
+		connection.executescript(
+			"CREATE TABLE QueuedTorrents (comparison TEXT, hashString TEXT, feedDestination TEXT, minRatio REAL, minTime INTEGER, addedOn INTEGER, added INTEGER, queuedOn INTEGER, torrentType INTEGER, proper TEXT, source TEXT, container TEXT, codec TEXT, quality TEXT, day INTEGER, month INTEGER, year INTEGER, torrentTitle TEXT, url TEXT, title TEXT, season INTEGER, episode INTEGER, releaseType TEXT, album TEXT, artist TEXT);"
+			"CREATE TABLE BlacklistedTorrents (url STRING PRIMARY KEY);"
+			"CREATE VIEW QueuedTorrentsView AS SELECT QueuedTorrents.url, QueuedTorrents.queuedOn FROM QueuedTorrents WHERE added = 0 ORDER BY queuedOn ASC;"
+			"INSERT INTO QueuedTorrents (url, added, queuedOn) VALUES ('http://testurl.com/old', 0, 1);"
+		)
+		connection.close()
+
+		dbObject = Databases(
+			dbType = "SQLITE3",
+			databaseSettings = {
+				'databaseLocation': self.testDatabaseFile
+			}
+		)
+
+		self.assertEqual(
+			dbObject.getQueuedTorrents(selectors=['url', 'priority']),
+			[{'url':'http://testurl.com/old', 'priority':0}]
+		)
+
+		torrent = Torrents.TV(torrentTitle='some.show.s01e01.proper.720p.junk.here', url='http://testurl.com/new')
+		torrent.setPriority()
+		dbObject.addTorrentsToQueue([torrent])
+
+		self.assertEqual(dbObject.getNextQueuedTorrent(selectors=['url']), {'url':'http://testurl.com/new'})
+
+		connection = sqlite3.connect(self.testDatabaseFile)
+		indexes = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+		connection.close()
+
+		self.assertIn(('idx_QueuePriority',), indexes)
+
+		self.removeDatabase()
+
+
+	def test_persistentConnection(self):
+
+		self.removeDatabase()
+
+		try:
+			dbObject = Databases(
+				dbType = "SQLITE3",
+				databaseSettings = {
+					'databaseLocation': self.testDatabaseFile,
+					'persistentConnection': True
+				}
+			)
+
+			dbObject.addBlacklistedTorrent(url='http://testurl.com/test')
+			connection = Database.connection
+
+			self.assertIsNotNone(connection)
+
+			# Instances made without the setting open their own connections
+			otherObject = Databases(dbType = "SQLITE3")
+			self.assertFalse(otherObject.Database.databaseSettings['persistentConnection'])
+			self.assertFalse(Database.databaseSettings['persistentConnection'])
+
+			with patch('flannelfox.databases.ff_sqlite3.sql.connect', wraps=sqlite3.connect) as mockConnect:
+				self.assertTrue(otherObject.torrentBlacklisted(url='http://testurl.com/test'))
+				self.assertTrue(dbObject.torrentBlacklisted(url='http://testurl.com/test'))
+				self.assertEqual(mockConnect.call_count, 1)
+
+			self.assertIs(Database.connection, connection)
+
+			Database.closeConnection()
+			self.assertIsNone(Database.connection)
+
+			# A closed connection is opened again when needed
+			self.assertTrue(dbObject.torrentBlacklisted(url='http://testurl.com/test'))
+			self.assertIsNotNone(Database.connection)
+
+		finally:
+			Database.closeConnection()
+
+		self.removeDatabase()
+
+
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file
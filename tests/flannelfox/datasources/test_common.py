@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+import unittest, os, json, tempfile, time
+from unittest.mock import patch
+
+from flannelfox.datasources import common, rss
+
+
+class TestConfigStore(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+	def writeConfig(self, name, data):
+		path = os.path.join(self.tmp.name, name)
+
+		# Write through a rename so the stamp always changes
+		with open(path + '.tmp', 'w') as f:
+			json.dump(data, f)
+		os.replace(path + '.tmp', path)
+
+		return path
+
+	def checkStore(self, store):
+		one = self.writeConfig('one.json', [{'list_name':'one'}])
+		two = self.writeConfig('two.json', [{'list_name':'two'}])
+		self.writeConfig('ignored.txt', [])
+
+		files = dict(store.getConfigFiles())
+		self.assertEqual(files, {one:[{'list_name':'one'}], two:[{'list_name':'two'}]})
+		version = store.version
+
+		# Nothing changed so nothing is read again
+		with patch('flannelfox.datasources.common.json.load') as load:
+			self.assertEqual(dict(store.getConfigFiles()), files)
+			self.assertFalse(load.called)
+		self.assertEqual(store.version, version)
+
+		# Only the changed file is read
+		self.writeConfig('two.json', [{'list_name':'three'}])
+		with patch('flannelfox.datasources.common.json.load', side_effect=json.load) as load:
+			files = dict(store.getConfigFiles())
+			self.assertEqual(load.call_count, 1)
+		self.assertEqual(files[two], [{'list_name':'three'}])
+		self.assertGreater(store.version, version)
+
+		os.remove(one)
+		self.assertEqual(list(dict(store.getConfigFiles()).keys()), [two])
+
+		store.close()
+
+	def test_statScan(self):
+		self.checkStore(common.ConfigStore(self.tmp.name, useInotify=False))
+
+	@unittest.skipUnless(common.InotifyWatch.available(), 'inotify is not available')
+	def test_inotify(self):
+		store = common.ConfigStore(self.tmp.name, useInotify=True)
+		self.checkStore(store)
+
+	@unittest.skipUnless(common.InotifyWatch.available(), 'inotify is not available')
+	def test_inotifySkipsListing(self):
+		store = common.ConfigStore(self.tmp.name, useInotify=True)
+		self.writeConfig('one.json', [])
+		store.getConfigFiles()
+
+		with patch('flannelfox.datasources.common.os.listdir') as listdir:
+			store.getConfigFiles()
+			self.assertFalse(listdir.called)
+
+		store.close()
+
+	def test_missingDirectory(self):
+		store = common.ConfigStore(os.path.join(self.tmp.name, 'missing'))
+		self.assertEqual(store.getConfigFiles(), [])
+		store.close()
+
+	def test_rssCompiledOnce(self):
+		self.writeConfig('rss.json', [{'list_name':'feed', 'type':'tv', 'feedDestination':'tv', 'filters':[{'include':[{'title':'a'}]}]}])
+
+		first = rss.readRssConfigs(self.tmp.name)
+		second = rss.readRssConfigs(self.tmp.name)
+
+		key = os.path.join(self.tmp.name, 'rss.json.feed')
+		self.assertIs(first[key], second[key])
+
+		self.writeConfig('rss.json', [{'list_name':'feed', 'type':'tv', 'feedDestination':'tv', 'filters':[{'include':[{'title':'b'}]}]}])
+		third = rss.readRssConfigs(self.tmp.name)
+		self.assertEqual(third[key]['feedFilters'], [[{'key':'title', 'val':'b', 'exclude':False}]])
+
+		common.configStores.pop(self.tmp.name).close()
+
+	def test_pollInterval(self):
+		self.writeConfig('rss.json', [
+			{'list_name':'fast', 'type':'tv', 'feedDestination':'tv', 'pollInterval':'1'},
+			{'list_name':'slow', 'type':'tv', 'feedDestination':'tv', 'pollInterval':30},
+			{'list_name':'default', 'type':'tv', 'feedDestination':'tv'},
+			{'list_name':'broken', 'type':'tv', 'feedDestination':'tv', 'pollInterval':0}
+		])
+
+		majorFeeds = rss.readRssConfigs(self.tmp.name)
+
+		self.assertEqual(majorFeeds[os.path.join(self.tmp.name, 'rss.json.fast')]['pollInterval'], 60)
+		self.assertEqual(majorFeeds[os.path.join(self.tmp.name, 'rss.json.slow')]['pollInterval'], 1800)
+		self.assertNotIn('pollInterval', majorFeeds[os.path.join(self.tmp.name, 'rss.json.default')])
+		self.assertNotIn(os.path.join(self.tmp.name, 'rss.json.broken'), majorFeeds)
+
+		common.configStores.pop(self.tmp.name).close()
+
+
+	def test_priority(self):
+		self.writeConfig('rss.json', [
+			{'list_name':'first', 'type':'tv', 'feedDestination':'tv', 'priority':'10'},
+			{'list_name':'default', 'type':'tv', 'feedDestination':'tv'}
+		])
+
+		majorFeeds = rss.readRssConfigs(self.tmp.name)
+
+		self.assertEqual(majorFeeds[os.path.join(self.tmp.name, 'rss.json.first')]['priority'], 10)
+		self.assertNotIn('priority', majorFeeds[os.path.join(self.tmp.name, 'rss.json.default')])
+
+		common.configStores.pop(self.tmp.name).close()
+
+
+class TestCacheFiles(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.cacheFileName = os.path.join(self.tmp.name, 'cache', 'watchlist')
+
+	def tearDown(self):
+		common.cacheFiles.forget()
+		self.tmp.cleanup()
+
+	def test_readFromMemory(self):
+		common.updateCacheFile(cacheFileName=self.cacheFileName, data=['a', 'b'])
+
+		# Only the temp file was renamed into place
+		self.assertEqual(os.listdir(os.path.dirname(self.cacheFileName)), ['watchlist'])
+
+		with patch('builtins.open') as mockOpen:
+			self.assertEqual(common.readCacheFile(self.cacheFileName), ['a', 'b'])
+			self.assertFalse(mockOpen.called)
+
+		# A file changed by someone else is read again
+		with open(self.cacheFileName, 'w') as f:
+			json.dump(['c', 'd', 'e'], f)
+
+		self.assertEqual(common.readCacheFile(self.cacheFileName), ['c', 'd', 'e'])
+
+	def test_marshalFormat(self):
+		common.updateCacheFile(cacheFileName=self.cacheFileName, data=['json'])
+
+		with patch.dict(common.settings['cache'], {'format':'marshal'}):
+			common.updateCacheFile(cacheFileName=self.cacheFileName + '2', data=['marshal'])
+
+			# Both formats can always be read
+			common.cacheFiles.forget()
+			self.assertEqual(common.readCacheFile(self.cacheFileName), ['json'])
+			self.assertEqual(common.readCacheFile(self.cacheFileName + '2'), ['marshal'])
+
+		with open(self.cacheFileName + '2', 'rb') as f:
+			self.assertTrue(f.read().startswith(common.CacheFiles.MARSHAL_MAGIC))
+
+	def test_missingCache(self):
+		self.assertEqual(common.readCacheFile(self.cacheFileName), [])
+		self.assertFalse(common.isCacheStillValid(cacheFileName=self.cacheFileName))
+
+	def test_isCacheStillValid(self):
+		common.updateCacheFile(cacheFileName=self.cacheFileName, data=['a'])
+		self.assertTrue(common.isCacheStillValid(cacheFileName=self.cacheFileName, frequency=10))
+		self.assertFalse(common.isCacheStillValid(cacheFileName=self.cacheFileName, force=True))
+
+		old = time.time() - 3600
+		os.utime(self.cacheFileName, (old, old))
+		self.assertFalse(common.isCacheStillValid(cacheFileName=self.cacheFileName, frequency=60))
+		self.assertTrue(common.isCacheStillValid(cacheFileName=self.cacheFileName, frequency=120))
+
+	def test_getCacheTTL(self):
+		with patch.dict(common.settings['cache'], {'ttl':{'default':5, 'lastfm':10}, 'staleWindow':{'default':20}}):
+			self.assertEqual(common.getCacheTTL('lastfm'), (10, 20))
+			self.assertEqual(common.getCacheTTL('trakt'), (5, 20))
+
+
+if __name__ == '__main__':
+	unittest.main()
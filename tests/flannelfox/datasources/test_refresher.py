@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import unittest, os, tempfile, threading, time
+from unittest.mock import patch
+
+import flannelfox
+from flannelfox.datasources import common, refresher, lastfm
+
+
+class TestRefresher(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.cacheFileName = os.path.join(self.tmp.name, 'watchlist')
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+
+	def test_rateLimiter(self):
+		limiter = refresher.RateLimiter(20)
+
+		start = time.monotonic()
+		for i in range(5):
+			limiter.wait()
+
+		# The first call is free, the other four are spaced 50ms apart
+		self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+
+	def test_synchronousWithoutRefresher(self):
+		with patch.object(common, 'isCacheStillValid', return_value=False):
+			self.assertEqual(refresher.getWatchlist(self.cacheFileName, lambda: ['a']), ['a'])
+
+			# A failed fetch falls back to the cache
+			self.assertEqual(refresher.getWatchlist(self.cacheFileName, lambda: []), ['a'])
+
+		os.remove(self.cacheFileName)
+		with patch.object(common, 'isCacheStillValid', return_value=False):
+			self.assertRaises(ValueError, refresher.getWatchlist, self.cacheFileName, lambda: [])
+
+
+	def test_backgroundRefresh(self):
+		common.updateCacheFile(cacheFileName=self.cacheFileName, data=['old'])
+
+		release = threading.Event()
+		fetched = threading.Event()
+
+		def fetch():
+			release.wait(5)
+			fetched.set()
+			return ['new']
+
+		# Out of date, but inside the stale window
+		ttl, staleWindow = common.getCacheTTL()
+		def isCacheStillValid(cacheFileName=None, frequency=None):
+			return frequency > ttl
+
+		with patch.object(refresher, 'refresher', refresher.Refresher()) as r, \
+			patch.object(common, 'isCacheStillValid', side_effect=isCacheStillValid):
+
+			r.start()
+			try:
+				# The stale copy is returned while the refresh is blocked
+				self.assertEqual(refresher.getWatchlist(self.cacheFileName, fetch), ['old'])
+
+				# Only one refresh runs per cache file
+				self.assertFalse(r.submit(self.cacheFileName, fetch))
+
+				release.set()
+				self.assertTrue(fetched.wait(5))
+
+				for i in range(50):
+					if self.cacheFileName not in r.pending:
+						break
+					time.sleep(0.05)
+
+				self.assertEqual(common.readCacheFile(self.cacheFileName), ['new'])
+
+				# Past the stale window the cache is not used at all
+				isCacheStillValid = lambda cacheFileName=None, frequency=None: False
+				common.isCacheStillValid.side_effect = isCacheStillValid
+				self.assertRaises(ValueError, refresher.getWatchlist, self.cacheFileName, lambda: [])
+
+			finally:
+				r.stop()
+
+
+	def test_failedRefreshBacksOff(self):
+		r = refresher.Refresher()
+		r.start()
+
+		try:
+			self.assertTrue(r.submit(self.cacheFileName, lambda: []))
+
+			for i in range(50):
+				if self.cacheFileName in r.failed:
+					break
+				time.sleep(0.05)
+
+			self.assertFalse(r.submit(self.cacheFileName, lambda: ['a']))
+
+		finally:
+			r.stop()
+
+
+	def test_lastfmPages(self):
+		api = lastfm.lastfmApi()
+
+		def libraryPage(apiKey, username, page):
+			return (200, {'artists':{
+				'@attr':{'totalPages':'4'},
+				'artist':[{'name':'artist {0}'.format(page)}]
+			}})
+
+		with patch.object(lastfm.lastfmApi, '_lastfmApi__getLibraryArtistsPage', side_effect=libraryPage) as getPage:
+			self.assertEqual(
+				api._lastfmApi__getLibraryArtistsFeed('key', 'user'),
+				(200, ['artist 1', 'artist 2', 'artist 3', 'artist 4'])
+			)
+			self.assertEqual(getPage.call_count, 4)
+
+		def failingPage(apiKey, username, page):
+			if page == 3:
+				return (-1, None)
+			return libraryPage(apiKey, username, page)
+
+		with patch.object(lastfm.lastfmApi, '_lastfmApi__getLibraryArtistsPage', side_effect=failingPage):
+			self.assertEqual(api._lastfmApi__getLibraryArtistsFeed('key', 'user'), (-1, []))
+
+
+if __name__ == '__main__':
+	unittest.main()
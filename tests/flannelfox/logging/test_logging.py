@@ -1,9 +1,30 @@
 # -*- coding: utf-8 -*-
 
-import unittest
+import unittest, threading, multiprocessing
 from unittest.mock import patch
 from flannelfox import logging
 
+
+class Recorder(logging.logging.Handler):
+
+	def __init__(self):
+		logging.logging.Handler.__init__(self)
+		self.messages = []
+		self.threads = []
+
+	def emit(self, record):
+		self.messages.append(record.getMessage())
+		self.threads.append(threading.current_thread())
+
+
+class Counted(object):
+
+	calls = 0
+
+	def __str__(self):
+		Counted.calls += 1
+		return 'counted'
+
 class TestLogging(unittest.TestCase):
 
 	@classmethod
@@ -33,5 +54,123 @@ class TestLogging(unittest.TestCase):
 			logging.getFileHandle('')
 
 
+	def test_lazy(self):
+		logger = logging.logging.getLogger('flannelfox.tests.lazy')
+		logger.propagate = False
+		logger.setLevel(logging.logging.INFO)
+
+		recorder = Recorder()
+		logger.addHandler(logging.QueueHandler(recorder))
+
+		Counted.calls = 0
+
+		# Disabled levels never format the message
+		logger.debug(logging.lazy('{0}', Counted()))
+		self.assertEqual(Counted.calls, 0)
+
+		logger.info(logging.lazy('{0} {name}', Counted(), name='torrent'))
+		self.assertEqual(recorder.messages, ['counted torrent'])
+		self.assertEqual(Counted.calls, 1)
+
+
+	def test_listener(self):
+		logger = logging.logging.getLogger('flannelfox.tests.listener')
+		logger.propagate = False
+		logger.setLevel(logging.logging.INFO)
+
+		recorder = Recorder()
+		logger.addHandler(logging.QueueHandler(recorder))
+
+		# Without a listener records are written right away
+		logger.info('direct')
+		self.assertEqual(recorder.threads, [threading.current_thread()])
+
+		logging.startListener()
+		try:
+			logger.info('queued')
+
+		finally:
+			logging.stopListener()
+
+		self.assertIsNone(logging.listener)
+		self.assertEqual(recorder.messages, ['direct', 'queued'])
+		self.assertIsNot(recorder.threads[1], threading.current_thread())
+
+
+	def test_listenerOtherProcess(self):
+		logger = logging.logging.getLogger('flannelfox.tests.fork')
+		logger.propagate = False
+		logger.setLevel(logging.logging.INFO)
+
+		recorder = Recorder()
+		logger.addHandler(logging.QueueHandler(recorder))
+
+		logging.startListener()
+		try:
+			# A forked pool worker inherits the listener of its parent
+			with patch('flannelfox.logging.os.getpid', return_value=-1):
+				logger.info('worker')
+
+			self.assertEqual(recorder.threads, [threading.current_thread()])
+
+		finally:
+			logging.stopListener()
+
+
+
+	def test_listenerPrepare(self):
+		logger = logging.logging.getLogger('flannelfox.tests.prepare')
+		logger.propagate = False
+		logger.setLevel(logging.logging.INFO)
+
+		recorder = Recorder()
+		logger.addHandler(logging.QueueHandler(recorder))
+
+		torrents = ['a']
+
+		logging.startListener()
+		try:
+			# The message is formatted before the record is queued
+			logger.info('%s', torrents)
+			torrents.append('b')
+
+		finally:
+			logging.stopListener()
+
+		self.assertEqual(recorder.messages, ["['a']"])
+
+
+	def test_listenerWorkers(self):
+		name = 'flannelfox.tests.worker'
+
+		logger = logging.logging.getLogger(name)
+		logger.propagate = False
+		logger.setLevel(logging.logging.INFO)
+
+		recorder = Recorder()
+		logger.addHandler(logging.QueueHandler(recorder, name))
+
+		def work(records):
+			logging.initWorker(records)
+			logger.info(logging.lazy('worker {0}', 1))
+
+		handles = dict(logging.handles)
+		logging.handles[name] = recorder
+
+		logging.startListener()
+		try:
+			# A worker hands its records to the listener of the parent
+			worker = multiprocessing.get_context('fork').Process(target=work, args=(logging.getWorkerQueue(),))
+			worker.start()
+			worker.join(5)
+
+		finally:
+			logging.stopListener()
+			logging.handles = handles
+
+		self.assertEqual(recorder.messages, ['worker 1'])
+		self.assertIsNot(recorder.threads[0], threading.current_thread())
+
+
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import unittest, os, tempfile
+
+from flannelfox.rssdaemon import circuitbreaker
+
+class TestCircuitBreaker(unittest.TestCase):
+
+	options = {'failures': 2, 'hostFailures': 3, 'delay': 100, 'maxDelay': 1000}
+
+	def setUp(self):
+		self.tempDir = tempfile.mkdtemp()
+		self.stateFile = os.path.join(self.tempDir, 'circuitbreaker.json')
+
+		self.majorFeeds = {
+			'tv': {'feedName': 'tv', 'minorFeeds': [{'url': 'http://a.com/1'}, {'url': 'http://a.com/2'}, {'url': 'http://b.com/1'}]},
+			'movies': {'feedName': 'movies', 'minorFeeds': [{'url': 'http://a.com/1'}]}
+		}
+
+
+	def tearDown(self):
+		for fileName in os.listdir(self.tempDir):
+			os.remove(os.path.join(self.tempDir, fileName))
+
+		os.rmdir(self.tempDir)
+
+
+	def getBreaker(self):
+		return circuitbreaker.CircuitBreaker(self.options, stateFile=self.stateFile)
+
+
+	def getUrls(self, majorFeeds):
+		return sorted(minorFeed['url'] for majorFeed in majorFeeds.values() for minorFeed in majorFeed['minorFeeds'])
+
+
+	def test_feed(self):
+		breaker = self.getBreaker()
+
+		self.assertEqual(breaker.record('http://b.com/1', False, 0, error='http 500'), [])
+		self.assertEqual(breaker.record('http://b.com/1', False, 0, error='http 500'), ['http://b.com/1'])
+
+		# Left alone until the delay is up
+		self.assertNotIn('http://b.com/1', self.getUrls(breaker.filter(self.majorFeeds, 99)))
+		self.assertIn('http://b.com/1', self.getUrls(breaker.filter(self.majorFeeds, 100)))
+
+		# The delay doubles when the probe fails
+		breaker.record('http://b.com/1', False, 100)
+		self.assertEqual(breaker.feeds['http://b.com/1'].openUntil, 300)
+
+		for idx in range(10):
+			breaker.record('http://b.com/1', False, 300)
+
+		self.assertEqual(breaker.feeds['http://b.com/1'].openUntil, 1300)
+
+		# A success closes it again
+		breaker.record('http://b.com/1', True, 1300)
+		self.assertEqual(breaker.feeds, {})
+		self.assertEqual(breaker.hosts, {})
+		self.assertEqual(self.getUrls(breaker.filter(self.majorFeeds, 1300)), self.getUrls(self.majorFeeds))
+
+
+	def test_host(self):
+		breaker = self.getBreaker()
+
+		for url in ('http://a.com/1', 'http://a.com/2', 'http://a.com/1'):
+			breaker.record(url, False, 0, error='no response')
+
+		self.assertTrue(breaker.hosts['a.com'].isOpen(0))
+
+		# Every feed of the host is left alone
+		self.assertEqual(self.getUrls(breaker.filter(self.majorFeeds, 0)), ['http://b.com/1'])
+
+		# One of its feeds probes it when the delay is up
+		allowed = breaker.filter(self.majorFeeds, 100)
+		self.assertEqual(self.getUrls(allowed), ['http://a.com/1', 'http://a.com/1', 'http://b.com/1'])
+
+		breaker.record('http://a.com/1', True, 100)
+		self.assertEqual(self.getUrls(breaker.filter(self.majorFeeds, 100)), self.getUrls(self.majorFeeds))
+
+
+	def test_save(self):
+		breaker = self.getBreaker()
+
+		for idx in range(2):
+			breaker.record('http://b.com/1', False, 0, error='http 404')
+
+		breaker.save()
+		self.assertFalse(breaker.changed)
+
+		# Kept across restarts
+		breaker = self.getBreaker()
+		self.assertEqual(breaker.feeds['http://b.com/1'].toDict(), {'failures': 2, 'openUntil': 100, 'lastError': 'http 404'})
+		self.assertEqual(breaker.hosts['b.com'].failures, 2)
+		self.assertIn('http://b.com/1: 2 failures, retried in 50s, last error: http 404', breaker.getSummary(50))
+
+		# Feeds that are no longer configured are forgotten
+		del self.majorFeeds['tv']
+		breaker.prune(self.majorFeeds)
+
+		self.assertEqual(breaker.feeds, {})
+		self.assertEqual(breaker.hosts, {})
+		self.assertEqual(breaker.getSummary(50), '')
+
+
+	def test_load(self):
+		with open(self.stateFile, 'w') as stateFile:
+			stateFile.write('not json')
+
+		# A broken file starts over
+		self.assertEqual(self.getBreaker().feeds, {})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+import unittest, os, tempfile, time
+
+from unittest.mock import patch
+
+from flannelfox.rssdaemon import feedpool
+from flannelfox.torrenttools import Filters
+
+def getUrls(job):
+	return [(majorFeed['feedName'], minorFeed['url']) for majorFeed, minorFeed in feedpool.getSubscriptions(job)]
+
+def getUrlsSlowly(job):
+	urls = getUrls(job)
+
+	if ('tv', 'b') in urls:
+		time.sleep(10)
+
+	return urls
+
+class TestFeedPool(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.mkdtemp()
+		self.configFile = os.path.join(self.tempDir, 'rssfeeds.pickle')
+
+		self.majorFeeds = {
+			'tv': {'feedName': 'tv', 'feedType': 'tv', 'minorFeeds': [{'url': 'a'}, {'url': 'b'}, {'url': 'c'}]},
+			'movies': {'feedName': 'movies', 'feedType': 'movie', 'minorFeeds': [{'url': 'd'}]}
+		}
+
+		self.pool = feedpool.FeedPool(getUrls, 2, configFile=self.configFile)
+
+
+	def tearDown(self):
+		self.pool.close()
+		os.rmdir(self.tempDir)
+
+
+	def test_update(self):
+		self.assertTrue(self.pool.update(self.majorFeeds))
+		self.assertEqual(self.pool.version, 1)
+		self.assertTrue(os.path.isfile(self.configFile))
+
+		# Nothing is written when the feeds did not change
+		self.assertFalse(self.pool.update(self.majorFeeds))
+		self.assertEqual(self.pool.version, 1)
+
+		# Changes made in place are seen too
+		self.majorFeeds['movies']['minorFeeds'].append({'url': 'e'})
+		self.assertTrue(self.pool.update(self.majorFeeds))
+		self.assertEqual(self.pool.version, 2)
+
+
+	def test_updateFilters(self):
+		filterList = Filters.FilterList()
+		self.majorFeeds['tv']['feedFilters'] = filterList
+		self.majorFeeds['movies']['feedFilters'] = [[{'key': 'title', 'val': 'a', 'exclude': False}]]
+
+		self.assertTrue(self.pool.update(self.majorFeeds))
+
+		# The filters are not serialised to find out nothing changed
+		with patch.object(feedpool.pickle, 'dumps') as mockDumps, patch.object(feedpool.pickle, 'dump') as mockDump:
+			self.assertFalse(self.pool.update(self.majorFeeds))
+			mockDumps.assert_not_called()
+			mockDump.assert_not_called()
+
+		# A FilterList changed by its watchlist
+		filterList.add([{'key': 'title', 'val': 'b', 'exclude': False}], tag='b')
+		self.assertTrue(self.pool.update(self.majorFeeds))
+
+		# A config file that was compiled again
+		self.majorFeeds['movies']['feedFilters'] = [[{'key': 'title', 'val': 'a', 'exclude': False}]]
+		self.assertTrue(self.pool.update(self.majorFeeds))
+		self.assertEqual(self.pool.version, 3)
+
+
+	def test_getJobs(self):
+		self.pool.update(self.majorFeeds)
+
+		tv = self.majorFeeds['tv']
+		due = {
+			'tv': dict(tv, minorFeeds=[tv['minorFeeds'][0], tv['minorFeeds'][2]]),
+			'movies': self.majorFeeds['movies']
+		}
+
+		# A job for each feed that is due
+		self.assertEqual(
+			sorted(self.pool.getJobs(due)),
+			[(self.configFile, 1, [('movies', 0)]), (self.configFile, 1, [('tv', 0)]), (self.configFile, 1, [('tv', 2)])]
+		)
+
+		# Longest first, feeds that were never timed before the rest
+		self.pool.durations = {('a', 'tv'): 1.0, ('c', 'tv'): 5.0}
+
+		self.assertEqual(
+			[self.pool.getFeed(job) for job in self.pool.getJobs(due)],
+			[('d', 'movie'), ('c', 'tv'), ('a', 'tv')]
+		)
+
+
+	def test_getJobsShared(self):
+		self.majorFeeds['trakt'] = {'feedName': 'trakt', 'feedType': 'tv', 'minorFeeds': [{'url': 'c'}, {'url': 'a'}]}
+		self.majorFeeds['other'] = {'feedName': 'other', 'feedType': 'movie', 'minorFeeds': [{'url': 'a'}]}
+		self.pool.update(self.majorFeeds)
+
+		jobs = self.pool.getJobs(self.majorFeeds)
+
+		# A url is fetched once for every majorFeed of the same feedType
+		self.assertEqual(len(jobs), 5)
+		self.assertEqual(
+			sorted(getUrls(job) for job in jobs),
+			[
+				[('movies', 'd')],
+				[('other', 'a')],
+				[('tv', 'a'), ('trakt', 'a')],
+				[('tv', 'b')],
+				[('tv', 'c'), ('trakt', 'c')]
+			]
+		)
+
+
+	def test_getSubscriptions(self):
+		self.pool.update(self.majorFeeds)
+
+		self.assertEqual(getUrls((self.configFile, 1, [('tv', 0), ('tv', 2)])), [('tv', 'a'), ('tv', 'c')])
+		self.assertEqual(getUrls((self.configFile, 1, [('movies', 0)])), [('movies', 'd')])
+		self.assertEqual(feedpool.loaded['version'], 1)
+
+		# A new version is read again
+		self.majorFeeds['tv']['minorFeeds'].pop(0)
+		self.pool.update(self.majorFeeds)
+
+		self.assertEqual(getUrls((self.configFile, 2, [('tv', 0)])), [('tv', 'b')])
+		self.assertEqual(feedpool.loaded['version'], 2)
+
+
+	def test_map(self):
+		self.pool.update(self.majorFeeds)
+
+		results = self.pool.map(self.pool.getJobs(self.majorFeeds))
+		self.assertEqual(sorted(results), [[('movies', 'd')], [('tv', 'a')], [('tv', 'b')], [('tv', 'c')]])
+
+		# Every job was timed
+		self.assertEqual(sorted(self.pool.durations.keys()), [('a', 'tv'), ('b', 'tv'), ('c', 'tv'), ('d', 'movie')])
+		self.assertAlmostEqual(self.pool.work, sum(self.pool.durations.values()))
+
+		# The workers are kept for the next cycle
+		workers = self.pool.pool
+
+		self.majorFeeds['movies']['minorFeeds'] = [{'url': 'e'}]
+		self.pool.update(self.majorFeeds)
+
+		# Timings of feeds that are gone are dropped
+		self.assertNotIn(('d', 'movie'), self.pool.durations)
+
+		results = self.pool.map(self.pool.getJobs(self.majorFeeds))
+		self.assertEqual(sorted(results), [[('movies', 'e')], [('tv', 'a')], [('tv', 'b')], [('tv', 'c')]])
+		self.assertIs(self.pool.pool, workers)
+
+		self.pool.close()
+		self.assertIsNone(self.pool.pool)
+		self.assertFalse(os.path.exists(self.configFile))
+
+
+	def test_mapDeadline(self):
+		self.pool = feedpool.FeedPool(getUrlsSlowly, 2, configFile=self.configFile)
+		self.pool.update(self.majorFeeds)
+
+		start = time.monotonic()
+		results = list(self.pool.map(self.pool.getJobs(self.majorFeeds), deadline=start + 1))
+
+		# The results that came in before the deadline are kept
+		self.assertLess(time.monotonic() - start, 5)
+		self.assertEqual(sorted(results), [[('movies', 'd')], [('tv', 'a')], [('tv', 'c')]])
+
+		# The slow feed is left over and not timed, the workers are stopped
+		self.assertEqual([self.pool.getFeed(job) for job in self.pool.unfinished], [('b', 'tv')])
+		self.assertNotIn(('b', 'tv'), self.pool.durations)
+		self.assertIsNone(self.pool.pool)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 
-import unittest, os
+import unittest, os, time
 from unittest.mock import patch
 
-from flannelfox import rssdaemon
+from flannelfox import rssdaemon, scheduler
+from flannelfox.rssdaemon import circuitbreaker
 from flannelfox.databases import Databases
+from flannelfox.torrenttools import TorrentQueue, Filters
 from flannelfox.settings import settings
 
 class TestRssDaemon(unittest.TestCase):
@@ -1709,6 +1711,46 @@ class TestRssDaemon(unittest.TestCase):
 
 
 
+	def test_rssToTorrentsFeedInfo(self):
+		feedInfo = {}
+
+		rssdaemon.rssToTorrents(self.testRssDataTv, feedType='tv', feedInfo=feedInfo)
+
+		self.assertIsNone(feedInfo['hint'])
+		self.assertEqual(feedInfo['links'][0], 'https://somesite.com/link1')
+		self.assertEqual(len(feedInfo['links']), 2)
+		self.assertEqual(feedInfo['parsed'], 2)
+
+
+	def test_rssToTorrentsFeedFilters(self):
+		rule = {'key':'title', 'val':'chicago p.d.', 'exclude':False}
+
+		# Only the items the filters could match become torrents
+		results = rssdaemon.rssToTorrents(self.testRssDataTv, feedType='tv', feedFilters=Filters.FilterList([[rule]]))
+		self.assertEqual([result['episode'] for result in results], ['3', '4'])
+
+		feedInfo = {}
+		rule['val'] = 'some other show'
+
+		results = rssdaemon.rssToTorrents(self.testRssDataTv, feedType='tv', feedFilters=Filters.FilterList([[rule]]), feedInfo=feedInfo)
+		self.assertEqual(results, [])
+		self.assertEqual(feedInfo['parsed'], 2)
+
+
+	def test_getFeedHint(self):
+		ttl = b'<rss version="2.0"><channel><ttl>30</ttl></channel></rss>'
+		updatePeriod = (
+			b'<rss version="2.0" xmlns:sy="http://purl.org/rss/1.0/modules/syndication/"><channel>'
+			b'<sy:updatePeriod>hourly</sy:updatePeriod><sy:updateFrequency>4</sy:updateFrequency>'
+			b'</channel></rss>'
+		)
+
+		for xmlData, hint in ((ttl, 1800), (updatePeriod, 900)):
+			feedInfo = {}
+			rssdaemon.rssToTorrents(xmlData, feedType='tv', feedInfo=feedInfo)
+			self.assertEqual(feedInfo['hint'], hint)
+
+
 	@patch('flannelfox.rssdaemon.readRSSFeed')
 	def test_rssThread(self,mock_readRSSFeed):
 
@@ -1752,6 +1794,48 @@ class TestRssDaemon(unittest.TestCase):
 		results = rssdaemon.rssThread(majorFeed)
 
 		self.assertEqual(processedResponse, results[1])
+		self.assertEqual(list(results[5].keys()), ['http://somesite.com'])
+
+		# The url is only fetched once for both minorFeeds
+		mock_readRSSFeed.assert_called_once_with('http://somesite.com')
+
+
+	@patch('flannelfox.rssdaemon.readRSSFeed')
+	def test_readSubscriptions(self, mock_readRSSFeed):
+
+		def getMajorFeed(feedName, title, feedType='tv'):
+			return {
+				'feedName': feedName,
+				'feedType': feedType,
+				'feedDestination': feedName,
+				'minorFeeds': [{'url': 'http://somesite.com', 'minRatio': 1.0, 'minTime': 72, 'comparison': 'or'}],
+				'feedFilters': Filters.FilterList([[{'key': 'title', 'val': title, 'exclude': False}]])
+			}
+
+		subscriptions = [
+			(majorFeed, majorFeed['minorFeeds'][0]) for majorFeed in (
+				getMajorFeed('one', 'chicago p.d.'),
+				getMajorFeed('two', 'some other show'),
+				getMajorFeed('three', 'chicago p.d.')
+			)
+		]
+
+		mock_readRSSFeed.return_value = (self.testRssDataTv, 200, 'utf-8')
+
+		pid, torrents, error, processed, feedMetrics, feedInfo = rssdaemon.readSubscriptions(subscriptions)
+
+		# Fetched and parsed once, filtered for each majorFeed
+		mock_readRSSFeed.assert_called_once_with('http://somesite.com')
+		self.assertIsNone(error)
+		self.assertEqual(processed, 2)
+		self.assertEqual([torrent['feedDestination'] for torrent in torrents], ['one', 'one', 'three', 'three'])
+
+		# Another feedType is fetched on its own
+		mock_readRSSFeed.reset_mock()
+		subscriptions.append((getMajorFeed('four', 'chicago p.d.', 'movie'), subscriptions[0][1]))
+
+		rssdaemon.readSubscriptions(subscriptions)
+		self.assertEqual(mock_readRSSFeed.call_count, 2)
 
 
 	@patch('flannelfox.datasources.rss.readRssConfigs')
@@ -1774,6 +1858,27 @@ class TestRssDaemon(unittest.TestCase):
 		self.assertEqual(self.getQueuedTorrentsCount(), 2)
 
 
+	@patch('flannelfox.rssdaemon.metrics.write')
+	@patch('flannelfox.datasources.rss.readRssConfigs')
+	@patch('flannelfox.datasources.lastfm.readLastfmArtistsConfigs')
+	@patch('flannelfox.datasources.goodreads.readGoodreadsConfigs')
+	@patch('flannelfox.datasources.trakttv.readTraktTvConfigs')
+	def test_rssReader_metricsName(self, mock_trakttv, mock_goodreads, mock_lastfm, mock_rss, mock_write):
+
+		mock_rss.return_value = {}
+		mock_lastfm.return_value = {}
+		mock_goodreads.return_value = {}
+		mock_trakttv.return_value = {}
+
+		rssdaemon.rssReader()
+		mock_write.assert_called_once_with('rssdaemon')
+
+		# The combined daemon writes one file for both of its loops
+		mock_write.reset_mock()
+		rssdaemon.rssReader(metricsName='combineddaemon')
+		mock_write.assert_called_once_with('combineddaemon')
+
+
 	@patch('flannelfox.datasources.rss.readRssConfigs')
 	@patch('flannelfox.datasources.lastfm.readLastfmArtistsConfigs')
 	@patch('flannelfox.datasources.goodreads.readGoodreadsConfigs')
@@ -1834,6 +1939,158 @@ class TestRssDaemon(unittest.TestCase):
 		self.assertEqual(self.getQueuedTorrentsCount(), 2)
 
 
+	@patch('flannelfox.datasources.rss.readRssConfigs')
+	@patch('flannelfox.datasources.lastfm.readLastfmArtistsConfigs')
+	@patch('flannelfox.datasources.goodreads.readGoodreadsConfigs')
+	@patch('flannelfox.datasources.trakttv.readTraktTvConfigs')
+	@patch('flannelfox.rssdaemon.readRSSFeed')
+	def test_rssReader_schedule(self, mock_readRSSFeed, mock_trakttv, mock_goodreads, mock_lastfm, mock_rss):
+
+		self.removeDatabase()
+
+		mock_rss.return_value = self.testRssConfig
+		mock_lastfm.return_value = {}
+		mock_goodreads.return_value = {}
+		mock_trakttv.return_value = {}
+
+		mock_readRSSFeed.return_value = (self.testRssDataTv, 200, 'utf-8')
+
+		schedule = scheduler.FeedSchedule(60, adaptive={'minInterval':60, 'maxInterval':3600, 'targetItems':1.0})
+
+		rssdaemon.rssReader(schedule=schedule)
+		self.assertEqual(self.getQueuedTorrentsCount(), 2)
+
+		urls = [minorFeed['url'] for majorFeed in self.testRssConfig.values() for minorFeed in majorFeed['minorFeeds']]
+
+		for url in urls:
+			self.assertIsNotNone(schedule.stats[url].links)
+
+		# Nothing is due straight after a poll
+		self.assertEqual(schedule.getDue(self.testRssConfig), {})
+
+
+	@patch('flannelfox.datasources.rss.readRssConfigs')
+	@patch('flannelfox.datasources.lastfm.readLastfmArtistsConfigs')
+	@patch('flannelfox.datasources.goodreads.readGoodreadsConfigs')
+	@patch('flannelfox.datasources.trakttv.readTraktTvConfigs')
+	@patch('flannelfox.rssdaemon.readRSSFeed')
+	@patch.dict(settings, {'rssCycleTimeout': 2})
+	def test_rssReader_deadline(self, mock_readRSSFeed, mock_trakttv, mock_goodreads, mock_lastfm, mock_rss):
+
+		self.removeDatabase()
+
+		mock_rss.return_value = {}
+		mock_lastfm.return_value = {}
+		mock_goodreads.return_value = {}
+		mock_trakttv.return_value = self.testGoodreadsConfig
+
+		def readRSSFeed(url):
+			# One tracker hangs
+			if 'site2.com' in url:
+				time.sleep(20)
+
+			return (self.testRssDataEbook, 200, 'utf-8')
+
+		mock_readRSSFeed.side_effect = readRSSFeed
+
+		schedule = scheduler.FeedSchedule(60)
+
+		start = time.time()
+		rssdaemon.rssReader(schedule=schedule)
+
+		# What was read before the deadline is kept
+		self.assertLess(time.time() - start, 10)
+		self.assertEqual(self.getQueuedTorrentsCount(), 2)
+
+		# The feeds that were given up on are polled again next cycle
+		due = schedule.getDue(self.testGoodreadsConfig)
+		urls = [minorFeed['url'] for majorFeed in due.values() for minorFeed in majorFeed['minorFeeds']]
+
+		self.assertEqual(sorted(set(urls)), ['http://site2.com/rss', 'http://site2.com/rss?somefiler=1'])
+
+
+	@patch('flannelfox.datasources.rss.readRssConfigs')
+	@patch('flannelfox.datasources.lastfm.readLastfmArtistsConfigs')
+	@patch('flannelfox.datasources.goodreads.readGoodreadsConfigs')
+	@patch('flannelfox.datasources.trakttv.readTraktTvConfigs')
+	@patch('flannelfox.rssdaemon.readRSSFeed')
+	def test_rssReader_breaker(self, mock_readRSSFeed, mock_trakttv, mock_goodreads, mock_lastfm, mock_rss):
+
+		self.removeDatabase()
+
+		mock_rss.return_value = {}
+		mock_lastfm.return_value = {}
+		mock_goodreads.return_value = {}
+		mock_trakttv.return_value = self.testGoodreadsConfig
+
+		def readRSSFeed(url):
+			# One tracker is down
+			if 'site2.com' in url:
+				return (None, 503, None)
+
+			return (self.testRssDataEbook, 200, 'utf-8')
+
+		mock_readRSSFeed.side_effect = readRSSFeed
+
+		stateFile = os.path.join(settings['files']['privateDir'], 'test-circuitbreaker.json')
+		options = {'failures': 3, 'hostFailures': 2, 'delay': 300, 'maxDelay': 3600}
+
+		breaker = circuitbreaker.CircuitBreaker(options, stateFile=stateFile)
+
+		try:
+			rssdaemon.rssReader(breaker=breaker)
+			self.assertEqual(self.getQueuedTorrentsCount(), 2)
+
+			# Both feeds of the host failed so it is tripped
+			self.assertEqual([key for key, circuit in breaker.getTripped()], ['site2.com'])
+			self.assertTrue(os.path.exists(stateFile))
+
+			# And left alone on the next cycle, even after a restart
+			breaker = circuitbreaker.CircuitBreaker(options, stateFile=stateFile)
+			allowed = breaker.filter(self.testGoodreadsConfig)
+			self.assertEqual(set(minorFeed['url'] for majorFeed in allowed.values() for minorFeed in majorFeed['minorFeeds']), {'http://site.com/rss'})
+
+			# The fetches happen in the workers, had the host been polled
+			# again it would have failed more times
+			rssdaemon.rssReader(breaker=breaker)
+
+			self.assertEqual(breaker.hosts['site2.com'].failures, 2)
+			self.assertNotIn('site.com', breaker.hosts)
+
+		finally:
+			os.remove(stateFile)
+
+
+	@patch('flannelfox.datasources.rss.readRssConfigs')
+	@patch('flannelfox.datasources.lastfm.readLastfmArtistsConfigs')
+	@patch('flannelfox.datasources.goodreads.readGoodreadsConfigs')
+	@patch('flannelfox.datasources.trakttv.readTraktTvConfigs')
+	@patch('flannelfox.rssdaemon.readRSSFeed')
+	@patch('flannelfox.rssdaemon.scheduler.notify')
+	def test_rssReader_handoff(self, mock_notify, mock_readRSSFeed, mock_trakttv, mock_goodreads, mock_lastfm, mock_rss):
+
+		self.removeDatabase()
+
+		mock_rss.return_value = self.testRssConfig
+		mock_lastfm.return_value = {}
+		mock_goodreads.return_value = {}
+		mock_trakttv.return_value = {}
+
+		mock_readRSSFeed.return_value = (self.testRssDataTv, 200, 'utf-8')
+
+		woken = []
+		handoff = TorrentQueue.Handoff(wake=lambda: woken.append(True))
+		handoff.torrents = []
+
+		rssdaemon.rssReader(handoff=handoff)
+
+		# Written to the database and handed over once per url, queuedaemon
+		# is not told
+		self.assertEqual(self.getQueuedTorrentsCount(), 2)
+		self.assertEqual(len(handoff), 1)
+		self.assertEqual(woken, [True])
+		mock_notify.assert_not_called()
+
 
 if __name__ == '__main__':
 	unittest.main()
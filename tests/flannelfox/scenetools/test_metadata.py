@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import unittest, random
+
+from flannelfox.scenetools import TV, Movie, Music, MetaData, Columns, VideoProperties, AudioProperties
+
+class TestMetaData(unittest.TestCase):
+
+	def searchMetaData(self, meta, properties):
+		'''
+		The substring search the extractor replaced
+		'''
+		metaData = {}
+
+		meta = meta.lower()
+		for ch in ('.', '[', ']', '(', ')', '{', '}', '-'):
+			meta = meta.replace(ch, ' ')
+
+		meta = ' {0} '.format(meta.strip())
+
+		for name, values, rule in properties:
+			for value in values:
+				if ' {0} '.format(value.lower()) in meta:
+
+					if rule == MetaData.FLAG:
+						metaData[name] = True
+						break
+
+					elif rule == MetaData.LONGEST:
+						if name not in metaData or len(metaData[name]) < len(value):
+							metaData[name] = value
+
+					else:
+						metaData[name] = value
+						break
+
+		return metaData
+
+
+	def getMetas(self, values, count):
+		rand = random.Random(42)
+		words = values + ['junk', 'group', 'x264', 'S01E01', '24bit', 'DJ', 'Mix', '']
+		separators = ['.', ' ', '-', '  ', '[', ']', '(', ')', '{', '}', '_']
+
+		metas = []
+		for idx in range(count):
+			meta = ''
+			for word in rand.sample(words, rand.randint(1, 6)):
+				meta += rand.choice(separators) + rand.choice([word, word.upper(), word.title()])
+			metas.append(meta)
+
+		return metas
+
+
+	def test_sameAsSearch(self):
+		video = [
+			('quality', VideoProperties.Quality),
+			('container', VideoProperties.Container),
+			('codec', VideoProperties.Codec),
+			('source', VideoProperties.Source),
+			('proper', VideoProperties.Proper)
+		]
+
+		audio = [
+			('quality', AudioProperties.Quality),
+			('releaseType', AudioProperties.ReleaseType),
+			('codec', AudioProperties.Codec),
+			('source', AudioProperties.Source),
+			('proper', AudioProperties.Proper)
+		]
+
+		rules = {
+			TV: {'codec': MetaData.LONGEST, 'proper': MetaData.FLAG},
+			Movie: {'proper': MetaData.FLAG},
+			Music: {'proper': MetaData.FLAG}
+		}
+
+		for module, lists in ((TV, video), (Movie, video), (Music, audio)):
+
+			properties = [(name, values, rules[module].get(name, MetaData.FIRST)) for name, values in lists]
+			metas = self.getMetas(sum((values for name, values in lists), []), 2000)
+
+			for meta, parsed in zip(metas, module.parseMetaDataMany(metas)):
+				self.assertEqual(parsed, self.searchMetaData(meta, properties), meta)
+				self.assertEqual(module.parseMetaData(meta), parsed)
+
+
+	def test_precedence(self):
+
+		# The longest codec wins for tv, the first in the list for movies
+		self.assertEqual(TV.parseMetaData('h264.h264hi10p')['codec'], 'h264hi10p')
+		self.assertEqual(Movie.parseMetaData('h264.h264hi10p')['codec'], 'h264hi10p')
+		self.assertEqual(Movie.parseMetaData('h264.xvid')['codec'], 'xvid')
+
+		# Phrases match whole words one space apart
+		self.assertEqual(Music.parseMetaData('[2016] [24bit Lossless] - FLAC')['quality'], '24bit lossless')
+		self.assertEqual(Music.parseMetaData('[24bit.lossless]')['quality'], '24bit lossless')
+		self.assertEqual(Music.parseMetaData('[24bit  lossless]')['quality'], 'lossless')
+		self.assertEqual(Music.parseMetaData('[dj mix]')['releaseType'], 'dj mix')
+
+		self.assertEqual(TV.parseMetaData(None), {})
+		self.assertEqual(TV.parseMetaData('.proper.720p.')['proper'], True)
+
+
+	def test_parseMany(self):
+		parsed = TV.parseMetaDataMany(['.720p.hdtv', '.720p.hdtv', None])
+
+		self.assertEqual(parsed, [{'quality':'720p', 'source':'hdtv'}, {'quality':'720p', 'source':'hdtv'}, {}])
+
+		# Titles with the same meta data do not share a dict
+		self.assertIsNot(parsed[0], parsed[1])
+
+
+	def test_parseTitles(self):
+		titles = {
+			TV: ['some.show.s01e01.720p.hdtv', 'not a show', 'other.show.s02e03.720p.hdtv.proper', 'some.show.2016.01.02.1080p'],
+			Movie: ['some.movie.2009.x264.720p', 'no year here', 'other.movie.(2010).dvdrip'],
+			Music: ['some.artist.-.album.name.[2008-mp3-v0(vbr)]', 'no album', 'some artist - album name [1997] [Single] - MP3 / V0 (VBR) / CD']
+		}
+
+		for module, batch in titles.items():
+			columns = module.parseTitles(batch)
+
+			self.assertEqual(columns['parsed'], [module.parseTitle(title) is not None for title in batch])
+
+			# Every column has a row for each title
+			for column in columns.values():
+				self.assertEqual(len(column), len(batch))
+
+			for idx, title in enumerate(batch):
+				self.assertEqual(Columns.getRow(columns, idx), module.parseTitle(title))
+
+
+if __name__ == '__main__':
+	unittest.main()
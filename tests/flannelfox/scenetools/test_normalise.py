@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import unittest, random, re, html
+
+from flannelfox import settings
+from flannelfox.scenetools import Normalise, SeparatorCharacters
+
+class TestNormalise(unittest.TestCase):
+
+	ALPHABET = ['a', 'b', '1', '2', ' ', '.', '_', '-', '|', '&', '&amp;', '(', ')', '[', ']', '{', '}', ':', ',', '\'', '\\', '\t', 'x264', 'Blu-Ray', 'v0 (vbr)', 'TvHD 1 2 ', ' (2005)']
+
+	def getStrings(self, count=3000):
+		rand = random.Random(7)
+		return [''.join(rand.choice(self.ALPHABET) for idx in range(rand.randint(0, 12))) for idx in range(count)]
+
+
+	def replaceChain(self, name, ampersands=True, dropYear=False):
+		'''
+		The strip/replace chain cleanName replaced
+		'''
+		name = name.strip(SeparatorCharacters.SeparatorCharactersStr+SeparatorCharacters.SeparatorSpecialCharactersStr)
+		name = SeparatorCharacters.SeparatorCharactersRegexCompiled.sub(' ', name)
+
+		if ampersands:
+			name = name.replace(u' & ', u' and ')
+
+		name = name.strip()
+
+		if dropYear:
+			name = re.sub(r'(.+) \([\d]+\)$', r'\1', name)
+
+		for ch in [u'(', u')', u'[', u']', '{', '}']:
+			if ch in name:
+				name = name.replace(ch, u'')
+
+		return name
+
+
+	def test_cleanName(self):
+		for name in self.getStrings():
+			for ampersands, dropYear in ((True, False), (False, False), (True, True)):
+				self.assertEqual(
+					Normalise.cleanName(name, ampersands=ampersands, dropYear=dropYear),
+					self.replaceChain(name, ampersands=ampersands, dropYear=dropYear),
+					repr(name)
+				)
+
+
+	def test_cleanTitle(self):
+		for title in self.getStrings():
+			expected = html.unescape(re.sub(r'&', r'and', title, flags=re.IGNORECASE))
+
+			expected = expected.replace('.',' ')
+			for ch in (':', '\\', '\'', ','):
+				expected = expected.replace(ch, '')
+
+			self.assertEqual(Normalise.cleanTitle(title), expected, repr(title))
+
+
+	def test_sanitise(self):
+		for title in self.getStrings():
+			expected = re.sub(r'(?:'+r')|(?:'.join(settings.BAD_PREFIXES)+r')', r'', title, flags=re.IGNORECASE)
+
+			for key, val in settings.KEYWORD_SYNONYMS.items():
+				expected = re.sub(key, val, expected, flags=re.IGNORECASE)
+
+			self.assertEqual(Normalise.sanitise(title), expected, repr(title))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest.mock import patch
+
+from flannelfox.scenetools import TV, Movie, Patterns
+
+class TestPatterns(unittest.TestCase):
+
+	def setUp(self):
+		Patterns.takeRejected()
+
+
+	def test_matchFirst(self):
+		rules = [Patterns.compile(r'(?P<title>a*)b'), Patterns.compile(r'(?P<title>.+)b'), Patterns.compile(r'c')]
+
+		self.assertEqual(Patterns.matchFirst(rules, 'aab').group('title'), 'aa')
+		self.assertIsNone(Patterns.matchFirst(rules, 'x'))
+
+		# Rules whose match is not accepted are passed over
+		match = Patterns.matchFirst(rules, 'b.b', accept=lambda match: match.group('title') != '')
+		self.assertEqual(match.group('title'), 'b.')
+
+		# Without an accepted match the last rule decides
+		self.assertEqual(Patterns.matchFirst(rules[:2], 'bb', accept=lambda match: False).group('title'), 'b')
+
+
+	def test_maxLength(self):
+		title = 'some.show.s01e01.720p.hdtv{0}'.format('.' * 600)
+
+		self.assertIsNone(TV.parseTitle(title))
+		self.assertIsNone(Movie.parseTitle('some.movie.2009{0}'.format('.' * 600)))
+		self.assertEqual(Patterns.takeRejected(), {'length': 2})
+
+		# Counts start again once taken
+		self.assertEqual(Patterns.takeRejected(), {})
+
+		with patch.dict(Patterns.settings.settings['titleParsing'], {'maxLength': 1000}):
+			self.assertEqual(TV.parseTitle(title)['title'], 'some show')
+
+
+	@unittest.skipIf(Patterns.regex is None, 'regex is not installed')
+	def test_timeout(self):
+		with patch.dict(Patterns.settings.settings['titleParsing'], {'maxLength': 100000, 'timeout': 0.01}):
+			self.assertIsNone(TV.parseTitle('a{0}b'.format('.' * 20000)))
+
+		self.assertEqual(Patterns.takeRejected(), {'timeout': 1})
+
+
+if __name__ == '__main__':
+	unittest.main()
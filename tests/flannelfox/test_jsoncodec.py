@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from flannelfox import jsoncodec
+
+class TestJsonCodec(unittest.TestCase):
+
+	def test_roundTrip(self):
+
+		data = {
+			'method':'torrent-add',
+			'arguments':{
+				'filename':'http://somesite.com/"quoted"\\path/ünïcode',
+				'ids':[1, 2, 3],
+				'delete-local-data':False
+			},
+			'tag':1
+		}
+
+		encoded = jsoncodec.encode(data)
+
+		self.assertIsInstance(encoded, bytes)
+		self.assertEqual(jsoncodec.decode(encoded), data)
+		self.assertEqual(jsoncodec.decode(encoded.decode('utf-8')), data)
+
+
+	def test_decodeDetectsInvalidData(self):
+
+		with self.assertRaises(jsoncodec.DecodeError):
+			jsoncodec.decode(b'<html>not json</html>')
+
+		with self.assertRaises(jsoncodec.DecodeError):
+			jsoncodec.decode(b'')
+
+
+if __name__ == '__main__':
+	unittest.main()
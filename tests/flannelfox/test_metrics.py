@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import unittest, tempfile, os, pickle, json
+from unittest.mock import patch
+
+from flannelfox import metrics
+from flannelfox.settings import settings
+
+
+class TestMetrics(unittest.TestCase):
+
+	def test_registry(self):
+		registry = metrics.Registry()
+
+		registry.inc('fetches', feed='tv')
+		registry.inc('fetches', 2, feed='tv')
+		registry.gauge('queue', 5)
+		registry.observe('fetch', 0.5, feed='tv')
+		registry.observe('fetch', 1.5, feed='tv')
+
+		with registry.timer('parse'):
+			pass
+
+		self.assertEqual(registry.get('fetches', feed='tv'), 3)
+		self.assertEqual(registry.get('queue'), 5)
+		self.assertEqual(registry.get('fetch', feed='tv'), [2, 2.0, 1.5])
+		self.assertEqual(registry.get('parse')[0], 1)
+		self.assertIsNone(registry.get('fetches', feed='movies'))
+
+
+	def test_disabled(self):
+		registry = metrics.Registry(enabled=False)
+
+		registry.inc('fetches', feed='tv')
+		registry.gauge('queue', 5)
+		registry.observe('fetch', 0.5)
+
+		with registry.timer('parse'):
+			pass
+
+		self.assertEqual(registry.snapshot(), {'counters': {}, 'gauges': {}, 'timers': {}})
+
+		# The module functions leave the process registry alone
+		with patch.object(metrics, 'registry', metrics.Registry()), \
+			patch.dict(settings['metrics'], {'enabled': False}):
+			metrics.inc('fetches')
+			metrics.gauge('queue', 5)
+			metrics.observe('fetch', 0.5)
+
+			with metrics.timer('parse') as timer:
+				pass
+
+			self.assertIs(timer, metrics.NULL_TIMER)
+			self.assertEqual(metrics.registry.snapshot(), {'counters': {}, 'gauges': {}, 'timers': {}})
+
+
+	def test_merge(self):
+		worker = metrics.Registry()
+		worker.inc('items', 10, feed='tv')
+		worker.observe('fetch', 2.0, feed='tv')
+
+		# Snapshots cross process boundaries
+		snapshot = pickle.loads(pickle.dumps(worker.snapshot()))
+
+		registry = metrics.Registry()
+		registry.inc('items', 5, feed='tv')
+		registry.observe('fetch', 1.0, feed='tv')
+		registry.merge(snapshot)
+		registry.merge(None)
+
+		self.assertEqual(registry.get('items', feed='tv'), 15)
+		self.assertEqual(registry.get('fetch', feed='tv'), [2, 3.0, 2.0])
+
+
+	def test_prometheus(self):
+		registry = metrics.Registry()
+		registry.inc('fetches', feed='say "hi"')
+		registry.gauge('queue', 5, state='total')
+		registry.observe('fetch', 0.25)
+
+		self.assertEqual(registry.toPrometheus().splitlines(), [
+			'# TYPE flannelfox_fetches_total counter',
+			'flannelfox_fetches_total{feed="say \\"hi\\""} 1',
+			'# TYPE flannelfox_queue gauge',
+			'flannelfox_queue{state="total"} 5',
+			'# TYPE flannelfox_fetch_seconds summary',
+			'flannelfox_fetch_seconds_count 1',
+			'flannelfox_fetch_seconds_sum 0.250000',
+			'# TYPE flannelfox_fetch_seconds_max gauge',
+			'flannelfox_fetch_seconds_max 0.250000'
+		])
+
+
+	def test_write(self):
+		registry = metrics.Registry()
+		registry.inc('fetches', feed='tv')
+
+		with tempfile.TemporaryDirectory() as directory:
+			fileName = os.path.join(directory, 'metrics', 'rssdaemon.prom')
+			registry.write(fileName)
+
+			with open(fileName) as metricsFile:
+				self.assertIn('flannelfox_fetches_total{feed="tv"} 1', metricsFile.read())
+
+			fileName = os.path.join(directory, 'rssdaemon.json')
+			registry.write(fileName, 'json')
+
+			with open(fileName) as metricsFile:
+				self.assertEqual(
+					json.load(metricsFile)['counters'],
+					[{'name':'fetches', 'labels':{'feed':'tv'}, 'value':1}]
+				)
+
+			self.assertEqual(sorted(os.listdir(directory)), ['metrics', 'rssdaemon.json'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+import unittest, tempfile, os, threading, socket
+
+from flannelfox import scheduler
+
+
+class Clock(object):
+
+	def __init__(self):
+		self.now = 1000.0
+
+	def __call__(self):
+		return self.now
+
+
+class TestScheduler(unittest.TestCase):
+
+	def setUp(self):
+		self.clock = Clock()
+		self.jobs = scheduler.Scheduler(clock=self.clock)
+		self.runs = []
+		self.release = threading.Event()
+		self.release.set()
+
+
+	def work(self):
+		self.runs.append(self.clock.now)
+		self.release.wait(5)
+
+
+	def waitForJobs(self):
+		for thread in self.jobs.threads:
+			thread.join(5)
+
+
+	def test_fixedRate(self):
+		job = self.jobs.add('work', self.work, 60)
+
+		self.assertEqual(len(self.jobs.runPending()), 1)
+		self.waitForJobs()
+
+		# Deadlines stay on the grid no matter how long a run takes
+		self.clock.now = 1030.0
+		self.assertEqual(self.jobs.runPending(), [])
+		self.assertEqual(self.jobs.getTimeout(), 30.0)
+
+		self.clock.now = 1061.0
+		self.assertEqual(len(self.jobs.runPending()), 1)
+		self.waitForJobs()
+
+		self.assertEqual(self.runs, [1000.0, 1061.0])
+		self.assertEqual(job.nextRun, 1120.0)
+		self.assertEqual(job.runs, 2)
+
+
+	def test_skipsOverlappingRuns(self):
+		self.release.clear()
+		job = self.jobs.add('work', self.work, 60)
+
+		self.jobs.runPending()
+
+		# Still running through three deadlines
+		self.clock.now = 1200.0
+		self.assertEqual(self.jobs.runPending(), [])
+
+		self.release.set()
+		self.waitForJobs()
+
+		self.clock.now = 1210.0
+		self.assertEqual(len(self.jobs.runPending()), 1)
+		self.waitForJobs()
+
+		# 1060 and 1120 are skipped, this run stands in for 1180
+		self.assertEqual(self.runs, [1000.0, 1210.0])
+		self.assertEqual(job.skipped, 2)
+		self.assertEqual(job.nextRun, 1240.0)
+
+
+	def test_wake(self):
+		self.jobs.add('work', self.work, 60)
+		self.jobs.runPending()
+		self.waitForJobs()
+
+		self.clock.now = 1010.0
+		self.assertTrue(self.jobs.wake('work'))
+		self.assertFalse(self.jobs.wake('missing'))
+		self.jobs.runPending()
+		self.waitForJobs()
+
+		self.assertEqual(self.runs, [1000.0, 1010.0])
+
+
+	def test_wakeWhileRunning(self):
+		self.release.clear()
+		job = self.jobs.add('work', self.work, 60)
+		self.jobs.runPending()
+
+		self.clock.now = 1010.0
+		self.jobs.wake('work')
+		self.assertEqual(self.jobs.runPending(), [])
+
+		# The wake up is not lost, it runs once the first run is done
+		self.release.set()
+		self.waitForJobs()
+		self.assertEqual(len(self.jobs.runPending()), 1)
+		self.waitForJobs()
+
+		self.assertEqual(self.runs, [1000.0, 1010.0])
+
+
+	def test_errors(self):
+		def fail():
+			raise ValueError('broken')
+
+		job = self.jobs.add('fail', fail, 60)
+		self.jobs.runPending()
+		self.waitForJobs()
+
+		self.assertEqual(job.errors, 1)
+		self.assertFalse(job.running)
+
+
+	def test_run(self):
+		jobs = scheduler.Scheduler()
+
+		def work():
+			self.runs.append(1)
+			if len(self.runs) == 3:
+				jobs.stop()
+
+		jobs.add('work', work, 0.01)
+		jobs.run()
+
+		self.assertEqual(len(self.runs), 3)
+
+
+	@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'needs unix sockets')
+	def test_trigger(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'queuedaemon.sock')
+			woken = threading.Event()
+
+			self.assertFalse(scheduler.notify(path))
+
+			jobs = scheduler.Scheduler()
+			jobs.add('work', woken.set, 3600, delay=3600)
+
+			self.assertTrue(jobs.listen(path, 'work'))
+
+			thread = threading.Thread(target=jobs.run)
+			thread.start()
+
+			self.assertTrue(scheduler.notify(path))
+			self.assertTrue(woken.wait(5))
+
+			jobs.stop()
+			thread.join(5)
+
+			self.assertFalse(thread.is_alive())
+			self.assertFalse(os.path.exists(path))
+
+
+def markPolled(schedule, majorFeeds, now):
+	for majorFeed in majorFeeds.values():
+		for minorFeed in majorFeed['minorFeeds']:
+			schedule.record(minorFeed['url'], majorFeed, None, now=now)
+
+
+class TestFeedSchedule(unittest.TestCase):
+
+	def setUp(self):
+		self.majorFeeds = {
+			'fast': {'feedName':'fast', 'minorFeeds':[{'url':'http://fast'}]},
+			'slow': {'feedName':'slow', 'pollInterval':1800, 'minorFeeds':[{'url':'http://slow'}, {'url':'http://other'}]}
+		}
+
+
+	def test_getDue(self):
+		schedule = scheduler.FeedSchedule(60)
+
+		self.assertEqual(sorted(schedule.getDue(self.majorFeeds, 0)), ['fast', 'slow'])
+		markPolled(schedule, self.majorFeeds, 0)
+
+		# The job can start a little early
+		self.assertEqual(sorted(schedule.getDue(self.majorFeeds, 59)), ['fast'])
+		markPolled(schedule, {'fast': self.majorFeeds['fast']}, 59)
+
+		self.assertEqual(sorted(schedule.getDue(self.majorFeeds, 1800)), ['fast', 'slow'])
+
+		# Feeds that are no longer configured are forgotten
+		del self.majorFeeds['slow']
+		schedule.getDue(self.majorFeeds, 1800)
+		self.assertEqual(list(schedule.stats.keys()), ['http://fast'])
+
+
+	def test_dueMinorFeeds(self):
+		schedule = scheduler.FeedSchedule(60)
+		markPolled(schedule, self.majorFeeds, 0)
+		schedule.record('http://other', self.majorFeeds['slow'], None, now=1000)
+
+		due = schedule.getDue(self.majorFeeds, 1800)
+
+		# Only the urls that are due are polled
+		self.assertEqual(due['slow']['minorFeeds'], [{'url':'http://slow'}])
+		self.assertEqual(len(self.majorFeeds['slow']['minorFeeds']), 2)
+
+
+	def test_adaptive(self):
+		schedule = scheduler.FeedSchedule(60, adaptive={'minInterval':60, 'maxInterval':3600, 'targetItems':1.0})
+		majorFeed = self.majorFeeds['fast']
+		links = ['link{0}'.format(i) for i in range(50)]
+
+		stats = schedule.record('http://fast', majorFeed, links[:10], now=0)
+		self.assertEqual(stats.interval, 60)
+
+		# Nothing new, back off
+		stats = schedule.record('http://fast', majorFeed, links[:10], now=60)
+		self.assertEqual(stats.interval, 90)
+
+		stats = schedule.record('http://fast', majorFeed, links[:10], now=150)
+		self.assertEqual(stats.interval, 135)
+
+		# A new item every 300 seconds
+		stats.rate = None
+		stats = schedule.record('http://fast', majorFeed, links[1:11], now=450)
+		self.assertEqual(stats.interval, 300)
+		self.assertEqual(stats.lastNewItem, 450)
+
+		# Everything is new, items may have been missed
+		stats = schedule.record('http://fast', majorFeed, links[20:30], now=750)
+		self.assertEqual(stats.interval, 150)
+
+		# The feed asks to be cached for an hour and a half
+		stats = schedule.record('http://fast', majorFeed, links[21:31], hint=5400, now=900)
+		self.assertEqual(stats.interval, 3600)
+
+		self.assertFalse(schedule.isDue('http://fast', majorFeed, 900 + 1800))
+		self.assertTrue(schedule.isDue('http://fast', majorFeed, 900 + 3600))
+
+
+	def test_pollIntervalIsNotAdapted(self):
+		schedule = scheduler.FeedSchedule(60, adaptive={'minInterval':60, 'maxInterval':3600, 'targetItems':1.0})
+		majorFeed = self.majorFeeds['slow']
+
+		schedule.record('http://slow', majorFeed, ['a'], now=0)
+		schedule.record('http://slow', majorFeed, ['a'], now=1800)
+
+		self.assertTrue(schedule.isDue('http://slow', majorFeed, 3600))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+import unittest, os, socket, tempfile, threading, hashlib, xmlrpc.client
+from unittest.mock import patch, MagicMock
+
+import flannelfox
+from flannelfox.settings import settings
+from flannelfox.torrentclients import RTorrent, Torrent
+from flannelfox.torrentclients.RTorrent import Responses, bdecodeInfoHash
+from flannelfox.torrentclients.tools import xmlrpc2scgi
+
+
+class FakeRTorrent(object):
+	'''
+	Minimal scgi xmlrpc server listening on a unix socket, connections are
+	kept open so reuse can be checked
+	'''
+
+	def __init__(self, path, handler):
+		self.path = path
+		self.handler = handler
+		self.connections = 0
+		self.calls = []
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.bind(path)
+		self.sock.listen(5)
+		self.thread = threading.Thread(target=self.serve, daemon=True)
+		self.thread.start()
+
+	def serve(self):
+		while True:
+			try:
+				conn, addr = self.sock.accept()
+			except OSError:
+				return
+			self.connections += 1
+			threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+	def readRequest(self, conn, data):
+		while b':' not in data:
+			chunk = conn.recv(4096)
+			if not chunk:
+				return None, b''
+			data += chunk
+
+		length, _, data = data.partition(b':')
+		length = int(length)
+
+		while len(data) < length + 1:
+			data += conn.recv(4096)
+
+		headers = data[:length].split(b'\x00')
+		data = data[length+1:]
+		bodyLength = int(headers[headers.index(b'CONTENT_LENGTH')+1])
+
+		while len(data) < bodyLength:
+			data += conn.recv(4096)
+
+		return data[:bodyLength], data[bodyLength:]
+
+	def dispatch(self, method, params):
+		self.calls.append(method)
+
+		if method == 'system.multicall':
+			results = []
+			for call in params[0]:
+				try:
+					results.append([self.dispatch(call['methodName'], call['params'])])
+				except xmlrpc.client.Fault as e:
+					results.append({'faultCode':e.faultCode, 'faultString':e.faultString})
+			return results
+
+		return self.handler(method, params)
+
+	def handle(self, conn):
+		rest = b''
+		with conn:
+			while True:
+				body, rest = self.readRequest(conn, rest)
+				if body is None:
+					return
+
+				params, method = xmlrpc.client.loads(body, use_builtin_types=True)
+
+				try:
+					reply = xmlrpc.client.dumps((self.dispatch(method, params),), methodresponse=True)
+				except xmlrpc.client.Fault as e:
+					reply = xmlrpc.client.dumps(e)
+
+				reply = reply.encode('utf-8')
+				conn.sendall(
+					b'Status: 200 OK\r\nContent-Type: text/xml\r\nContent-Length: ' +
+					str(len(reply)).encode('ascii') + b'\r\n\r\n' + reply
+				)
+
+	def close(self):
+		self.sock.close()
+
+
+class TestRTorrent(unittest.TestCase):
+
+	TORRENT = b'd8:announce3:url4:infod4:name4:test12:piece lengthi16384eee'
+
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.socketPath = os.path.join(self.tmp.name, 'rtorrent.sock')
+		self.rows = []
+		self.loaded = {}
+		self.server = FakeRTorrent(self.socketPath, self.handler)
+		self.settings = patch.dict(settings['client'], {'type':'rtorrent', 'url':'scgi://{0}'.format(self.socketPath)})
+		self.settings.start()
+
+	def tearDown(self):
+		self.settings.stop()
+		self.server.close()
+		self.tmp.cleanup()
+
+	def handler(self, method, params):
+		if method == 'd.multicall2':
+			return self.rows
+
+		if method == 'd.hash':
+			if params[0] not in self.loaded:
+				raise xmlrpc.client.Fault(-501, 'Could not find info-hash.')
+			return params[0]
+
+		if method == 'load.raw_start_verbose':
+			self.loaded[bdecodeInfoHash(params[1])] = list(params[2:])
+			return 0
+
+		if method == 'd.base_path':
+			return self.loaded.get(params[0], '')
+
+		if method in ('d.erase', 'd.stop', 'd.start', 'd.check_hash'):
+			if params[0] not in self.loaded:
+				raise xmlrpc.client.Fault(-501, 'Could not find info-hash.')
+			return 0
+
+		raise xmlrpc.client.Fault(-506, 'Method not defined')
+
+
+	def test_bdecodeInfoHash(self):
+		info = b'd4:name4:test12:piece lengthi16384ee'
+		self.assertEqual(bdecodeInfoHash(self.TORRENT), hashlib.sha1(info).hexdigest().upper())
+		self.assertRaises(ValueError, bdecodeInfoHash, b'not a torrent')
+		self.assertRaises(ValueError, bdecodeInfoHash, b'd8:announce3:urle')
+		self.assertRaises(ValueError, bdecodeInfoHash, b'd4:infod4:name')
+
+
+	def test_connectionReuse(self):
+		rpc = xmlrpc2scgi.RTorrentXMLRPCClient('scgi://{0}'.format(self.socketPath))
+
+		for i in range(5):
+			self.assertEqual(rpc.d.multicall2('', 'main', 'd.hash='), [])
+
+		self.assertEqual(self.server.connections, 1)
+
+		# A connection dropped by the server is replaced transparently
+		rpc.connection.sock.shutdown(socket.SHUT_RDWR)
+		self.assertEqual(rpc.d.multicall2('', 'main', 'd.hash='), [])
+		self.assertEqual(self.server.connections, 2)
+		rpc.close()
+
+
+	def test_largeReply(self):
+		self.rows = [['{0:040X}'.format(i), 'x' * 200] for i in range(5000)]
+
+		conn = xmlrpc2scgi.SCGIConnection('scgi://{0}'.format(self.socketPath), bufferSize=1024)
+		rpc = xmlrpc2scgi.RTorrentXMLRPCClient('scgi://{0}'.format(self.socketPath), connection=conn)
+
+		self.assertEqual(rpc.d.multicall2('', 'main', 'd.hash=', 'd.name='), self.rows)
+		self.assertGreater(len(conn.buffer), 1024)
+		rpc.close()
+
+
+	def test_missingSettings(self):
+		with self.assertRaisesRegex(ValueError, 'host and port not set'):
+			RTorrent.Client(clientSettings={'type':'rtorrent'})
+
+		with self.assertRaisesRegex(ValueError, 'port not set'):
+			RTorrent.Client(clientSettings={'type':'rtorrent', 'host':'localhost'})
+
+		client = RTorrent.Client(clientSettings={'type':'rtorrent', 'host':'localhost', 'port':5000})
+		self.assertEqual(client.elements['url'], 'scgi://localhost:5000')
+
+
+	def test_updateQueue(self):
+		client = RTorrent.Client()
+
+		self.rows = [
+			# hash, state, active, hashing, complete, completed, size, ratio, uprate, message, dir, multi, finished, last active
+			['AAA', 1, 1, 0, 0, 50, 100, 0, 0, '', '/data/a', 0, 0, 10],
+			['BBB', 1, 1, 0, 1, 100, 100, 1500, 20, '', '/data/b/BBB', 1, 5, 20],
+			['CCC', 0, 0, 0, 0, 0, 100, 0, 0, '', '/data/c', 0, 0, 30],
+			['DDD', 1, 1, 1, 0, 0, 0, 0, 0, '', '/data/d', 0, 0, 40],
+		]
+
+		self.assertEqual(client.updateQueue(), (Responses.success, 200))
+
+		queue = client.getQueue()
+		self.assertEqual([t['hashString'] for t in queue], ['AAA', 'BBB', 'CCC', 'DDD'])
+		self.assertEqual([t['status'] for t in queue], [4, 6, 0, 2])
+		self.assertEqual(queue[0]['percentDone'], 0.5)
+		self.assertEqual(queue[1]['uploadRatio'], 1.5)
+		self.assertEqual(queue[1]['downloadDir'], '/data/b')
+		self.assertEqual(len(client.getDownloading()), 1)
+		self.assertEqual(len(client.getSeeding()), 1)
+
+		# The whole queue is read with one call on one connection
+		client.updateQueue()
+		self.assertEqual(self.server.calls.count('d.multicall2'), 2)
+		self.assertEqual(self.server.connections, 1)
+
+
+	def test_updateQueueRemovesBadTorrents(self):
+		client = RTorrent.Client()
+		self.loaded['AAA'] = os.path.join(self.tmp.name, 'missing')
+
+		self.rows = [
+			['AAA', 1, 1, 0, 0, 0, 100, 0, 0, 'Tracker: [Failure reason "unregistered torrent"]', '/data/a', 0, 0, 0],
+		]
+
+		with patch.object(RTorrent.Client, 'SLEEP_SHORT', 0):
+			self.assertEqual(client.updateQueue(), (Responses.success, 200))
+
+		self.assertEqual(client.getQueue(), [])
+		self.assertIn('d.erase', self.server.calls)
+
+
+	@patch.object(RTorrent.Client, 'SLEEP_SHORT', 0)
+	@patch.object(RTorrent.Client, 'SLEEP_LONG', 0)
+	def test_torrentActions(self):
+		client = RTorrent.Client()
+		self.loaded['AAA'] = os.path.join(self.tmp.name, 'AAA')
+		os.mkdir(self.loaded['AAA'])
+
+		self.assertTrue(client.stopTorrent(hashString='AAA'))
+		self.assertTrue(client.startTorrent(hashString='AAA'))
+		self.assertTrue(client.verifyTorrent(hashString='AAA'))
+		self.assertFalse(client.stopTorrent(hashString='ZZZ'))
+		self.assertFalse(client.stopTorrent())
+
+		self.assertTrue(client.removeTorrent(hashString='AAA', deleteData=True))
+		self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'AAA')))
+		self.assertFalse(client.removeTorrent(hashString='ZZZ'))
+
+		self.assertFalse(client.restart())
+
+
+	@patch('flannelfox.torrentclients.RTorrent.requests.get')
+	def test_addTorrentURL(self, mockGet):
+		client = RTorrent.Client()
+
+		mockGet.return_value = MagicMock(status_code=200, content=self.TORRENT)
+		hashString = bdecodeInfoHash(self.TORRENT)
+
+		self.assertEqual(client.addTorrentURL(url='http://test', destination='/data/tv'), (0, hashString))
+		self.assertEqual(self.loaded[hashString], ['d.directory.set="/data/tv"'])
+
+		self.assertEqual(client.addTorrentURL(url='http://test', destination='/data/tv'), (1, hashString))
+
+		mockGet.return_value = MagicMock(status_code=200, content=b'<html>login</html>')
+		self.assertEqual(client.addTorrentURL(url='http://test'), (3, Responses.badTorrent))
+
+		mockGet.return_value = MagicMock(status_code=404, content=b'')
+		self.assertEqual(client.addTorrentURL(url='http://test'), (3, Responses.torrentNotFound))
+
+		mockGet.return_value = MagicMock(status_code=503, content=b'')
+		self.assertEqual(client.addTorrentURL(url='http://test'), (2, Responses.torrentServiceUnavailable))
+
+		mockGet.side_effect = Exception('timeout')
+		self.assertEqual(client.addTorrentURL(url='http://test'), (2, Responses.torrentNoResponse))
+
+		self.assertRaises(ValueError, client.addTorrentURL)
+
+
+if __name__ == '__main__':
+	unittest.main()
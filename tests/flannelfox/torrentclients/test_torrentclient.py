@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+import unittest, threading
+from unittest.mock import patch
+
+import flannelfox
+from flannelfox.settings import settings
+from flannelfox.torrentclients import TorrentClient, Generic, Torrent
+
+
+class FakeBackend(Generic.Client):
+
+	# Used to check that the backends are polled at the same time
+	barrier = None
+
+	def __init__(self, clientSettings=None):
+		self.elements = dict(clientSettings, queue=[])
+		self.torrents = []
+		self.added = []
+		self.removed = []
+
+	def updateQueue(self):
+		if self.barrier is not None:
+			self.barrier.wait(timeout=5)
+		self.elements['queue'] = list(self.torrents)
+		return ('success', 200)
+
+	def addTorrentURL(self, url=None, destination=None):
+		hashString = '{0}-{1}'.format(self.elements['name'], len(self.added))
+		self.added.append((url, destination))
+		return (0, hashString)
+
+	def removeTorrent(self, hashString=None, deleteData=False, reason='No Reason Given'):
+		self.removed.append(hashString)
+		return True
+
+
+def makeTorrent(hashString, status=6, downloadDir='/data'):
+	return Torrent(
+		hashString=hashString,
+		id=1,
+		error=0,
+		errorString='',
+		uploadRatio=10.0,
+		percentDone=1.0,
+		doneDate=1,
+		activityDate=1,
+		rateUpload=0,
+		downloadDir=downloadDir,
+		status=status
+	)
+
+
+class TestTorrentClient(unittest.TestCase):
+
+	def getClient(self, policy='fewestTorrents', clients=None):
+		clients = clients or [
+			{'name':'a', 'type':'fake'},
+			{'name':'b', 'type':'fake'}
+		]
+
+		with patch.dict(TorrentClient.BACKENDS, {'fake':FakeBackend}), \
+			patch.dict(settings, {'clients':clients}), \
+			patch.dict(settings['queueManagement'], {'shardingPolicy':policy}):
+			return TorrentClient()
+
+
+	def test_singleClient(self):
+		with patch.dict(settings['client'], {'type':'fake', 'name':'only'}), \
+			patch.dict(TorrentClient.BACKENDS, {'fake':FakeBackend}):
+			client = TorrentClient()
+
+		self.assertEqual(len(client.clients), 1)
+		self.assertIs(client.view, client.client)
+
+
+	def test_unknownClient(self):
+		with patch.dict(settings, {'clients':[{'type':'unknown'}]}):
+			self.assertRaises(ValueError, TorrentClient)
+
+
+	def test_aggregatedQueue(self):
+		client = self.getClient()
+		a, b = client.clients
+
+		a.torrents = [makeTorrent('a1'), makeTorrent('a2', status=4)]
+		b.torrents = [makeTorrent('b1')]
+
+		# Both backends must be waiting at the same time to get through
+		FakeBackend.barrier = threading.Barrier(2)
+		try:
+			self.assertEqual(client.updateQueue(), ('success', 200))
+		finally:
+			FakeBackend.barrier = None
+
+		self.assertEqual([t['hashString'] for t in client.getQueue()], ['a1', 'a2', 'b1'])
+		self.assertEqual([t['hashString'] for t in client.getDownloading()], ['a2'])
+		self.assertEqual([t['hashString'] for t in client.getSeeding()], ['a1', 'b1'])
+
+		# Calls for a torrent go to the backend holding it
+		client.removeTorrent(hashString='b1')
+		client.deleteTorrent(hashString='a1')
+		self.assertEqual(a.removed, ['a1'])
+		self.assertEqual(b.removed, ['b1'])
+
+
+	@patch('flannelfox.torrentclients.time.sleep')
+	def test_shardFewestTorrents(self, mockSleep):
+		client = self.getClient()
+		a, b = client.clients
+
+		a.torrents = [makeTorrent('a1'), makeTorrent('a2')]
+		client.updateQueue()
+
+		client.addTorrentURL(url='http://1', destination='/data')
+		client.addTorrentURL(url='http://2', destination='/data')
+		client.addTorrentURL(url='http://3', destination='/data')
+
+		# Adds since the last poll count towards a backend's load
+		self.assertEqual(len(a.added), 1)
+		self.assertEqual(len(b.added), 2)
+		self.assertIs(client.owners['b-0'], b)
+
+
+	@patch('flannelfox.torrentclients.time.sleep')
+	def test_shardFeedDestination(self, mockSleep):
+		client = self.getClient(policy='feedDestination', clients=[
+			{'name':'a', 'type':'fake'},
+			{'name':'b', 'type':'fake'},
+			{'name':'c', 'type':'fake', 'destinations':['/data/music']}
+		])
+		a, b, c = client.clients
+
+		b.torrents = [makeTorrent('b1', downloadDir='/data/tv'), makeTorrent('b2', downloadDir='/data/tv')]
+		client.updateQueue()
+
+		client.addTorrentURL(url='http://1', destination='/data/tv')
+		client.addTorrentURL(url='http://2', destination='/data/music/flac')
+		client.addTorrentURL(url='http://3', destination='/data/movies')
+
+		self.assertEqual(b.added, [('http://1', '/data/tv')])
+		self.assertEqual(c.added, [('http://2', '/data/music/flac')])
+		self.assertEqual(a.added, [('http://3', '/data/movies')])
+
+
+	@patch('flannelfox.torrentclients.time.sleep')
+	@patch('flannelfox.torrentclients.UsedSpace.check')
+	def test_shardLeastUsedSpace(self, mockCheck, mockSleep):
+		client = self.getClient(policy='leastUsedSpace', clients=[
+			{'name':'a', 'type':'fake', 'maxUsedSpaceDir':'/a'},
+			{'name':'b', 'type':'fake', 'maxUsedSpaceDir':'/b'}
+		])
+		a, b = client.clients
+
+		a.torrents = [makeTorrent('a1'), makeTorrent('a2'), makeTorrent('a3')]
+		b.torrents = [makeTorrent('b1')]
+		client.updateQueue()
+
+		mockCheck.side_effect = lambda folder, size: {'/a':30, '/b':10}[folder]
+
+		client.addTorrentURL(url='http://1', destination='/data')
+		client.addTorrentURL(url='http://2', destination='/data')
+		client.addTorrentURL(url='http://3', destination='/data')
+
+		# Each add counts as an average torrent of 10G until the next poll
+		self.assertEqual(len(b.added), 2)
+		self.assertEqual(len(a.added), 1)
+
+		# The space is only measured once a poll
+		self.assertEqual(mockCheck.call_count, 2)
+
+		client.updateQueue()
+		client.addTorrentURL(url='http://4', destination='/data')
+		self.assertEqual(mockCheck.call_count, 4)
+
+
+
+	@patch('flannelfox.torrentclients.time.sleep')
+	def test_shardHeldTorrent(self, mockSleep):
+		client = self.getClient()
+		a, b = client.clients
+
+		a.torrents = [makeTorrent('a1'), makeTorrent('a2')]
+		client.updateQueue()
+
+		client.addTorrentURL(url='http://1', destination='/data')
+		self.assertEqual(b.added, [('http://1', '/data')])
+
+		# b now holds it, adding it again goes back to b even though a has
+		# fewer torrents than b after a poll
+		b.torrents = [makeTorrent('b-0'), makeTorrent('b2'), makeTorrent('b3')]
+		client.updateQueue()
+
+		with patch.object(b, 'addTorrentURL', return_value=(1, 'b-0')), \
+			patch.object(client.database, 'torrentExists', return_value=False):
+			self.assertFalse(client.addTorrentURL(url='http://1', destination='/data'))
+
+		# The duplicate is removed from the backend that reported it
+		self.assertEqual(a.added, [])
+		self.assertEqual(a.removed, [])
+		self.assertEqual(b.removed, ['b-0'])
+
+		# Once it is gone from the backends it may go anywhere
+		b.torrents = [makeTorrent('b2'), makeTorrent('b3')]
+		client.updateQueue()
+		client.addTorrentURL(url='http://1', destination='/data')
+		self.assertEqual(a.added, [('http://1', '/data')])
+
+
+	@patch('flannelfox.torrentclients.time.sleep')
+	def test_duplicateOnOtherClient(self, mockSleep):
+		client = self.getClient()
+		a, b = client.clients
+
+		a.torrents = [makeTorrent('a1')]
+		client.updateQueue()
+
+		with patch.object(b, 'addTorrentURL', return_value=(1, 'x1')), \
+			patch.object(client.database, 'torrentExists', return_value=False):
+			client.addTorrentURL(url='http://1', destination='/data')
+
+		self.assertEqual(a.removed, [])
+		self.assertEqual(b.removed, ['x1'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -6,7 +6,8 @@ from unittest.mock import patch, PropertyMock
 import flannelfox
 from flannelfox.settings import settings
 from flannelfox.torrentclients import Transmission, Torrent
-from flannelfox.torrentclients.Transmission import Responses
+from flannelfox.torrentclients.Transmission import Responses, Request
+from flannelfox import jsoncodec
 
 class TestTransmission(unittest.TestCase):
 
@@ -396,6 +397,55 @@ class TestTransmission(unittest.TestCase):
 		self.assertEqual(2, len(result))
 
 
+	def test_request(self):
+
+		request = Request('torrent-add', {'filename':'http://localhost/a "quoted" name\\'}, tag=7)
+		posted = jsoncodec.decode(request.encode())
+
+		self.assertEqual(posted, {
+			'method':'torrent-add',
+			'arguments':{'filename':'http://localhost/a "quoted" name\\'},
+			'tag':7
+		})
+
+		self.assertEqual(jsoncodec.decode(Request('session-get').encode()), {'method':'session-get', 'arguments':{}})
+
+		first = Request.torrentGet(['id', 'hashString'], tag=1)
+		second = Request.torrentGet(['id', 'hashString'], tag=2)
+
+		self.assertIs(first.prefix, second.prefix)
+		self.assertEqual(jsoncodec.decode(second.encode()), {
+			'method':'torrent-get',
+			'arguments':{'fields':['id', 'hashString']},
+			'tag':2
+		})
+
+
+	@patch.object(flannelfox.torrentclients.Transmission.Client, '_Client__sendRequest')
+	@patch('flannelfox.torrentclients.Transmission.Client.SLEEP_SHORT', new_callable=PropertyMock)
+	def test_parseTransmissionResponse(self, SLEEP_SHORT, mock_sendRequest):
+
+		SLEEP_SHORT.return_value = 0
+
+		client = Transmission.Client()
+		request = Request('torrent-get', {'fields':['id']}, tag=42)
+
+		mock_sendRequest.return_value = (b'{"arguments":{"torrents":[]},"result":"success","tag":42}', 200, 'utf-8')
+		response, httpResponseCode, transmissionResponseCode = client._Client__parseTransmissionResponse(request)
+
+		self.assertEqual(httpResponseCode, 200)
+		self.assertEqual(transmissionResponseCode, Responses.success)
+		self.assertEqual(response['arguments'], {'torrents':[]})
+
+		# A reply for a different call should never be accepted
+		mock_sendRequest.reset_mock()
+		mock_sendRequest.return_value = (b'{"arguments":{},"result":"success","tag":41}', 200, 'utf-8')
+		response, httpResponseCode, transmissionResponseCode = client._Client__parseTransmissionResponse(request)
+
+		self.assertEqual(transmissionResponseCode, 'failed')
+		self.assertEqual(mock_sendRequest.call_count, Transmission.Client.TRANSMISSION_MAX_RETRIES)
+
+
 	def test_client(self):
 
 		mock_settings = {
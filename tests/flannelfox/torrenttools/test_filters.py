@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import unittest, pickle
+
+from flannelfox.torrenttools import Filters
+from flannelfox.torrenttools.Torrents import Generic, TV
+
+
+def titleRules(title, quality='720p'):
+	return [
+		{'key':'title', 'val':title, 'exclude':False},
+		{'key':'quality', 'val':quality, 'exclude':False}
+	]
+
+
+class TestFilters(unittest.TestCase):
+
+	def test_candidates(self):
+		likeRules = [{'key':'titleLike', 'val':'show', 'exclude':False}]
+		excludeRules = [{'key':'title', 'val':'some show', 'exclude':True}]
+
+		filterList = Filters.FilterList([
+			titleRules('some show'),
+			titleRules('other show'),
+			likeRules,
+			excludeRules
+		])
+
+		self.assertEqual(
+			filterList.candidates({'title':'some show'}),
+			[likeRules, excludeRules, titleRules('some show')]
+		)
+
+		self.assertEqual(
+			filterList.candidates({'title':'unknown'}),
+			[likeRules, excludeRules]
+		)
+
+		# Plain list changes are picked up on the next lookup
+		filterList.append(titleRules('new show'))
+		self.assertEqual(filterList.candidates({'title':'new show'})[-1], titleRules('new show'))
+
+
+	def test_survivors(self):
+		filterList = Filters.FilterList([
+			titleRules('some show'),
+			[{'key':'artist', 'val':'some artist', 'exclude':False}]
+		])
+
+		columns = {
+			'parsed': [True, True, False, True],
+			'title': ['some show', 'other show', 'some show', None],
+			'artist': [None, None, None, 'some artist']
+		}
+
+		self.assertEqual(filterList.survivors(columns), [0, 3])
+
+		# A rule list that is not indexed could match any title
+		filterList.add([{'key':'titleLike', 'val':'show', 'exclude':False}])
+		self.assertEqual(filterList.survivors(columns), [0, 1, 3])
+
+
+	def test_addRemoveTag(self):
+		filterList = Filters.FilterList()
+
+		filterList.add(titleRules('some show'), tag='some show')
+		filterList.add(titleRules('some show', '1080p'), tag='some show')
+		filterList.add(titleRules('other show'), tag='other show')
+
+		self.assertEqual(len(filterList), 3)
+		self.assertEqual(filterList.removeTag('some show'), 2)
+		self.assertEqual(filterList, [titleRules('other show')])
+		self.assertEqual(filterList.candidates({'title':'some show'}), [])
+		self.assertEqual(filterList.removeTag('missing'), 0)
+
+
+	def test_pickle(self):
+		filterList = Filters.FilterList()
+		filterList.add(titleRules('some show'), tag='some show')
+
+		copy = pickle.loads(pickle.dumps(filterList))
+
+		self.assertEqual(copy, filterList)
+		self.assertEqual(list(copy.tags), ['some show'])
+		self.assertEqual(copy.candidates({'title':'some show'}), [titleRules('some show')])
+
+
+	def test_updateFilterList(self):
+		built = []
+
+		def makeRuleLists(item):
+			built.append(item)
+			return [titleRules(item)]
+
+		filterList, added, removed = Filters.updateFilterList(None, ['a', 'b'], str, makeRuleLists)
+		self.assertEqual((added, removed), (2, 0))
+
+		filterList, added, removed = Filters.updateFilterList(filterList, ['b', 'c', None], str.lower, makeRuleLists)
+
+		# Only the new entry gets rules built, the invalid one is skipped
+		self.assertEqual(built, ['a', 'b', 'c'])
+		self.assertEqual((added, removed), (1, 1))
+		self.assertEqual(filterList, [titleRules('b'), titleRules('c')])
+
+
+	def test_filterCache(self):
+		cache = Filters.FilterCache()
+		feedList = {'list_name':'test'}
+		snapshot = ['a']
+
+		first = cache.get('feed', feedList, snapshot, str, lambda item: [titleRules(item)])
+		self.assertIs(cache.get('feed', feedList, snapshot, str, None), first)
+
+		# A changed config starts from scratch
+		changed = cache.get('feed', {'list_name':'other'}, ['a'], str, lambda item: [titleRules(item, '1080p')])
+		self.assertIsNot(changed, first)
+		self.assertEqual(changed, [titleRules('a', '1080p')])
+
+
+	def test_filterMatch(self):
+		rules = [
+			titleRules('some show'),
+			titleRules('other show', '1080p'),
+			[{'key':'titleLike', 'val':'another', 'exclude':False}],
+			[{'key':'artist', 'val':'some artist', 'exclude':False}]
+		]
+
+		filterList = Filters.FilterList(rules)
+
+		torrents = [
+			TV(torrentTitle='some.show.s01e01.720p.junk.here'),
+			TV(torrentTitle='some.show.s01e01.1080p.junk.here'),
+			TV(torrentTitle='other.show.s01e01.1080p.junk.here'),
+			TV(torrentTitle='another.show.s01e01.480p.junk.here'),
+			TV(torrentTitle='missing.show.s01e01.720p.junk.here'),
+			Generic(torrentTitle='some.artist.some.album')
+		]
+
+		torrents[-1].elements['artist'] = 'some artist'
+
+		for torrent in torrents:
+			self.assertEqual(torrent.filterMatch(filterList), torrent.filterMatch(rules))
+
+		self.assertEqual([t.filterMatch(filterList) for t in torrents], [True, False, True, True, False, True])
+
+
+if __name__ == '__main__':
+	unittest.main()
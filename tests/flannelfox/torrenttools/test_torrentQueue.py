@@ -4,7 +4,7 @@ import unittest
 from unittest.mock import patch
 import os
 
-from flannelfox.torrenttools.TorrentQueue import Queue
+from flannelfox.torrenttools.TorrentQueue import Queue, Handoff
 from flannelfox.torrenttools import Torrents
 
 class TestTorrentQueue(unittest.TestCase):
@@ -61,5 +61,98 @@ class TestTorrentQueue(unittest.TestCase):
 		mockDatabaseTorrentBlacklisted.return_value = False
 		mockDatabaseTorrentExists.return_value = False
 
+
+	@patch.object(Queue, 'databaseTorrentBlacklisted')
+	@patch.object(Queue, 'databaseTorrentExists')
+	def test_flush(self, mockDatabaseTorrentExists, mockDatabaseTorrentBlacklisted):
+
+		mockDatabaseTorrentBlacklisted.return_value = False
+		mockDatabaseTorrentExists.return_value = False
+
+		torrentQueue = Queue()
+		torrent = Torrents.TV(torrentTitle='some.show.s01e01.720p.junk.here')
+		torrentQueue.append(torrent)
+
+		with patch.object(torrentQueue.database, 'addTorrentsToQueue') as mockAddTorrentsToQueue:
+
+			# The queue is emptied once written
+			mockAddTorrentsToQueue.return_value = True
+			self.assertEqual(torrentQueue.flush(), [torrent])
+			self.assertEqual(len(torrentQueue), 0)
+			mockAddTorrentsToQueue.assert_called_once_with([torrent])
+
+			# Flushed torrents are still duplicates
+			self.assertEqual(torrentQueue.append(Torrents.TV(torrentTitle='some.show.s01e01.720p.junk.here')), -1)
+			self.assertEqual(len(torrentQueue), 0)
+
+			torrentQueue.append(Torrents.TV(torrentTitle='some.show.s01e02.720p.junk.here'))
+
+			mockAddTorrentsToQueue.return_value = False
+			self.assertIsNone(torrentQueue.flush())
+			self.assertEqual(len(torrentQueue), 0)
+
+			# Torrents of a failed write are not taken for duplicates
+			self.assertEqual(torrentQueue.append(Torrents.TV(torrentTitle='some.show.s01e02.720p.junk.here')), 0)
+			self.assertEqual(len(torrentQueue), 1)
+
+
+class TestHandoff(unittest.TestCase):
+
+	class FakeDatabase(object):
+
+		def __init__(self, torrents):
+			self.torrents = torrents
+			self.queries = 0
+
+		def getQueuedTorrents(self, selectors=None, num=None):
+			self.queries += 1
+			return [dict(torrent) for torrent in self.torrents]
+
+
+	def test_Handoff(self):
+
+		woken = []
+		handoff = Handoff(wake=lambda: woken.append(True))
+		database = self.FakeDatabase([{'url':'http://testurl.com/1', 'feedDestination':''}])
+
+		newTorrent = Torrents.TV(torrentTitle='some.show.s01e02.720p.junk.here', url='http://testurl.com/2')
+
+		# Torrents put before the first load are read from the database
+		handoff.put([newTorrent])
+		self.assertEqual(len(handoff), 0)
+		self.assertEqual(woken, [True])
+
+		handoff.load(database)
+		handoff.load(database)
+		self.assertEqual(database.queries, 1)
+
+		# Torrents are held the way the database returns them
+		handoff.put([newTorrent])
+		handoff.put([newTorrent])
+		self.assertEqual(handoff.get(), [
+			{'url':'http://testurl.com/1', 'feedDestination':''},
+			{'url':'http://testurl.com/2', 'feedDestination':'', 'priority':0}
+		])
+
+		# Higher priorities go first
+		properTorrent = Torrents.TV(torrentTitle='some.show.s01e01.proper.720p.junk.here', url='http://testurl.com/3')
+		properTorrent.setPriority(1)
+		handoff.put([properTorrent])
+		self.assertEqual([torrent['url'] for torrent in handoff.get(2)], ['http://testurl.com/3', 'http://testurl.com/1'])
+		handoff.remove('http://testurl.com/3')
+
+		handoff.remove('http://testurl.com/1')
+		self.assertEqual([torrent['url'] for torrent in handoff.get()], ['http://testurl.com/2'])
+
+		# Nothing to hand over does not wake the queue reader
+		handoff.put([])
+		self.assertEqual(len(woken), 4)
+
+		handoff.invalidate()
+		handoff.load(database)
+		self.assertEqual(database.queries, 2)
+		self.assertEqual([torrent['url'] for torrent in handoff.get()], ['http://testurl.com/1'])
+
+
 if __name__ == '__main__':
 	unittest.main()
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 
-import unittest
-from flannelfox.torrenttools.Torrents import Generic, TV, Movie, Music
+import unittest, pickle
+from flannelfox.torrenttools import Torrents
+from flannelfox.torrenttools.Torrents import Generic, TV, Movie, Music, Ebook
 
 class TestTorrents(unittest.TestCase):
 
@@ -255,5 +256,78 @@ class TestTorrents(unittest.TestCase):
 		)
 
 
+
+	def test_setPriority(self):
+
+		# The quality and propers are added to the priority of the list
+		self.assertEqual(TV(torrentTitle='some.show.s01e01.720p.junk.here').setPriority(), 1)
+		self.assertEqual(TV(torrentTitle='some.show.s01e01.1080p.junk.here').setPriority(), 2)
+		self.assertEqual(TV(torrentTitle='some.show.s01e01.proper.1080p.junk.here').setPriority(), 3)
+		self.assertEqual(TV(torrentTitle='some.show.s01e01.hdtv.junk.here').setPriority(5), 5)
+
+		torrent = TV(torrentTitle='some.show.s01e01.720p.junk.here')
+		torrent.setPriority(10)
+		self.assertEqual(torrent['priority'], 11)
+
+		# The priority does not make two torrents differ
+		self.assertTrue(torrent == TV(torrentTitle='some.show.s01e01.720p.junk.here'))
+
+
+	def test_parseTitles(self):
+		titles = {
+			Generic: ['Some "Thing" & Other.Thing'],
+			TV: ['Chicago.P.D.S02E03.720p.HDTV.x264', 'Some.Show.S01E01.720p.HDTV', 'Not a show', 'Some.Show.S01E02.720p.HDTV'],
+			Movie: ['Some.Movie.2009.x264.720p', 'No year'],
+			Music: ['Some.Artist.-.Album.Name.[2008-mp3-v0(vbr)]', 'No album'],
+			Ebook: ['Some Author - Some Book']
+		}
+
+		for torrentType, batch in titles.items():
+			columns = torrentType.parseTitles(batch)
+
+			for idx, torrentTitle in enumerate(batch):
+
+				try:
+					expected = torrentType(torrentTitle=torrentTitle, url='url', minTime=1)
+
+				except TypeError:
+					self.assertFalse(columns['parsed'][idx])
+					self.assertIsNone(columns['title'][idx])
+					self.assertRaises(TypeError, torrentType.fromColumns, columns, idx, 'url')
+					continue
+
+				# The columns hold the title the filters are checked against
+				self.assertEqual(columns['title'][idx], expected['title'])
+
+				torrent = torrentType.fromColumns(columns, idx, 'url', minTime=1)
+				self.assertEqual(torrent.elements, expected.elements)
+
+		# Titles are mapped the same way as when the torrent is made
+		self.assertEqual(TV.parseTitles(titles[TV])['title'][0], 'chicago p.d.')
+
+
+	def test_packTorrents(self):
+		torrents = [
+			TV(torrentTitle='some.show.s01e01.720p.junk.here', url='url1'),
+			TV(torrentTitle='some.show.s01e02.720p.junk.here', url='url2'),
+			Movie(torrentTitle='Some.Movie.2009.x264.720p', url='url3'),
+			Generic(torrentTitle='Some Thing', url='url4')
+		]
+		torrents[2].setPriority(5)
+
+		records = Torrents.packTorrents(torrents)
+
+		# Only the values are sent, in the order of the queue columns
+		self.assertEqual(len(records[0]), len(Torrents.QUEUED_FIELDS))
+		self.assertEqual(records[2][Torrents.QUEUED_FIELDS.index('priority')], torrents[2]['priority'])
+
+		unpacked = Torrents.unpackTorrents(pickle.loads(pickle.dumps(records)))
+
+		for torrent, expected in zip(unpacked, torrents):
+			self.assertIs(type(torrent), type(expected))
+			self.assertEqual(torrent.elements, expected.elements)
+
+		self.assertTrue(unpacked[1].filterMatch([[{'key': 'title', 'val': 'some show', 'exclude': False}]]))
+
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file